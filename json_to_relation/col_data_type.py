@@ -13,6 +13,7 @@ Created on Sep 23, 2013
 
 @author: paepcke
 '''
+from decimal import Decimal
 import sys
 
 
@@ -21,19 +22,20 @@ TEXT_LEN = 2**16
 MEDIUM_TEXT_LEN = 2**24
 LONG_TEXT_LEN = 2**32
 
-TINY_INT_MAX = 2**8 - 1
+# Signed ranges, which is how the columns are created:
+TINY_INT_MAX = 2**7 - 1
 TINY_INT_MIN = -2**7
 
-SMALL_INT_MAX = 2**16 - 1
-SMALL_INT_MIN = 2**15
+SMALL_INT_MAX = 2**15 - 1
+SMALL_INT_MIN = -2**15
 
-MEDIUM_INT_MAX = 2**24 - 1
+MEDIUM_INT_MAX = 2**23 - 1
 MEDIUM_INT_MIN = -2**23
 
-INT_MAX = 2**32 - 1
+INT_MAX = 2**31 - 1
 INT_MIN = -2**31
 
-BIG_INT_MAX = 2**64 - 1
+BIG_INT_MAX = 2**63 - 1
 BIG_INT_MIN = -2**63
 
 FLOAT_MAX = sys.float_info.max
@@ -85,6 +87,7 @@ class ColDataType:
                 	 LONGTEXT : '',
                 	 TINYINT  : -1,
                 	 SMALLINT : -1,
+                	 MEDIUMINT: -1,
                 	 INT      : -1,
                 	 BIGINT   : -1,
                 	 FLOAT    : -1.0,
@@ -115,7 +118,7 @@ class ColDataType:
         :param cls: ColDataType, makes it a class method
         :type cls: ColDataType
         :param value: example value
-        :type value: {str | unicode | int | float | bool | None}
+        :type value: {str | unicode | int | long | float | Decimal | bool | None}
         '''
 
         if value is None:
@@ -127,28 +130,43 @@ class ColDataType:
             return ColDataType.BOOL
         
         if isinstance(value, str) or isinstance(value, unicode):
-            if len(value) < TINY_TEXT_LEN:
-                return ColDataType.TINYTEXT
-            elif len(value) < MEDIUM_TEXT_LEN:
-                return ColDataType.MEDIUMTEXT
-            else:
-                return ColDataType.LONGTEXT
+            return cls.textTypeForLength(len(value))
             
-        elif isinstance(value, int):
-            if value < TINY_INT_MAX and value >= TINY_INT_MIN:
+        elif isinstance(value, (int, long)):
+            if value <= TINY_INT_MAX and value >= TINY_INT_MIN:
                 return ColDataType.TINYINT
-            elif value < MEDIUM_INT_MAX and value >= MEDIUM_INT_MIN:
+            elif value <= SMALL_INT_MAX and value >= SMALL_INT_MIN:
+                return ColDataType.SMALLINT
+            elif value <= MEDIUM_INT_MAX and value >= MEDIUM_INT_MIN:
                 return ColDataType.MEDIUMINT
-            elif value < INT_MAX and value >= INT_MIN:
+            elif value <= INT_MAX and value >= INT_MIN:
                 return ColDataType.INT
-            else:
+            elif value <= BIG_INT_MAX and value >= BIG_INT_MIN:
                 return ColDataType.BIGINT
-            
-        elif isinstance(value, float):
-            if value < FLOAT_MAX and value >= FLOAT_MIN:
-                return ColDataType.FLOAT
             else:
                 return ColDataType.DOUBLE
+            
+        elif isinstance(value, (float, Decimal)):
+            # FLOAT would round away digits of
+            # most values that Python holds:
+            return ColDataType.DOUBLE
         else:
             raise ValueError("Unknown type for value '%s'" % str(value) )
-        
+
+    @classmethod
+    def textTypeForLength(cls, length):
+        '''
+        Return the smallest MySQL text type that holds
+        strings of the given length.
+
+        :param length: number of characters
+        :type length: int
+        '''
+        if length < TINY_TEXT_LEN:
+            return ColDataType.TINYTEXT
+        elif length < TEXT_LEN:
+            return ColDataType.TEXT
+        elif length < MEDIUM_TEXT_LEN:
+            return ColDataType.MEDIUMTEXT
+        else:
+            return ColDataType.LONGTEXT
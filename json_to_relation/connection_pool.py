@@ -0,0 +1,145 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Process-wide cache of open MySQL connections, shared by
+the MySQLDB wrappers in mysqldb.py and pymysql_utils1.py.
+
+Connections are keyed by the function that created them
+(pymysql.connect, MySQLdb.connect, ...) and by their connect
+arguments. A connection that a MySQLDB instance no longer needs
+is parked in the pool, and handed to the next instance that asks
+for the same key. Parked connections are pinged before reuse;
+dead ones are discarded silently.
+
+Usage::
+    conn = ConnectionPool.acquire(pymysql.connect, host='127.0.0.1', user='me', db='Edx')
+    ...
+    ConnectionPool.release(conn)
+'''
+
+import threading
+
+
+class ConnectionPool(object):
+
+    # Maximum number of idle connections kept
+    # per connection key. Surplus connections
+    # are closed when released:
+    MAX_IDLE_PER_KEY = 4
+
+    # Map from connection key to list of idle connections:
+    idleConnections = {}
+
+    # Map from id() of handed-out connections to their key:
+    connectionKeys = {}
+
+    lock = threading.Lock()
+
+    @classmethod
+    def acquire(cls, connectFunc, **connArgs):
+        '''
+        Return an open connection for the given connect function and
+        arguments. Reuses an idle connection with the same key if one
+        is alive, else creates a new one by calling connectFunc(**connArgs).
+        Exceptions raised by connectFunc propagate to the caller.
+
+        :param connectFunc: driver function that opens a connection, e.g. pymysql.connect
+        :type connectFunc: callable
+        :param connArgs: keyword arguments for connectFunc
+        :type connArgs: {str : <any>}
+        :return: open connection
+        :rtype: <driver connection>
+        '''
+        key = cls.makeKey(connectFunc, connArgs)
+        while True:
+            with cls.lock:
+                try:
+                    conn = cls.idleConnections.get(key, []).pop()
+                except IndexError:
+                    conn = None
+            if conn is None:
+                conn = connectFunc(**connArgs)
+                break
+            if cls.isAlive(conn):
+                break
+            cls.closeQuietly(conn)
+        with cls.lock:
+            cls.connectionKeys[id(conn)] = key
+        return conn
+
+    @classmethod
+    def release(cls, conn):
+        '''
+        Return a connection obtained from acquire() to the pool.
+        Any open transaction is rolled back. Connections the pool
+        does not know, and connections beyond MAX_IDLE_PER_KEY,
+        are closed.
+
+        :param conn: connection obtained from acquire()
+        :type conn: <driver connection>
+        '''
+        with cls.lock:
+            key = cls.connectionKeys.pop(id(conn), None)
+        if key is None:
+            cls.closeQuietly(conn)
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            cls.closeQuietly(conn)
+            return
+        with cls.lock:
+            idleList = cls.idleConnections.setdefault(key, [])
+            if len(idleList) < ConnectionPool.MAX_IDLE_PER_KEY:
+                idleList.append(conn)
+                return
+        cls.closeQuietly(conn)
+
+    @classmethod
+    def closeAll(cls):
+        '''
+        Close all idle connections. Connections currently handed
+        out are unaffected; they are closed when released.
+        '''
+        with cls.lock:
+            idleLists = cls.idleConnections.values()
+            cls.idleConnections = {}
+            cls.connectionKeys = {}
+        for idleList in idleLists:
+            for conn in idleList:
+                cls.closeQuietly(conn)
+
+    @classmethod
+    def numIdle(cls):
+        '''
+        Return the number of idle connections across all keys.
+        '''
+        with cls.lock:
+            return sum([len(idleList) for idleList in cls.idleConnections.values()])
+
+    @classmethod
+    def makeKey(cls, connectFunc, connArgs):
+        return (connectFunc, tuple(sorted(connArgs.items())))
+
+    @classmethod
+    def isAlive(cls, conn):
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    @classmethod
+    def closeQuietly(cls, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -40,7 +40,6 @@ import hashlib
 import json
 import os
 import re
-import string
 from unidecode import unidecode
 import uuid
 
@@ -48,8 +47,9 @@ from col_data_type import ColDataType
 from generic_json_parser import GenericJSONParser
 from locationManager import LocationManager
 from modulestoreImporter import ModulestoreImporter
-from output_disposition import ColumnSpec
+from output_disposition import ColumnSpec, OutputFile
 from ipToCountry import IpCountryDict
+from warning_aggregator import WarningAggregator
 
 class AssessmentOptionSource():
     LEARNER = 0,
@@ -126,6 +126,10 @@ class EdXTrackLogJSONParser(GenericJSONParser):
     # Picking (likely) zip codes out of a string:
     zipCodePattern = re.compile(r'[^0-9]([0-9]{5})')
 
+    # Max number of mailing addresses whose zip code
+    # and country are remembered:
+    MAX_CACHED_MAIL_ADDRS = 10000
+
     hexGE32Digits = re.compile(r'[a-fA-F0-9]{32,}')
 
     # Finding the word 'status' in problem_graded events:
@@ -147,6 +151,22 @@ class EdXTrackLogJSONParser(GenericJSONParser):
     #   input_i4x-Medicine-HRP258-problem-98ca37dbf24849debcc29eb36811cb68_3_1_choice_3'
     findHashPattern = re.compile(r'([a-f0-9]{32})')
 
+    # Quarters covered by the PARTITION BY LIST clause of the
+    # main table. One partition per quarter. Quarters are
+    # named as in getQuarter(); partitions are named by
+    # academic year, which starts with the fall quarter:
+    # winter2013 is in partition pAY2012_Winter:
+    FIRST_PARTITIONED_QUARTER = 'winter2013'
+    LAST_PARTITIONED_QUARTER  = 'summer2018'
+    QUARTERS_IN_ACADEMIC_YEAR = ['fall', 'winter', 'spring', 'summer']
+
+    # Staging tables whose rows are merged into EdxPrivate by
+    # privateTableMerger.py when deferPrivateMerge is True. Their
+    # CSV files are loaded with REPLACE, so that of rows re-delivered
+    # within a load batch the one loaded last, i.e. the newest, is
+    # merged:
+    DEFERRED_MERGE_TABLES = ['Account', 'EventIp']
+
     def __init__(self,
                  jsonToRelationConverter,
                  mainTableName,
@@ -154,7 +174,9 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                  progressEvery=1000,
                  replaceTables=False,
                  dbName='test',
-                 useDisplayNameCache=False):
+                 useDisplayNameCache=False,
+                 deferPrivateMerge=False,
+                 partitionByQuarter=False):
         '''
         Constructor
 
@@ -178,6 +200,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                     that contains the needed information from modulestore. See
                     modulestoreImporter.py for details.
         :type useDisplayNameCache: Bool
+        :param deferPrivateMerge: if True, finish() does not merge the Edx.Account and
+                    Edx.EventIp staging tables into EdxPrivate. The staging tables then
+                    accumulate across all files of a load batch, and are merged once
+                    by privateTableMerger.py at the end of the batch. Their CSV files are
+                    loaded with REPLACE, so that the newest of re-delivered rows is merged.
+        :type deferPrivateMerge: Bool
+        :param partitionByQuarter: if True, CSV rows for the main table are written
+                    to one file per quarter, and the generated LOAD commands load
+                    each file into the matching partition of the main table only.
+        :type partitionByQuarter: Bool
         '''
         super(EdXTrackLogJSONParser, self).__init__(jsonToRelationConverter,
                                                     logfileID=logfileID,
@@ -186,6 +218,12 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         self.mainTableName = mainTableName
         self.dbName = dbName
+        self.deferPrivateMerge = deferPrivateMerge
+        self.partitionByQuarter = partitionByQuarter
+
+        # Number of ill-formed JSON lines of which
+        # rescueBadJSON() saved what it could:
+        self.numRescuedLines = 0
 
         self.setupMySqlDumpControlInstructions()
 
@@ -208,6 +246,12 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         # A Country abbreviation lookup facility:
         self.countryChecker = LocationManager()
+        # Mailing address --> (zipcode, country) of addresses
+        # seen so far; accounts are often created repeatedly
+        # with the same address:
+        self.mailAddrLocations = {}
+        self.numMailAddrLookups = 0
+        self.numMailAddrHits = 0
 
         # An ip-country lookup facility:
         self.ipCountryDict = IpCountryDict()
@@ -556,7 +600,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # executed *somewhere*. If the .sql files are loaded
         # from the CLI, the statements in the .sql files should
         # be uncommented (remove just the '-- '!. Normally,
-        # the manageEdxDb.py script will do the re-enabling.
+        # the manageEdxDb.py script will do the re-enabling
+        # through executeCSVLoad.sh and postLoadIndexer.py.
         self.dumpPostscript1    =   "-- /*!40000 ALTER TABLE `%s` ENABLE KEYS */;\n" % self.mainTableName +\
                                     "-- /*!40000 ALTER TABLE `State` ENABLE KEYS */;\n" +\
                                     "-- /*!40000 ALTER TABLE `InputState` ENABLE KEYS */;\n" +\
@@ -660,13 +705,17 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         try:
             # Turn top level JSON object to dict:
             try:
-                record = json.loads(str(jsonStr))
+                record = self.decodeJSON(str(jsonStr))
             except ValueError as e:
                 # Try it again after cleaning up the JSON
                 # We don't do the cleanup routinely to save
                 # time.
                 try:
                     cleanJsonStr = self.makeJSONSafe(jsonStr)
+                    if cleanJsonStr == jsonStr:
+                        # Nothing to clean (e.g. a truncated line);
+                        # parsing again would fail the same way:
+                        raise e
                     record = json.loads(cleanJsonStr)
                 except ValueError as e:
                     # Pull out what we can, and place in 'badly_formatted' column
@@ -1011,7 +1060,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 return
 
             else:
-                self.logWarn("Unknown event type '%s' in tracklog row %s" % (eventType, self.jsonToRelationConverter.makeFileCitation()))
+                self.logWarn("Unknown event type '%s' in tracklog row %s", eventType, WarningAggregator.LOCATION)
                 return
         except Exception as e:
             # Note whether any error occurred, so that
@@ -1030,6 +1079,13 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # call to this method:
             self.getReadyForNextRow()
 
+    def decodeJSON(self, jsonStr):
+        '''
+        Turn one track log line into a dict. A method of its own,
+        so that JSONToRelation's stage profiling can time it.
+        '''
+        return json.loads(jsonStr)
+
     def resultTriplet(self, row, targetTableName, colNamesToSet=None):
         '''
         Given an array of column names, and an array of column values,
@@ -1124,7 +1180,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # Several switches to speed up the bulk load:
         self.jsonToRelationConverter.pushString(self.dumpInsertPreamble)
 
-    def genOneCreateStatement(self, tableName, schemaDict, primaryKeyName=None, foreignKeyColNames=None, autoincrement=False):
+    def genOneCreateStatement(self, tableName, schemaDict, primaryKeyName=None, foreignKeyColNames=None, autoincrement=False, partitionClause=None, partitionColInKey=False):
         '''
         Given a table name and its ordered schema dict, generate
         a basic SQL CREATE TABLE statement. Primary and foreign key names may
@@ -1157,10 +1213,20 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type foreignKeyColNames: Dict<String,(String,String)>
         :param autoincrement: whether this table's primary key is autoincrement
         :type autoincrement: Boolean
-        '''
+        :param partitionClause: optional partitioning column name and PARTITION BY clause,
+                  as generated by genQuarterPartitionClause().
+        :type partitionClause: {(String,String) | None}
+        :param partitionColInKey: if True, the primary key is (primaryKeyName, partitioning column),
+                  as MySQL requires for loading into single partitions. Else the primary key is
+                  primaryKeyName alone.
+        :type partitionColInKey: Boolean
+        '''
+        compositeKey = partitionColInKey and partitionClause is not None and primaryKeyName is not None
         createStatement = "CREATE TABLE IF NOT EXISTS %s (\n" % tableName
         for colname in schemaDict.keys():
-            if colname == primaryKeyName:
+            if colname == primaryKeyName and compositeKey:
+                createStatement += "%s NOT NULL,\n" % schemaDict[colname].getSQLDefSnippet()
+            elif colname == primaryKeyName:
                 if autoincrement:
                     createStatement += "%s NOT NULL PRIMARY KEY AUTO_INCREMENT,\n" % schemaDict[colname].getSQLDefSnippet()
                 else:
@@ -1171,38 +1237,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             for foreignTableName in foreignKeyColNames.keys():
                 (localFldName, foreignKeyName) = foreignKeyColNames[foreignTableName]
                 createStatement += "    FOREIGN KEY(%s) REFERENCES %s(%s) ON DELETE CASCADE,\n" % (localFldName, foreignTableName, foreignKeyName)
+        if compositeKey:
+            (partitionColName, partitionSpec) = partitionClause  #@UnusedVariable
+            createStatement += "    PRIMARY KEY(%s,%s),\n" % (primaryKeyName, partitionColName)
 
         # Cut away the comma and newline after the last column spec,
         # and add newline, closing paren, and semicolon:
         createStatement = createStatement[0:-2] + '\n    ) ENGINE=InnoDB'
-        if tableName == 'EdxTrackEvent':
-            createStatement += '\nPARTITION BY LIST COLUMNS(quarter) ( \n' +\
-                     "PARTITION pAY2012_Winter VALUES IN ('winter2013'),\n" +\
-                     "PARTITION pAY2012_Spring VALUES IN ('spring2013'),\n" +\
-    				 "PARTITION pAY2012_Summer VALUES IN ('summer2013'),\n" +\
-    				 "PARTITION pAY2013_Fall VALUES IN ('fall2013'),\n" +\
-    				 "PARTITION pAY2013_Winter VALUES IN ('winter2014'),\n" +\
-    				 "PARTITION pAY2013_Spring VALUES IN ('spring2014'),\n" +\
-    				 "PARTITION pAY2013_Summer VALUES IN ('summer2014'),\n" +\
-    				 "PARTITION pAY2014_Fall VALUES IN ('fall2014'),\n" +\
-    				 "PARTITION pAY2014_Winter VALUES IN ('winter2015'),\n" +\
-    				 "PARTITION pAY2014_Spring VALUES IN ('spring2015'),\n" +\
-    				 "PARTITION pAY2014_Summer VALUES IN ('summer2015'),\n" +\
-    				 "PARTITION pAY2015_Fall VALUES IN ('fall2015'),\n" +\
-    				 "PARTITION pAY2015_Winter VALUES IN ('winter2016'),\n" +\
-    				 "PARTITION pAY2015_Spring VALUES IN ('spring2016'),\n" +\
-    				 "PARTITION pAY2015_Summer VALUES IN ('summer2016'),\n" +\
-    				 "PARTITION pAY2016_Fall VALUES IN ('fall2016'),\n" +\
-    				 "PARTITION pAY2016_Winter VALUES IN ('winter2017'),\n" +\
-    				 "PARTITION pAY2016_Spring VALUES IN ('spring2017'),\n" +\
-    				 "PARTITION pAY2016_Summer VALUES IN ('summer2017'),\n" +\
-    				 "PARTITION pAY2017_Fall VALUES IN ('fall2017'),\n" +\
-    				 "PARTITION pAY2017_Winter VALUES IN ('winter2018'),\n" +\
-    				 "PARTITION pAY2017_Spring VALUES IN ('spring2018'),\n" +\
-    				 "PARTITION pAY2017_Summer VALUES IN ('summer2018')" +\
-                     ");\n"
-        else:
-            createStatement  += ';\n'
+        if partitionClause is not None:
+            createStatement += partitionClause[1]
+        createStatement  += ';\n'
 
         return createStatement
 
@@ -1344,10 +1388,15 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def createMainTable(self):
 
+        # The main table is partitioned by quarter, so that
+        # loads only touch the partition of their quarter, and
+        # quarter-bounded queries only scan the partitions involved:
         createStatement = self.genOneCreateStatement(self.mainTableName,
                                                      self.schemaHintsMainTable,
                                                      primaryKeyName='_id',
-                                                     autoincrement=False)
+                                                     autoincrement=False,
+                                                     partitionClause=self.genQuarterPartitionClause(),
+                                                     partitionColInKey=self.partitionByQuarter)
 
         # Used to be a good boy and declare the foreign keys
         # as such to MySQL. But doing this then forces correct
@@ -1369,12 +1418,76 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 #                                                      foreignKeyColNames=foreignKeysDict,
 #                                                      autoincrement=False)
         self.jsonToRelationConverter.pushString(createStatement)
+        if self.partitionByQuarter:
+            # Have the output module write one CSV file per quarter,
+            # instead of the table's single CSV file:
+            self.jsonToRelationConverter.setPartitionColumn(self.mainTableName, 'quarter')
         # Tell the output module (output_disposition.OutputFile) that
         # it needs to know about a new table. That module will create
         # a CSV file and CSV writer to which rows destined for this
         # table will be written:
         self.jsonToRelationConverter.startNewTable(self.mainTableName, self.schemaHintsMainTable)
 
+    def genQuarterPartitionClause(self):
+        '''
+        Generate the PARTITION BY LIST clause for the main table:
+        one partition for each quarter from FIRST_PARTITIONED_QUARTER
+        to LAST_PARTITIONED_QUARTER. Ex.::
+
+            PARTITION BY LIST COLUMNS(quarter) (
+            PARTITION pAY2013_Fall VALUES IN ('fall2013'),
+            PARTITION pAY2013_Winter VALUES IN ('winter2014'),
+               ...
+            )
+
+        :return: the partitioning column name, and the clause
+        :rtype: (String, String)
+        '''
+        partitionSpecs = ["PARTITION %s VALUES IN ('%s')" % (self.getQuarterPartitionName(quarter), quarter)
+                          for quarter in self.getPartitionedQuarters()]
+        return ('quarter', '\nPARTITION BY LIST COLUMNS(quarter) ( \n' + ',\n'.join(partitionSpecs) + ')')
+
+    def getPartitionedQuarters(self):
+        '''
+        Return the quarters that have a partition in the main table,
+        in time order, named as by getQuarter(): ['winter2013', 'spring2013', ...]
+        '''
+        quarters = []
+        quarterNames = EdXTrackLogJSONParser.QUARTERS_IN_ACADEMIC_YEAR
+        (quarterName, year) = self.splitQuarter(EdXTrackLogJSONParser.FIRST_PARTITIONED_QUARTER)
+        while len(quarters) == 0 or quarters[-1] != EdXTrackLogJSONParser.LAST_PARTITIONED_QUARTER:
+            quarters.append('%s%s' % (quarterName, year))
+            # Quarters after fall are named with
+            # the next calendar year:
+            if quarterName == 'fall':
+                year += 1
+            quarterName = quarterNames[(quarterNames.index(quarterName) + 1) % len(quarterNames)]
+        return quarters
+
+    def getQuarterPartitionName(self, quarter):
+        '''
+        Return the name of the main table partition that holds
+        the given quarter: 'fall2014' --> 'pAY2014_Fall',
+        'winter2015' --> 'pAY2014_Winter'. Returns None if the
+        quarter has no partition.
+
+        :param quarter: quarter as returned by getQuarter()
+        :type quarter: String
+        :rtype: {String | None}
+        '''
+        if quarter not in self.getPartitionedQuarters():
+            return None
+        (quarterName, year) = self.splitQuarter(quarter)
+        academicYear = year if quarterName == 'fall' else year - 1
+        return 'pAY%s_%s' % (academicYear, quarterName.capitalize())
+
+    def splitQuarter(self, quarter):
+        '''
+        Split a quarter as returned by getQuarter() into name and year:
+        'fall2014' --> ('fall', 2014)
+        '''
+        return (quarter[:-4], int(quarter[-4:]))
+
     def handleCommonFields(self, record, row):
         self.currCourseDisplayName = None
         # Create a unique tuple key and event key  for this event:
@@ -1524,14 +1637,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type eventType:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in sequence navigation event." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in sequence navigation event.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in sequence navigation event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in sequence navigation event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         oldIndex = event.get('old', 0)
@@ -1539,8 +1652,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         try:
             seqID    = event['id']
         except KeyError:
-            self.logWarn("Track log line %s with event type %s is missing sequence id" %
-                         (self.jsonToRelationConverter.makeFileCitation(), eventType))
+            self.logWarn("Track log line %s with event type %s is missing sequence id",
+                         WarningAggregator.LOCATION, eventType)
             return row
         self.setValInRow(row, 'sequence_id', seqID)
         self.setValInRow(row, 'goto_from', oldIndex)
@@ -1638,8 +1751,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in problem_check event." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in problem_check event.",
+                         WarningAggregator.LOCATION)
             return row
 
         if isinstance(event, basestring):
@@ -1649,8 +1762,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         # Complex case: event field should be a dict:
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in problem_check event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in problem_check event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         # Go through all the top-level problem_check event fields first:
@@ -1763,8 +1876,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                 answersDict[problemID] = self.makeInsertSafe(answerChoice)
             except ValueError:
                 # Badly formatted GET parameter element:
-                self.logWarn("Track log line %s: badly formatted problemID/answerChoice GET parameter pair: '%s'." %\
-                             (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+                self.logWarn("Track log line %s: badly formatted problemID/answerChoice GET parameter pair: '%s'.",
+                             WarningAggregator.LOCATION, event)
                 return row
         if len(answersDict) > 0:
             # Receive all the Answer table keys generated for
@@ -2190,8 +2303,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         #              (event, self.jsonToRelationConverter.makeFileCitation(), str(event)))                  
         # #*********************        
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event type problem_reset." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in event type problem_reset.",
+                         WarningAggregator.LOCATION)
             return row
 
         # From "{\"POST\": {\"id\": [\"i4x://Engineering/EE368/problem/ab656f3cb49e4c48a6122dc724267cb6@draft\"]}, \"GET\": {}}"
@@ -2207,16 +2320,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
                 return row
             else:
-                self.logWarn("Track log line %s: event is not a dict in problem_reset event: '%s'" %\
-                             (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+                self.logWarn("Track log line %s: event is not a dict in problem_reset event: '%s'",
+                             WarningAggregator.LOCATION, event)
                 return row
 
         # Get the POST field's problem id array:
         try:
             problemIDs = postGetDict['POST']['id']
         except KeyError:
-            self.logWarn("Track log line %s with event type problem_reset contains event without problem ID array: '%s'" %
-                         (self.jsonToRelationConverter.makeFileCitation(), event))
+            self.logWarn("Track log line %s with event type problem_reset contains event without problem ID array: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         self.setValInRow(row, 'problem_id', problemIDs)
         # Try to look up the human readable display name
@@ -2244,24 +2357,24 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event type problem_show." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in event type problem_show.",
+                         WarningAggregator.LOCATION)
             return row
 
         # From "{\"POST\": {\"id\": [\"i4x://Engineering/EE368/problem/ab656f3cb49e4c48a6122dc724267cb6@draft\"]}, \"GET\": {}}"
         # make a dict:
         postGetDict = self.ensureDict(event)
         if postGetDict is None:
-            self.logWarn("Track log line %s: event is not a dict in problem_show event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in problem_show event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         # Get the problem id:
         try:
             problemID = postGetDict['problem']
         except KeyError:
-            self.logWarn("Track log line %s with event type problem_show contains event without problem ID: '%s'" %
-                         (self.jsonToRelationConverter.makeFileCitation(), event))
+            self.logWarn("Track log line %s with event type problem_show contains event without problem ID: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         self.setValInRow(row, 'problem_id', problemID)
         # Try to look up the human readable display name
@@ -2290,13 +2403,13 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event type problem_save." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in event type problem_save.",
+                         WarningAggregator.LOCATION)
             return row
 
         if not isinstance(event, basestring):
-            self.logWarn("Track log line %s: event is not a string in problem save event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a string in problem save event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         probIDSolPairs = event.split('&')
@@ -2353,24 +2466,24 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in question hide or show." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in question hide or show.",
+                         WarningAggregator.LOCATION)
             return row
 
         "{\"location\":\"i4x://Education/EDUC115N/combinedopenended/4abb8b47b03d4e3b8c8189b3487f4e8d\"}"
         # make a dict:
         locationDict = self.ensureDict(event)
         if locationDict is None:
-            self.logWarn("Track log line %s: event is not a dict in problem_show/hide event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in problem_show/hide event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         # Get location:
         try:
             location = locationDict['location']
         except KeyError:
-            self.logWarn("Track log line %s: no location field provided in problem hide or show event: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: no location field provided in problem hide or show event: '%s'",
+             WarningAggregator.LOCATION, event)
             return row
 
         self.setValInRow(row, 'question_location', location)
@@ -2386,16 +2499,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in select_rubric." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in select_rubric.",
+                         WarningAggregator.LOCATION)
             return row
 
         # From "{\"location\":\"i4x://Education/EDUC115N/combinedopenended/4abb8b47b03d4e3b8c8189b3487f4e8d\",\"selection\":\"1\",\"category\":0}"
         # make a dict:
         locationDict = self.ensureDict(event)
         if locationDict is None:
-            self.logWarn("Track log line %s: event is not a dict in select_rubric event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in select_rubric event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         try:
@@ -2403,8 +2516,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             selection = locationDict['selection']
             category = locationDict['category']
         except KeyError:
-            self.logWarn("Track log line %s: missing location, selection, or category in event type select_rubric." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing location, selection, or category in event type select_rubric.",
+                         WarningAggregator.LOCATION)
             return row
         self.setValInRow(row, 'question_location', location)
         self.setValInRow(row, 'rubric_selection', selection)
@@ -2429,23 +2542,23 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             {u'value': u'5'}
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in oe_feedback_response_selected." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in oe_feedback_response_selected.",
+                         WarningAggregator.LOCATION)
             return row
 
         # From "{\"value\":\"5\"}"
         # make a dict:
         valDict = self.ensureDict(event)
         if valDict is None:
-            self.logWarn("Track log line %s: event is not a dict in oe_feedback_response_selected event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in oe_feedback_response_selected event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         try:
             value = valDict['value']
         except KeyError:
-            self.logWarn("Track log line %s: missing 'value' field in event type oe_feedback_response_selected." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing 'value' field in event type oe_feedback_response_selected.",
+                         WarningAggregator.LOCATION)
             return row
         self.setValInRow(row, 'feedback_response_selected', value)
 
@@ -2469,14 +2582,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in video play or pause." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in video play or pause.",
+                         WarningAggregator.LOCATION)
             return row
 
         valsDict = self.ensureDict(event)
         if valsDict is None:
-            self.logWarn("Track log line %s: event is not a dict in video play/pause: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in video play/pause: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         videoID = valsDict.get('id', None)
@@ -2503,14 +2616,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in video seek." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in video seek.",
+                         WarningAggregator.LOCATION)
             return row
 
         valsDict = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in video play/pause: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in video play/pause: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         videoID = valsDict.get('id', None)
@@ -2539,14 +2652,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in video speed change." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in video speed change.",
+                         WarningAggregator.LOCATION)
             return row
 
         valsDict = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in video speed change: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in video speed change: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         videoID = valsDict.get('id', None)
@@ -2579,14 +2692,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text event type fullscreen." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text event type fullscreen.",
+                         WarningAggregator.LOCATION)
             return row
 
         valsDict = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in fullscreen: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in fullscreen: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         videoID = valsDict.get('id', None)
@@ -2613,14 +2726,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text event type fullscreen." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text event type fullscreen.",
+                         WarningAggregator.LOCATION)
             return row
 
         valsDict = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in not_fullscreen: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in not_fullscreen: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         videoID = valsDict.get('id', None)
@@ -2720,15 +2833,15 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in book event type." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in book event type.",
+                         WarningAggregator.LOCATION)
             return row
 
         # Make a dict from the string:
         valsDict = self.ensureDict(event)
         if valsDict is None:
-            self.logWarn("Track log line %s: event is not a dict in book event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in book event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         bookInteractionType = valsDict.get('name', None)
@@ -2792,21 +2905,21 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         {"problem_id": "i4x://Medicine/HRP258/problem/28b525192c4e43daa148dc7308ff495e"}
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in showanswer." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in showanswer.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in handle showanswer event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in handle showanswer event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         try:
             problem_id = event['problem_id']
         except KeyError:
-            self.logWarn("Track log line %s: showanswer event does not include a problem ID: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: showanswer event does not include a problem ID: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         self.setValInRow(row, 'problem_id', problem_id)
@@ -2835,14 +2948,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event info in show_transcript or hide_transcript." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in show_transcript or hide_transcript.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in show_transcript or hide_transcript: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in show_transcript or hide_transcript: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         xcriptID = event.get('id', None)
@@ -2894,14 +3007,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in problem_check event." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in problem_check event.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in handle problem_check event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in handle problem_check event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         problem_id = event.get('problem_id', None)
@@ -2987,8 +3100,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event info in problem_rescore_fail." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in problem_rescore_fail.",
+                         WarningAggregator.LOCATION)
             return row
         problem_id = event.get('problem_id', None)
         failure    = event.get('failure', None)  # 'closed' or 'unreset'
@@ -3031,14 +3144,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in problem_rescore event." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in problem_rescore event.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in handle problem_rescore event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in handle problem_rescore event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         problem_id = event.get('problem_id', None)
@@ -3093,14 +3206,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in save_problem_fail, save_problem_success, or reset_problem_fail." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in save_problem_fail, save_problem_success, or reset_problem_fail.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in handle save_problem_fail, save_problem_success, or reset_problem_fail event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in handle save_problem_fail, save_problem_success, or reset_problem_fail event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         problem_id = event.get('problem_id', None)
@@ -3198,14 +3311,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in reset_problem." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in reset_problem.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in handle reset_problem event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in handle reset_problem event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         self.setValInRow(row, 'problem_id',event.get('problem_id', ''))
@@ -3235,24 +3348,24 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def handleRescoreReset(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in rescore-all-submissions or reset-all-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in rescore-all-submissions or reset-all-attempts.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in handle resource event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in handle resource event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         courseID = event.get('course', '')
         if len(courseID) == 0:
-            self.logWarn("Track log line %s: missing course ID in rescore-all-submissions or reset-all-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing course ID in rescore-all-submissions or reset-all-attempts.",
+                         WarningAggregator.LOCATION)
         problemID = event.get('problem', '')
         if len(problemID) == 0:
-            self.logWarn("Track log line %s: missing problem ID in rescore-all-submissions or reset-all-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing problem ID in rescore-all-submissions or reset-all-attempts.",
+                         WarningAggregator.LOCATION)
 
         self.setValInRow(row, 'course_id', courseID)
         self.setValInRow(row, 'problem_id', problemID)
@@ -3266,29 +3379,29 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def handleDeleteStateRescoreSubmission(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in delete-student-module-state or rescore-student-submission." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in delete-student-module-state or rescore-student-submission.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
 
-            self.logWarn("Track log line %s: event is not a dict in delete-student-module-state or rescore-student-submission event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in delete-student-module-state or rescore-student-submission event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         courseID  = event.get('course', '')
         problemID = event.get('problem', '')
         studentID = event.get('student', '')
         if courseID is None:
-            self.logWarn("Track log line %s: missing course ID in delete-student-module-state or rescore-student-submission." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing course ID in delete-student-module-state or rescore-student-submission.",
+                         WarningAggregator.LOCATION)
         if problemID is None:
-            self.logWarn("Track log line %s: missing problem ID in delete-student-module-state or rescore-student-submission." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing problem ID in delete-student-module-state or rescore-student-submission.",
+                         WarningAggregator.LOCATION)
         if studentID is None:
-            self.logWarn("Track log line %s: missing student ID in delete-student-module-state or rescore-student-submission." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing student ID in delete-student-module-state or rescore-student-submission.",
+                         WarningAggregator.LOCATION)
         self.setValInRow(row, 'course_id', courseID)
         self.setValInRow(row, 'problem_id', problemID)
         # Try to look up the human readable display name
@@ -3301,14 +3414,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def handleResetStudentAttempts(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in reset-student-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in reset-student-attempts.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in reset-student-attempt event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in reset-student-attempt event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         problemID = event.get('problem', '')
@@ -3316,17 +3429,17 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         instructorID = event.get('instructor_id', '')
         attempts = event.get('old_attempts', -1)
         if len(problemID) == 0:
-            self.logWarn("Track log line %s: missing problem ID in reset-student-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing problem ID in reset-student-attempts.",
+                         WarningAggregator.LOCATION)
         if len(studentID) == 0:
-            self.logWarn("Track log line %s: missing student ID in reset-student-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing student ID in reset-student-attempts.",
+                         WarningAggregator.LOCATION)
         if len(instructorID) == 0:
-            self.logWarn("Track log line %s: missing instrucotrIDin reset-student-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing instrucotrIDin reset-student-attempts.",
+                         WarningAggregator.LOCATION)
         if attempts < 0:
-            self.logWarn("Track log line %s: missing attempts field in reset-student-attempts." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing attempts field in reset-student-attempts.",
+                         WarningAggregator.LOCATION)
 
         self.setValInRow(row, 'problem_id', problemID)
         # Try to look up the human readable display name
@@ -3340,25 +3453,25 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def handleGetStudentProgressPage(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in get-student-progress-page." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in get-student-progress-page.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in get-student-progress-page event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in get-student-progress-page event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         studentID = event.get('student', None)
         instructorID = event.get('instructor_id', None)
 
         if studentID is None:
-            self.logWarn("Track log line %s: missing student ID in get-student-progress-page." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing student ID in get-student-progress-page.",
+                         WarningAggregator.LOCATION)
         if instructorID is None:
-            self.logWarn("Track log line %s: missing instrucotrID in get-student-progress-page." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing instrucotrID in get-student-progress-page.",
+                         WarningAggregator.LOCATION)
 
         self.setValInRow(row, 'student_id', studentID)
         self.setValInRow(row, 'instructor_id', instructorID)
@@ -3366,34 +3479,34 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def handleAddRemoveInstructor(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in add-instructor or remove-instructor." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in add-instructor or remove-instructor.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in add-instructor or remove-instructor event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in add-instructor or remove-instructor event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         instructorID = event.get('instructor_id', None)
 
         if instructorID is None:
-            self.logWarn("Track log line %s: missing instrucotrID add-instructor or remove-instructor." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing instrucotrID add-instructor or remove-instructor.",
+                         WarningAggregator.LOCATION)
         self.setValInRow(row, 'instructor_id', instructorID)
         return row
 
     def handleListForumMatters(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in list-forum-admins, list-forum-mods, or list-forum-community-TAs." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in list-forum-admins, list-forum-mods, or list-forum-community-TAs.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in list-forum-admins, list-forum-mods, or list-forum-community-TAs event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in list-forum-admins, list-forum-mods, or list-forum-community-TAs event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         return row
@@ -3401,43 +3514,43 @@ class EdXTrackLogJSONParser(GenericJSONParser):
     def handleForumManipulations(self, record, row, event):
         if event is None:
             self.logWarn("Track log line %s: missing event info in one of remove-forum-admin, add-forum-admin, " +\
-                         "remove-forum-mod, add-forum-mod, remove-forum-community-TA, or add-forum-community-TA." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+                         "remove-forum-mod, add-forum-mod, remove-forum-community-TA, or add-forum-community-TA.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in one of handle forum manipulations event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in one of handle forum manipulations event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         screen_name  = event.get('username', None)
 
         if screen_name is None:
             self.logWarn("Track log line %s: missing screen_name in one of remove-forum-admin, add-forum-admin, " +\
-                         "remove-forum-mod, add-forum-mod, remove-forum-community-TA, or add-forum-community-TA." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+                         "remove-forum-mod, add-forum-mod, remove-forum-community-TA, or add-forum-community-TA.",
+                         WarningAggregator.LOCATION)
 
         self.setValInRow(row, 'screen_name', self.hashGeneral(screen_name))
         return row
 
     def handlePsychometricsHistogramGen(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event info in psychometrics-histogram-generation." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info in psychometrics-histogram-generation.",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in psychometrics-histogram-generation event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in psychometrics-histogram-generation event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         problemID = event.get('problem', None)
 
         if problemID is None:
-            self.logWarn("Track log line %s: missing problemID in pyschometrics-histogram-generation event." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing problemID in pyschometrics-histogram-generation event.",
+                         WarningAggregator.LOCATION)
         self.setValInRow(row, 'problem_id', problemID)
         # Try to look up the human readable display name
         # of the problem, and insert it into the main
@@ -3466,14 +3579,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event info add-or-remove-user-group" %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event info add-or-remove-user-group",
+                         WarningAggregator.LOCATION)
             return row
 
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in add-or-remove-user-group event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in add-or-remove-user-group event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         eventName  = event.get('event_name', None)
@@ -3481,14 +3594,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         event = event.get('event', None)
 
         if eventName is None:
-            self.logWarn("Track log line %s: missing event_name in add-or-remove-user-group." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event_name in add-or-remove-user-group.",
+                         WarningAggregator.LOCATION)
         if user is None:
-            self.logWarn("Track log line %s: missing user field in add-or-remove-user-group." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing user field in add-or-remove-user-group.",
+                         WarningAggregator.LOCATION)
         if event is None:
-            self.logWarn("Track log line %s: missing event field in add-or-remove-user-group." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event field in add-or-remove-user-group.",
+                         WarningAggregator.LOCATION)
 
         self.setValInRow(row, 'event_name', eventName)
         self.setValInRow(row, 'group_user', user)
@@ -3521,8 +3634,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event type create_account." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in event type create_account.",
+                         WarningAggregator.LOCATION)
             return row
 
         try:
@@ -3535,8 +3648,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # }
             postDict = event['POST']
         except Exception as e:
-            self.logWarn("Track log line %s: event is not a dict in create_account event: '%s' (%s)" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event), `e`))
+            self.logWarn("Track log line %s: event is not a dict in create_account event: '%s' (%s)",
+                         WarningAggregator.LOCATION, event, `e`)
             return row
 
         # Get the POST field's entries into an ordered
@@ -3632,8 +3745,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         '''
         event = self.ensureDict(event)
         if event is None:
-            self.logWarn("Track log line %s: event is not a dict in edx_course_enrollment_(de)activated event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in edx_course_enrollment_(de)activated event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         self.setValInRow(row, 'mode', event.get('mode', None))
         self.setValInRow(row, 'session', event.get('session', None))
@@ -3678,8 +3791,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in save_problem_fail, save_problem_success, or reset_problem_fail." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in save_problem_fail, save_problem_success, or reset_problem_fail.",
+                         WarningAggregator.LOCATION)
             return row
 
         answersDict = {}
@@ -3690,8 +3803,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         probIdCorrectIterator = EdXTrackLogJSONParser.problemGradedComplexPattern.finditer(str(event))
         if probIdCorrectIterator is None:
             # Should have found at least one probID/correctness pair:
-            self.logWarn("Track log line %s: could not parse out problemID/correctness pairs from '%s'. (stuffed into badlyFormatted)" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: could not parse out problemID/correctness pairs from '%s'. (stuffed into badlyFormatted)",
+                         WarningAggregator.LOCATION, event)
             self.setValInRow(row, 'badly_formatted', str(event))
             return row
         # Go through each match:
@@ -3747,14 +3860,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event type change-email-settings." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in event type change-email-settings.",
+                         WarningAggregator.LOCATION)
             return row
 
         accountDict = self.ensureDict(event)
         if accountDict is None:
-            self.logWarn("Track log line %s: event is not a dict in change-email-settings event: '%s' (%s)" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in change-email-settings event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         course_id = accountDict.get('course', None)
@@ -3798,18 +3911,18 @@ class EdXTrackLogJSONParser(GenericJSONParser):
     def handleABExperimentEvent(self, record, row, event):
 
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event type assigned_user_to_partition or child_id." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in event type assigned_user_to_partition or child_id.",
+                         WarningAggregator.LOCATION)
             return row
 
         eventDict = self.ensureDict(event)
         if eventDict is None:
-            self.logWarn("Track log line %s: event is not a dict in assigned_user_to_partition or child_id event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in assigned_user_to_partition or child_id event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         if len(row) < 1:
-            self.logWarn("Track log line %s: encountered empty partial row while processing assigned_user_to_partition or child_id: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: encountered empty partial row while processing assigned_user_to_partition or child_id: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         try:
             eventType = record['event_type']
@@ -3861,7 +3974,7 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             except TypeError:
                 # A type error was seen once during a transform; unsure how
                 # that comes about. But this guards against them:
-                self.logWarn("Event %s should have child-id field but has '%s'" % (eventType,childId))
+                self.logWarn("Event %s should have child-id field but has '%s'", eventType,childId)
                 moduleDisplayName = ''
             if len(moduleDisplayName) > 0:
                 abExpDict['resource_display_name'] = moduleDisplayName
@@ -3888,8 +4001,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         '''
 
         if contextDict is None:
-            self.logWarn("Track log line %s: missing context field in event that concerns learner in AB Experiment: " %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing context field in event that concerns learner in AB Experiment: ",
+                         WarningAggregator.LOCATION)
             return
 
         # Ensure that the passed-in context dict includes the
@@ -3897,8 +4010,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         courseUserTagsDict = contextDict.get('course_user_tags', None)
         if courseUserTagsDict is None:
-            self.logWarn("Track log line %s: missing course_user_tags in context field in event that concerns learner in AB Experiment: " %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing course_user_tags in context field in event that concerns learner in AB Experiment: ",
+                         WarningAggregator.LOCATION)
             return
         abTestInfoDict = self.ensureDict(courseUserTagsDict)
 
@@ -3937,26 +4050,26 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def handleOpenAssessmentEvent(self, record, row, event):
         if event is None:
-            self.logWarn("Track log line %s: missing event text in one of the openassessment event types." %\
-                         (self.jsonToRelationConverter.makeFileCitation()))
+            self.logWarn("Track log line %s: missing event text in one of the openassessment event types.",
+                         WarningAggregator.LOCATION)
             return row
 
         eventDict = self.ensureDict(event)
         if eventDict is None:
-            self.logWarn("Track log line %s: event is not a dict in one of the openassessment events: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in one of the openassessment events: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         if len(row) < 1:
-            self.logWarn("Track log line %s: encountered empty partial row while processing an openassessment event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: encountered empty partial row while processing an openassessment event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         try:
             eventType = record['event_type']
         except KeyError:
             # Cant' really happen, b/c event_type is what triggers call
             # to this method. But...:
-            self.logWarn("Track log line %s: encountered openassessment event event without event_type: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: encountered openassessment event event without event_type: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         # Give the OpenAssessment table row we are constructing
@@ -4118,8 +4231,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         if peerOrSelfAssessPartsField is None:
             return resTxt
         if type(peerOrSelfAssessPartsField) != list:
-            self.logWarn("Track log line %s: parts field of openassessmentblock.peer_assess or openassessmentblock.self_assess not an array: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(peerOrSelfAssessPartsField)))
+            self.logWarn("Track log line %s: parts field of openassessmentblock.peer_assess or openassessmentblock.self_assess not an array: '%s'",
+                         WarningAggregator.LOCATION, peerOrSelfAssessPartsField)
         for partsStruct in peerOrSelfAssessPartsField:
             # partsStruct is something like:
             #   {'criterion': {'points_possible': 3, 'name': '1'}, 'option': {'points': 3, 'name': '3'}, 'feedback': ''}
@@ -4248,8 +4361,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type event:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event %s." %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: missing event text in event %s.",
+                         WarningAggregator.LOCATION, event)
             return row
 
         # Interesting info is hidden in the event_type field of this
@@ -4263,15 +4376,15 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         eventDict = self.ensureDict(event)
         if eventDict is None:
-            self.logWarn("Track log line %s: event is not a dict in path-styled event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in path-styled event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         try:
             postDict = eventDict['POST']
         except KeyError:
-            self.logWarn("Track log line %s: event in path-styled event is not GET styled: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event in path-styled event is not GET styled: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         # Grab the 'verb' at the end, if there is one:
@@ -4312,8 +4425,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
         eventDict = self.ensureDict(event)
         if eventDict is None:
-            self.logWarn("Track log line %s: event is not a dict in path-styled event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in path-styled event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         self.setValInRow(row, 'submission_id', str(event.get('query', None)))
@@ -4340,16 +4453,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         try:
             location = eventDict['location']
         except KeyError:
-            self.logWarn("Track log line %s: no location field provided in is_student_calibrated event: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: no location field provided in is_student_calibrated event: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             return row
         try:
             # The 'location' is an array of strings. Turn them into one string:
             location = '; '.join(location)
             self.setValInRow(row, 'question_location', location)
         except TypeError:
-            self.logWarn("Track log line %s: location field provided in is_student_calibrated event contains a non-string: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: location field provided in is_student_calibrated event contains a non-string: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             return row
 
         return row
@@ -4372,16 +4485,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         try:
             position = eventDict['position']
         except KeyError:
-            self.logWarn("Track log line %s: no position field provided in got_position event: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: no position field provided in got_position event: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             return row
         try:
             # The 'position' is an array of ints. Turn them into one string:
             position = '; '.join(position)
             self.setValInRow(row, 'position', position)
         except TypeError:
-            self.logWarn("Track log line %s: position field provided in goto_position event contains a non-string: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: position field provided in goto_position event contains a non-string: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             return row
 
         return row
@@ -4404,16 +4517,16 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         try:
             location = eventDict['location']
         except KeyError:
-            self.logWarn("Track log line %s: no location field provided in is_student_calibrated event: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: no location field provided in is_student_calibrated event: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             return row
         try:
             # The 'location' is an array of strings. Turn them into one string:
             location = '; '.join(location)
             self.setValInRow(row, 'question_location', location)
         except TypeError:
-            self.logWarn("Track log line %s: location field provided in is_student_calibrated event contains a non-string: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: location field provided in is_student_calibrated event contains a non-string: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             return row
 
         return row
@@ -4443,8 +4556,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         try:
             student_file = '; '.join(student_file)
         except TypeError:
-            self.logWarn("Track log line %s: student_file field provided in save_answer event contains a non-string: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: student_file field provided in save_answer event contains a non-string: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             student_file = ''
         self.setValInRow(row, 'student_file', student_file)
 
@@ -4453,8 +4566,8 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             # Ensure escape of comma, quotes, and CR/LF:
             student_answer = self.makeInsertSafe(student_answer)
         except TypeError:
-            self.logWarn("Track log line %s: student_answer field provided in save_answer event contains a non-string: '%s'" %\
-             (self.jsonToRelationConverter.makeFileCitation(), str(eventDict)))
+            self.logWarn("Track log line %s: student_answer field provided in save_answer event contains a non-string: '%s'",
+             WarningAggregator.LOCATION, eventDict)
             student_answer = ''
         self.setValInRow(row, 'long_answer', student_answer)
 
@@ -4543,21 +4656,21 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         :type eventType:
         '''
         if event is None:
-            self.logWarn("Track log line %s: missing event text in event %s." %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: missing event text in event %s.",
+                         WarningAggregator.LOCATION, event)
             return row
 
         eventDict = self.ensureDict(event)
         if eventDict is None:
-            self.logWarn("Track log line %s: event is not a dict in event: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event is not a dict in event: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
 
         try:
             postDict = eventDict['POST']
         except KeyError:
-            self.logWarn("Track log line %s: event in login_ajax is not GET styled: '%s'" %\
-                         (self.jsonToRelationConverter.makeFileCitation(), str(event)))
+            self.logWarn("Track log line %s: event in login_ajax is not GET styled: '%s'",
+                         WarningAggregator.LOCATION, event)
             return row
         email = postDict.get('email', None)
         # We get remember here, but don't carry it to the relational world:
@@ -4589,18 +4702,26 @@ class EdXTrackLogJSONParser(GenericJSONParser):
                   destination for CSV rows destined for a given table.
         :type outputDisposition: OutputDisposition
         '''
+        if self.numRescuedLines > 0:
+            self.logInfo("Rescued fields of %d ill-formed JSON lines into column badly_formatted." % self.numRescuedLines)
         if includeCSVLoadCommands:
             self.jsonToRelationConverter.pushString(self.createCSVTableLoadCommands(outputDisposition))
         # Unlock tables, and return foreign key checking to its normal behavior:
         self.jsonToRelationConverter.pushString(self.dumpPostscript1)
 
-        # Copy the temporary Account entries from
-        # the tmp table in Edx to the final dest
-        # in EdxPrivate:
-        self.createMergeAccountTbl()
+        if self.deferPrivateMerge:
+            # Leave the Account and EventIp entries in the
+            # Edx staging tables; they are merged once for
+            # the whole load batch:
+            self.jsonToRelationConverter.pushString("-- Merge of Edx.Account and Edx.EventIp into EdxPrivate deferred to end of load batch (privateTableMerger.py).\n")
+        else:
+            # Copy the temporary Account entries from
+            # the tmp table in Edx to the final dest
+            # in EdxPrivate:
+            self.createMergeAccountTbl()
 
-        # Same for the EventIp table:
-        self.createMergeEventIpTbl()
+            # Same for the EventIp table:
+            self.createMergeEventIpTbl()
 
         # Restore various defaults:
         self.jsonToRelationConverter.pushString(self.dumpPostscript2)
@@ -4618,16 +4739,63 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         csvLoadCommands    =  "SET sql_log_bin=0;\n"
         csvLoadCommands    += "SET autocommit=0;\n"
         for tableName in ['LoadInfo', 'InputState', 'State', 'CorrectMap', 'Answer', 'Account', 'EventIp', 'EdxTrackEvent', 'ABExperiment', 'OpenAssessment']:
+            if self.partitionByQuarter and tableName == self.mainTableName:
+                csvLoadCommands += self.createPartitionLoadCommands(outputDisposition)
+                continue
             filename = outputDisposition.getCSVTableOutFileName(tableName)
             # SQL statements for LOAD INFILE all .csv tables in turn. Only used
             # when no INSERT statement dump is being generated:
-            csvLoadCommands += "LOAD DATA LOCAL INFILE '%s' IGNORE INTO TABLE %s FIELDS OPTIONALLY ENCLOSED BY \"'\" TERMINATED BY ','; \n" %\
-                               (filename, tableName)
+            if self.deferPrivateMerge and tableName in EdXTrackLogJSONParser.DEFERRED_MERGE_TABLES:
+                csvLoadCommands += self.createLoadCommand(filename, tableName, duplicateHandling='REPLACE')
+            else:
+                csvLoadCommands += self.createLoadCommand(filename, tableName)
 
         csvLoadCommands    += "SET autocommit=1;\n"
         csvLoadCommands += "SET sql_log_bin=1;\n"
         return csvLoadCommands
 
+    def createPartitionLoadCommands(self, outputDisposition):
+        '''
+        Create one LOAD INFILE command for each per-quarter CSV file of
+        the main table. Each command names the quarter's partition, so
+        MySQL only locks and appends to that partition. Quarters without
+        a partition are loaded without partition selection.
+
+        :param outputDisposition: an OutputDisposition that offers getCSVPartitionOutFileNames(tableName)
+        :type outputDisposition: OutputDisposition
+        '''
+        csvLoadCommands = ''
+        for (quarter, filename) in outputDisposition.getCSVPartitionOutFileNames(self.mainTableName).items():
+            partitionName = self.getQuarterPartitionName(quarter)
+            partitionSelection = ' PARTITION (%s)' % partitionName if partitionName is not None else ''
+            csvLoadCommands += self.createLoadCommand(filename, self.mainTableName, partitionSelection)
+        return csvLoadCommands
+
+    def createLoadCommand(self, filename, tableName, partitionSelection='', duplicateHandling='IGNORE'):
+        '''
+        Create the LOAD INFILE command for one CSV file. Compressed
+        CSV files (see OutputFile.COMPRESSION_SUFFIXES) are loaded
+        through a FIFO; see OutputFile.createFifoLoadPrologue()
+        and OutputFile.createFifoLoadEpilogue().
+
+        :param filename: fully qualified name of the CSV file
+        :type filename: String
+        :param tableName: table to load into
+        :type tableName: String
+        :param partitionSelection: ' PARTITION (<name>)', or empty string
+        :type partitionSelection: String
+        :param duplicateHandling: 'IGNORE' keeps the row already in the table when a
+                  loaded row has a duplicate key; 'REPLACE' keeps the loaded row
+        :type duplicateHandling: {'IGNORE' | 'REPLACE'}
+        :return: one to three lines of commands for the mysql client
+        :rtype: String
+        '''
+        (loadSource, loadCommands) = OutputFile.createFifoLoadPrologue(filename)
+        loadCommands += "LOAD DATA LOCAL INFILE '%s' %s INTO TABLE %s%s FIELDS OPTIONALLY ENCLOSED BY \"'\" TERMINATED BY ','; \n" %\
+                        (loadSource, duplicateHandling, tableName, partitionSelection)
+        loadCommands += OutputFile.createFifoLoadEpilogue(filename)
+        return loadCommands
+
     def createMergeAccountTbl(self):
         '''
         Called at the very end of a load: copies all the entries
@@ -4993,9 +5161,14 @@ class EdXTrackLogJSONParser(GenericJSONParser):
         verbatim, i.e. without real parsing. We place those in the proper
         fields, and leave it at that.
 
-        :param badJSONStr:
-        :type badJSONStr:
+        :param badJSONStr: the ill-formed JSON
+        :type badJSONStr: String
+        :param row: partially filled array of values. Passed by reference
+        :type row: List<<any>>
+        :return: the row
+        :rtype: [<any>]
         '''
+        self.numRescuedLines += 1
         screen_name = self.tryJSONExtraction(EdXTrackLogJSONParser.searchPatternDict['username'], badJSONStr)
         #host = self.tryJSONExtraction(EdXTrackLogJSONParser.searchPatternDict['host'], badJSONStr)
         session = self.tryJSONExtraction(EdXTrackLogJSONParser.searchPatternDict['session'], badJSONStr)
@@ -5020,6 +5193,33 @@ class EdXTrackLogJSONParser(GenericJSONParser):
             ip_country = ''
         self.setValInRow(row, 'ip_country', ip_country)
         self.setValInRow(row, 'badly_formatted', self.makeInsertSafe(event))
+        return row
+
+    def getCacheStats(self):
+        '''
+        Hits and lookups of the mailing address cache, and of
+        the modulestore hash lookup's decoded records cache.
+
+        :return: cache name --> (number of hits, number of lookups)
+        :rtype: OrderedDict<String,(int,int)>
+        '''
+        cacheStats = OrderedDict()
+        cacheStats['mail_addresses'] = (self.numMailAddrHits, self.numMailAddrLookups)
+        # Only a memory-mapped HashLookupStore has a records cache:
+        hashLookupStats = getattr(getattr(self.hashMapper, 'hashLookup', None), 'getCacheStats', None)
+        if hashLookupStats is not None:
+            cacheStats['modulestore_hashes'] = hashLookupStats()
+        return cacheStats
+
+    def getNumRescuedLines(self):
+        '''
+        Return the number of ill-formed JSON lines of this
+        parser's file from which rescueBadJSON() extracted
+        what it could.
+
+        :rtype: int
+        '''
+        return self.numRescuedLines
 
     def tryJSONExtraction(self, pattern, theStr):
         m = pattern.search(theStr)
@@ -5037,65 +5237,34 @@ class EdXTrackLogJSONParser(GenericJSONParser):
 
     def getZipAndCountryFromMailAddr(self, mailAddr, accountDict):
 
+            self.numMailAddrLookups += 1
+            try:
+                (accountDict['zipcode'], accountDict['country']) = self.mailAddrLocations[mailAddr]
+                self.numMailAddrHits += 1
+                return accountDict
+            except KeyError:
+                pass
+
             zipCodeMatch = EdXTrackLogJSONParser.zipCodePattern.findall(mailAddr)
             if len(zipCodeMatch) > 0:
-                accountDict['zipcode'] = zipCodeMatch[-1]
-            else:
-                accountDict['zipcode'] = ''
-
-            # See whether the address includes a country:
-            # Last ditch: if we think we found a zip code,
-            # start out thinking US for the country:
-            if len(accountDict['zipcode']) > 0:
-                accountDict['country'] = 'USA'
+                zipcode = zipCodeMatch[-1]
             else:
-                accountDict['country'] = ''
-            # Our zip code might be a different number,
-            # so do look for an explicit country:
-            splitMailAddr = re.split(r'\W+', mailAddr)
-            # Surely not the fastest, but I'm tired: pass
-            # a sliding window of four,three,bi, and unigrams
-            # over the mailing address to find a country
-            # specification:
-            for mailWordIndx in range(len(splitMailAddr)):
-                try:
-                    fourgram = string.join([splitMailAddr[mailWordIndx],
-                                            splitMailAddr[mailWordIndx + 1],
-                                            splitMailAddr[mailWordIndx + 2],
-                                            splitMailAddr[mailWordIndx + 3]])
-                    country = self.countryChecker.isCountry(fourgram)
-                    if len(country) > 0:
-                        accountDict['country'] = country
-                        break
-                except IndexError:
-                    pass
-                try:
-                    trigram = string.join([splitMailAddr[mailWordIndx], splitMailAddr[mailWordIndx + 1], splitMailAddr[mailWordIndx + 2]])
-                    country = self.countryChecker.isCountry(trigram)
-                    if len(country) > 0:
-                        accountDict['country'] = country
-                        break
-                except IndexError:
-                    pass
-
-                try:
-                    bigram = string.join([splitMailAddr[mailWordIndx], splitMailAddr[mailWordIndx + 1]])
-                    country = self.countryChecker.isCountry(bigram)
-                    if len(country) > 0:
-                        accountDict['country'] = country
-                        break
-                except IndexError:
-                    pass
-
-                unigram = splitMailAddr[mailWordIndx]
-                country = self.countryChecker.isCountry(unigram)
-                if len(country) > 0:
-                    accountDict['country'] = country
-                    break
+                zipcode = ''
+
+            # Look for an explicit country, since our zip code
+            # might be a different number. Last ditch: if we
+            # think we found a zip code, take the country to be US:
+            country = self.countryChecker.findCountryInAddress(mailAddr)
+            if len(country) == 0 and len(zipcode) > 0:
+                country = 'USA'
             # Make sure that zip code is empty unless address is USA:
-            if accountDict['country'] != 'USA':
-                accountDict['zipcode'] = ''
+            if country != 'USA':
+                zipcode = ''
 
+            if len(self.mailAddrLocations) >= EdXTrackLogJSONParser.MAX_CACHED_MAIL_ADDRS:
+                self.mailAddrLocations.clear()
+            self.mailAddrLocations[mailAddr] = (zipcode, country)
+            (accountDict['zipcode'], accountDict['country']) = (zipcode, country)
             return accountDict
 
     def anonymizeUser(self,screenName,email):
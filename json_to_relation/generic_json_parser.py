@@ -14,10 +14,29 @@ Created on Sep 23, 2013
 @author: paepcke
 '''
 import StringIO
+from collections import OrderedDict
+from decimal import Decimal
 import ijson
+import json
 import re
 
 from col_data_type import ColDataType
+from warning_aggregator import WarningAggregator
+
+
+class JSONObjectPairs(list):
+    '''
+    The (key, value) pairs of one decoded JSON object, in
+    document order and including any duplicate keys, just
+    as ijson reports them. A distinct type, so that objects
+    can be told apart from arrays while flattening.
+    '''
+    pass
+
+def rejectJSONConstant(name):
+    # ijson does not accept NaN and Infinity; neither
+    # does the fast path, so such lines take the ijson path:
+    raise ValueError("Non-standard JSON constant: %s" % name)
 
 class GenericJSONParser(object):
     '''
@@ -30,6 +49,28 @@ class GenericJSONParser(object):
     # groups: 'item' and 'name'.
     REMOVE_ITEM_FROM_STRING_PATTERN = re.compile(r'(item)\.([^.]*$)')
 
+    # Decoder for the fast path of processOneJSONObject(). Uses the
+    # C scanner of the json module; floats become Decimals, as in ijson:
+    JSON_DECODER = json.JSONDecoder(parse_float=Decimal,
+                                    parse_constant=rejectJSONConstant,
+                                    object_pairs_hook=JSONObjectPairs)
+
+    # Placeholder pushed behind the elements of an array while
+    # flattening; marks where ijson would report 'end_array':
+    END_OF_ARRAY = object()
+
+    # Column type for new columns, and conversion of the value,
+    # by Python type of a decoded JSON scalar. Corresponds to the
+    # ijson events 'string', 'boolean', 'number', and 'null':
+    SCALAR_COL_TYPES = {unicode    : (ColDataType.TEXT, None),
+                        str        : (ColDataType.TEXT, None),
+                        bool       : (ColDataType.SMALLINT, int),
+                        int        : (ColDataType.DOUBLE, None),
+                        long       : (ColDataType.DOUBLE, None),
+                        Decimal    : (ColDataType.DOUBLE, None),
+                        type(None) : (ColDataType.TEXT, lambda value: '')
+                        }
+
     def __init__(self, jsonToRelationConverter, logfileID='', progressEvery=1000):
         '''
 
@@ -58,6 +99,10 @@ class GenericJSONParser(object):
         # in subclasses, and the column names are added in setValInRow() as
         # that method is called to insert values.
         self.colNamesByTable = {} 
+        
+        # Memo for the fast path: (nested label, array index or None)
+        # to legal column name:
+        self.colNameCache = {}
     
     def getReadyForNextRow(self):
         '''
@@ -89,7 +134,12 @@ class GenericJSONParser(object):
     		('end_map', None)
     		('start_array', None)
     		('end_array', None)
-		
+
+		The string is decoded in one go with the C decoder of the json
+		module, and the result is flattened by flattenIntoRow(). Only
+		strings that decoder rejects are parsed event by event with
+		ijson, in processJSONEvents(). Both yield the same row.
+
 		:param jsonStr: string of a single, self contained JSON object
 		:type jsonStr: String
 		:param row: partially filled array of values.
@@ -100,100 +150,220 @@ class GenericJSONParser(object):
         self.jsonToRelationConverter.bumpLineCounter()
         try:
             try:
-                parser = ijson.parse(StringIO.StringIO(jsonStr))
-            except Exception as e:
-                self.logWarn('Ill formed JSON in track log, line %d: %s' % (self.jsonToRelationConverter.makeFileCitation(), `e`))
-                return row
-            
-            # Stack of array index counters for use with
-            # nested arrays:
-            arrayIndexStack = Stack()
-            # Not currently processing 
-            #for prefix,event,value in self.parser:
-            for nestedLabel, event, value in parser:
-                #print("Nested label: %s; event: %s; value: %s" % (nestedLabel,event,value))
-                if event == "start_map":
-                    if not arrayIndexStack.empty():
-                        # Starting a new attribute/value pair within an array: need
-                        # a new number to differentiate column headers                    
-                        self.incArrayIndex(arrayIndexStack)
-                    continue
-                
-                if (len(nestedLabel) == 0) or\
-                   (event == "map_key") or\
-                   (event == "end_map"):
-                    continue
-                
-                if not arrayIndexStack.empty():
-                    # Label is now something like
-                    # employees.item.firstName. The 'item' is ijson's way of indicating
-                    # that we are in an array. Remove the '.item.' part; it makes
-                    # the relation column header unnecessarily long. Then append 
-                    # our array index number with an underscore:
-                    nestedLabel = self.removeItemPartOfString(nestedLabel) +\
-                                  '_' +\
-                                  str(arrayIndexStack.top(exceptionOnEmpty=True))
-                
-                # Ensure that label contains only MySQL-legal identifier chars. Else
-                # quote the label:                
-                nestedLabel = self.jsonToRelationConverter.ensureLegalIdentifierChars(nestedLabel)
-                
-                # Check whether caller gave a type hint for this column:
-                try:
-                    colDataType = self.jsonToRelationConverter.getSchemaHint(nestedLabel)
-                except KeyError:
-                    colDataType = None
-                
-                if event == "string":
-                    if colDataType is None:
-                        colDataType = ColDataType.TEXT
-                    self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
-                    self.setValInRow(row, nestedLabel, value)
-                    continue
-    
-                if event == "boolean":
-                    if colDataType is None:
-                        colDataType = ColDataType.SMALLINT
-                    self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
-                    if value:
-                        value = 1
-                    else:
-                        value = 0
-                    self.setValInRow(row, nestedLabel,value)                                
-                    continue 
-    
-                if event == "number":
-                    if colDataType is None:
-                        colDataType = ColDataType.DOUBLE
-                    self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
-                    self.setValInRow(row, nestedLabel,value)
-                    continue
-    
-                if event == "null":
-                    if colDataType is None:
-                        colDataType = ColDataType.TEXT
-                    self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
-                    self.setValInRow(row, nestedLabel, '')
-                    continue
-    
-                if event == "start_array":
-                    # New array index entry for this nested label.
-                    # Used to generate <label>_0, <label>_1, etc. for
-                    # column names:
-                    arrayIndexStack.push(-1)
-                    continue
-    
-                if event == "end_array":
-                    # Array closed; forget the array counter:
-                    arrayIndexStack.pop()
-                    continue
-    
-                raise ValueError("Unknown JSON value type at %s for value %s (ijson event: %s)" % (nestedLabel,value,str(event))) 
-            return row
+                jsonObj = GenericJSONParser.JSON_DECODER.decode(jsonStr)
+            except ValueError:
+                # Leave ill formed JSON to the incremental parser,
+                # which reports it, and fills the row up to the
+                # point of error, as it always has:
+                return self.processJSONEvents(jsonStr, row)
+            return self.flattenIntoRow(jsonObj, row)
         finally:
             self.reportProgressIfNeeded()
             self.getReadyForNextRow()
 
+    def flattenIntoRow(self, jsonObj, row):
+        '''
+        Fast path of processOneJSONObject(): fills the row from the
+        (column name, value) pairs of flattenJSON(). Produces the same
+        column names, array index suffixes, column types, and values
+        as processJSONEvents() does from ijson events. Column positions
+        are looked up in the main table's schema directly.
+
+        :param jsonObj: JSON object as decoded by JSON_DECODER
+        :type jsonObj: {JSONObjectPairs | list | <scalar>}
+        :param row: partially filled array of values.
+        :type row: List<<any>>
+        :return: the passed-in row, filled with the object's values
+        :rtype: [<any>]
+        '''
+        converter = self.jsonToRelationConverter
+        scalarColTypes = GenericJSONParser.SCALAR_COL_TYPES
+        schemas = converter.destination.schemas
+        mainTableName = converter.mainTableName
+        for (colName, node) in self.flattenJSON(jsonObj):
+            try:
+                (colDataType, convertValue) = scalarColTypes[type(node)]
+            except KeyError:
+                raise ValueError("Unknown JSON value type at %s for value %s" % (colName, node))
+            value = node if convertValue is None else convertValue(node)
+            # Column position straight from the main table's
+            # schema, rather than via two getSchemaHint() calls:
+            schema = schemas[mainTableName]
+            colSpec = schema.get(colName) if schema else None
+            if colSpec is None:
+                converter.ensureColExistence(colName, colDataType)
+                colSpec = schemas[mainTableName][colName]
+            if colSpec.colPos < len(row):
+                row[colSpec.colPos] = value
+            else:
+                self.setValInRow(row, colName, value)
+        return row
+
+    def flattenJSON(self, jsonObj):
+        '''
+        Generator that walks the tree of a decoded JSON object depth
+        first, without recursion, and yields each scalar with the
+        column name that processJSONEvents() would give it. Column
+        names are memoized, so the regular expressions in
+        removeItemPartOfString() and ensureLegalIdentifierChars() run
+        once per distinct label, not once per value.
+
+        :param jsonObj: JSON object as decoded by JSON_DECODER
+        :type jsonObj: {JSONObjectPairs | list | <scalar>}
+        :return: (column name, decoded scalar) pairs in document order
+        :rtype: generator((String, {unicode | bool | int | long | Decimal | None}))
+        '''
+        converter = self.jsonToRelationConverter
+        colNameCache = self.colNameCache
+        endOfArray = GenericJSONParser.END_OF_ARRAY
+        # Array index counters of enclosing arrays:
+        arrayIndexStack = []
+        # Nodes still to visit, with their nested label; the
+        # label of the top level node is None, which ijson
+        # reports as '':
+        toVisit = [(None, jsonObj)]
+        while toVisit:
+            (nestedLabel, node) = toVisit.pop()
+            if node is endOfArray:
+                arrayIndexStack.pop()
+                continue
+            nodeType = type(node)
+            if nodeType is JSONObjectPairs:
+                if arrayIndexStack:
+                    # Starting a new attribute/value pair within an array: need
+                    # a new number to differentiate column headers:
+                    arrayIndexStack[-1] += 1
+                if nestedLabel is None:
+                    toVisit.extend(reversed(node))
+                else:
+                    toVisit.extend([(nestedLabel + '.' + key, value) for (key, value) in reversed(node)])
+                continue
+            if nodeType is list:
+                if nestedLabel:
+                    arrayIndexStack.append(-1)
+                    toVisit.append((nestedLabel, endOfArray))
+                itemLabel = 'item' if nestedLabel is None else nestedLabel + '.item'
+                toVisit.extend([(itemLabel, item) for item in reversed(node)])
+                continue
+            if not nestedLabel:
+                continue
+
+            arrayIndex = arrayIndexStack[-1] if arrayIndexStack else None
+            try:
+                colName = colNameCache[(nestedLabel, arrayIndex)]
+            except KeyError:
+                colName = nestedLabel
+                if arrayIndex is not None:
+                    colName = self.removeItemPartOfString(colName) + '_' + str(arrayIndex)
+                colName = converter.ensureLegalIdentifierChars(colName)
+                colNameCache[(nestedLabel, arrayIndex)] = colName
+            yield (colName, node)
+
+    def processJSONEvents(self, jsonStr, row):
+        '''
+        Fills the row from the ijson events of the given JSON string.
+        Used by processOneJSONObject() for strings that the fast
+        path cannot decode.
+
+        :param jsonStr: string of a single, self contained JSON object
+        :type jsonStr: String
+        :param row: partially filled array of values.
+        :type row: List<<any>>
+        :return: array of values. Fills into the passed-in row array
+        :rtype: [<any>]
+        '''
+        try:
+            parser = ijson.parse(StringIO.StringIO(jsonStr))
+        except Exception as e:
+            self.logWarn('Ill formed JSON in track log, line %s: %r', WarningAggregator.LOCATION, e)
+            return row
+        
+        # Stack of array index counters for use with
+        # nested arrays:
+        arrayIndexStack = Stack()
+        # Not currently processing 
+        #for prefix,event,value in self.parser:
+        for nestedLabel, event, value in parser:
+            #print("Nested label: %s; event: %s; value: %s" % (nestedLabel,event,value))
+            if event == "start_map":
+                if not arrayIndexStack.empty():
+                    # Starting a new attribute/value pair within an array: need
+                    # a new number to differentiate column headers                    
+                    self.incArrayIndex(arrayIndexStack)
+                continue
+            
+            if (len(nestedLabel) == 0) or\
+               (event == "map_key") or\
+               (event == "end_map"):
+                continue
+            
+            if not arrayIndexStack.empty():
+                # Label is now something like
+                # employees.item.firstName. The 'item' is ijson's way of indicating
+                # that we are in an array. Remove the '.item.' part; it makes
+                # the relation column header unnecessarily long. Then append 
+                # our array index number with an underscore:
+                nestedLabel = self.removeItemPartOfString(nestedLabel) +\
+                              '_' +\
+                              str(arrayIndexStack.top(exceptionOnEmpty=True))
+            
+            # Ensure that label contains only MySQL-legal identifier chars. Else
+            # quote the label:                
+            nestedLabel = self.jsonToRelationConverter.ensureLegalIdentifierChars(nestedLabel)
+            
+            # Check whether caller gave a type hint for this column:
+            try:
+                colDataType = self.jsonToRelationConverter.getSchemaHint(nestedLabel)
+            except KeyError:
+                colDataType = None
+            
+            if event == "string":
+                if colDataType is None:
+                    colDataType = ColDataType.TEXT
+                self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
+                self.setValInRow(row, nestedLabel, value)
+                continue
+
+            if event == "boolean":
+                if colDataType is None:
+                    colDataType = ColDataType.SMALLINT
+                self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
+                if value:
+                    value = 1
+                else:
+                    value = 0
+                self.setValInRow(row, nestedLabel,value)                                
+                continue 
+
+            if event == "number":
+                if colDataType is None:
+                    colDataType = ColDataType.DOUBLE
+                self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
+                self.setValInRow(row, nestedLabel,value)
+                continue
+
+            if event == "null":
+                if colDataType is None:
+                    colDataType = ColDataType.TEXT
+                self.jsonToRelationConverter.ensureColExistence(nestedLabel, colDataType)
+                self.setValInRow(row, nestedLabel, '')
+                continue
+
+            if event == "start_array":
+                # New array index entry for this nested label.
+                # Used to generate <label>_0, <label>_1, etc. for
+                # column names:
+                arrayIndexStack.push(-1)
+                continue
+
+            if event == "end_array":
+                # Array closed; forget the array counter:
+                arrayIndexStack.pop()
+                continue
+
+            raise ValueError("Unknown JSON value type at %s for value %s (ijson event: %s)" % (nestedLabel,value,str(event))) 
+        return row
+
     def getValInRow(self, theRow, colName, tableName=None):
         '''
         Given a row, column name, and table name, retrieve the value
@@ -219,19 +389,19 @@ class GenericJSONParser(object):
         try:
             colSpec = self.jsonToRelationConverter.getSchemaHint(colName, tableName)
         except KeyError:
+            msgFormat = "Attempt to retrieve unanticipated field name '%s' from table '%s' (%s)"
+            citation = self.jsonToRelationConverter.makeFileCitation()
             if not self.unittesting:
-                msg = "Attempt to retrieve unanticipated field name '%s' from table '%s' (%s)" %\
-                             (colName, tableName, self.jsonToRelationConverter.makeFileCitation())
-                self.logWarn(msg)
-            raise ValueError(msg)
+                self.logWarn(msgFormat, colName, tableName, citation)
+            raise ValueError(msgFormat % (colName, tableName, citation))
         try:
             return theRow[colSpec.colPos]
         except IndexError:
-            msg = "Attempt to retrieve field name '%s' from table '%s' before that row element was set (%s)" %\
-                             (colName, tableName, self.jsonToRelationConverter.makeFileCitation())
+            msgFormat = "Attempt to retrieve field name '%s' from table '%s' before that row element was set (%s)"
+            citation = self.jsonToRelationConverter.makeFileCitation()
             if not self.unittesting:
-                self.logWarn(msg)
-            raise ValueError(msg)
+                self.logWarn(msgFormat, colName, tableName, citation)
+            raise ValueError(msgFormat % (colName, tableName, citation))
     
     def setValInRow(self, theRow, colName, value, tableName=None):
         '''
@@ -264,8 +434,8 @@ class GenericJSONParser(object):
                 value = defaultVal
         except KeyError:
             if not self.unittesting:
-                self.logWarn("Unanticipated field name '%s' intended for table '%s' (%s)" %\
-                             (colName, tableName, self.jsonToRelationConverter.makeFileCitation()))
+                self.logWarn("Unanticipated field name '%s' intended for table '%s' (%s)",
+                             colName, tableName, WarningAggregator.LOCATION)
             return theRow
             
         targetPos = colSpec.colPos
@@ -346,11 +516,35 @@ class GenericJSONParser(object):
         self.linesSinceLastProgReport += 1
         self.totalLinesDoneSoFar += 1
         if self.linesSinceLastProgReport >= self.progressEvery:
-            self.logInfo("Processed %d JSON objects..." % self.totalLinesDoneSoFar)
+            self.jsonToRelationConverter.reportProgress()
             self.linesSinceLastProgReport = 0
+
+    def getCacheStats(self):
+        '''
+        Hits and lookups of the parser's caches, for progress
+        reports. Subclasses with caches override this.
+
+        :return: cache name --> (number of hits, number of lookups)
+        :rtype: OrderedDict<String,(int,int)>
+        '''
+        return OrderedDict()
             
-    def logWarn(self, msg):
-        self.jsonToRelationConverter.__class__.logger.warn(msg)
+    def logWarn(self, msg, *args):
+        '''
+        Log a warning. If args are given, msg is a format string,
+        and the warning goes through the converter's WarningAggregator:
+        it is only formatted if logged, and counted under msg. Pass
+        WarningAggregator.LOCATION to cite the current track log line.
+
+        :param msg: message, or format string for args
+        :type msg: String
+        :param args: values for the format string
+        :type args: <any>
+        '''
+        if len(args) == 0:
+            self.jsonToRelationConverter.__class__.logger.warn(msg)
+        else:
+            self.jsonToRelationConverter.warnings.warn(msg, *args)
 
     def logInfo(self, msg):
         self.jsonToRelationConverter.__class__.logger.info(msg)
@@ -0,0 +1,262 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Read-only, memory-mapped store for the OpenEdx hash --> modulestore
+info map that ModulestoreImporter builds. Replaces the pickled dict
+that used to be loaded in full by every process that resolves hashes.
+
+Opening a store only maps the file; records are decoded when they
+are looked up. Processes that map the same file share its pages.
+
+File layout (all integers little-endian)::
+
+    'MSLS'                      magic
+    uint32                      format version
+    uint32                      number of entries n
+    uint64 * (n+1)              offsets of the records in the pool,
+                                relative to the start of the pool; the
+                                last offset is the end of the pool
+    pool                        records, sorted by utf-8 encoded key
+
+Each record is the key followed by the values of FIELDS, each
+encoded as a uint32 byte length and the utf-8 bytes. A length of
+NONE_LEN encodes None.
+
+Usage::
+    HashLookupStore.write('/tmp/hashLookup.store', {'c894...' : {'org' : 'Medicine', ...}})
+    store = HashLookupStore('/tmp/hashLookup.store')
+    store.get('c894...')['display_name']
+'''
+
+import array
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from UserDict import DictMixin
+
+
+class HashLookupStore(DictMixin):
+
+    MAGIC = 'MSLS'
+    VERSION = 1
+
+    # Values kept for each hash, in record order:
+    FIELDS = ('org', 'course_short_name', 'category', 'revision', 'name', 'display_name')
+
+    # Length that stands for a None value:
+    NONE_LEN = 0xFFFFFFFF
+
+    HEADER = struct.Struct('<4sII')
+    OFFSET = struct.Struct('<Q')
+    LENGTH = struct.Struct('<I')
+
+    def __init__(self, storePath):
+        '''
+        Map the given store file.
+
+        :param storePath: path to a file created by HashLookupStore.write()
+        :type storePath: String
+        @raise IOError: if the file cannot be opened.
+        @raise ValueError: if the file is not a store of this format version.
+        '''
+        self.storePath = storePath
+        with open(storePath, 'rb') as storeFd:
+            self.mmap = mmap.mmap(storeFd.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mmap) < HashLookupStore.HEADER.size:
+            raise ValueError('File %s is too short to be a hash lookup store.' % storePath)
+        (magic, version, self.numEntries) = HashLookupStore.HEADER.unpack_from(self.mmap, 0)
+        if magic != HashLookupStore.MAGIC or version != HashLookupStore.VERSION:
+            raise ValueError('File %s is not a version %s hash lookup store.' % (storePath, HashLookupStore.VERSION))
+        self.offsetsStart = HashLookupStore.HEADER.size
+        self.poolStart = self.offsetsStart + (self.numEntries + 1) * HashLookupStore.OFFSET.size
+        # Decoded records of keys looked up so far. Track log
+        # events refer to the same few thousand hashes over and
+        # over, so this stays small compared to the whole map:
+        self.recordCache = {}
+        self.numLookups = 0
+        self.numCacheMisses = 0
+
+    @classmethod
+    def write(cls, storePath, hashLookup):
+        '''
+        Write the given hash --> info dict to a store file. The file
+        is written next to its destination, and then renamed, so that
+        processes that have the old file mapped are not disturbed.
+
+        :param storePath: destination path
+        :type storePath: String
+        :param hashLookup: map from hash string to dict with (at least) the keys in FIELDS
+        :type hashLookup: {String : {String : {String | None}}}
+        '''
+        cls.writeItems(storePath, sorted([(cls.encode(key), infoDict) for (key, infoDict) in hashLookup.items()]))
+
+    @classmethod
+    def writeItems(cls, storePath, sortedItems):
+        '''
+        Write a store file from (encodedKey, infoDict) pairs that are
+        already sorted by encodedKey, such as the output of
+        iterEncodedItems() merged with new entries. Records are spooled
+        to a temporary pool file, so only the offsets table is held
+        in memory. Like write(), replaces storePath by rename.
+
+        :param storePath: destination path
+        :type storePath: String
+        :param sortedItems: pairs of utf-8 encoded key and info dict, sorted by key
+        :type sortedItems: iterable((str, {String : {String | None}}))
+        '''
+        tmpPath = '%s.tmp%s' % (storePath, os.getpid())
+        offsets = array.array('L')
+        with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(storePath))) as poolFd:
+            offset = 0
+            for (encodedKey, infoDict) in sortedItems:
+                record = cls.packValue(encodedKey) +\
+                         ''.join([cls.packValue(cls.encode(infoDict.get(fieldName, ''))) for fieldName in cls.FIELDS])
+                offsets.append(offset)
+                poolFd.write(record)
+                offset += len(record)
+            offsets.append(offset)
+            poolFd.seek(0)
+            with open(tmpPath, 'wb') as storeFd:
+                storeFd.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(offsets) - 1))
+                for offset in offsets:
+                    storeFd.write(cls.OFFSET.pack(offset))
+                shutil.copyfileobj(poolFd, storeFd)
+        os.rename(tmpPath, storePath)
+
+    def close(self):
+        self.mmap.close()
+
+    def getCacheStats(self):
+        '''
+        :return: number of lookups answered from the decoded records cache, and number of all lookups
+        :rtype: (int, int)
+        '''
+        return (self.numLookups - self.numCacheMisses, self.numLookups)
+
+    # ------------- Dict Methods -------------------
+
+    def __getitem__(self, key):
+        self.numLookups += 1
+        try:
+            infoDict = self.recordCache[key]
+        except KeyError:
+            self.numCacheMisses += 1
+            index = self.findIndex(key)
+            infoDict = None if index is None else self.readRecord(index)[1]
+            self.recordCache[key] = infoDict
+        if infoDict is None:
+            raise KeyError(key)
+        return infoDict
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self.numEntries
+
+    def __iter__(self):
+        for index in range(self.numEntries):
+            yield self.readKey(index)
+
+    def keys(self):
+        return list(self.__iter__())
+
+    def iteritems(self):
+        for index in range(self.numEntries):
+            yield self.readRecord(index)
+
+    def iterEncodedItems(self):
+        '''
+        Generator of (utf-8 encoded key, info dict) in key order,
+        as needed by writeItems().
+        '''
+        for (key, infoDict) in self.iteritems():
+            yield (key.encode('utf-8'), infoDict)
+
+    # ------------- Support Methods -------------------
+
+    def findIndex(self, key):
+        '''
+        Binary search for the given key.
+
+        :return: position of the key's record, or None if key is not in the store.
+        :rtype: {int | None}
+        '''
+        encodedKey = HashLookupStore.encode(key)
+        # Inner loop of every cache miss; avoids
+        # method calls and attribute lookups:
+        unpackFrom = struct.unpack_from
+        mm = self.mmap
+        offsetsStart = self.offsetsStart
+        poolStart = self.poolStart
+        low = 0
+        high = self.numEntries
+        while low < high:
+            middle = (low + high) // 2
+            keyStart = poolStart + unpackFrom('<Q', mm, offsetsStart + 8 * middle)[0]
+            keyLen = unpackFrom('<I', mm, keyStart)[0]
+            middleKey = mm[keyStart + 4:keyStart + 4 + keyLen]
+            if middleKey < encodedKey:
+                low = middle + 1
+            elif middleKey > encodedKey:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def recordStart(self, index):
+        return self.poolStart + HashLookupStore.OFFSET.unpack_from(self.mmap, self.offsetsStart + index * HashLookupStore.OFFSET.size)[0]
+
+    def readKey(self, index):
+        return self.readValue(self.recordStart(index))[0].decode('utf-8')
+
+    def readRecord(self, index):
+        '''
+        Decode the record at the given position.
+
+        :return: the key, and a new dict with one entry per name in FIELDS
+        :rtype: (unicode, {String : {unicode | None}})
+        '''
+        (encodedKey, pos) = self.readValue(self.recordStart(index))
+        infoDict = {}
+        for fieldName in HashLookupStore.FIELDS:
+            (encodedValue, pos) = self.readValue(pos)
+            infoDict[fieldName] = None if encodedValue is None else encodedValue.decode('utf-8')
+        return (encodedKey.decode('utf-8'), infoDict)
+
+    def readValue(self, pos):
+        '''
+        Read one length-prefixed value at the given file position.
+
+        :return: the raw bytes (or None), and the position after the value
+        :rtype: ({str | None}, int)
+        '''
+        length = HashLookupStore.LENGTH.unpack_from(self.mmap, pos)[0]
+        pos += HashLookupStore.LENGTH.size
+        if length == HashLookupStore.NONE_LEN:
+            return (None, pos)
+        return (self.mmap[pos:pos + length], pos + length)
+
+    @classmethod
+    def packValue(cls, encodedValue):
+        if encodedValue is None:
+            return cls.LENGTH.pack(cls.NONE_LEN)
+        return cls.LENGTH.pack(len(encodedValue)) + encodedValue
+
+    @classmethod
+    def encode(cls, value):
+        if value is None:
+            return None
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return str(value)
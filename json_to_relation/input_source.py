@@ -63,6 +63,24 @@ class InputSource(object):
         # If the conversion worked fine, then this return value
         # is ignored.
         return False
+
+    def getBytesRead(self):
+        '''
+        Offset up to which the source was read. For compressed
+        files this is the offset in the compressed file, so
+        that it can be compared to getSize().
+
+        :return: number of bytes read, or None if unknown
+        :rtype: {int | None}
+        '''
+        return None
+
+    def getSize(self):
+        '''
+        :return: size of the source in bytes, or None if unknown
+        :rtype: {int | None}
+        '''
+        return None
             
     
 
@@ -96,6 +114,32 @@ class InURI(InputSource):
         :rtype: String
         '''
         return self.inFilePathOrURL
+
+    def getBytesRead(self):
+        if self.compression == COMPRESSION_TYPE.GZIP:
+            # Offset of the gzip file's underlying
+            # file, i.e. into the compressed bytes:
+            compressedFd = self.fileHandle.fileobj
+        elif self.compression == COMPRESSION_TYPE.NO_COMPRESSION:
+            # Local files are opened as file:// URLs:
+            compressedFd = getattr(self.fileHandle, 'fp', None)
+        else:
+            # BZ2File only knows its uncompressed offset:
+            return None
+        try:
+            return compressedFd.tell()
+        except (AttributeError, IOError, ValueError):
+            # Remote, or closed:
+            return None
+
+    def getSize(self):
+        parseResult = urlparse(self.localFilePath)
+        if len(parseResult.scheme) > 0 and parseResult.scheme != 'file':
+            return None
+        try:
+            return os.path.getsize(parseResult.path)
+        except OSError:
+            return None
     
     def decompress(self, line):
         if self.compression == COMPRESSION_TYPE.NO_COMPRESSION:
@@ -174,6 +218,12 @@ class InString(InputSource):
         :rtype: String
         '''
         return "In-string"
+
+    def getBytesRead(self):
+        return self.fileHandle.tell()
+
+    def getSize(self):
+        return self.fileHandle.len
         
     def decompress(self, line):
         '''
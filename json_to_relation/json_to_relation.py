@@ -39,6 +39,7 @@ Modifications:
 
 from cStringIO import StringIO
 from collections import OrderedDict
+import cProfile
 import copy
 import logging
 import math
@@ -46,12 +47,16 @@ import os
 import re
 import shutil
 import tempfile
+import time
 import datetime
 
 from col_data_type import ColDataType
 from generic_json_parser import GenericJSONParser
 from input_source import InputSource, InURI, InString, InMongoDB, InPipe
 from output_disposition import OutputDisposition, OutputFile, OutputPipe
+from progress_reporter import ProgressReporter
+from stage_profiler import StageProfiler
+from warning_aggregator import WarningAggregator
 
 class JSONToRelation(object):
     '''
@@ -99,7 +104,11 @@ class JSONToRelation(object):
                  loggingLevel=logging.INFO,
                  logFile=None,
                  mainTableName='Main',
-                 progressEvery=1000):
+                 progressEvery=1000,
+                 warningsFile=None,
+                 profile=False,
+                 profileStatsFile=None,
+                 metricsFile=None):
         '''
         Create a JSON-to-Relation converter. The JSON source can be
         a file with JSON objects, a StringIO.StringIO string pseudo file,
@@ -149,6 +158,21 @@ class JSONToRelation(object):
         :type logFile: String
         :param progressEvery: number of JSON object to process before reporting the number in a log info msg. If None, no reporting
         :type  progressEvery: {int | None}
+        :param warningsFile: path to file to which all warnings are appended as JSON lines. Default is None: warnings
+                             are only logged, the first few of each kind in full. See WarningAggregator.
+        :type warningsFile: String
+        :param profile: if True, convert() times its stages: reading input, JSON decoding, each
+                        parser handler, building INSERT statements, writing output. It logs
+                        a table of the times at the end. See StageProfiler.
+        :type profile: Boolean
+        :param profileStatsFile: path to which convert() dumps cProfile statistics, for reading
+                                 with pstats. Default is None: no cProfile.
+        :type profileStatsFile: String
+        :param metricsFile: path to which snapshots of throughput, rows per table, and cache hit
+                            rates are written during and after convert(). Prometheus text format
+                            if the name ends in .prom, else JSON. Default is None: progress is
+                            only logged. See ProgressReporter.
+        :type metricsFile: String
         @raise ValueErrer: when value of jsonParserInstance is neither None, nor an instance of GenericJSONParser,
                         nor one of its subclasses.
         @raise ValueError: when jsonSource is not an instance of InPipe, InString, InURI, or InMongoDB
@@ -200,7 +224,19 @@ class JSONToRelation(object):
         # to us for parsing. Used for logging malformed entries:
         self.lineCounter = -1
 
+        # Counters for progress reports. Lines and bytes of
+        # input, lines that failed to convert, and rows emitted
+        # per table name:
+        self.numInputLines = 0
+        self.numInputBytes = 0
+        self.numBadLines = 0
+        self.rowsPerTable = OrderedDict()
+
         self.setupLogging(loggingLevel, logFile)
+        self.warnings = WarningAggregator(JSONToRelation.logger, self.getSourceLocation, sidecarFileName=warningsFile)
+        self.profile = profile
+        self.profileStatsFile = profileStatsFile
+        self.progressReporter = ProgressReporter(self, JSONToRelation.logger, metricsFileName=metricsFile)
 
         # Check whether log output would interleave with data output:
         if logFile is None and isinstance(destination, OutputPipe):
@@ -294,6 +330,19 @@ class JSONToRelation(object):
         '''
         self.destination.startNewTable(tableName, schemaHintsNewTable)
 
+    def setPartitionColumn(self, tableName, colName):
+        '''
+        Called by parsers that want the CSV rows of one table split
+        into one file per value of the given column, e.g. one file
+        per quarter for EdxTrackEvent. See OutputDisposition.setPartitionColumn().
+
+        :param tableName: name of table whose rows are to be split
+        :type tableName: String
+        :param colName: name of column whose value selects the output file
+        :type colName: String
+        '''
+        self.destination.setPartitionColumn(tableName, colName)
+
     def getSourceName(self):
         '''
         Request a human-readable name of the JSON source, which
@@ -357,16 +406,18 @@ class JSONToRelation(object):
         Convert each JSON object into the requested output format (e.g. CSV),
         and deliver it to the destination (e.g. a file)
 
-        :param prependColHeader: If true, the final destination, if it is stdout or a file,
-                will have the column names prepended. Note that this option requires that
-                the output file is first written to a temp file, and then merged with the
-                completed column name header row to the final destination that was specified
-                by the client.
+        :param prependColHeader: If true, the column names are made available with CSV
+                output. The column names are only complete once all JSON is read, so they
+                cannot be written ahead of the rows without copying the output. For file
+                destinations, rows are therefore written straight to the file, and the column
+                names go into a header file next to it (see OutputFile.getHeaderFileName()),
+                which OutputFile.createCSVLoadCommand() uses. For stdout, the output is
+                first written to a temp file, and then copied to stdout behind the header row.
         :type prependColHeader: Boolean
         '''
         savedFinalOutDest = None
         if self.destination.getOutputFormat() != self.destination.OutputFormat.SQL_INSERT_STATEMENTS:
-            if prependColHeader:
+            if prependColHeader and not isinstance(self.destination, OutputFile):
                 savedFinalOutDest = self.destination
                 tmpFd  = tempfile.NamedTemporaryFile(suffix='.csv',prefix='jsonToRelationTmp')
                 self.tmpFileName = tmpFd.name
@@ -379,72 +430,133 @@ class JSONToRelation(object):
         #*************
         #numErrorsSoFar = 0
         #*************
-        with self.destination as outFd, self.jsonSource as inFd:
-            for jsonStr in inFd:
-                # Skip empty rows:
-                if jsonStr == '\n' or len(jsonStr) == 0:
-                    continue
-                newRow = []
-                try:
-                    # processOneJSONObject will call pushtToTable() for all
-                    # tables necessary for each event type. The method will
-                    # direct the top level event information to the table
-                    # called self.mainTableName.
-                    self.jsonParserInstance.processOneJSONObject(jsonStr, newRow)
-                except (ValueError, KeyError) as e:
-                    JSONToRelation.logger.warn('Line %s: bad JSON object: %s' % (self.makeFileCitation(), `e`))
-                    #***************
-                    # Uncomment to print the offending JSON string, and quit:
-                    #print('=====================================')
-                    #print(jsonStr)
-                    #numErrorsSoFar += 1
-                    #if numErrorsSoFar > 5:
-                    #    raise
-
-                    # Uncomment to get stacktrace for the above caught errors:
-                    #import sys
-                    #import traceback
-                    #traceback.print_tb(sys.exc_info()[2])
-                    #print('-------------------------------------')
-                    #***************
-                self.bumpLineCounter()
-
-            # Since we hold back SQL insertion values to include them
-            # all into one INSERT statement, need to flush after last
-            # call to processOneJSONObject:
-#             if self.destination.getOutputFormat() == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
-#                 self.processFinishedRow('FLUSH', outFd)
-#                 # Give parser a chance to seal the sql file:
-#                 self.jsonParserInstance.finish()
-
-            self.processFinishedRow('FLUSH', outFd)
-            # Give parser a chance to seal the sql file. If we are
-            # outputting only CSV, and the parser that was used generated MySQL INSERT statements,
-            # then let the finish() method know; it will include the CSV load commands, so
-            # that the main file can simply be sourced into MySQL:
-            if self.destination.getOutputFormat() == OutputDisposition.OutputFormat.CSV:
-                self.jsonParserInstance.finish(includeCSVLoadCommands=True, outputDisposition=self.destination)
-            else:
-                self.jsonParserInstance.finish(includeCSVLoadCommands=False)
-
+        stageProfiler = StageProfiler() if self.profile else None
+        if self.profileStatsFile is not None:
+            cProfiler = cProfile.Profile()
+            cProfiler.enable()
+        startTime = time.time()
+        self.progressReporter.start()
+        try:
+            with self.destination as outFd, self.jsonSource as inFd:
+                if stageProfiler is not None:
+                    inFd = self.instrumentStages(stageProfiler, outFd, inFd)
+                for jsonStr in inFd:
+                    # Skip empty rows:
+                    if jsonStr == '\n' or len(jsonStr) == 0:
+                        continue
+                    self.numInputLines += 1
+                    self.numInputBytes += len(jsonStr)
+                    newRow = []
+                    try:
+                        # processOneJSONObject will call pushtToTable() for all
+                        # tables necessary for each event type. The method will
+                        # direct the top level event information to the table
+                        # called self.mainTableName.
+                        self.jsonParserInstance.processOneJSONObject(jsonStr, newRow)
+                    except (ValueError, KeyError) as e:
+                        self.numBadLines += 1
+                        self.warnings.warn('Line %s: bad JSON object: %r', WarningAggregator.LOCATION, e)
+                        #***************
+                        # Uncomment to print the offending JSON string, and quit:
+                        #print('=====================================')
+                        #print(jsonStr)
+                        #numErrorsSoFar += 1
+                        #if numErrorsSoFar > 5:
+                        #    raise
+
+                        # Uncomment to get stacktrace for the above caught errors:
+                        #import sys
+                        #import traceback
+                        #traceback.print_tb(sys.exc_info()[2])
+                        #print('-------------------------------------')
+                        #***************
+                    self.bumpLineCounter()
+
+                # Since we hold back SQL insertion values to include them
+                # all into one INSERT statement, need to flush after last
+                # call to processOneJSONObject:
+    #             if self.destination.getOutputFormat() == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
+    #                 self.processFinishedRow('FLUSH', outFd)
+    #                 # Give parser a chance to seal the sql file:
+    #                 self.jsonParserInstance.finish()
+
+                self.processFinishedRow('FLUSH', outFd)
+                # Give parser a chance to seal the sql file. If we are
+                # outputting only CSV, and the parser that was used generated MySQL INSERT statements,
+                # then let the finish() method know; it will include the CSV load commands, so
+                # that the main file can simply be sourced into MySQL:
+                if self.destination.getOutputFormat() == OutputDisposition.OutputFormat.CSV:
+                    self.jsonParserInstance.finish(includeCSVLoadCommands=True, outputDisposition=self.destination)
+                else:
+                    self.jsonParserInstance.finish(includeCSVLoadCommands=False)
+                self.warnings.flush()
+        finally:
+            # Stop profiling, put back the methods that the stage
+            # profiler wrapped, flush the warning counts, and close
+            # the sidecar file, also when the conversion fails:
+            if self.profileStatsFile is not None:
+                cProfiler.disable()
+                cProfiler.dump_stats(self.profileStatsFile)
+            if stageProfiler is not None:
+                stageProfiler.restore()
+            self.warnings.close()
+
+        elapsed = time.time() - startTime
+        bytesWritten = self.destination.getBytesWritten()
+        JSONToRelation.logger.info("Wrote %d bytes in %.1f sec (%.2f MB/sec)." %\
+                                   (bytesWritten, elapsed, bytesWritten / elapsed / 1024 / 1024 if elapsed > 0 else 0))
+        self.progressReporter.report(done=True)
+        if stageProfiler is not None:
+            JSONToRelation.logger.info("Stage times of %s:" % self.getSourceName())
+            for reportLine in stageProfiler.report(elapsed):
+                JSONToRelation.logger.info(reportLine)
 
         # If output to other than MySQL table (e.g. CSV file), check whether
-        # we are to prepend the column header row:
-        if prependColHeader and savedFinalOutDest is not None:
+        # we are to provide the column header row:
+        if not prependColHeader or self.destination.getOutputFormat() == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
+            return
+        if savedFinalOutDest is None:
+            # Rows went straight to the destination
+            # file; the header row goes next to it:
+            headerFile = OutputFile(self.destination.getHeaderFileName(), OutputDisposition.OutputFormat.CSV, options='wb')
+            with headerFile as headerFd:
+                self.pushToTable(self.getColHeaders(), headerFd)
+            return
+        try:
+            with open(self.destination.name, 'rb') as inFd, savedFinalOutDest as finalOutFd:
+                colHeaders = self.getColHeaders()
+                self.pushToTable(colHeaders, finalOutFd)
+                shutil.copyfileobj(inFd, finalOutFd.fileHandle)
+        finally:
+            self.destination = savedFinalOutDest
             try:
-                #with open(self.destination.name, 'rb') as inFd, OutputDisposition(savedFinalOutDest) as finalOutFd:
-                with open(self.destination.name, 'rb') as inFd, savedFinalOutDest as finalOutFd:
-                    colHeaders = self.getColHeaders()
-                    self.pushToTable(colHeaders, finalOutFd)
-                    shutil.copyfileobj(inFd, finalOutFd.fileHandle)
-            finally:
-                try:
-                    # Will fail for String file inputs, b/c strings
-                    # don't get closed:
-                    self.tmpFileName.close() # This deletes the file
-                except:
-                    pass
+                os.remove(self.tmpFileName)
+            except OSError:
+                pass
+
+
+    def instrumentStages(self, stageProfiler, outFd, inFd):
+        '''
+        Have the given profiler time the stages of the conversion:
+        the parser's JSON decoding, processOneJSONObject(), handlers,
+        push methods, and finish(); INSERT statement construction;
+        writes to the destination; and reading the input lines.
 
+        :param stageProfiler: profiler that is to time the stages
+        :type stageProfiler: StageProfiler
+        :param outFd: destination being written to
+        :type outFd: OutputDisposition
+        :param inFd: input lines being read
+        :type inFd: iterable
+        :return: iterator over the lines of inFd that times their reading
+        :rtype: generator
+        '''
+        stageProfiler.instrument(self.jsonParserInstance, ['decodeJSON'], 'json.loads')
+        stageProfiler.instrument(self.jsonParserInstance, ['processOneJSONObject', 'finish'])
+        stageProfiler.instrumentByPrefix(self.jsonParserInstance, ['handle', 'subHandle', 'push'])
+        stageProfiler.instrument(self, ['processFinishedRow', 'prepareMySQLRow', 'constructValuesStr'])
+        stageProfiler.instrument(outFd, ['write', 'writerow', 'writerows'], 'write output')
+        return stageProfiler.timeIterator('read input', inFd)
 
     def pushString(self, whatToWrite):
         '''
@@ -475,8 +587,20 @@ class JSONToRelation(object):
         #****************************
         if outFd is None:
             outFd = self.destination
+            # Count rows emitted by the parsers; header
+            # rows come with an explicit outFd:
+            tableName = row[0] if isinstance(row, tuple) else self.mainTableName
+            self.rowsPerTable[tableName] = self.rowsPerTable.get(tableName, 0) + 1
         self.processFinishedRow(row, outFd)
 
+    def reportProgress(self):
+        '''
+        Called by parsers every progressEvery JSON objects. Logs
+        throughput and rows so far, and updates the metrics file,
+        if one was requested.
+        '''
+        self.progressReporter.report()
+
     def processFinishedRow(self, filledNewRow, outFd):
         '''
         When a row is finished, this method processes the row as per
@@ -769,6 +893,9 @@ class JSONToRelation(object):
     def makeFileCitation(self):
         return self.getSourceName() + ':' + str(self.lineCounter)
 
+    def getSourceLocation(self):
+        return (self.getSourceName(), self.lineCounter)
+
     def bumpLineCounter(self):
         self.lineCounter += 1
 
@@ -17,6 +17,7 @@ Manages fast lookup of countries, given words that *might* be countries.
 @author: paepcke
 '''
 import os
+import re
 
 
 class LocationManager(object):
@@ -24,6 +25,14 @@ class LocationManager(object):
     Manages fast lookup of countries, given words that *might* be countries.
     '''
 
+    # Country names longer than this many words are
+    # not looked for in mailing addresses:
+    MAX_PHRASE_WORDS = 4
+
+    # Trie node key under which a node stores the
+    # country whose phrase ends at that node:
+    PHRASE_END = None
+
 
     def __init__(self):
         '''
@@ -32,6 +41,10 @@ class LocationManager(object):
         # Dict mapping first two letters of countries to list
         # of countries that start with those two letters:
         self.countryLookup = {}
+        # Token-level trie of country phrases: nested dicts
+        # keyed by words; the first word with its first letter
+        # capitalized, as isCountry() compares:
+        self.countryTrie = {}
         
         countryFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/countries.txt')
         with open(countryFile, 'r') as fd:
@@ -43,6 +56,13 @@ class LocationManager(object):
                 self.countryLookup[country[:2].upper()] = [country]
             else:
                 self.countryLookup[country[:2].upper()].append(country)
+            phrase = country.split(' ')
+            if len(country) == 0 or len(phrase) > LocationManager.MAX_PHRASE_WORDS:
+                continue
+            node = self.countryTrie
+            for word in phrase:
+                node = node.setdefault(word, {})
+            node[LocationManager.PHRASE_END] = self.normalizeCountry(country)
                 
     def isCountry(self, candidateStr):
         countryList = self.countryLookup.get(candidateStr[:2].upper(), None)
@@ -51,9 +71,54 @@ class LocationManager(object):
         candidateStr = candidateStr[0].upper() + candidateStr[1:]
         for country in countryList:
             if candidateStr == country:
-                if country == 'US' or\
-                   country == 'United States' or\
-                   country == 'United States of America':
-                    country = 'USA'
+                return self.normalizeCountry(country)
+        return ''
+
+    def findCountry(self, words):
+        '''
+        Find the first country phrase in a list of words in one
+        left-to-right pass. Where several phrases start at the same
+        word, the longest one wins. Equivalent to calling isCountry()
+        on the four-, three-, two-, and one-word phrases starting at
+        each word in turn.
+
+        :param words: words of a mailing address, as split at non-word characters
+        :type words: [String]
+        :return: the country, or empty string if the words name none
+        :rtype: String
+        '''
+        numWords = len(words)
+        for startIndx in range(numWords):
+            word = words[startIndx]
+            if len(word) == 0:
+                continue
+            node = self.countryTrie.get(word[0].upper() + word[1:], None)
+            country = ''
+            wordIndx = startIndx + 1
+            while node is not None:
+                country = node.get(LocationManager.PHRASE_END, country)
+                if wordIndx >= numWords:
+                    break
+                node = node.get(words[wordIndx], None)
+                wordIndx += 1
+            if len(country) > 0:
                 return country
         return ''
+
+    def findCountryInAddress(self, mailAddr):
+        '''
+        Find the first country named in a mailing address.
+
+        :param mailAddr: free-form mailing address
+        :type mailAddr: String
+        :return: the country, or empty string if the address names none
+        :rtype: String
+        '''
+        return self.findCountry(re.split(r'\W+', mailAddr))
+
+    def normalizeCountry(self, country):
+        if country == 'US' or\
+           country == 'United States' or\
+           country == 'United States of America':
+            return 'USA'
+        return country
@@ -16,14 +16,40 @@ to resolve OpenEdX hashes, like videos and modules into
 human readable form.
 
 @author: paepcke
+
+Modifications:
+  - The cache keeps a fingerprint of each course's modulestore entries,
+    and the short course name index, in a sidecar file next to the
+    store. refreshCache() re-ingests only courses whose fingerprints
+    changed.
+  - loadModstoreFromJSON() parses the modulestore extract incrementally
+    with ijson, instead of reading and json.loads()-ing the whole file.
+  - The hash lookup cache is a memory-mapped HashLookupStore
+    (data/hashLookup.store) instead of a pickled dict. Records
+    are decoded on lookup, rather than unpickled in full at startup.
 '''
 from UserDict import DictMixin
+import argparse
 import csv
+import hashlib
+import heapq
 import json
 import os
-import cPickle
 import re
+import resource
 import subprocess
+import sys
+import time
+
+import ijson
+from ijson.common import JSONError
+try:
+    # C backend, if yajl is installed; same API, much faster:
+    import ijson.backends.yajl2_c as ijsonBackend
+except ImportError:
+    ijsonBackend = ijson
+
+from hash_lookup_store import HashLookupStore
 
 class ModulestoreImporter(DictMixin):
     '''
@@ -53,8 +79,13 @@ class ModulestoreImporter(DictMixin):
     an instance of this class can export either or both of the dicts to .csv files.
     See methods exportCourseNameLookup() and exportHashInfo()  
     
-    To save time for Python clients, the hash-to-info dict is pickled to a file
-    as a cache. Clients may choose to use this cache as part of instance construction.
+    To save time for Python clients, the hash-to-info dict is saved to a file
+    as a cache: a HashLookupStore, which is memory-mapped rather than loaded.
+    Clients may choose to use this cache as part of instance construction.
+    The short course name dict, and a fingerprint of each course's entries,
+    are saved in a small JSON index file next to the cache. When the
+    modulestore extract is refreshed, refreshCache() uses the fingerprints
+    to re-ingest only the courses that changed.
     
     Look for string 'non-Stanford' for modifications needed in installations
     other than Stanford.
@@ -62,30 +93,34 @@ class ModulestoreImporter(DictMixin):
 
     hashLookupCache = None
 
+    # Version of the JSON index file that is kept
+    # next to the hash lookup store:
+    INDEX_VERSION = 1
+
     def __init__(self, jsonFileName, useCache=True, pickleCachePath=None, parent=None):
         '''
         Prepares instance for subsequent calls to getDisplayName() or
         export(). Preparations include looking for either the given file
-        name, if useCache is False, or the cache file, which is a pickled
-        Python dict containing OpenEdx hash codes to display_name mappings
+        name, if useCache is False, or the cache file, which is a
+        HashLookupStore containing OpenEdx hash codes to display_name mappings
         is missing, then the modulestore is refreshed from the OpenEdX backups.
 
         :param jsonFileName: file path to JSON file that contains an excerpt
                     of modulestore, the OpenEdx course db. This file is
                     created using script cronRefreshModuleStore.sh.
         :type jsonFileName: String
-        :param useCache: if True, and a file hashLookup.pkl exists in this
-                        file's 'data' subdirectory, treat .pkl file as a 
-                        pickled dict that maps OpenEdx hashes to display
+        :param useCache: if True, and a file hashLookup.store exists in this
+                        file's 'data' subdirectory, memory-map that file as a
+                        HashLookupStore that maps OpenEdx hashes to display
                         names. That file would have been created by an
                         earlier instantiation of this class. 
-                        If False, or the pickle file is missing, then
+                        If False, or the store file is missing, then
                         the cache is created by accessing the file
                         modulestore_latest.json in the data subdirectory.
                         That file is created when running cronRefreshModuleStore.sh.
         :type useCache: Bool
         :param pickleCachePath: destination for cache of the hash-->info dict.
-                                Default is data/hashLookup.pkl 
+                                Default is data/hashLookup.store 
         :type pickleCachePath: String
         :param parent: the caller object. If provided, that object must provide
                methods logInfo(), logWarn(), logDebug(), and logError(). If this
@@ -107,9 +142,11 @@ class ModulestoreImporter(DictMixin):
         self.hashStringOnlyPattern =  re.compile(r'^[a-fA-F0-9]{32}$')
         
         if pickleCachePath is None:
-            self.pickleCachePath = os.path.join(os.path.dirname(__file__), 'data/hashLookup.pkl')
+            self.pickleCachePath = os.path.join(os.path.dirname(__file__), 'data/hashLookup.store')
         else:
             self.pickleCachePath = pickleCachePath
+        # Short course name index and course fingerprints:
+        self.indexPath = self.pickleCachePath + '.index'
             
         # Ensure the target directory exists:
         if not os.path.exists(os.path.dirname(self.pickleCachePath)):
@@ -131,11 +168,6 @@ class ModulestoreImporter(DictMixin):
             # Just work with the JSON file, and create the cache:
             useCache = False
         
-        # Pattern to ensure that the first non-comment char in the
-        # file is '{', the opening brace. Allows any number of comments
-        # that start with '#':
-        self.legalJSONStartPattern = re.compile('^([\s]*[#][^\n]*\n)*[\s]*[{]')
-        
         cacheAccessSucceeded = True
         # Get dict {"all" : [{...}, {...},...]}
         if useCache:
@@ -143,23 +175,31 @@ class ModulestoreImporter(DictMixin):
                 self.hashLookup = ModulestoreImporter.hashLookupCache
             else:
                 try:
-                    with open(self.pickleCachePath, 'r') as pickleFd:
-                        self.hashLookup = cPickle.load(pickleFd)
-                        ModulestoreImporter.hashLookupCache = self.hashLookup
-                except IOError:
+                    # Only maps the file; records are
+                    # decoded as they are looked up:
+                    self.hashLookup = HashLookupStore(self.pickleCachePath)
+                    ModulestoreImporter.hashLookupCache = self.hashLookup
+                except (IOError, ValueError):
+                    # Missing, or left by an older version:
                     cacheAccessSucceeded = False
             if cacheAccessSucceeded:
-                # Build lookup for short course name to three-part standard name:
-                self.buildCourseShortNameToCourseName()            
+                # Get lookup for short course name to three-part standard
+                # name saved with the cache, or rebuild it:
+                if not self.loadIndex():
+                    self.buildCourseShortNameToCourseName()
+                    # Fingerprints are only known after ingesting the
+                    # JSON; without them the next refresh is a full one:
+                    self.courseFingerprints = {}
+                    self.saveIndex()
                 return
     
         # No use of cache, or cache unavailable:
         self.loadModstoreFromJSON()
         
-        # Save the lookup in a quick-to-load Python pickle file for future use
+        # Save the lookup in a memory-mappable store for future use
         # when option useCache is true.
-        with open(self.pickleCachePath, 'w') as pickleFd:
-            cPickle.dump(self.hashLookup, pickleFd)
+        HashLookupStore.write(self.pickleCachePath, self.hashLookup)
+        self.saveIndex()
         # Also save it in a class var to share with other instances:
         ModulestoreImporter.hashLookupCache = self.hashLookup
 
@@ -250,6 +290,76 @@ class ModulestoreImporter(DictMixin):
             return None
         return infoDict['revision']
         
+    def refreshCache(self):
+        '''
+        Bring the cache files up to date with the JSON file passed
+        to __init__(), typically after cronRefreshModuleStore.sh has
+        pulled a new modulestore extract. Only courses whose
+        fingerprint changed are re-ingested; records of all other
+        courses are copied from the existing store. If there is no
+        usable cache, or it has no fingerprints, the cache is rebuilt
+        from scratch.
+
+        The JSON file is read twice: once to compute fingerprints,
+        and, if any course changed, once more to collect the changed
+        courses' entries.
+
+        :return: short names of added, changed, or removed courses;
+                 None if the cache was rebuilt from scratch.
+        :rtype: {[String] | None}
+        @raise ValueError: when modulestore JSON could not be parsed.
+        '''
+        try:
+            oldStore = HashLookupStore(self.pickleCachePath)
+        except (IOError, ValueError):
+            oldStore = None
+        if oldStore is None or not self.loadIndex() or len(self.courseFingerprints) == 0:
+            self.loadModstoreFromJSON()
+            HashLookupStore.write(self.pickleCachePath, self.hashLookup)
+            self.saveIndex()
+            self.hashLookup = HashLookupStore(self.pickleCachePath)
+            ModulestoreImporter.hashLookupCache = self.hashLookup
+            return None
+
+        startTime = time.time()
+        fingerprintSums = {}
+        for modstoreEntryDict in self.iterModstoreEntries():
+            lookupEntry = self.makeLookupEntry(modstoreEntryDict)
+            if lookupEntry is not None:
+                self.addToFingerprint(fingerprintSums, lookupEntry[0], lookupEntry[1])
+        newFingerprints = self.finishFingerprints(fingerprintSums)
+        oldFingerprints = self.courseFingerprints
+        changedCourses = set([courseName for courseName in set(newFingerprints.keys()) | set(oldFingerprints.keys())
+                              if newFingerprints.get(courseName, None) != oldFingerprints.get(courseName, None)])
+        if len(changedCourses) == 0:
+            self.hashLookup = oldStore
+            ModulestoreImporter.hashLookupCache = self.hashLookup
+            self.logInfo("Modulestore cache %s is up to date (%.1f sec)" % (self.pickleCachePath, time.time() - startTime))
+            return []
+
+        changedLookup = {}
+        for modstoreEntryDict in self.iterModstoreEntries():
+            lookupEntry = self.makeLookupEntry(modstoreEntryDict)
+            if lookupEntry is not None and lookupEntry[1]['course_short_name'] in changedCourses:
+                changedLookup[lookupEntry[0]] = lookupEntry[1]
+        unchangedItems = ((encodedKey, infoDict) for (encodedKey, infoDict) in oldStore.iterEncodedItems()
+                          if infoDict['course_short_name'] not in changedCourses)
+        changedItems = sorted([(HashLookupStore.encode(key), infoDict) for (key, infoDict) in changedLookup.items()])
+        HashLookupStore.writeItems(self.pickleCachePath, self.mergeSortedItems(changedItems, unchangedItems))
+        oldStore.close()
+        self.hashLookup = HashLookupStore(self.pickleCachePath)
+        ModulestoreImporter.hashLookupCache = self.hashLookup
+
+        # Patch the short course name index the same way:
+        for shortName in changedCourses:
+            self.courseNameLookup.pop(shortName, None)
+        self.courseNameLookup.update(self.makeCourseShortNameToCourseName(changedLookup.itervalues()))
+        self.courseFingerprints = newFingerprints
+        self.saveIndex()
+        self.logInfo("Refreshed %d of %d courses (%d entries) in modulestore cache %s in %.1f sec" %\
+                     (len(changedCourses), len(newFingerprints), len(changedLookup), self.pickleCachePath, time.time() - startTime))
+        return sorted(changedCourses)
+
     def exportHashInfo(self, outFilePath, addHeader=True):
         '''
         Export the dict hash --> org/category/... to 
@@ -278,8 +388,7 @@ class ModulestoreImporter(DictMixin):
                 csvWriter.writerow(['name_hash','org','short_course_name','category','revision','display_name'])
             # Go through each OpenEdx hash, retrieve the little modstore dict that's
             # associated with it, and write to CSV:
-            for modstoreID in self.hashLookup.keys():
-                entryDict = self.hashLookup[modstoreID]
+            for (modstoreID, entryDict) in self.hashLookup.iteritems():
                 values = [modstoreID,
                           entryDict['org'],
                           entryDict['course_short_name'],
@@ -398,52 +507,192 @@ class ModulestoreImporter(DictMixin):
            2. _id.category != 'course' and _id.name is a hash string: self.hashLookup key <-- _id.name
            3. _id.category != 'course' and _id.name is not a hash string: self.hashLookup key <-- '_id.course'_'_id.category'_'_id.name'
         This scheme is not perfect, but it suffices for what we want to do.
+
+        The JSON file is parsed incrementally, one entry at a time, so
+        memory use is bounded by the size of self.hashLookup, not by the
+        size of the file. See iterModstoreEntries() for accepted layouts.
+        Logs number of entries, entries/sec, and peak memory when done.
+
+        @raise ValueError: when modulestore JSON could not be parsed.
         '''
-        jsonStr = open(self.jsonFileName, 'r').read()
-        if self.legalJSONStartPattern.search(jsonStr) is None:
-            # Doesn't start with opening brace:
-            jsonStr = '{"all" :' + jsonStr + "}"
-        
-        try:
-            self.modstoreDict = json.loads(jsonStr)
-        except ValueError:
-            errMsg = "Bad JSON found in module store extract file %s: %s" % (self.jsonFileName, jsonStr)
-            self.logError(errMsg)
-            raise ValueError(errMsg)
-        
         # Create a lookup table mapping hashes of problems
         # and other modules into human-readable names:
         self.hashLookup = {}
-        for modstoreEntryDict in self.modstoreDict['all']:
-            # modstoreEntryDict is like this:
-            # {u'_id': {u'category': u'annotatable', u'name': u'Annotation', u'course': u'templates', u'tag': u'i4x', u'org': u'edx', u'revision': None}, u'metadata': {u'display_name': u'Annotation'}}
-            try:
-                infoDict = {}
-                infoDict['org'] = modstoreEntryDict['_id'].get('org', '')
-                infoDict['course_short_name'] = modstoreEntryDict['_id'].get('course', '')
-                infoDict['category'] = modstoreEntryDict['_id'].get('category', '')
-                infoDict['revision'] = modstoreEntryDict['_id'].get('revision', '')
-                infoDict['name'] = modstoreEntryDict['_id'].get('name', '')                
-                infoDict['display_name'] = modstoreEntryDict['metadata'].get('display_name', '')
-                
-                if infoDict['category'] == 'course':
-                    key = modstoreEntryDict['_id'].get('course', '')
-                    self.hashLookup[key] = infoDict
-                elif self.hashStringOnlyPattern.search(infoDict['name']) is not None:
-                    # Name is a hash str:
-                    key = modstoreEntryDict['_id'].get('name', '')
-                    self.hashLookup[key] = infoDict
-                else:
-                    key = modstoreEntryDict['_id'].get('course', '') + '_' +\
-                          modstoreEntryDict['_id'].get('category', '') + '_' +\
-                          modstoreEntryDict['_id'].get('name', '')
-                    self.hashLookup[key] = infoDict
-            except KeyError:
-                # The 'about' entries don't have metadata; just ignore those entries:
-                pass
+        fingerprintSums = {}
+        numEntries = 0
+        startTime = time.time()
+        for modstoreEntryDict in self.iterModstoreEntries():
+            numEntries += 1
+            lookupEntry = self.makeLookupEntry(modstoreEntryDict)
+            if lookupEntry is not None:
+                self.hashLookup[lookupEntry[0]] = lookupEntry[1]
+                self.addToFingerprint(fingerprintSums, lookupEntry[0], lookupEntry[1])
+        self.courseFingerprints = self.finishFingerprints(fingerprintSums)
+        elapsedTime = time.time() - startTime
+        self.logInfo("Loaded %d modulestore entries from %s in %.1f sec (%.0f entries/sec; peak memory %.1f MB)" %\
+                     (numEntries, self.jsonFileName, elapsedTime,
+                      numEntries / elapsedTime if elapsedTime > 0 else 0,
+                      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
         # Build lookup for short course name to three-part standard name:
         self.buildCourseShortNameToCourseName()
-                  
+
+    def iterModstoreEntries(self):
+        '''
+        Generator over the entries in the JSON file passed to __init__().
+        Lines at the start of the file that begin with '#' are skipped.
+        Three layouts are accepted:
+        
+           - a JSON array of entries: [{...}, {...}, ...]  (the output
+             of cronRefreshModuleStore.sh)
+           - an object whose 'all' key holds that array: {"all" : [{...}, ...]}
+           - one entry per line, as written by mongoexport: {...}\\n{...}\\n
+
+        Entries are yielded as they are parsed; the file is never
+        held in memory as a whole.
+
+        @raise ValueError: when modulestore JSON could not be parsed.
+        '''
+        with open(self.jsonFileName, 'rb') as jsonFd:
+            # Skip comment lines, and remember where the JSON starts:
+            jsonStart = 0
+            firstLine = jsonFd.readline()
+            while len(firstLine) > 0 and (len(firstLine.strip()) == 0 or firstLine.lstrip().startswith('#')):
+                jsonStart = jsonFd.tell()
+                firstLine = jsonFd.readline()
+            jsonFd.seek(jsonStart)
+            if firstLine.lstrip().startswith('{') and self.isModstoreEntryLine(firstLine):
+                # One entry per line:
+                for (lineNum, line) in enumerate(jsonFd):
+                    if len(line.strip()) == 0:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        errMsg = "Bad JSON found in module store extract file %s at entry line %d: %s" % (self.jsonFileName, lineNum + 1, `e`)
+                        self.logError(errMsg)
+                        raise ValueError(errMsg)
+                return
+            # One array, either on its own, or as the value of 'all':
+            prefix = 'all.item' if firstLine.lstrip().startswith('{') else 'item'
+            numEntries = 0
+            try:
+                for modstoreEntryDict in ijsonBackend.items(jsonFd, prefix):
+                    numEntries += 1
+                    yield modstoreEntryDict
+            except JSONError as e:
+                errMsg = "Bad JSON found in module store extract file %s after entry %d: %s" % (self.jsonFileName, numEntries, `e`)
+                self.logError(errMsg)
+                raise ValueError(errMsg)
+
+    def isModstoreEntryLine(self, line):
+        '''
+        Return True if the given line holds one complete
+        modulestore entry, rather than the start of an array,
+        or an entire {"all" : [...]} document.
+        '''
+        try:
+            return '_id' in json.loads(line)
+        except (ValueError, TypeError):
+            return False
+
+    def makeLookupEntry(self, modstoreEntryDict):
+        '''
+        Turn one modulestore entry into a key and info dict for
+        self.hashLookup, using the key scheme described in
+        loadModstoreFromJSON().
+
+        :param modstoreEntryDict: one modulestore entry, like this:
+                 {u'_id': {u'category': u'annotatable', u'name': u'Annotation', u'course': u'templates', u'tag': u'i4x', u'org': u'edx', u'revision': None}, u'metadata': {u'display_name': u'Annotation'}}
+        :type modstoreEntryDict: {String : <any>}
+        :return: key and info dict, or None for entries without metadata
+        :rtype: {(String, {String : String}) | None}
+        '''
+        try:
+            infoDict = {}
+            infoDict['org'] = modstoreEntryDict['_id'].get('org', '')
+            infoDict['course_short_name'] = modstoreEntryDict['_id'].get('course', '')
+            infoDict['category'] = modstoreEntryDict['_id'].get('category', '')
+            infoDict['revision'] = modstoreEntryDict['_id'].get('revision', '')
+            infoDict['name'] = modstoreEntryDict['_id'].get('name', '')                
+            infoDict['display_name'] = modstoreEntryDict['metadata'].get('display_name', '')
+            
+            if infoDict['category'] == 'course':
+                key = modstoreEntryDict['_id'].get('course', '')
+            elif self.hashStringOnlyPattern.search(infoDict['name']) is not None:
+                # Name is a hash str:
+                key = modstoreEntryDict['_id'].get('name', '')
+            else:
+                key = modstoreEntryDict['_id'].get('course', '') + '_' +\
+                      modstoreEntryDict['_id'].get('category', '') + '_' +\
+                      modstoreEntryDict['_id'].get('name', '')
+            return (key, infoDict)
+        except KeyError:
+            # The 'about' entries don't have metadata; just ignore those entries:
+            return None
+
+    def addToFingerprint(self, fingerprintSums, key, infoDict):
+        '''
+        Add one lookup entry to the running fingerprint of its course.
+        A course's fingerprint is the sum of the MD5 digests of its
+        entries, plus the number of entries, so it does not depend on
+        the order of entries in the JSON file.
+
+        :param fingerprintSums: map course short name --> [digestSum, numEntries]; updated in place
+        :type fingerprintSums: {String : [long, int]}
+        '''
+        entryStr = json.dumps([key] + [infoDict[fieldName] for fieldName in HashLookupStore.FIELDS])
+        digest = long(hashlib.md5(entryStr).hexdigest(), 16)
+        courseSum = fingerprintSums.setdefault(infoDict['course_short_name'], [0L, 0])
+        courseSum[0] = (courseSum[0] + digest) % (1 << 128)
+        courseSum[1] += 1
+
+    def finishFingerprints(self, fingerprintSums):
+        return dict([(courseName, '%032x:%d' % (digestSum, numEntries))
+                     for (courseName, (digestSum, numEntries)) in fingerprintSums.items()])
+
+    def mergeSortedItems(self, newItems, oldItems):
+        '''
+        Merge two lists of (encodedKey, infoDict), each sorted by key,
+        into one sorted generator. Where both have the same key, the
+        item from newItems wins.
+        '''
+        prevKey = None
+        for (encodedKey, isOld, infoDict) in heapq.merge(((encodedKey, 0, infoDict) for (encodedKey, infoDict) in newItems),
+                                                         ((encodedKey, 1, infoDict) for (encodedKey, infoDict) in oldItems)):
+            if encodedKey == prevKey:
+                continue
+            prevKey = encodedKey
+            yield (encodedKey, infoDict)
+
+    def loadIndex(self):
+        '''
+        Read the short course name index and the course fingerprints
+        saved next to the cache into self.courseNameLookup and
+        self.courseFingerprints.
+
+        :return: True if the index was read, False if it is missing or unusable.
+        :rtype: Bool
+        '''
+        try:
+            with open(self.indexPath, 'r') as indexFd:
+                index = json.load(indexFd)
+            if index.get('version', None) != ModulestoreImporter.INDEX_VERSION:
+                return False
+            self.courseNameLookup = index['courseNameLookup']
+            self.courseFingerprints = index['courseFingerprints']
+            return True
+        except (IOError, ValueError, KeyError, AttributeError):
+            return False
+
+    def saveIndex(self):
+        tmpPath = '%s.tmp%s' % (self.indexPath, os.getpid())
+        with open(tmpPath, 'w') as indexFd:
+            json.dump({'version' : ModulestoreImporter.INDEX_VERSION,
+                       'courseNameLookup' : self.courseNameLookup,
+                       'courseFingerprints' : self.courseFingerprints},
+                      indexFd)
+        os.rename(tmpPath, self.indexPath)
+
     def buildCourseShortNameToCourseName(self):
         '''
         Creates a dict self.courseNameLookup, which maps a
@@ -458,9 +707,20 @@ class ModulestoreImporter(DictMixin):
         keys to little dicts with the contents of one modulestore
         entry.
         '''
-        self.courseNameLookup = {}
-        for infoDictID in self.hashLookup.keys():
-            infoDict = self.hashLookup[infoDictID]
+        self.courseNameLookup = self.makeCourseShortNameToCourseName(infoDict for (infoDictID, infoDict) in self.hashLookup.iteritems())  # @UnusedVariable
+
+    def makeCourseShortNameToCourseName(self, infoDicts):
+        '''
+        Return a dict short course name --> canonical name, built
+        from the course entries among the given info dicts, as
+        described in buildCourseShortNameToCourseName().
+
+        :param infoDicts: info dicts as stored in self.hashLookup
+        :type infoDicts: iterable({String : String})
+        :rtype: {String : String}
+        '''
+        courseNameLookup = {}
+        for infoDict in infoDicts:
             if infoDict.get('category', None) != 'course':
                 continue
             shortName = infoDict['course_short_name']
@@ -469,10 +729,11 @@ class ModulestoreImporter(DictMixin):
             # (Should we require at least two letter?)
             if re.search(r'^[a-zA-Z]', shortName) is None:
                 continue
-            self.courseNameLookup[shortName] =\
+            courseNameLookup[shortName] =\
                                   infoDict['org'] + '/' +\
                                   shortName + '/' +\
                                   infoDict['name']
+        return courseNameLookup
         
 #         for infoDictID in self.hashLookup.keys():
 #             infoDict = self.hashLookup[infoDictID]
@@ -514,3 +775,34 @@ class ModulestoreImporter(DictMixin):
         if self.parent is not None:
             self.parent.logDebug(msg)
     
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Build or refresh the modulestore hash lookup cache from a modulestore JSON extract.')
+    parser.add_argument('-c', '--cachePath',
+                        action='store',
+                        default=None,
+                        help='Path of the hash lookup store. Default: data/hashLookup.store next to this script.')
+    parser.add_argument('-f', '--full',
+                        action='store_true',
+                        help='Rebuild the cache from scratch, rather than re-ingesting only changed courses.')
+    parser.add_argument('jsonFile',
+                        nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/modulestore_latest.json'),
+                        help='Modulestore JSON extract. Default: data/modulestore_latest.json next to this script.')
+    args = parser.parse_args();
+
+    cachePath = args.cachePath
+    if cachePath is None:
+        cachePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/hashLookup.store')
+    if args.full or not os.path.exists(cachePath):
+        ModulestoreImporter(args.jsonFile, useCache=False, pickleCachePath=cachePath)
+        print('Rebuilt modulestore cache %s from %s.' % (cachePath, args.jsonFile))
+    else:
+        importer = ModulestoreImporter(args.jsonFile, useCache=True, pickleCachePath=cachePath)
+        changedCourses = importer.refreshCache()
+        if changedCourses is None:
+            print('Rebuilt modulestore cache %s from %s.' % (cachePath, args.jsonFile))
+        else:
+            print('Refreshed modulestore cache %s; %d changed courses: %s' % (cachePath, len(changedCourses), ', '.join(changedCourses)))
@@ -0,0 +1,186 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+In-memory indexes over a local copy of modulestore, for ModulestoreExtractor.
+
+Placing a problem or video in its course takes several lookups:
+the course's display name, the parent vertical, sequential, and
+chapter, and whether the vertical is staff-only. Issuing one Mongo
+find() for each of these, for each module, makes extraction run for
+hours. Instead, the extractor hands a batch of modules to prefetchOld(),
+which resolves all the lookups for the batch with a few find() calls
+that use '$in', level by level up the course tree. The extract loops
+then only do dict lookups.
+
+For the split modulestore, fetchDefinitions() pulls the definitions
+of all blocks of one course structure in '$in' batches.
+
+Usage::
+    index = ModulestoreIndex(pymongo.MongoClient().modulestore)
+    index.prefetchOld(problemBatch)
+    (verticalURI, problemIdx) = index.locateModuleInParent(ModulestoreIndex.resourceURI(problemBatch[0]))
+'''
+
+
+class ModulestoreIndex(object):
+
+    # Max number of values in one '$in' clause:
+    IN_BATCH_SIZE = 1000
+
+    # Result of locateModuleInParent() for modules
+    # without a parent; same as the original query's:
+    NO_PARENT = (None, -2)
+
+    # Levels above a problem or video: vertical, sequential,
+    # chapter, course:
+    NUM_PARENT_LEVELS = 4
+
+    def __init__(self, msdb):
+        '''
+        :param msdb: the modulestore database, as from pymongo.MongoClient().modulestore
+        :type msdb: pymongo.database.Database
+        '''
+        self.msdb = msdb
+        # Child URI --> (parent URI, 1-based position among the parent's children):
+        self.parents = {}
+        # (org, course) --> long course name, or None if there is no course entry:
+        self.courseNames = {}
+        # Module name --> visible_to_staff_only:
+        self.staffOnly = {}
+
+    @staticmethod
+    def resourceURI(module):
+        '''
+        Resource URI of an old-style modulestore entry, as used
+        in definition.children, and as EdxTrackEvent hook.
+        '''
+        moduleId = module["_id"]
+        return "%s://%s/%s/%s/%s" % (moduleId["tag"], moduleId["org"], moduleId["course"], moduleId["category"], moduleId["name"])
+
+    # ----------------------------  Old-Style Modulestore -----------------------------
+
+    def prefetchOld(self, modules):
+        '''
+        Load everything that courseName(), locateModuleInParent(),
+        and isStaffOnly() will be asked about the given modules and
+        their enclosing verticals, sequentials, and chapters. Entries
+        already in the indexes are not fetched again.
+
+        :param modules: old-style modulestore entries, such as problems or videos
+        :type modules: [{String : <any>}]
+        '''
+        self.loadCourseNames(set([(module['_id']['org'], module['_id']['course']) for module in modules]))
+        uris = [ModulestoreIndex.resourceURI(module) for module in modules]
+        for level in range(ModulestoreIndex.NUM_PARENT_LEVELS):
+            self.loadParents(uris)
+            uris = [self.parents[uri][0] for uri in uris if self.parents[uri][0] is not None]
+            if level == 0:
+                # Parents of the modules are the verticals:
+                self.loadStaffOnly(set([verticalURI.split('/')[5] for verticalURI in uris]))
+
+    def courseName(self, org, course):
+        '''
+        :return: the long name of the given course, or None if modulestore has no course entry for it.
+        :rtype: {String | None}
+        '''
+        if (org, course) not in self.courseNames:
+            self.loadCourseNames([(org, course)])
+        return self.courseNames[(org, course)]
+
+    def locateModuleInParent(self, resourceURI):
+        '''
+        Given URI for a module, return the URI of the enclosing module,
+        and the 1-based position of the module among its siblings.
+        Returns NO_PARENT for modules without a parent, and for
+        resourceURI None.
+
+        :rtype: ({String | None}, int)
+        '''
+        if not resourceURI:
+            return ModulestoreIndex.NO_PARENT
+        if resourceURI not in self.parents:
+            self.loadParents([resourceURI])
+        return self.parents[resourceURI]
+
+    def isStaffOnly(self, moduleName):
+        if moduleName not in self.staffOnly:
+            self.loadStaffOnly([moduleName])
+        return self.staffOnly[moduleName]
+
+    def loadCourseNames(self, orgCourses):
+        '''
+        Fill self.courseNames for the given (org, course) pairs.
+        Where modulestore has several course entries for one
+        course, the first one wins, as with the former find().next().
+        '''
+        missing = set([orgCourse for orgCourse in orgCourses if orgCourse not in self.courseNames])
+        for batch in self.batches(sorted(set([course for (org, course) in missing]))):  #@UnusedVariable
+            for courseEntry in self.msdb.modulestore.find({"_id.category": "course", "_id.course": {"$in": batch}},
+                                                          {"_id": 1}):
+                orgCourse = (courseEntry['_id']['org'], courseEntry['_id']['course'])
+                if orgCourse in missing and orgCourse not in self.courseNames:
+                    self.courseNames[orgCourse] = courseEntry['_id']['name']
+        for orgCourse in missing:
+            self.courseNames.setdefault(orgCourse, None)
+
+    def loadParents(self, uris):
+        '''
+        Fill self.parents for the given child URIs. All children of
+        each parent found are indexed, so siblings of the requested
+        modules are not fetched again.
+        '''
+        missing = sorted(set([uri for uri in uris if uri not in self.parents]))
+        for batch in self.batches(missing):
+            for parentModule in self.msdb.modulestore.find({"definition.children": {"$in": batch}},
+                                                           {"_id": 1, "definition.children": 1}):
+                parentURI = ModulestoreIndex.resourceURI(parentModule)
+                for (position, childURI) in enumerate(parentModule['definition']['children']):
+                    if childURI not in self.parents:
+                        self.parents[childURI] = (parentURI, position + 1)  # Use 1-indexing
+        for uri in missing:
+            self.parents.setdefault(uri, ModulestoreIndex.NO_PARENT)
+
+    def loadStaffOnly(self, moduleNames):
+        missing = sorted(set([moduleName for moduleName in moduleNames if moduleName not in self.staffOnly]))
+        for batch in self.batches(missing):
+            for module in self.msdb.modulestore.find({"_id.name": {"$in": batch}},
+                                                     {"_id.name": 1, "metadata.visible_to_staff_only": 1}):
+                if module['_id']['name'] not in self.staffOnly:
+                    self.staffOnly[module['_id']['name']] = module.get('metadata', {}).get('visible_to_staff_only', False)
+        for moduleName in missing:
+            self.staffOnly.setdefault(moduleName, False)
+
+    # ----------------------------  Split Modulestore -----------------------------
+
+    def fetchDefinitions(self, definitionIds, projection=None):
+        '''
+        Return the modulestore.definitions documents with
+        the given IDs. Definitions are not kept in the index,
+        since each is used by only one course's blocks.
+
+        :param definitionIds: values of the 'definition' field of structure blocks
+        :type definitionIds: [ObjectId]
+        :param projection: fields to retrieve; default: all
+        :type projection: {String : int}
+        :return: map from definition ID to definition document; IDs without definition are absent
+        :rtype: {ObjectId : {String : <any>}}
+        '''
+        definitions = {}
+        for batch in self.batches(list(set(definitionIds))):
+            for definition in self.msdb['modulestore.definitions'].find({"_id": {"$in": batch}}, projection):
+                definitions[definition['_id']] = definition
+        return definitions
+
+    # ----------------------------  Utilities -----------------------------
+
+    def batches(self, values):
+        for start in range(0, len(values), ModulestoreIndex.IN_BATCH_SIZE):
+            yield values[start:start + ModulestoreIndex.IN_BATCH_SIZE]
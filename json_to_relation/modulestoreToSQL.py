@@ -20,16 +20,25 @@
 ##  either modulestore case.
 
 
+import Queue
 import argparse
 from collections import namedtuple
 import datetime
 import logging
 import math
+from multiprocessing.pool import ThreadPool
 import os.path
 import re
 import sys
+import threading
+import time
+# Imported up front: the lazy import in datetime.strptime()
+# is not thread-safe in Python 2, and extraction passes
+# run in threads:
+import _strptime  #@UnusedImport
 
 import pymongo as mng
+from modulestoreIndex import ModulestoreIndex
 from pymysql_utils1 import MySQLDB
 
 
@@ -37,6 +46,10 @@ from pymysql_utils1 import MySQLDB
 # Data type for AY_[quarter][year] date ranges
 Quarter = namedtuple('Quarter', ['start_date', 'end_date', 'quarter'])
 
+# Outcome of one extraction pass. Seconds is the time
+# the pass took to extract, and hand its rows to the loader:
+PassTiming = namedtuple('PassTiming', ['passName', 'tableName', 'numRows', 'seconds'])
+
 # Class variables for determining internal status of course
 SU_ENROLLMENT_DOMAIN = "shib:https://idp.stanford.edu/"
 INTERNAL_ORGS = ['ohsx', 'ohs', 'oli']
@@ -68,15 +81,36 @@ class ModulestoreExtractor(MySQLDB):
     # rows:
     REPORT_EVERY_N_ROWS  = 10000
     
-    def __init__(self, split=True, old=True, edxproblem=True, courseinfo=True, edxvideo=True, verbose=False):
+    # Number of old-modulestore problems or videos
+    # whose parents, course names, and staff-only flags
+    # are fetched from Mongo together:
+    PREFETCH_BATCH_SIZE = 500
+    
+    # Default number of extraction passes run concurrently,
+    # which is also the number of split-modulestore courses
+    # extracted concurrently:
+    NUM_WORKERS = 4
+    
+    # Max number of row batches waiting to be bulk-inserted;
+    # extraction pauses while the loader catches up:
+    LOAD_QUEUE_SIZE = 4
+    
+    def __init__(self, split=True, old=True, edxproblem=True, courseinfo=True, edxvideo=True, verbose=False, numWorkers=None):
         '''
         Get interface to modulestore backup.
         Note: This class presumes modulestore was recently loaded to mongod.
         Class also presumes that mongod is running on localhost:27017.
         '''
+        self.numWorkers = ModulestoreExtractor.NUM_WORKERS if numWorkers is None else numWorkers
+        # Set by export() while extraction passes run:
+        self.loadQueue = None
+        self.coursePool = None
 
         # FIXME: don't presume modulestore is recently loaded and running
         self.msdb = mng.MongoClient().modulestore
+        # Bulk-loaded parent/course/definition lookups,
+        # to avoid one Mongo query per module:
+        self.index = ModulestoreIndex(self.msdb)
 
         if verbose:
             self.setupLogging(logging.INFO, logFile=None)
@@ -196,54 +230,81 @@ class ModulestoreExtractor(MySQLDB):
         '''
         Client method builds tables and loads various modulestore cases to MySQL.
         We reload both tables from scratch each time since the tables are relatively small.
+        
+        The extraction passes run concurrently, up to numWorkers at
+        a time. Split-modulestore passes additionally spread their
+        courses over numWorkers threads. Extracted rows go through a
+        bounded queue to a single loader thread, which bulk-inserts
+        them over this instance's connection while extraction goes on.
+        
+        :return: one PassTiming per extraction pass
+        :rtype: [PassTiming]
         '''
         self.__buildEmptyEdxProblemTable() if self.update_EP else None
         self.__buildEmptyCourseInfoTable() if self.update_CI else None
         self.__buildEmptyEdxVideoTable() if self.update_EV else None
 
+        passes = []
         if self.split and self.update_EP:
-            self.logInfo("About to ingest problem defs from new-type modulestore...")
-            self.__extractSplitEdxProblem()
-            self.logInfo("Done ingesting problem defs from new-type modulestore...")
-
+            passes.append(('problem defs from new-type modulestore', 'EdxProblem', self.__extractSplitEdxProblem))
         if self.split and self.update_CI:
-            self.logInfo("About to ingest course defs from new-type modulestore...")
-            self.__extractSplitCourseInfo()
-            self.logInfo("Done ingesting course defs from new-type modulestore...")
-            pass
-
+            passes.append(('course defs from new-type modulestore', 'CourseInfo', self.__extractSplitCourseInfo))
         if self.split and self.update_EV:
-            self.logInfo("About to ingest video defs from new-type modulestore...")
-            self.__extractSplitEdxVideo()
-            self.logInfo("Done ingesting video defs from new-type modulestore...")
-
+            passes.append(('video defs from new-type modulestore', 'EdxVideo', self.__extractSplitEdxVideo))
         if self.old and self.update_EP:
-            self.logInfo("About to ingest problem defs from old-type modulestore...")
-            self.__extractOldEdxProblem()
-            self.logInfo("Done ingesting problem defs from old-type modulestore...")
-
+            passes.append(('problem defs from old-type modulestore', 'EdxProblem', self.__extractOldEdxProblem))
         if self.old and self.update_CI:
-            self.logInfo("About to ingest course defs from old-type modulestore...")            
-            self.__extractOldCourseInfo()
-            self.logInfo("Done ingesting course defs from old-type modulestore...")
-
+            passes.append(('course defs from old-type modulestore', 'CourseInfo', self.__extractOldCourseInfo))
         if self.old and self.update_EV:
-            self.logInfo("About to ingest video defs from old-type modulestore...")
-            self.__extractOldEdxVideo()
-            self.logInfo("Done ingesting video defs from old-type modulestore...")
+            passes.append(('video defs from old-type modulestore', 'EdxVideo', self.__extractOldEdxVideo))
+        if len(passes) == 0:
+            return []
+
+        self.__startLoader()
+        self.coursePool = ThreadPool(self.numWorkers)
+        passPool = ThreadPool(min(self.numWorkers, len(passes)))
+        try:
+            timings = passPool.map(self.__runPass, passes)
+        finally:
+            passPool.close()
+            passPool.join()
+            self.coursePool.close()
+            self.coursePool.join()
+            self.coursePool = None
+            self.__stopLoader()
+        self.logInfo("Loader bulk-inserted %s rows in %.1f sec." % (self.numLoadedRows, self.loadSeconds))
+        return timings
+
+    def __runPass(self, extractionPass):
+        '''
+        Run one extraction pass, and time it.
+        
+        :param extractionPass: description for logging, name of target table, and extraction method
+        :type extractionPass: (String, String, callable)
+        :rtype: PassTiming
+        '''
+        (passName, tableName, extractMethod) = extractionPass
+        self.logInfo("About to ingest %s..." % passName)
+        startTime = time.time()
+        numRows = extractMethod()
+        self.logInfo("Done ingesting %s." % passName)
+        return PassTiming(passName, tableName, numRows, time.time() - startTime)
+
+    @classmethod
+    def formatReport(cls, timings):
+        lines = []
+        for timing in timings:
+            lines.append('%-42s %-10s %8d rows in %7.1f sec (%d rows/sec)' %
+                         (timing.passName, timing.tableName, timing.numRows, timing.seconds,
+                          timing.numRows / timing.seconds if timing.seconds > 0 else timing.numRows))
+        return '\n'.join(lines)
 
     @staticmethod
     def __resolveResourceURI(problem):
         '''
         Extract resource URI as identifier for EdxTrackEvent hook.
         '''
-        tag = problem["_id"]["tag"]
-        org = problem["_id"]["org"]
-        course = problem["_id"]["course"]
-        category = problem["_id"]["category"]
-        name = problem["_id"]["name"]
-        uri = "%s://%s/%s/%s/%s" % (tag, org, course, category, name)
-        return uri
+        return ModulestoreIndex.resourceURI(problem)
 
 
     @staticmethod
@@ -266,12 +327,8 @@ class ModulestoreExtractor(MySQLDB):
         '''
         org = module["_id"]["org"]
         course = module["_id"]["course"]
-        definition = self.msdb.modulestore.find({"_id.category": "course",
-                                                 "_id.org": org,
-                                                 "_id.course": course})
-        try:
-            name = definition[0]["_id"]["name"]
-        except IndexError:
+        name = self.index.courseName(org, course)
+        if name is None:
             self.logError('Course display name for course %s not found.' % str(course))
             cdn = '<Not found in Modulestore>'
             return cdn
@@ -285,17 +342,53 @@ class ModulestoreExtractor(MySQLDB):
         Given URI for a vertical, return the URI of the encapsulating sequential
         and an integer for what order in the sequence the vertical occurred.
         '''
-        if not resource_uri:
-            return None, -2
-        try:
-            parent_module = self.msdb.modulestore.find({"definition.children": resource_uri}).next()
-        except StopIteration:
-            # print resource_uri
-            return None, -2
-        parent_module_uri = self.__resolveResourceURI(parent_module)
-        order = parent_module['definition']['children'].index(resource_uri) + 1  # Use 1-indexing
-        return parent_module_uri, order
+        return self.index.locateModuleInParent(resource_uri)
 
+    def __prefetchedModules(self, modules):
+        '''
+        Generator over old-style modulestore entries from the given
+        cursor. Before yielding a batch of PREFETCH_BATCH_SIZE entries,
+        loads their course names, parents, and staff-only flags into
+        self.index with a few bulk queries.
+        '''
+        batch = []
+        for module in modules:
+            batch.append(module)
+            if len(batch) >= ModulestoreExtractor.PREFETCH_BATCH_SIZE:
+                self.index.prefetchOld(batch)
+                for prefetchedModule in batch:
+                    yield prefetchedModule
+                batch = []
+        if len(batch) > 0:
+            self.index.prefetchOld(batch)
+            for prefetchedModule in batch:
+                yield prefetchedModule
+
+
+    def __copyFromArchive(self, archive_table, table_name):
+        '''
+        If the given archive table exists and is not empty, copy its
+        rows to table_name. Uses a connection of its own, because the
+        loader thread may be using this instance's connection.
+        
+        :return: number of rows copied; 0 if the archive is absent or empty.
+        :rtype: int
+        '''
+        db = MySQLDB(db='Edx', user=self.user, passwd=self.pwd, pooled=True)
+        try:
+            self.logInfo('Checking whether %s exists and non-empty...' % archive_table)
+            num_rows = db.query('SELECT COUNT(*) FROM %s' % archive_table).next()[0]
+            self.logInfo('Found %s rows in %s.' % (num_rows, archive_table))
+            if num_rows > 0:
+                self.logInfo("Copying rows from %s to %s..." % (archive_table, table_name))
+                db.execute('INSERT INTO %s SELECT * FROM %s' % (table_name, archive_table))
+                self.logInfo("Done copying rows from %s to %s." % (archive_table, table_name))
+            return num_rows
+        except ValueError:
+            self.logInfo("%s not present; extracting 'old-modulestore' rows for %s from Mongodb." % (archive_table, table_name))
+            return 0
+        finally:
+            db.close()
 
     def __extractOldEdxProblem(self):
         '''
@@ -307,20 +400,11 @@ class ModulestoreExtractor(MySQLDB):
         to the EdxProblem table and are done. Else we run the
         actual extraction.
         '''
-        try:
-            self.logInfo('Checking whether EdxOldModstoreProblemArchive exists and non-empty...')
-            it = self.query('SELECT COUNT(*) FROM EdxOldModstoreProblemArchive')
-            num_rows = it.next()
-            self.logInfo('Found %s rows in EdxOldModstoreProblemArchive exists.' % num_rows)
-            if num_rows > 0:
-                self.logInfo("Copying rows from EdxOldModstoreProblemArchive to EdxProblem...")
-                self.execute('INSERT INTO EdxProblem SELECT * FROM EdxOldModstoreProblemArchive')
-                self.logInfo("Done copying rows from EdxOldModstoreProblemArchive to EdxProblem.")
-                return
-        except ValueError:
-            self.logInfo("EdxOldModstoreProblemArchive not present; extracting 'old-modulestore' problem defs from Mongodb.")
+        num_rows = self.__copyFromArchive('EdxOldModstoreProblemArchive', 'EdxProblem')
+        if num_rows > 0:
+            return num_rows
 
-        problems = self.msdb.modulestore.find({"_id.category": "problem"}).batch_size(20)
+        problems = self.__prefetchedModules(self.msdb.modulestore.find({"_id.category": "problem"}).batch_size(ModulestoreExtractor.PREFETCH_BATCH_SIZE))
         col_names     = ['problem_id',
                          'problem_display_name',
                          'course_display_name',
@@ -329,7 +413,15 @@ class ModulestoreExtractor(MySQLDB):
                          'weight',
                          'revision',
                          'max_attempts',
-                         'trackevent_hook'
+                         'trackevent_hook',
+                         'vertical_uri',
+                         'problem_idx',
+                         'sequential_uri',
+                         'vertical_idx',
+                         'chapter_uri',
+                         'sequential_idx',
+                         'chapter_idx',
+                         'staff_only'
                          ]
         
         
@@ -356,8 +448,7 @@ class ModulestoreExtractor(MySQLDB):
                 staff_only = False
             else:
                 staff_name = vertical_uri.split('/')[5]
-                staff_only = self.msdb.modulestore.find({"_id.name": staff_name}).next()['metadata']\
-                             .get('visible_to_staff_only', False)
+                staff_only = self.index.isStaffOnly(staff_name)
             
             # URI for enclosing chapter and location of sequential
             chapter_uri, sequential_idx = self.__locateModuleInParent(sequential_uri)
@@ -400,17 +491,13 @@ class ModulestoreExtractor(MySQLDB):
             self.__loadToSQL('EdxProblem', col_names, table)
             num_pulled += len(table)            
             self.logInfo("Ingested %s rows of old-modulestore problems." % num_pulled)
-            
+        return num_pulled
+
     def __extractSplitEdxProblem(self):
         '''
         Extract problem data from Split MongoDB modulestore.
         SQL load method expects a list of dicts mapping column names to data.
         '''
-        table = []
-        
-        # Get a course generator and iterate through
-        courses = self.msdb['modulestore.active_versions'].find()
-
         col_names     = ['problem_id',
                          'problem_display_name',
                          'course_display_name',
@@ -421,51 +508,50 @@ class ModulestoreExtractor(MySQLDB):
                          'max_attempts',
                          'trackevent_hook'
                          ]
-        num_pulled = 0
-
-        for course in courses:
-            cdn = "%s/%s/%s" % (course['org'], course['course'], course['run'])
-            if self.is_test_name(cdn):
-                continue
-            cid = course['versions'].get('published-branch', None)
-            if not cid:
-                continue
+        return self.__extractSplitPerCourse('EdxProblem', col_names, self.__splitCourseProblems, 'new-modulestore problems')
 
-            # Retrieve course structure from published branch and filter out non-problem blocks
+    def __splitCourseProblems(self, course):
+        '''
+        Return the EdxProblem rows of one course of the Split modulestore.
+        Runs in a thread of self.coursePool.
+        '''
+        table = []
+        cdn = "%s/%s/%s" % (course['org'], course['course'], course['run'])
+        if self.is_test_name(cdn):
+            return table
+        cid = course['versions'].get('published-branch', None)
+        if not cid:
+            return table
+
+        # Retrieve course structure from published branch and filter out non-problem blocks
+        try:
+            structure = self.msdb['modulestore.structures'].find({"_id": cid, "blocks.block_type": "problem"}).next()
+        except StopIteration:
+            return table
+        problem_blocks = filter(lambda b: b['block_type'] == 'problem', structure['blocks'])
+        definitions = self.index.fetchDefinitions([block['definition'] for block in problem_blocks],
+                                                  {"fields.data": 1})
+        for block in problem_blocks:
             try:
-                structure = self.msdb['modulestore.structures'].find({"_id": cid, "blocks.block_type": "problem"}).next()
-            except StopIteration:
+                definition = definitions[block['definition']]
+            except KeyError:
                 continue
-            for block in filter(lambda b: b['block_type'] == 'problem', structure['blocks']):
-                try:
-                    definition = self.msdb['modulestore.definitions'].find({"_id": block['definition']}).next()
-                except StopIteration:
-                    continue
-
-                # Construct data dict and append to table list
-                data = (block['block_id'],                         # problem_id
-                        block['fields'].get('display_name', "NA"), # problem_display_name 
-                        cdn,                                       # course_display_name
-                        definition['fields']['data'],              # problem_text
-                # TODO: Test the below on real course data from split modulestore
-                # TODO: Add context metadata
-                        False,      							   # date                         
-                        -1,         							   # weight
-                        False,      							   # revision
-                        -1,         							   # max_attempts
-                        False         							   # trackeventhook
-                        )
-                table.append(data)
-                if len(table) >= ModulestoreExtractor.BULK_INSERT_NUM_ROWS:
-                    self.__loadToSQL('EdxProblem', col_names, table)
-                    num_pulled += len(table)
-                    if num_pulled > ModulestoreExtractor.REPORT_EVERY_N_ROWS:
-                        self.logInfo("Ingested %s rows of new-modulestore problems." % num_pulled)
-                    table = []
-        if len(table) > 0:
-            self.__loadToSQL('EdxProblem', col_names, table)
-            num_pulled += len(table)
-            self.logInfo("Ingested %s rows of new-modulestore problems." % num_pulled)            
+
+            # Construct data dict and append to table list
+            data = (block['block_id'],                         # problem_id
+                    block['fields'].get('display_name', "NA"), # problem_display_name 
+                    cdn,                                       # course_display_name
+                    definition['fields']['data'],              # problem_text
+            # TODO: Test the below on real course data from split modulestore
+            # TODO: Add context metadata
+                    False,                                     # date                         
+                    -1,                                        # weight
+                    False,                                     # revision
+                    -1,                                        # max_attempts
+                    False                                      # trackeventhook
+                    )
+            table.append(data)
+        return table
 
     def __extractOldEdxVideo(self):
         '''
@@ -476,25 +562,14 @@ class ModulestoreExtractor(MySQLDB):
         If that table is present and not empty, we copy from it to the EdxVideo
         table and are done. Else we run the actual extraction.        
         '''
-        
-        try:
-            self.logInfo('Checking whether EdxOldModstoreVideoArchive exists and non-empty...')
-            it = self.query('SELECT COUNT(*) FROM EdxOldModstoreVideoArchive')
-            num_rows = it.next()
-            self.logInfo('Found %s rows in EdxOldModstoreVideoArchive exists.' % num_rows)
+        num_rows = self.__copyFromArchive('EdxOldModstoreVideoArchive', 'EdxVideo')
+        if num_rows > 0:
+            return num_rows
 
-            if num_rows > 0:
-                self.logInfo("Copying rows from EdxOldModstoreVideoArchive to EdxProblem...")
-                self.execute('INSERT INTO EdxVideo SELECT * FROM EdxOldModstoreVideoArchive')
-                self.logInfo("Done copying rows from EdxOldModstoreVideoArchive to EdxProblem.")
-                return
-        except ValueError:
-            self.logInfo("EdxOldModstoreVideoArchive not present; extracting 'old-modulestore' video defs from Mongodb.")
-        
         table = []
         num_pulled = 0        
 
-        videos = self.msdb.modulestore.find({"_id.category": "video"}).batch_size(20)
+        videos = self.__prefetchedModules(self.msdb.modulestore.find({"_id.category": "video"}).batch_size(ModulestoreExtractor.PREFETCH_BATCH_SIZE))
 
         col_names     = ['video_id',
                          'video_display_name',
@@ -503,9 +578,9 @@ class ModulestoreExtractor(MySQLDB):
                          'video_code',
                          'trackevent_hook',
                          'vertical_uri',
-                         'problem_idx',
+                         'video_idx',
                          'sequential_uri',
-                         'vertical_idx'
+                         'vertical_idx',
                          'chapter_uri',
                          'sequential_idx',
                          'chapter_idx'
@@ -551,72 +626,92 @@ class ModulestoreExtractor(MySQLDB):
             self.__loadToSQL('EdxVideo', col_names, table)
             num_pulled += len(table)            
             self.logInfo("Ingested %s rows of old-modulestore videos." % num_pulled)
+        return num_pulled
 
     def __extractSplitEdxVideo(self):
         '''
         Extract video metadata from Split MongoDB modulestore.
         More or less identical to EdxProblem extract, but with different metadata.
         '''
-        table = []
-        num_pulled = 0
-        
-        # Get a course generator and iterate through
-        courses = self.msdb['modulestore.active_versions'].find()
-        
+        # Context columns are not yet extracted from Split courses:
         col_names     = ['video_id',
                          'video_display_name',
                          'course_display_name',
                          'video_uri',
-                         'video_code',
-                         'trackevent_hook',
-                         'vertical_uri',
-                         'problem_idx',
-                         'sequential_uri',
-                         'vertical_idx'
-                         'chapter_uri',
-                         'sequential_idx',
-                         'chapter_idx'
+                         'video_code'
                          ]
-        
-        for course in courses:
-            cdn = "%s/%s/%s" % (course['org'], course['course'], course['run'])
-            if self.is_test_name(cdn):
-                continue
+        return self.__extractSplitPerCourse('EdxVideo', col_names, self.__splitCourseVideos, 'new-modulestore videos')
 
-            cid = course['versions'].get('published-branch', None)
-            if not cid:
+    def __splitCourseVideos(self, course):
+        '''
+        Return the EdxVideo rows of one course of the Split modulestore.
+        Runs in a thread of self.coursePool.
+        '''
+        table = []
+        cdn = "%s/%s/%s" % (course['org'], course['course'], course['run'])
+        if self.is_test_name(cdn):
+            return table
+
+        cid = course['versions'].get('published-branch', None)
+        if not cid:
+            return table
+
+        # Retrieve course structure from published branch and filter out non-problem blocks
+        try:
+            structure = self.msdb['modulestore.structures'].find({"_id": cid, "blocks.block_type": "video"}).next()
+        except StopIteration:
+            return table  # Some courses don't have any video content
+        video_blocks = filter(lambda b: b['block_type'] == 'video', structure['blocks'])
+        definitions = self.index.fetchDefinitions([block['definition'] for block in video_blocks],
+                                                  {"_id": 1})
+        for block in video_blocks:
+            if block['definition'] not in definitions:
                 continue
 
-            # Retrieve course structure from published branch and filter out non-problem blocks
-            try:
-                structure = self.msdb['modulestore.structures'].find({"_id": cid, "blocks.block_type": "video"}).next()
-            except StopIteration:
-                continue  # Some courses don't have any video content
-            for block in filter(lambda b: b['block_type'] == 'video', structure['blocks']):
-                try:
-                    definition = self.msdb['modulestore.definitions'].find({"_id": block['definition']}).next() #@UnusedVariable
-                except StopIteration:
-                    continue
-
-                data = (block['block_id'], # video_id'
-                        block['fields'].get('display_name', 'NA'), # video_display_name
-                        cdn, # course_display_name
-                        block['fields'].get('html5_sources', 'NA'), # video_uri
-                        block['fields'].get('youtube_id_1_0', 'NA') # video_code
-                        )
-                
-                table.append(data)
-                if len(table) >= ModulestoreExtractor.BULK_INSERT_NUM_ROWS:
-                    self.__loadToSQL('EdxVideo', col_names, table)
-                    num_pulled += len(table)
-                    if num_pulled > ModulestoreExtractor.REPORT_EVERY_N_ROWS:
-                        self.logInfo("Ingested %s rows of new-modulestore videos." % num_pulled)
-                        
-                    table = []
+            data = (block['block_id'], # video_id'
+                    block['fields'].get('display_name', 'NA'), # video_display_name
+                    cdn, # course_display_name
+                    block['fields'].get('html5_sources', 'NA'), # video_uri
+                    block['fields'].get('youtube_id_1_0', 'NA') # video_code
+                    )
+            table.append(data)
+        return table
+
+    def __extractSplitPerCourse(self, table_name, col_names, courseRowsFunc, rowsDescription):
+        '''
+        Run courseRowsFunc on every course of the Split modulestore,
+        spread over the threads of self.coursePool, and hand the
+        resulting rows to __loadToSQL() in batches.
+        
+        :param table_name: table to load
+        :type table_name: String
+        :param col_names: names of the columns courseRowsFunc fills
+        :type col_names: [String]
+        :param courseRowsFunc: function from active_versions entry to list of row tuples
+        :type courseRowsFunc: callable
+        :param rowsDescription: what the rows are, for logging
+        :type rowsDescription: String
+        :return: number of rows extracted
+        :rtype: int
+        '''
+        table = []
+        num_pulled = 0
+        
+        # Get a course generator and iterate through
+        courses = self.msdb['modulestore.active_versions'].find()
+        for course_rows in self.coursePool.imap_unordered(courseRowsFunc, courses):
+            table.extend(course_rows)
+            if len(table) >= ModulestoreExtractor.BULK_INSERT_NUM_ROWS:
+                self.__loadToSQL(table_name, col_names, table)
+                num_pulled += len(table)
+                if num_pulled > ModulestoreExtractor.REPORT_EVERY_N_ROWS:
+                    self.logInfo("Ingested %s rows of %s." % (num_pulled, rowsDescription))
+                table = []
         if len(table) > 0:
-            self.__loadToSQL('EdxVideo', col_names, table)
-            num_pulled += len(table)            
-            self.logInfo("Ingested %s rows of new-modulestore videos." % num_pulled)
+            self.__loadToSQL(table_name, col_names, table)
+            num_pulled += len(table)
+            self.logInfo("Ingested %s rows of %s." % (num_pulled, rowsDescription))
+        return num_pulled
             
     @staticmethod
     def inRange(date, quarter):
@@ -814,115 +909,99 @@ class ModulestoreExtractor(MySQLDB):
             self.__loadToSQL('CourseInfo', col_names, table)
             num_pulled += len(table)            
             self.logInfo("Ingested %s rows of old-modulestore course info." % num_pulled)
+        return num_pulled
 
     def __extractSplitCourseInfo(self):
         '''
         Extract course metadata from Split MongoDB modulestore.
         Inserts results in table CourseInfo.
         '''
-
-        table = []
-        num_pulled = 0
-        
         col_names     = ['course_display_name',
                          'course_catalog_name',
-                         'start_date',
-                         'end_date',
                          'academic_year',
                          'quarter',
                          'is_internal',
                          'enrollment_start',
+                         'start_date',
                          'enrollment_end',
+                         'end_date',
                          'grade_policy',
                          'certs_policy'
                          ]
-        
-        # Get all most recent versions of 'course' type documents from modulestore
-        courses = self.msdb['modulestore.active_versions'].find()
-        for course in courses:
-#             #*******
-#             try:
-#                 if course['course'] == '115':
-#                     print("In new.")
-#             except KeyError:
-#                 pass
-#             #*******
-            cdn = "course-V%s:%s+%s+%s" %\
-                (course['schema_version'],course['org'], course['course'], course['run'])
-            if self.is_test_name(cdn):
-                continue
+        return self.__extractSplitPerCourse('CourseInfo', col_names, self.__splitCourseInfoRows, 'new-modulestore course info')
 
-            cid = course['versions'].get('published-branch', None)
-            if not cid:
-                continue  # Ignore if not a 'published' course
-            # Get this course block and corresponding definition document from modulestore
-            try:
-                structure = self.msdb['modulestore.structures'].find({"_id": cid, "blocks.block_type": "course"}).next()
-            except StopIteration:
-                # No record found in structures:
-                continue
-            try:
-                block = filter(lambda b: b['block_type'] == 'course', structure['blocks'])[0]
-            except IndexError:
-                self.logError('No course block found for course %s' % str(course))
-                continue
-            try:
-                definition = self.msdb['modulestore.definitions'].find({"_id": block['definition']}).next()
-            except StopIteration:
-                continue
-
-            datestr = lambda d: datetime.datetime.strftime(d, "%Y-%m-%dT%H:%M:%SZ")
-            
-            start_date = block['fields'].get('start', '0000-00-00T00:00:00Z')
-            end_date = block['fields'].get('end', '0000-00-00T00:00:00Z')
-            start_date = datestr(start_date) if type(start_date) is datetime.datetime else start_date
-            end_date = datestr(end_date) if type(end_date) is datetime.datetime else end_date
-            academic_year, quarter, num_quarters = self.__lookupAYDataFromDates(start_date, end_date) #@UnusedVariable
-            
-            # We decided rather to have all courses in CourseInfo,
-            # even ones with 'bad' start/end dates:
-            #if academic_year not in VALID_AYS:
-            #    continue
-            
-            enrollment_start = block['fields'].get('enrollment_start', '0000-00-00T00:00:00Z')
-            enrollment_end   = block['fields'].get('enrollment_end', '0000-00-00T00:00:00Z')
-            enrollment_start = datestr(enrollment_start) if type(enrollment_start) is datetime.datetime else enrollment_start
-            enrollment_end   = datestr(enrollment_end) if type(enrollment_end) is datetime.datetime else enrollment_end
-            
-            try:
-                grade_policy = str(definition['fields'].get('grading_policy').get('GRADER', 'NA'))
-                certs_policy = ("minimum_grade_credit: %s certificate_policy: " %\
-                                block['fields'].get('minimum_grade_credit', 'NA')) +\
-                                str(definition['fields'].get('grading_policy').get('GRADE_CUTOFFS', 'NA'))
-            except AttributeError:
-                grade_policy = 'NA'
-                certs_policy = 'NA'
-                        
-            data = (cdn, # course_display_name
-                    block['fields']['display_name'], # course_catalog_name
-                    academic_year, # academic_year
-                    quarter, # quarter
-                    self.isInternal(course,block), # is_internal
-                    enrollment_start, # enrollment_start
-                    start_date, # start_date
-                    enrollment_end, # enrollment_end
-                    end_date,   # end_date
-                    grade_policy, # grade_policy
-                    certs_policy # certs_policy
-                    )
+    def __splitCourseInfoRows(self, course):
+        '''
+        Return the CourseInfo row of one course of the Split
+        modulestore as a one-element list; an empty list if the
+        course is skipped. Runs in a thread of self.coursePool.
+        '''
+        cdn = "course-V%s:%s+%s+%s" %\
+            (course['schema_version'],course['org'], course['course'], course['run'])
+        if self.is_test_name(cdn):
+            return []
+
+        cid = course['versions'].get('published-branch', None)
+        if not cid:
+            return []  # Ignore if not a 'published' course
+        # Get this course block and corresponding definition document from modulestore
+        try:
+            structure = self.msdb['modulestore.structures'].find({"_id": cid, "blocks.block_type": "course"}).next()
+        except StopIteration:
+            # No record found in structures:
+            return []
+        try:
+            block = filter(lambda b: b['block_type'] == 'course', structure['blocks'])[0]
+        except IndexError:
+            self.logError('No course block found for course %s' % str(course))
+            return []
+        try:
+            definition = self.msdb['modulestore.definitions'].find({"_id": block['definition']}).next()
+        except StopIteration:
+            return []
 
-            table.append(data)
-            if len(table) >= ModulestoreExtractor.BULK_INSERT_NUM_ROWS:
-                self.__loadToSQL('CourseInfo', col_names, table)
-                num_pulled += len(table)
-                if num_pulled > ModulestoreExtractor.REPORT_EVERY_N_ROWS:
-                    self.logInfo("Ingested %s rows of new-modulestore course info." % num_pulled)
-                
-                table = []
-        if len(table) > 0:
-            self.__loadToSQL('CourseInfo', col_names, table)
-            num_pulled += len(table)
-            self.logInfo("Ingested %s rows of new-modulestore course info." % num_pulled)
+        datestr = lambda d: datetime.datetime.strftime(d, "%Y-%m-%dT%H:%M:%SZ")
+        
+        start_date = block['fields'].get('start', '0000-00-00T00:00:00Z')
+        end_date = block['fields'].get('end', '0000-00-00T00:00:00Z')
+        start_date = datestr(start_date) if type(start_date) is datetime.datetime else start_date
+        end_date = datestr(end_date) if type(end_date) is datetime.datetime else end_date
+        academic_year, quarter, num_quarters = self.__lookupAYDataFromDates(start_date, end_date) #@UnusedVariable
+        
+        # We decided rather to have all courses in CourseInfo,
+        # even ones with 'bad' start/end dates:
+        #if academic_year not in VALID_AYS:
+        #    continue
+        
+        enrollment_start = block['fields'].get('enrollment_start', '0000-00-00T00:00:00Z')
+        enrollment_end   = block['fields'].get('enrollment_end', '0000-00-00T00:00:00Z')
+        enrollment_start = datestr(enrollment_start) if type(enrollment_start) is datetime.datetime else enrollment_start
+        enrollment_end   = datestr(enrollment_end) if type(enrollment_end) is datetime.datetime else enrollment_end
+        
+        try:
+            grade_policy = str(definition['fields'].get('grading_policy').get('GRADER', 'NA'))
+            certs_policy = ("minimum_grade_credit: %s certificate_policy: " %\
+                            block['fields'].get('minimum_grade_credit', 'NA')) +\
+                            str(definition['fields'].get('grading_policy').get('GRADE_CUTOFFS', 'NA'))
+        except AttributeError:
+            grade_policy = 'NA'
+            certs_policy = 'NA'
+                    
+        data = (cdn, # course_display_name
+                block['fields']['display_name'], # course_catalog_name
+                academic_year, # academic_year
+                quarter, # quarter
+                self.isInternal(course,block), # is_internal
+                enrollment_start, # enrollment_start
+                start_date, # start_date
+                enrollment_end, # enrollment_end
+                end_date,   # end_date
+                grade_policy, # grade_policy
+                certs_policy # certs_policy
+                )
+
+
+        return [data]
 
     # ----------------------- Utilities -------------------
 
@@ -952,8 +1031,68 @@ class ModulestoreExtractor(MySQLDB):
         '''
         Build columns tuple and list of row tuples for MySQLDB bulkInsert operation, then execute.
         We hold tables in memory to minimize query load on the receiving database.
+        While export() runs, the rows are queued for the loader thread
+        instead; this blocks while LOAD_QUEUE_SIZE batches are waiting.
+        '''
+        if self.loadQueue is None:
+            self.bulkInsert(table_name, columns, arr_of_tuples)
+        else:
+            self.loadQueue.put((table_name, columns, arr_of_tuples))
+
+    #-------------------------
+    # __startLoader
+    #--------------
+
+    def __startLoader(self):
+        self.loadQueue = Queue.Queue(ModulestoreExtractor.LOAD_QUEUE_SIZE)
+        self.loadErrorInfo = None
+        self.numLoadedRows = 0
+        self.loadSeconds = 0.0
+        self.loader = threading.Thread(target=self.__runLoader, name='ModulestoreLoader')
+        self.loader.daemon = True
+        self.loader.start()
+
+    #-------------------------
+    # __runLoader
+    #--------------
+
+    def __runLoader(self):
+        '''
+        Loader thread: bulk-insert queued batches until the None
+        sentinel arrives. After a failed insert, remaining batches
+        are discarded, so that extraction threads do not block on
+        a full queue; __stopLoader() re-raises the error.
+        '''
+        while True:
+            batch = self.loadQueue.get()
+            if batch is None:
+                return
+            if self.loadErrorInfo is not None:
+                continue
+            (table_name, columns, arr_of_tuples) = batch
+            startTime = time.time()
+            try:
+                self.bulkInsert(table_name, columns, arr_of_tuples)
+            except Exception:
+                self.loadErrorInfo = sys.exc_info()
+                continue
+            self.numLoadedRows += len(arr_of_tuples)
+            self.loadSeconds += time.time() - startTime
+
+    #-------------------------
+    # __stopLoader
+    #--------------
+
+    def __stopLoader(self):
+        '''
+        Wait for the loader thread to insert all queued batches.
         '''
-        self.bulkInsert(table_name, columns, arr_of_tuples)
+        self.loadQueue.put(None)
+        self.loader.join()
+        self.loadQueue = None
+        if self.loadErrorInfo is not None:
+            (excType, excValue, excTraceback) = self.loadErrorInfo
+            raise excType, excValue, excTraceback
 
     #-------------------------
     # setupLogging
@@ -1006,6 +1145,11 @@ and fills tables CourseInfo, EdxProblem, and EdxVideo.'''
                         help='print operational info to log.',
                         dest='verbose',
                         action='store_true');
+    parser.add_argument('-w', '--workers',
+                        help='number of extraction passes, and of courses, processed concurrently. Default: %s.' % ModulestoreExtractor.NUM_WORKERS,
+                        dest='workers',
+                        type=int,
+                        default=None);
     parser.add_argument('to_load',
                         action='store',
 			nargs='*',
@@ -1032,5 +1176,6 @@ and fills tables CourseInfo, EdxProblem, and EdxVideo.'''
     extractor = ModulestoreExtractor(edxproblem=True if 'edxproblem' in to_load else False,
 				     edxvideo=True if 'edxvideo' in to_load else False,
 				     courseinfo=True if 'courseinfo' in to_load else False,
-				     verbose=args.verbose)
-    extractor.export()
+				     verbose=args.verbose,
+				     numWorkers=args.workers)
+    print(ModulestoreExtractor.formatReport(extractor.export()))
@@ -24,7 +24,9 @@ import subprocess
 import tempfile
 
 import pymysql
+import pymysql.cursors
 
+from connection_pool import ConnectionPool
 
 #import MySQLdb
 class MySQLDB(object):
@@ -34,9 +36,17 @@ class MySQLDB(object):
 
       for result in mySqlObj.query('SELECT * FROM foo'):
            print result
+
+    For very large results, pass streaming=True to query(), or use
+    queryBatches(), which yields lists of rows. Both then use an unbuffered,
+    server-side cursor, so results are not materialized on the client.
     '''
 
-    def __init__(self, host='127.0.0.1', port=3306, user='root', passwd='', db='mysql'):
+    # Number of rows to pull from the server
+    # with each fetchmany() in query():
+    QUERY_BATCH_SIZE = 10000
+
+    def __init__(self, host='127.0.0.1', port=3306, user='root', passwd='', db='mysql', pooled=False):
         '''
         
         :param host: MySQL host
@@ -49,6 +59,9 @@ class MySQLDB(object):
         :type passwd: string
         :param db: database to connect to within server
         :type db: string
+        :param pooled: if True, take the connection from the process-wide \
+           ConnectionPool, and return it there on close()
+        :type pooled: bool
         '''
         
         # If all arguments are set to None, we are unittesting:
@@ -59,8 +72,12 @@ class MySQLDB(object):
         self.pwd  = passwd
         self.db   = db
         self.cursors = []
+        self.pooled = pooled
         try:
-            self.connection = pymysql.connect(host=host, port=port, user=user, passwd=passwd, db=db)
+            if pooled:
+                self.connection = ConnectionPool.acquire(pymysql.connect, host=host, port=port, user=user, passwd=passwd, db=db)
+            else:
+                self.connection = pymysql.connect(host=host, port=port, user=user, passwd=passwd, db=db)
             #self.connection = MySQLdb.connect(host=host, port=port, user=user, passwd=passwd, db=db, local_infile=1)
         
         #except MySQLdb.OperationalError:
@@ -69,15 +86,55 @@ class MySQLDB(object):
             raise ValueError('Cannot reach MySQL server with host:%s, port:%s, user:%s, pwd:%s, db:%s' %
                              (host, port, user, pwd, db))
         
+    @classmethod
+    def readOptionFilePassword(cls, optionFileName, group='client'):
+        '''
+        Return the password of the given group in a MySQL option
+        file, such as ~/.my.cnf. Used by scripts that are run by
+        shell scripts which themselves log in with a --login-path
+        or option file, and therefore have no password to pass on.
+
+        :param optionFileName: path to the option file
+        :type optionFileName: String
+        :param group: option group whose password is wanted
+        :type group: String
+        :return: the password, or '' if the group has none
+        :rtype: String
+        @raise IOError: if the option file cannot be read
+        '''
+        password = ''
+        currGroup = None
+        with open(optionFileName, 'r') as fd:
+            for line in fd:
+                line = line.strip()
+                if len(line) == 0 or line[0] in '#;!':
+                    continue
+                if line.startswith('['):
+                    currGroup = line.strip('[]').strip()
+                    continue
+                (optName, sep, optValue) = line.partition('=')
+                if currGroup == group and sep == '=' and optName.strip() == 'password':
+                    optValue = optValue.strip()
+                    if len(optValue) > 1 and optValue[0] == optValue[-1] and optValue[0] in '\'"':
+                        optValue = optValue[1:-1]
+                    password = optValue
+        return password
+
     def close(self):
         '''
         Close all cursors that are currently still open.
+        Then close the connection, or return it to the
+        connection pool if this instance is pooled.
         '''
         for cursor in self.cursors:
             try:
                 cursor.close()
             except:
                 pass
+        self.cursors = []
+        if self.pooled:
+            ConnectionPool.release(self.connection)
+            return
         try:
             self.connection.close()
         except:
@@ -210,6 +267,24 @@ class MySQLDB(object):
         finally:
             cursor.close()
         
+    def execute(self, query):
+        '''
+        Execute an arbitrary query, including
+        MySQL directives.
+
+        :param query: query or directive
+        :type query: String
+        :return: number of rows affected, as reported by the server
+        :rtype: int
+        '''
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query)
+            self.connection.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
     def ensureSQLTyping(self, colVals):
         '''
         Given a list of items, return a string that preserves
@@ -228,21 +303,54 @@ class MySQLDB(object):
                 resList.append(el)
         return ','.join(map(str,resList))        
         
-    def query(self, queryStr):
+    def query(self, queryStr, streaming=False, batchSize=None):
         '''
         Query iterator. Given a query, return one result for each
-        subsequent call.
+        subsequent call. Rows are pulled from the server batchSize
+        at a time.
+
+        With streaming=True an unbuffered, server-side cursor is used,
+        so the result is not held on the client. Until such an iterator
+        is exhausted or this instance is closed, no other statement
+        may be issued on this instance's connection.
 
         :param queryStr: query
         :type queryStr: String
+        :param streaming: whether to use an unbuffered server-side cursor
+        :type streaming: bool
+        :param batchSize: number of rows per fetchmany(); default QUERY_BATCH_SIZE
+        :type batchSize: int
         '''
-        cursor = self.connection.cursor()
+        for batch in self.queryBatches(queryStr, streaming=streaming, batchSize=batchSize):
+            for row in batch:
+                yield row
+
+    def queryBatches(self, queryStr, streaming=True, batchSize=None):
+        '''
+        Query iterator that yields the result in lists of up to
+        batchSize rows. Uses an unbuffered server-side cursor unless
+        streaming is False. See query() for the restrictions that
+        come with streaming.
+
+        :param queryStr: query
+        :type queryStr: String
+        :param streaming: whether to use an unbuffered server-side cursor
+        :type streaming: bool
+        :param batchSize: maximum number of rows per yielded list; default QUERY_BATCH_SIZE
+        :type batchSize: int
+        '''
+        if batchSize is None:
+            batchSize = MySQLDB.QUERY_BATCH_SIZE
+        if streaming:
+            cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+        else:
+            cursor = self.connection.cursor()
         # For if caller never exhausts the results by repeated calls:
         self.cursors.append(cursor)
         cursor.execute(queryStr)
         while True:
-            nextRes = cursor.fetchone()
-            if nextRes is None:
+            batch = cursor.fetchmany(batchSize)
+            if not batch:
                 cursor.close()
                 return
-            yield nextRes
+            yield batch
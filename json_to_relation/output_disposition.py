@@ -15,15 +15,31 @@ Created on Sep 14, 2013
 
 Modifications:
   - Jan 1, 2013: added remove() method to OutputFile
+  - added setPartitionColumn(): split a table's CSV rows into one
+    file per partition column value
+  - output files are written through large write buffers, which
+    are flushed only at flush(), close(), and when a new table
+    is started, rather than after every write()
+  - OutputFile compresses its output if the file name ends in
+    .gz or .zst (see CompressedOutputFile)
   
 '''
 import StringIO
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import csv
+from multiprocessing.pool import ThreadPool
 import re
 import sys
 import os
 import tempfile
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    # zstd output is optional:
+    zstandard = None
 
 from col_data_type import ColDataType
 
@@ -47,20 +63,35 @@ class OutputDisposition(object):
     different tables are mixed. The corresponding (values-only)
     csv files are split: one file for each table.  
     '''
-    def __init__(self, outputFormat, outputDestObj=None):
+    
+    # Bytes that each output file collects in memory before
+    # handing them to the operating system in one write:
+    WRITE_BUFFER_SIZE = 1024 * 1024
+    
+    def __init__(self, outputFormat, outputDestObj=None, bufferSize=None):
         '''
 
         :param outputDestObj: instance of one of the subclasses
         :type outputDestObj: Subclass(OutputDisposition)
+        :param bufferSize: write buffer size in bytes of each output file; default WRITE_BUFFER_SIZE
+        :type bufferSize: int
         
         '''
         self.outputFormat = outputFormat
+        self.bufferSize = OutputDisposition.WRITE_BUFFER_SIZE if bufferSize is None else bufferSize
+        self.startTime = time.time()
         if outputDestObj is None:
             self.outputDest = self
         else:
             self.outputDest = outputDestObj
         self.csvTableFiles = {}
         self.schemas = TableSchemas()
+        # Map from table name to the name of the column
+        # whose value selects the CSV file for a row.
+        # See setPartitionColumn():
+        self.partitionColumns = {}
+        # Map from table name to OrderedDict partition value --> CSV file name:
+        self.partitionFileNames = {}
     
     def __enter__(self):
         return self.outputDest
@@ -85,6 +116,30 @@ class OutputDisposition(object):
     def flush(self):
         self.outputDest.flush()
 
+    def getBytesWritten(self):
+        '''
+        Return the number of bytes written to the output
+        and to all table CSV files so far, including bytes
+        still in write buffers.
+
+        :rtype: int
+        '''
+        return self.fileHandle.bytesWritten + sum([csvFd.bytesWritten for csvFd in self.csvTableFiles.values()])
+
+    def getBytesPerSec(self):
+        '''
+        Return getBytesWritten() divided by the seconds
+        since this disposition was created.
+
+        :rtype: float
+        '''
+        elapsed = time.time() - self.startTime
+        return self.getBytesWritten() / elapsed if elapsed > 0 else 0.0
+
+    def flushTableFiles(self):
+        for csvFd in self.csvTableFiles.values():
+            csvFd.flush()
+
     def getOutputFormat(self):
         return self.outputFormat
 
@@ -170,6 +225,38 @@ class OutputDisposition(object):
             colSpecObj = ColumnSpec( colName, colDataType, jsonToRelationConverter)
             schemaDict[colName] = colSpecObj
 
+    def setPartitionColumn(self, tableName, colName):
+        '''
+        Request that CSV rows for the given table be split
+        into one file per distinct value of the given column,
+        instead of going to a single file. Used to produce one
+        file per horizontal partition of a table, such as
+        one file per quarter of EdxTrackEvent. Outputs that
+        do not produce CSV files ignore the request. Call it
+        before startNewTable(), which then opens no single
+        CSV file for the table.
+
+        :param tableName: name of table whose rows are to be split
+        :type tableName: String
+        :param colName: name of the column whose value selects the file
+        :type colName: String
+        '''
+        self.partitionColumns[tableName] = colName
+
+    def getCSVPartitionOutFileNames(self, tableName):
+        '''
+        Return the CSV files into which rows of a table were
+        split by setPartitionColumn().
+
+        :param tableName: name of table
+        :type tableName: String
+        :return: dict mapping partition column values to CSV file names,
+                 in order of the values. Empty if the table was not split.
+        :rtype: OrderedDict<String,String>
+        '''
+        fileNames = self.partitionFileNames.get(tableName, {})
+        return OrderedDict([(partitionVal, fileNames[partitionVal]) for partitionVal in sorted(fileNames.keys())])
+
     def createTmpTableFile(self, tableName, fileSuffix):
         '''
         Used for cases in which parsers must create more than one
@@ -184,8 +271,9 @@ class OutputDisposition(object):
 
         :rtype: File
         '''
-        self.csvTableFiles[tableName] = tempfile.NamedTemporaryFile(prefix='tmpTable', 
-                                                                    suffix=fileSuffix)
+        self.csvTableFiles[tableName] = BufferedOutputFile(tempfile.NamedTemporaryFile(prefix='tmpTable', 
+                                                                                       suffix=fileSuffix,
+                                                                                       bufsize=self.bufferSize))
         return self.csvTableFiles[tableName]
         
         
@@ -200,20 +288,23 @@ class OutputDisposition(object):
         
 class OutputPipe(OutputDisposition):
     
-    def __init__(self, outputFormat):
-        super(OutputPipe, self).__init__(outputFormat)
-        self.fileHandle = sys.stdout
+    def __init__(self, outputFormat, bufferSize=None):
+        super(OutputPipe, self).__init__(outputFormat, bufferSize=bufferSize)
+        self.fileHandle = BufferedOutputFile(sys.stdout, closeFile=False)
         # Make file name accessible as property just like 
         # Python file objects do:
         self.name = "<stdout>"  # @UnusedVariable
-        self.csvWriter = csv.writer(sys.stdout, dialect='excel', delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        self.csvWriter = csv.writer(self.fileHandle, dialect='excel', delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
         self.tableCSVWriters = {}
         
     def close(self):
-        pass # don't close stdout
+        # Don't close stdout; just
+        # empty the buffers:
+        self.flush()
     
     def flush(self):
-        sys.stdout.flush()
+        self.fileHandle.flush()
+        self.flushTableFiles()
     
     def __str__(self):
         return "<OutputPipe:<stdout>"
@@ -227,8 +318,20 @@ class OutputPipe(OutputDisposition):
             else:
                 self.tableCSVWriters[tableName].writerow(row)
         else:
-            print(colElementArray)
+            self.fileHandle.write((colElementArray if isinstance(colElementArray, basestring) else str(colElementArray)) + '\n')
             
+    def writerows(self, colElementArrays, tableName=None):
+        '''
+        Write a batch of CSV value arrays in one call.
+
+        :param colElementArrays: value arrays
+        :type colElementArrays: [[<any>]]
+        :param tableName: name of table to which the rows belong; None for the main table
+        :type tableName: String
+        '''
+        csvWriter = self.csvWriter if tableName is None else self.tableCSVWriters[tableName]
+        csvWriter.writerows([map(str,colElementArray) for colElementArray in colElementArrays])
+
 
     def startNewTable(self, tableName, schemaHintsNewTable):
         '''
@@ -238,6 +341,8 @@ class OutputPipe(OutputDisposition):
         :param schemaHintsNewTable:
         :type schemaHintsNewTable:
         '''
+        # Table boundary: hand what we have to the OS:
+        self.fileHandle.flush()
         self.addSchemaHints(tableName, schemaHintsNewTable)
         tmpTableFile = self.createTmpTableFile(tableName, 'csv')
         self.tableCSVWriters[tableName] = csv.writer(tmpTableFile, 
@@ -253,8 +358,7 @@ class OutputPipe(OutputDisposition):
         :param whatToWrite:
         :type whatToWrite:
         '''
-        sys.stdout.write(whatToWrite)
-        sys.stdout.flush()
+        self.fileHandle.write(whatToWrite)
 
     def getCSVTableOutFileName(self, tableName):
         return self.name
@@ -271,7 +375,16 @@ class OutputFile(OutputDisposition):
     # we'll cut out in the code:
     VALUES_PATTERN = re.compile(r'^[\s]{4}\(([^\n]*)\n{0,1}')
     
-    def __init__(self, fileName, outputFormat, options='ab'):
+    # Output file name suffixes that turn on compression,
+    # and the commands that decompress to stdout:
+    COMPRESSION_SUFFIXES = OrderedDict([('.gz', 'gzip'), ('.zst', 'zstd')])
+    DECOMPRESS_COMMANDS  = {'gzip' : 'gzip -dc', 'zstd' : 'zstd -dc'}
+    
+    # Default number of threads that compress
+    # blocks of compressed output files:
+    NUM_COMPRESSION_THREADS = 4
+    
+    def __init__(self, fileName, outputFormat, options='ab', bufferSize=None, numCompressionThreads=None):
         '''
         Create instance of an output file destination for converted log files.
         Such an instance is created both for OutputFormat.SQL_INSERT_STATEMENTS and
@@ -288,37 +401,198 @@ class OutputFile(OutputDisposition):
         :param options: output file options as per Python built-in 'open()'. Defaults to append/binary. The
                   latter for compatibility with Windows
         :type options: String
+        :param bufferSize: write buffer size in bytes of the output file and each CSV table file;
+                  default WRITE_BUFFER_SIZE
+        :type bufferSize: int
+        :param numCompressionThreads: number of threads that compress output if fileName ends
+                  in one of COMPRESSION_SUFFIXES; default NUM_COMPRESSION_THREADS. The CSV table
+                  files are then compressed the same way.
+        :type numCompressionThreads: int
+        @raise ValueError: if zstd compression is requested, but the zstandard package is not installed.
         '''
-        super(OutputFile, self).__init__(outputFormat)        
+        super(OutputFile, self).__init__(outputFormat, bufferSize=bufferSize)        
         # Make file name accessible as property just like 
         # Python file objects do:
         self.name = fileName  # @UnusedVariable
         self.outputFormat = outputFormat
+        self.compression = OutputFile.compressionOfFile(fileName)
+        self.compressionPool = None
+        if self.compression is not None:
+            if self.compression == 'zstd' and zstandard is None:
+                raise ValueError("Output file %s needs the zstandard package for zstd compression." % fileName)
+            # One pool of compressing threads for all
+            # output files:
+            self.compressionPool = ThreadPool(OutputFile.NUM_COMPRESSION_THREADS if numCompressionThreads is None else numCompressionThreads)
         # Open the output file as 'append' and 'binary'
-        # The latter is needed for Windows.
-        self.fileHandle = open(fileName, options)
-        self.csvWriter = csv.writer(sys.stdout, dialect='excel', delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        # The latter is needed for Windows. Writes are
+        # collected in a buffer of bufferSize bytes:
+        self.fileHandle = self.openOutFile(fileName, options)
+        self.csvWriter = csv.writer(self.fileHandle, dialect='excel', delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
         if outputFormat == OutputDisposition.OutputFormat.CSV or\
             outputFormat == OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV:
             # Prepare for CSV files needed for the tables:
             self.tableCSVWriters = {}
         
     def close(self):
-        self.fileHandle.close()
-        # Also close any CSV out files that might exist:
+        # Close the main file and any CSV out files that might
+        # exist. Closing writes out the buffers, so all files
+        # are closed before the first failure is raised:
+        closeError = None
+        for fd in [self.fileHandle] + self.csvTableFiles.values():
+            try:
+                fd.close()
+            except (IOError, OSError) as e:
+                if closeError is None:
+                    closeError = e
+        if self.compressionPool is not None:
+            self.compressionPool.close()
+            self.compressionPool.join()
+            self.compressionPool = None
+        if closeError is not None:
+            raise closeError
+
+    def openOutFile(self, fileName, options):
+        '''
+        Open one output file, compressed if this OutputFile
+        compresses its output.
+
+        :param fileName: file to open
+        :type fileName: String
+        :param options: options as per Python built-in 'open()'
+        :type options: String
+        :rtype: BufferedOutputFile
+        '''
+        if self.compression is None or fileName == '/dev/null':
+            return BufferedOutputFile(open(fileName, options, self.bufferSize))
+        return BufferedOutputFile(CompressedOutputFile(open(fileName, options),
+                                                       self.compression,
+                                                       self.compressionPool))
+
+    @staticmethod
+    def compressionOfFile(fileName):
+        '''
+        Return the compression that a file's name
+        asks for, or None for uncompressed files.
+
+        :param fileName: file name
+        :type fileName: String
+        :return: 'gzip', 'zstd', or None
+        :rtype: {String | None}
+        '''
+        for (suffix, compression) in OutputFile.COMPRESSION_SUFFIXES.items():
+            if fileName.endswith(suffix):
+                return compression
+        return None
+
+    @staticmethod
+    def decompressCommand(fileName):
+        '''
+        Return the shell command that writes the decompressed
+        content of the given file to stdout when the file name
+        is appended, or None if the file is not compressed.
+        Used for feeding compressed CSV files to MySQL
+        LOAD DATA through a FIFO.
+
+        :param fileName: name of an output file
+        :type fileName: String
+        :rtype: {String | None}
+        '''
+        compression = OutputFile.compressionOfFile(fileName)
+        if compression is None:
+            return None
+        return OutputFile.DECOMPRESS_COMMANDS[compression]
+
+    @staticmethod
+    def createFifoLoadPrologue(fileName):
+        '''
+        Return what a MySQL LOAD DATA of the given file needs:
+        the file to load from, and the mysql client commands that
+        must precede the LOAD. For uncompressed files these are the
+        file itself, and no commands. For compressed files, a 'system'
+        command creates a FIFO next to the file, and then starts the
+        decompressor in the background, writing into the FIFO. The
+        FIFO exists when the command returns, so the LOAD that follows
+        can open it. The LOAD then reads from the FIFO, so the decompressed
+        data never touches the disk. The decompressor's process ID goes
+        into a file next to the FIFO; the commands from
+        createFifoLoadEpilogue() must follow the LOAD.
+
+        :param fileName: fully qualified name of the file to load
+        :type fileName: String
+        :return: (fileToLoadFrom, commandsBeforeLoad)
+        :rtype: (String, String)
+        '''
+        decompressCmd = OutputFile.decompressCommand(fileName)
+        if decompressCmd is None:
+            return (fileName, '')
+        fifoName = fileName + '.fifo'
+        return (fifoName, "system rm -f '%s'; mkfifo '%s'; %s '%s' > '%s' & echo $! > '%s.pid'\n" %\
+                          (fifoName, fifoName, decompressCmd, fileName, fifoName, fifoName))
+
+    @staticmethod
+    def createFifoLoadEpilogue(fileName):
+        '''
+        Return the mysql client commands that must follow a LOAD DATA
+        of the given file, after the commands from createFifoLoadPrologue().
+        For compressed files, a 'system' command removes the FIFO. If
+        the LOAD failed without reading the FIFO to its end, it also
+        kills the decompressor, which would otherwise wait for a reader
+        forever. After a successful LOAD the decompressor is done, and
+        the kill is a no-op.
+
+        :param fileName: fully qualified name of the file to load
+        :type fileName: String
+        :return: commands after the LOAD; empty for uncompressed files
+        :rtype: String
+        '''
+        if OutputFile.decompressCommand(fileName) is None:
+            return ''
+        fifoName = fileName + '.fifo'
+        return "system kill $(cat '%s.pid') 2>/dev/null; rm -f '%s' '%s.pid'\n" % (fifoName, fifoName, fifoName)
+
+    def getHeaderFileName(self):
+        '''
+        Return the name of the file that holds the column header
+        row of this CSV output, when JSONToRelation.convert() is
+        asked for headers: out.csv -> out_header.csv. The header
+        file is never compressed.
+
+        :rtype: String
+        '''
+        fileRoot = self.name
+        if self.compression is not None:
+            fileRoot = os.path.splitext(fileRoot)[0]
+        if fileRoot.endswith('.csv'):
+            fileRoot = fileRoot[:-len('.csv')]
+        return fileRoot + '_header.csv'
+
+    def createCSVLoadCommand(self, tableName):
+        '''
+        Create the mysql client commands that load this CSV output
+        into the given table. If a header file (see getHeaderFileName())
+        exists, its column names become the LOAD's column list, so the
+        CSV columns may come in any order.
+
+        :param tableName: table to load into
+        :type tableName: String
+        :return: commands for the mysql client, ending in a newline
+        :rtype: String
+        '''
+        colList = ''
         try:
-            for csvFD in self.csvTableFiles.values():
-                csvFD.close()
-        except:
+            with open(self.getHeaderFileName(), 'rb') as headerFd:
+                colList = ' (%s)' % ','.join(['`%s`' % colName for colName in csv.reader(headerFd).next()])
+        except (IOError, StopIteration):
             pass
+        (loadSource, loadPrologue) = OutputFile.createFifoLoadPrologue(self.name)
+        return loadPrologue +\
+               "LOAD DATA LOCAL INFILE '%s' INTO TABLE %s FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\r\\n'%s;\n" %\
+               (loadSource, tableName, colList) +\
+               OutputFile.createFifoLoadEpilogue(self.name)
 
     def flush(self):
         self.fileHandle.flush()
-        for csvFD in self.tableCSVWriters.values():
-            try:
-                csvFD.flush()
-            except:
-                pass
+        self.flushTableFiles()
             
     def remove(self):
         try:
@@ -403,7 +677,18 @@ class OutputFile(OutputDisposition):
         :type whatToWrite:
         '''
         self.fileHandle.write(whatToWrite)
-        self.fileHandle.flush()
+
+    def writerows(self, colElementArrays, tableName=None):
+        '''
+        Write a batch of CSV value arrays in one call.
+
+        :param colElementArrays: value arrays
+        :type colElementArrays: [[<any>]]
+        :param tableName: name of table to which the rows belong; None for the main table
+        :type tableName: String
+        '''
+        csvWriter = self.csvWriter if tableName is None else self.tableCSVWriters[tableName]
+        csvWriter.writerows([map(str,colElementArray) for colElementArray in colElementArrays])
         
     def startNewTable(self, tableName, schemaHintsNewTable):
         '''
@@ -416,6 +701,8 @@ class OutputFile(OutputDisposition):
         :param schemaHintsNewTable: map column name to column SQL type
         :type schemaHintsNewTable: {String,ColDataType}
         '''
+        # Table boundary: hand what we have to the OS:
+        self.fileHandle.flush()
         self.addSchemaHints(tableName, schemaHintsNewTable)
         if self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS:
             return
@@ -427,6 +714,10 @@ class OutputFile(OutputDisposition):
         except KeyError:
             # OK, really is a new table caller is starting:
             pass
+        if tableName in self.partitionColumns:
+            # Rows go to per-partition files, which are
+            # opened as their partitions occur:
+            return
         # Ensure that we have an open FD to write to for this table:
         if self.outputFormat == OutputDisposition.OutputFormat.CSV or\
            self.outputFormat == OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV:
@@ -452,11 +743,11 @@ class OutputFile(OutputDisposition):
             pass
         outFileName = self.getFileName()
         if outFileName == '/dev/null':
-            outFile = open('/dev/null', 'ab')
+            outFile = self.openOutFile('/dev/null', 'ab')
             self.csvTableFiles[tableName] = outFile 
             return outFile
         csvOutFileName = self.getCSVTableOutFileName(tableName)
-        outFile = open(csvOutFileName, 'w')
+        outFile = self.openOutFile(csvOutFileName, 'w')
         self.csvTableFiles[tableName] = outFile
         self.tableCSVWriters[tableName] = csv.writer(outFile, 
                                                      dialect='excel', 
@@ -467,8 +758,57 @@ class OutputFile(OutputDisposition):
     
     def getCSVTableOutFileName(self, tableName):
         # The 'None' below ensures that we get the
-        # main file's name back:
-        return "%s_%sTable.csv" % (self.getFileName(None), tableName) 
+        # main file's name back. CSV files are compressed
+        # like the main file, and carry its suffix:
+        mainFileName = self.getFileName(None)
+        if self.compression is None:
+            return "%s_%sTable.csv" % (mainFileName, tableName)
+        (mainFileRoot, compressionSuffix) = os.path.splitext(mainFileName)
+        return "%s_%sTable.csv%s" % (mainFileRoot, tableName, compressionSuffix)
+
+    def getPartitionIndex(self, tableName, insertSigLine):
+        '''
+        Given the first line of an INSERT statement for a table
+        that is split by setPartitionColumn(), return the position
+        of the partition column in the statement's column list.
+
+        :param tableName: name of table
+        :type tableName: String
+        :param insertSigLine: first line of INSERT statement: 'INSERT INTO tbl (col1,col2,...) VALUES'
+        :type insertSigLine: String
+        :return: zero-based position of partition column, or None if table is not
+                 split, or the column is not part of the INSERT
+        :rtype: {int | None}
+        '''
+        partitionColName = self.partitionColumns.get(tableName, None)
+        if partitionColName is None:
+            return None
+        colNames = insertSigLine[insertSigLine.find('(') + 1:insertSigLine.rfind(')')].split(',')
+        try:
+            return [colName.strip() for colName in colNames].index(partitionColName)
+        except ValueError:
+            return None
+
+    def ensureOpenCSVPartitionFile(self, tableName, partitionVal):
+        '''
+        Return the open file for the rows of the given table
+        whose partition column has value partitionVal. Files are
+        named like the table's CSV file, with the value inserted:
+        <outfile>_EdxTrackEvent_fall2014Table.csv.
+
+        :param tableName: name of table that is split by setPartitionColumn()
+        :type tableName: String
+        :param partitionVal: value of the partition column
+        :type partitionVal: String
+        :return: File object open for writing
+        :rtype: File
+        '''
+        # Empty partition values (e.g. events without time) get
+        # their own file, rather than a file without suffix:
+        partitionKey = '%s_%s' % (tableName, partitionVal if len(partitionVal) > 0 else 'unknown')
+        self.ensureOpenCSVOutFileFromTableName(partitionKey)
+        self.partitionFileNames.setdefault(tableName, {})[partitionVal] = self.csvTableFiles[partitionKey].name
+        return self.csvTableFiles[partitionKey]
 
     def writeCSVRowsFromInsertStatement(self, insertStatement):
         '''
@@ -497,6 +837,7 @@ class OutputFile(OutputDisposition):
             tblName = tblNameMatch.group(1)
         except IndexError:
             raise ValueError('Could not extract table name from "%s"' % insertStatement)
+        partitionIndex = self.getPartitionIndex(tblName, firstLine)
         
         readAllValueTuples = False
         while not readAllValueTuples:
@@ -514,6 +855,13 @@ class OutputFile(OutputDisposition):
             # Get just the comma-separated values list from
             # 'abfd_sfd,...);\n
             valuesList = oneValuesLineMatch.group(1)[:-2] + '\n'
+            if partitionIndex is not None:
+                # Values are single-quoted, with embedded quotes
+                # escaped by backslash (see makeInsertSafe()):
+                partitionVal = csv.reader([valuesList], quotechar="'", escapechar='\\', doublequote=False).next()[partitionIndex]
+                theOutFd = self.ensureOpenCSVPartitionFile(tblName, partitionVal)
+                theOutFd.write(valuesList)
+                continue
             # Make sure we've seen additions to this table before or,
             # if not, have a CSV writer and a file created to receive
             # the CSV lines:
@@ -521,6 +869,142 @@ class OutputFile(OutputDisposition):
             theOutFd = self.csvTableFiles[tblName]
             theOutFd.write(valuesList)
 
+class BufferedOutputFile(object):
+    '''
+    Wraps a file that was opened with a large write buffer, and
+    counts the bytes written to it. Writes land in the file's
+    buffer, and reach the operating system when the buffer is
+    full, or on flush() and close(). Offers what csv.writer,
+    shutil.copyfileobj(), and the code in this module need
+    of a file object.
+    '''
+    
+    def __init__(self, fileObj, closeFile=True):
+        '''
+        :param fileObj: file open for writing, with the desired buffer size
+        :type fileObj: file
+        :param closeFile: whether close() closes fileObj; False for stdout
+        :type closeFile: Boolean
+        '''
+        self.fileObj = fileObj
+        self.name = getattr(fileObj, 'name', None)
+        self.closeFile = closeFile
+        self.bytesWritten = 0
+        self.closed = False
+        
+    def write(self, whatToWrite):
+        self.fileObj.write(whatToWrite)
+        self.bytesWritten += len(whatToWrite)
+            
+    def flush(self):
+        self.fileObj.flush()
+        
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.fileObj.flush()
+        finally:
+            if self.closeFile:
+                self.fileObj.close()
+
+def compressBlock(data, compression):
+    '''
+    Compress one block of output into a self-contained
+    gzip member or zstd frame. Both formats allow such
+    pieces to be concatenated into one valid file. Runs in
+    the threads of a ThreadPool; zlib and zstandard release
+    the interpreter lock while they compress.
+
+    :param data: uncompressed bytes
+    :type data: str
+    :param compression: 'gzip' or 'zstd'
+    :type compression: String
+    :rtype: str
+    '''
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=CompressedOutputFile.ZSTD_LEVEL).compress(data)
+    # wbits 16 + MAX_WBITS: gzip header and trailer:
+    compressor = zlib.compressobj(CompressedOutputFile.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+class CompressedOutputFile(object):
+    '''
+    Write-only file that compresses in parallel. Written
+    strings are collected into blocks of blockSize bytes.
+    Each full block is handed to a thread pool for compression,
+    and the compressed blocks are written to the underlying file
+    in order. At most MAX_BLOCKS_IN_FLIGHT blocks wait for
+    compression at any time, which bounds memory use. Output
+    can be read with gzip -dc, zstd -dc, or Python's gzip module.
+    '''
+    
+    # Uncompressed bytes per independently compressed block:
+    BLOCK_SIZE = 4 * 1024 * 1024
+    MAX_BLOCKS_IN_FLIGHT = 8
+    
+    GZIP_LEVEL = 6
+    ZSTD_LEVEL = 3
+    
+    def __init__(self, fileObj, compression, threadPool, blockSize=None):
+        '''
+        :param fileObj: file open for writing, which receives the compressed blocks
+        :type fileObj: file
+        :param compression: 'gzip' or 'zstd'
+        :type compression: String
+        :param threadPool: pool that compresses the blocks; may be shared among files
+        :type threadPool: multiprocessing.pool.ThreadPool
+        :param blockSize: uncompressed bytes per block; default BLOCK_SIZE
+        :type blockSize: int
+        '''
+        self.fileObj = fileObj
+        self.name = fileObj.name
+        self.compression = compression
+        self.threadPool = threadPool
+        self.blockSize = CompressedOutputFile.BLOCK_SIZE if blockSize is None else blockSize
+        self.pending = []
+        self.numPendingBytes = 0
+        self.blocksInFlight = deque()
+        self.compressedBytesWritten = 0
+        
+    def write(self, whatToWrite):
+        self.pending.append(whatToWrite)
+        self.numPendingBytes += len(whatToWrite)
+        if self.numPendingBytes >= self.blockSize:
+            self.submitBlock()
+            
+    def submitBlock(self):
+        if self.numPendingBytes == 0:
+            return
+        block = ''.join(self.pending)
+        self.pending = []
+        self.numPendingBytes = 0
+        self.blocksInFlight.append(self.threadPool.apply_async(compressBlock, (block, self.compression)))
+        while len(self.blocksInFlight) > CompressedOutputFile.MAX_BLOCKS_IN_FLIGHT:
+            self.writeOldestBlock()
+            
+    def writeOldestBlock(self):
+        compressedBlock = self.blocksInFlight.popleft().get()
+        self.fileObj.write(compressedBlock)
+        self.compressedBytesWritten += len(compressedBlock)
+        
+    def flush(self):
+        '''
+        Compress what is pending, even if less than
+        a block, and write all compressed blocks.
+        '''
+        self.submitBlock()
+        while len(self.blocksInFlight) > 0:
+            self.writeOldestBlock()
+        self.fileObj.flush()
+        
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.fileObj.close()
+
 class ColumnSpec(object):
     '''
     Housekeeping class. Each instance represents the name,
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Post-load index maintenance for the Edx and EdxPrivate tables.
+
+After .sql/.csv files are loaded with keys disabled, each table's
+non-primary keys must be re-enabled, and any missing secondary
+indexes created. This module knows each table's index set (the same
+set createIndexForTable.sh creates), and processes the tables
+concurrently, each over its own connection. Within one table,
+statements run one after the other, since MySQL serializes DDL on
+a table anyway.
+
+Indexes that already exist are skipped. Every ENABLE KEYS and every
+CREATE INDEX is timed, and a report is printed at the end.
+
+Usage from the command line::
+
+    postLoadIndexer.py -u root -p [-t 4] [tableName [tableName ...]]
+    postLoadIndexer.py -u root -c ~/.my.cnf
+
+No table names: all tables in TABLE_INDEXES.
+'''
+
+import argparse
+from collections import OrderedDict, namedtuple
+import getpass
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import time
+
+from mysqldb import MySQLDB
+
+
+# One secondary index. prefixLen is None for
+# columns that need no index prefix length:
+IndexSpec = namedtuple('IndexSpec', ['indexName', 'colSpec', 'prefixLen'])
+
+# Database, whether the load disabled the table's
+# keys, and the table's secondary indexes:
+TableIndexes = namedtuple('TableIndexes', ['dbName', 'enableKeys', 'indexes'])
+
+# One line of the timing report. Action is one
+# of 'enable keys', 'created', 'exists', 'no table':
+IndexTiming = namedtuple('IndexTiming', ['dbName', 'tableName', 'indexName', 'action', 'seconds'])
+
+
+class PostLoadIndexer(object):
+
+    # Default number of tables to process concurrently:
+    NUM_WORKERS = 4
+
+    TABLE_INDEXES = OrderedDict([
+        ('EdxTrackEvent', TableIndexes('Edx', True,
+                                       [IndexSpec('EdxTrackEventIdxEvType', 'event_type', 255),
+                                        IndexSpec('EdxTrackEventIdxIdxUname', 'anon_screen_name', 40),
+                                        IndexSpec('EdxTrackEventIdxCourseDisplayName', 'course_display_name', 255),
+                                        IndexSpec('EdxTrackEventIdxResourceDisplayName', 'resource_display_name', 255),
+                                        IndexSpec('EdxTrackEventIdxSuccess', 'success', 15),
+                                        IndexSpec('EdxTrackEventIdxTime', 'time', None),
+                                        IndexSpec('EdxTrackEventIdxQuarter', 'quarter', None),
+                                        IndexSpec('EdxTrackEventIdxIP', 'ip_country', 3),
+                                        IndexSpec('EdxTrackEventIdxCourseNameTime', 'course_display_name,time', None),
+                                        IndexSpec('EdxTrackEventIdxVideoId', 'video_id', 255),
+                                        IndexSpec('EdxTrackEventIdxVideoCode', 'video_code', 255),
+                                        ])),
+        ('Answer',        TableIndexes('Edx', True,
+                                       [IndexSpec('AnswerIdxAns', 'answer', 255),
+                                        IndexSpec('AnswerIdxCourseID', 'course_id', 255),
+                                        ])),
+        ('CorrectMap',    TableIndexes('Edx', True, [])),
+        ('State',         TableIndexes('Edx', True, [])),
+        ('InputState',    TableIndexes('Edx', True, [])),
+        ('LoadInfo',      TableIndexes('Edx', True, [])),
+        ('ABExperiment',  TableIndexes('Edx', True,
+                                       [IndexSpec('ABExpEventTypeIdx', 'event_type', None),
+                                        IndexSpec('ABExpGrpIdIdx', 'group_id', None),
+                                        IndexSpec('ABExpGrpNmIdx', 'group_name', 255),
+                                        IndexSpec('ABExpPartIdIdx', 'partition_id', None),
+                                        IndexSpec('ABExpPartNmIdx', 'partition_name', 255),
+                                        IndexSpec('ABExpChldModIdIdx', 'child_module_id', 255),
+                                        ])),
+        ('OpenAssessment', TableIndexes('Edx', True,
+                                       [IndexSpec('OpAssEvTypeIdx', 'event_type', 255),
+                                        IndexSpec('OpAssAnonScNmIdx', 'anon_screen_name', 40),
+                                        IndexSpec('OpAssScoreTpIdx', 'score_type', 255),
+                                        IndexSpec('OpAssTimeIdx', 'time', None),
+                                        IndexSpec('OpAssSubmIdIdx', 'submission_uuid', 40),
+                                        IndexSpec('OpAssEdxAnonIdx', 'edx_anon_id', 40),
+                                        IndexSpec('OpAssCrsNmIdx', 'course_display_name', 255),
+                                        IndexSpec('OpAssRrcDispNmIdx', 'resource_display_name', 255),
+                                        IndexSpec('OpAssRscIdIdx', 'resource_id', 255),
+                                        IndexSpec('OpAssAttNumNmIdx', 'attempt_num', None),
+                                        IndexSpec('OpAssOptsIdx', 'options', 255),
+                                        IndexSpec('OpAssCorrIdx', 'corrections', 40),
+                                        IndexSpec('OpAssPtsidx', 'points', 40),
+                                        ])),
+        ('Account',       TableIndexes('EdxPrivate', True,
+                                       [IndexSpec('AccountIdxUname', 'screen_name', 255),
+                                        IndexSpec('AccountIdxAnonUname', 'anon_screen_name', 40),
+                                        IndexSpec('AccountIdxZip', 'zipcode', 10),
+                                        IndexSpec('AccountIdxCoun', 'country', 255),
+                                        IndexSpec('AccountIdxGen', 'gender', 6),
+                                        IndexSpec('AccountIdxDOB', 'year_of_birth', None),
+                                        IndexSpec('AccountIdxEdu', 'level_of_education', 10),
+                                        IndexSpec('AccountIdxCouID', 'course_id', 255),
+                                        ])),
+        ('EventIp',       TableIndexes('EdxPrivate', True, [])),
+        ('ActivityGrade', TableIndexes('Edx', False,
+                                       [IndexSpec('activityGradeFirst_submitIdx', 'first_submit', None),
+                                        IndexSpec('activityGradeLast_submitIdx', 'last_submit', None),
+                                        IndexSpec('ActGrdAnonSNIdx', 'anon_screen_name', 40),
+                                        IndexSpec('ActGrdCourseDisNmIdx', 'course_display_name', 255),
+                                        IndexSpec('ActGrdModIdIdx', 'module_id', 255),
+                                        IndexSpec('ActGrdModTypeIdx', 'module_type', 32),
+                                        IndexSpec('ActGrdResDispNmIdx', 'resource_display_name', 255),
+                                        IndexSpec('ActGrdNumAttemptsIdx', 'num_attempts', None),
+                                        ])),
+        ('UserCountry',   TableIndexes('Edx', False,
+                                       [IndexSpec('UserCountryIdxAnon', 'anon_screen_name', 40),
+                                        IndexSpec('UserCountryIdx3LtrCntry', 'three_letter_country', 3),
+                                        IndexSpec('UserCountryIdx2LtrCntry', 'two_letter_country', 2),
+                                        IndexSpec('UserCountryIdxCntry', 'country', 255),
+                                        ])),
+        ])
+
+    def __init__(self, user='root', passwd='', host='127.0.0.1', port=3306, numWorkers=None):
+        '''
+        :param user: MySQL user with ALTER and INDEX privileges on Edx and EdxPrivate
+        :type user: String
+        :param passwd: the user's MySQL password
+        :type passwd: String
+        :param host: MySQL host
+        :type host: String
+        :param port: MySQL port
+        :type port: int
+        :param numWorkers: number of tables to process concurrently; default NUM_WORKERS
+        :type numWorkers: int
+        '''
+        self.user = user
+        self.passwd = passwd
+        self.host = host
+        self.port = port
+        self.numWorkers = numWorkers if numWorkers is not None else PostLoadIndexer.NUM_WORKERS
+
+    def run(self, tableNames=None):
+        '''
+        Re-enable keys and create missing indexes for the given tables,
+        or for all tables in TABLE_INDEXES. Each table is handled by one
+        worker thread with its own connection.
+
+        :param tableNames: names of tables to process; None for all known tables
+        :type tableNames: [String]
+        :return: one IndexTiming for each action taken or skipped, grouped by table
+        :rtype: [IndexTiming]
+        '''
+        if tableNames is None:
+            tableNames = PostLoadIndexer.TABLE_INDEXES.keys()
+        for tableName in tableNames:
+            if tableName not in PostLoadIndexer.TABLE_INDEXES:
+                raise ValueError('No index information for table %s; known tables: %s' %
+                                 (tableName, ', '.join(PostLoadIndexer.TABLE_INDEXES.keys())))
+        pool = ThreadPool(min(self.numWorkers, max(len(tableNames), 1)))
+        try:
+            perTableTimings = pool.map(self.indexTable, tableNames)
+        finally:
+            pool.close()
+            pool.join()
+        return [timing for timings in perTableTimings for timing in timings]
+
+    def indexTable(self, tableName):
+        '''
+        Re-enable keys for one table if its load disabled them,
+        then create each of its indexes that does not exist yet.
+
+        :param tableName: name of table in TABLE_INDEXES
+        :type tableName: String
+        :return: timing information for each step
+        :rtype: [IndexTiming]
+        '''
+        tableInfo = PostLoadIndexer.TABLE_INDEXES[tableName]
+        dbName = tableInfo.dbName
+        timings = []
+        db = self.openConnection(dbName)
+        try:
+            existingIndexes = self.getExistingIndexes(db, dbName, tableName)
+            if existingIndexes is None:
+                timings.append(IndexTiming(dbName, tableName, None, 'no table', 0.0))
+                return timings
+            if tableInfo.enableKeys:
+                startTime = time.time()
+                db.execute('ALTER TABLE %s.%s ENABLE KEYS' % (dbName, tableName))
+                timings.append(IndexTiming(dbName, tableName, None, 'enable keys', time.time() - startTime))
+            for indexSpec in tableInfo.indexes:
+                if indexSpec.indexName in existingIndexes:
+                    timings.append(IndexTiming(dbName, tableName, indexSpec.indexName, 'exists', 0.0))
+                    continue
+                startTime = time.time()
+                db.execute(self.makeCreateIndexStatement(dbName, tableName, indexSpec))
+                timings.append(IndexTiming(dbName, tableName, indexSpec.indexName, 'created', time.time() - startTime))
+        finally:
+            db.close()
+        return timings
+
+    def openConnection(self, dbName):
+        return MySQLDB(host=self.host, port=self.port, user=self.user, passwd=self.passwd, db=dbName)
+
+    def getExistingIndexes(self, db, dbName, tableName):
+        '''
+        Return the set of index names that exist on the given table,
+        or None if the table does not exist.
+        '''
+        tableCount = list(db.query("SELECT COUNT(*) FROM information_schema.tables " +\
+                                   "WHERE table_schema = '%s' AND table_name = '%s'" % (dbName, tableName)))
+        if tableCount[0][0] == 0:
+            return None
+        return set([row[0] for row in db.query("SELECT DISTINCT index_name FROM information_schema.statistics " +\
+                                               "WHERE table_schema = '%s' AND table_name = '%s'" % (dbName, tableName))])
+
+    def makeCreateIndexStatement(self, dbName, tableName, indexSpec):
+        if indexSpec.prefixLen is None:
+            colSpec = indexSpec.colSpec
+        else:
+            colSpec = '%s(%d)' % (indexSpec.colSpec, indexSpec.prefixLen)
+        return 'CREATE INDEX %s ON %s.%s(%s)' % (indexSpec.indexName, dbName, tableName, colSpec)
+
+    @classmethod
+    def formatReport(cls, timings, wallClockSeconds=None):
+        '''
+        Return a printable table of the given timings, followed by
+        a total of the time spent in all statements and, if given,
+        the wall clock time of the whole run.
+
+        :param timings: result of run()
+        :type timings: [IndexTiming]
+        :param wallClockSeconds: elapsed time of the run
+        :type wallClockSeconds: float
+        :rtype: String
+        '''
+        lines = ['%-26s %-40s %-12s %10s' % ('Table', 'Index', 'Action', 'Seconds')]
+        for timing in timings:
+            lines.append('%-26s %-40s %-12s %10.2f' % ('%s.%s' % (timing.dbName, timing.tableName),
+                                                       timing.indexName if timing.indexName is not None else '-',
+                                                       timing.action,
+                                                       timing.seconds))
+        lines.append('Total statement time: %.2f sec' % sum([timing.seconds for timing in timings]))
+        if wallClockSeconds is not None:
+            lines.append('Wall clock time: %.2f sec' % wallClockSeconds)
+        return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Re-enable keys and create missing indexes on Edx/EdxPrivate tables after a load.')
+    parser.add_argument('-u', '--user',
+                        action='store',
+                        default='root',
+                        help='User ID that is to log into MySQL. Default: root.')
+    parser.add_argument('-p', '--password',
+                        action='store_true',
+                        help='Request to be asked for pwd for operating MySQL.')
+    parser.add_argument('-w', '--pwd',
+                        action='store',
+                        default='',
+                        help='MySQL password given on the command line.')
+    parser.add_argument('-c', '--optionFile',
+                        action='store',
+                        help='MySQL option file, such as ~/.my.cnf, whose [client] password is used.')
+    parser.add_argument('-t', '--threads',
+                        action='store',
+                        type=int,
+                        default=PostLoadIndexer.NUM_WORKERS,
+                        help='Number of tables to index concurrently. Default: %s.' % PostLoadIndexer.NUM_WORKERS)
+    parser.add_argument('tables',
+                        action='store',
+                        nargs='*',
+                        help='Tables to process. Default: all of %s' % ', '.join(PostLoadIndexer.TABLE_INDEXES.keys()))
+    args = parser.parse_args();
+
+    if args.password:
+        pwd = getpass.getpass("Enter %s's MySQL password on localhost: " % args.user)
+    elif args.optionFile is not None:
+        pwd = MySQLDB.readOptionFilePassword(args.optionFile)
+    else:
+        pwd = args.pwd
+    indexer = PostLoadIndexer(user=args.user, passwd=pwd, numWorkers=args.threads)
+    startTime = time.time()
+    timings = indexer.run(args.tables if len(args.tables) > 0 else None)
+    print(PostLoadIndexer.formatReport(timings, time.time() - startTime))
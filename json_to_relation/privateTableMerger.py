@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Merges the Edx.Account and Edx.EventIp staging tables into
+their permanent counterparts in EdxPrivate, once per load batch.
+
+Transforms run with EdXTrackLogJSONParser(deferPrivateMerge=True)
+leave their Account and EventIp rows in the staging tables in db Edx,
+rather than each .sql file rewriting the EdxPrivate tables. After all
+files of a batch are loaded, this module:
+
+   - ensures that each EdxPrivate table has its primary key, so that
+     duplicates are detected. A table without one is copied into a
+     keyed copy with INSERT IGNORE, which is then swapped in. Of rows
+     with the same key, the first one the copy reads survives; for
+     InnoDB tables without a primary key that is the row inserted
+     first,
+   - runs one INSERT ... SELECT ... ON DUPLICATE KEY UPDATE per table,
+     so re-delivered rows update in place instead of being deleted
+     and re-inserted. The .sql files load the staging tables with
+     REPLACE, so the staging row of a key is the one loaded last,
+     which is the newest,
+   - drops the staging table, and
+   - reports the time and number of affected rows of each merge.
+
+Staging tables that do not exist are skipped, so running the
+merge after loading non-deferred .sql files is harmless.
+
+Usage from the command line::
+
+    privateTableMerger.py -u root -p
+    privateTableMerger.py -u root -c ~/.my.cnf
+'''
+
+import argparse
+from collections import OrderedDict, namedtuple
+import getpass
+import os
+import sys
+import time
+
+from mysqldb import MySQLDB
+
+
+# Outcome of merging one staging table. Action is
+# 'merged', or 'no staging table':
+MergeTiming = namedtuple('MergeTiming', ['tableName', 'action', 'rowsAffected', 'seconds'])
+
+
+class PrivateTableMerger(object):
+
+    STAGING_DB = 'Edx'
+    PRIVATE_DB = 'EdxPrivate'
+
+    # Suffixes of the keyed copy of a private table without
+    # primary key, and of the original while it is replaced:
+    KEYED_COPY_SUFFIX = '_keyed'
+    UNKEYED_SUFFIX = '_unkeyed'
+
+    # Tables to merge, and their unique key columns:
+    MERGE_TABLES = OrderedDict([('Account', 'account_id'),
+                                ('EventIp', 'event_table_id')])
+
+    def __init__(self, user='root', passwd='', host='127.0.0.1', port=3306):
+        '''
+        :param user: MySQL user with write access to Edx and EdxPrivate
+        :type user: String
+        :param passwd: the user's MySQL password
+        :type passwd: String
+        :param host: MySQL host
+        :type host: String
+        :param port: MySQL port
+        :type port: int
+        '''
+        self.user = user
+        self.passwd = passwd
+        self.host = host
+        self.port = port
+
+    def merge(self):
+        '''
+        Merge all staging tables in MERGE_TABLES into EdxPrivate.
+
+        :return: one MergeTiming per table
+        :rtype: [MergeTiming]
+        '''
+        db = self.openConnection()
+        try:
+            return [self.mergeTable(db, tableName, keyColName)
+                    for (tableName, keyColName) in PrivateTableMerger.MERGE_TABLES.items()]
+        finally:
+            db.close()
+
+    def mergeTable(self, db, tableName, keyColName):
+        '''
+        Merge one staging table into its EdxPrivate counterpart,
+        then drop the staging table.
+
+        :param db: open connection
+        :type db: MySQLDB
+        :param tableName: name of table, which is the same in both dbs
+        :type tableName: String
+        :param keyColName: column that uniquely identifies a row
+        :type keyColName: String
+        :rtype: MergeTiming
+        '''
+        colNames = self.getColumnNames(db, PrivateTableMerger.STAGING_DB, tableName)
+        if len(colNames) == 0:
+            return MergeTiming(tableName, 'no staging table', 0, 0.0)
+        startTime = time.time()
+        db.execute("CREATE TABLE IF NOT EXISTS %s.%s LIKE %s.%s" %
+                   (PrivateTableMerger.PRIVATE_DB, tableName, PrivateTableMerger.STAGING_DB, tableName))
+        self.ensurePrimaryKey(db, tableName, keyColName)
+        rowsAffected = db.execute(self.makeMergeStatement(tableName, keyColName, colNames))
+        db.execute("DROP TABLE %s.%s" % (PrivateTableMerger.STAGING_DB, tableName))
+        return MergeTiming(tableName, 'merged', rowsAffected, time.time() - startTime)
+
+    def openConnection(self):
+        return MySQLDB(host=self.host, port=self.port, user=self.user, passwd=self.passwd, db=PrivateTableMerger.PRIVATE_DB)
+
+    def getColumnNames(self, db, dbName, tableName):
+        '''
+        Return the given table's column names in table order,
+        or an empty list if the table does not exist.
+        '''
+        return [row[0] for row in db.query("SELECT column_name FROM information_schema.columns " +\
+                                           "WHERE table_schema = '%s' AND table_name = '%s' " % (dbName, tableName) +\
+                                           "ORDER BY ordinal_position")]
+
+    def ensurePrimaryKey(self, db, tableName, keyColName):
+        '''
+        Give the EdxPrivate table a primary key on keyColName if it
+        has none. Earlier bulk loads may have run with keys stripped.
+        MySQL 5.7 removed ALTER IGNORE TABLE, so the rows are copied
+        into a keyed copy of the table with INSERT IGNORE, and the
+        copy is swapped in with one atomic RENAME TABLE. Of rows with
+        duplicate keys, the first one read by the copy's table scan
+        survives; without a primary key, InnoDB scans in insertion
+        order, so that is the oldest row. Rows staged by the current
+        batch then overwrite it in the merge.
+        '''
+        hasPrimary = list(db.query("SELECT COUNT(*) FROM information_schema.statistics " +\
+                                   "WHERE table_schema = '%s' AND table_name = '%s' AND index_name = 'PRIMARY'" %
+                                   (PrivateTableMerger.PRIVATE_DB, tableName)))[0][0]
+        if hasPrimary > 0:
+            return
+        privateTable = '%s.%s' % (PrivateTableMerger.PRIVATE_DB, tableName)
+        keyedTable   = privateTable + PrivateTableMerger.KEYED_COPY_SUFFIX
+        unkeyedTable = privateTable + PrivateTableMerger.UNKEYED_SUFFIX
+        # Leftovers of an interrupted earlier run:
+        db.execute("DROP TABLE IF EXISTS %s" % keyedTable)
+        db.execute("DROP TABLE IF EXISTS %s" % unkeyedTable)
+        db.execute("CREATE TABLE %s LIKE %s" % (keyedTable, privateTable))
+        db.execute("ALTER TABLE %s ADD PRIMARY KEY (%s)" % (keyedTable, keyColName))
+        db.execute("INSERT IGNORE INTO %s SELECT * FROM %s" % (keyedTable, privateTable))
+        db.execute("RENAME TABLE %s TO %s, %s TO %s" % (privateTable, unkeyedTable, keyedTable, privateTable))
+        db.execute("DROP TABLE %s" % unkeyedTable)
+
+    def makeMergeStatement(self, tableName, keyColName, colNames):
+        colNameList = ','.join(colNames)
+        updateList  = ','.join(['%s=VALUES(%s)' % (colName, colName) for colName in colNames if colName != keyColName])
+        return "INSERT INTO %s.%s (%s) SELECT %s FROM %s.%s ON DUPLICATE KEY UPDATE %s" %\
+               (PrivateTableMerger.PRIVATE_DB, tableName, colNameList,
+                colNameList, PrivateTableMerger.STAGING_DB, tableName,
+                updateList)
+
+    @classmethod
+    def formatReport(cls, timings):
+        lines = []
+        for timing in timings:
+            if timing.action == 'merged':
+                lines.append('%s.%s: merged from %s.%s in %.2f sec (%d rows affected)' %
+                             (PrivateTableMerger.PRIVATE_DB, timing.tableName,
+                              PrivateTableMerger.STAGING_DB, timing.tableName,
+                              timing.seconds, timing.rowsAffected))
+            else:
+                lines.append('%s.%s: no staging table %s.%s; nothing to merge' %
+                             (PrivateTableMerger.PRIVATE_DB, timing.tableName,
+                              PrivateTableMerger.STAGING_DB, timing.tableName))
+        return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Merge Edx.Account/Edx.EventIp staging tables into EdxPrivate after a load batch.')
+    parser.add_argument('-u', '--user',
+                        action='store',
+                        default='root',
+                        help='User ID that is to log into MySQL. Default: root.')
+    parser.add_argument('-p', '--password',
+                        action='store_true',
+                        help='Request to be asked for pwd for operating MySQL.')
+    parser.add_argument('-w', '--pwd',
+                        action='store',
+                        default='',
+                        help='MySQL password given on the command line.')
+    parser.add_argument('-c', '--optionFile',
+                        action='store',
+                        help='MySQL option file, such as ~/.my.cnf, whose [client] password is used.')
+    args = parser.parse_args();
+
+    if args.password:
+        pwd = getpass.getpass("Enter %s's MySQL password on localhost: " % args.user)
+    elif args.optionFile is not None:
+        pwd = MySQLDB.readOptionFilePassword(args.optionFile)
+    else:
+        pwd = args.pwd
+    merger = PrivateTableMerger(user=args.user, passwd=pwd)
+    print(PrivateTableMerger.formatReport(merger.merge()))
@@ -0,0 +1,243 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Throughput and progress reports of a JSONToRelation conversion.
+
+Every progressEvery lines the parser asks the converter to report
+progress. A ProgressReporter then logs one line with lines/sec, MB/sec
+of decompressed input, the share of bad lines, rows emitted per table,
+the hit rates of the parser's caches, and, where the input source
+knows its size and offset, the share of the source read so far and
+an ETA. For compressed files the offset is that of the compressed
+file, so the ETA holds even though the decompressed size is unknown.
+
+Optionally a snapshot of the same numbers is written to a metrics file
+at most every metricsInterval seconds, and once more when the conversion
+is done. A file name ending in .prom gets the Prometheus text exposition
+format, for node_exporter's textfile collector; any other name gets one
+JSON object. The file is replaced atomically, so readers never see a
+partial snapshot.
+
+Usage::
+    reporter = ProgressReporter(converter, logger, metricsFileName='/var/lib/node_exporter/j2s.prom')
+    reporter.start()
+    ...
+    reporter.report()
+    ...
+    reporter.report(done=True)
+'''
+from collections import OrderedDict
+import json
+import os
+import time
+
+
+class ProgressReporter(object):
+    '''
+    Logs throughput of a conversion, and exports it as metrics snapshots.
+    '''
+    # Minimum number of seconds between two
+    # snapshots written to the metrics file:
+    METRICS_INTERVAL = 15
+
+    METRICS_PREFIX = 'json_to_relation_'
+
+    PROMETHEUS_SUFFIX = '.prom'
+
+    def __init__(self, converter, logger, metricsFileName=None, metricsInterval=None):
+        '''
+        :param converter: the conversion being reported on. Its counters numInputLines,
+                          numInputBytes, numBadLines, and rowsPerTable, its jsonSource,
+                          and its parser's getCacheStats() are read for each report.
+        :type converter: JSONToRelation
+        :param logger: logger to which progress lines go
+        :type logger: logging.Logger
+        :param metricsFileName: file to which snapshots are written. Prometheus text format if
+                                the name ends in .prom, else JSON. None: no snapshots.
+        :type metricsFileName: {String | None}
+        :param metricsInterval: minimum seconds between snapshots. Default: METRICS_INTERVAL
+        :type metricsInterval: {int | None}
+        '''
+        self.converter = converter
+        self.logger = logger
+        self.metricsFileName = metricsFileName
+        self.metricsInterval = metricsInterval if metricsInterval is not None else ProgressReporter.METRICS_INTERVAL
+        self.start()
+
+    def start(self):
+        '''
+        Start the clock. Called when the conversion begins.
+        '''
+        self.startTime = time.time()
+        self.lastMetricsTime = None
+
+    def report(self, done=False):
+        '''
+        Log one progress line, and write a metrics snapshot if
+        the conversion is done, or metricsInterval seconds have
+        passed since the previous snapshot.
+
+        :param done: True for the final report of a conversion
+        :type done: Boolean
+        '''
+        snapshot = self.takeSnapshot(done)
+        self.logger.info(self.formatProgressLine(snapshot))
+        if self.metricsFileName is None:
+            return
+        now = snapshot['timestamp']
+        if done or self.lastMetricsTime is None or now - self.lastMetricsTime >= self.metricsInterval:
+            self.writeMetrics(snapshot)
+            self.lastMetricsTime = now
+
+    def takeSnapshot(self, done=False):
+        '''
+        Collect the conversion's counters and derived rates. Values
+        the input source cannot supply (size and offset of pipes,
+        remote files, and bz2 files) are None.
+
+        :param done: True if the conversion is done
+        :type done: Boolean
+        :return: metric name --> value; 'rows' and 'caches' map table and cache names to their numbers
+        :rtype: OrderedDict
+        '''
+        converter = self.converter
+        now = time.time()
+        elapsed = now - self.startTime
+        sourceBytesRead = converter.jsonSource.getBytesRead()
+        sourceSize = converter.jsonSource.getSize()
+        if done:
+            sourceBytesRead = sourceSize
+        fractionRead = None
+        etaSeconds = None
+        if sourceBytesRead is not None and sourceSize:
+            fractionRead = min(1.0, float(sourceBytesRead) / sourceSize)
+            if fractionRead > 0:
+                etaSeconds = elapsed * (1 - fractionRead) / fractionRead
+
+        snapshot = OrderedDict()
+        snapshot['source'] = converter.getSourceName()
+        snapshot['done'] = done
+        snapshot['timestamp'] = now
+        snapshot['elapsed_seconds'] = elapsed
+        snapshot['lines'] = converter.numInputLines
+        snapshot['bad_lines'] = converter.numBadLines
+        snapshot['input_bytes'] = converter.numInputBytes
+        snapshot['lines_per_second'] = converter.numInputLines / elapsed if elapsed > 0 else 0.0
+        snapshot['input_bytes_per_second'] = converter.numInputBytes / elapsed if elapsed > 0 else 0.0
+        snapshot['source_bytes_read'] = sourceBytesRead
+        snapshot['source_size_bytes'] = sourceSize
+        snapshot['fraction_read'] = fractionRead
+        snapshot['eta_seconds'] = etaSeconds
+        snapshot['rows'] = OrderedDict(converter.rowsPerTable)
+        getCacheStats = getattr(converter.jsonParserInstance, 'getCacheStats', None)
+        snapshot['caches'] = getCacheStats() if getCacheStats is not None else OrderedDict()
+        return snapshot
+
+    def formatProgressLine(self, snapshot):
+        '''
+        :param snapshot: result of takeSnapshot()
+        :type snapshot: OrderedDict
+        :return: one log line summarizing the snapshot
+        :rtype: String
+        '''
+        numLines = snapshot['lines']
+        parts = ['%.0f lines/sec' % snapshot['lines_per_second'],
+                 '%.2f MB/sec input' % (snapshot['input_bytes_per_second'] / 1024 / 1024),
+                 '%.2f%% bad lines' % (100.0 * snapshot['bad_lines'] / numLines if numLines > 0 else 0.0)]
+        if snapshot['fraction_read'] is not None and not snapshot['done']:
+            parts.append('%.1f%% of source read, ETA %s' % (100 * snapshot['fraction_read'], self.formatDuration(snapshot['eta_seconds'])))
+        if len(snapshot['rows']) > 0:
+            parts.append('rows: ' + ', '.join(['%s=%d' % tableRows for tableRows in snapshot['rows'].items()]))
+        cacheRates = ['%s=%.1f%%' % (cacheName, 100.0 * hits / lookups)
+                      for (cacheName, (hits, lookups)) in snapshot['caches'].items() if lookups > 0]
+        if len(cacheRates) > 0:
+            parts.append('cache hits: ' + ', '.join(cacheRates))
+        return '%s %d JSON objects in %.1f sec (%s)' %\
+               ('Done with' if snapshot['done'] else 'Processed', numLines, snapshot['elapsed_seconds'], '; '.join(parts))
+
+    def formatDuration(self, seconds):
+        if seconds is None:
+            return 'unknown'
+        (minutes, seconds) = divmod(int(seconds), 60)
+        (hours, minutes) = divmod(minutes, 60)
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+    def writeMetrics(self, snapshot):
+        '''
+        Replace the metrics file with the given snapshot. The
+        snapshot is written to a temp file in the same directory,
+        and renamed, so that readers see either the old or the
+        new snapshot in full. Failures are logged, not raised:
+        monitoring must not stop a conversion.
+
+        :param snapshot: result of takeSnapshot()
+        :type snapshot: OrderedDict
+        '''
+        if self.metricsFileName.endswith(ProgressReporter.PROMETHEUS_SUFFIX):
+            content = self.toPrometheus(snapshot)
+        else:
+            content = json.dumps(snapshot, indent=2) + '\n'
+        tmpFileName = '%s.%d.tmp' % (self.metricsFileName, os.getpid())
+        try:
+            with open(tmpFileName, 'w') as fd:
+                fd.write(content)
+            os.rename(tmpFileName, self.metricsFileName)
+        except (IOError, OSError) as e:
+            self.logger.warn("Could not write metrics file %s: %s" % (self.metricsFileName, `e`))
+
+    def toPrometheus(self, snapshot):
+        '''
+        Render a snapshot in the Prometheus text exposition format.
+        Every sample is labeled with the source; rows are also labeled
+        with their table, and cache numbers with their cache. Values
+        that are unknown are left out.
+
+        :param snapshot: result of takeSnapshot()
+        :type snapshot: OrderedDict
+        :return: content for a .prom file
+        :rtype: String
+        '''
+        sourceLabel = 'source="%s"' % self.escapeLabelValue(snapshot['source'])
+        lines = []
+        def addMetric(name, metricType, helpText, samples):
+            samples = [(labels, value) for (labels, value) in samples if value is not None]
+            if len(samples) == 0:
+                return
+            fullName = ProgressReporter.METRICS_PREFIX + name
+            lines.append('# HELP %s %s' % (fullName, helpText))
+            lines.append('# TYPE %s %s' % (fullName, metricType))
+            for (labels, value) in samples:
+                lines.append('%s{%s} %s' % (fullName, ','.join([sourceLabel] + labels), repr(float(value))))
+
+        addMetric('done', 'gauge', '1 once the conversion is done.', [([], 1 if snapshot['done'] else 0)])
+        addMetric('last_update_timestamp_seconds', 'gauge', 'Time of this snapshot.', [([], snapshot['timestamp'])])
+        addMetric('elapsed_seconds', 'gauge', 'Seconds since the conversion started.', [([], snapshot['elapsed_seconds'])])
+        addMetric('lines_total', 'counter', 'JSON lines read.', [([], snapshot['lines'])])
+        addMetric('bad_lines_total', 'counter', 'JSON lines that could not be converted.', [([], snapshot['bad_lines'])])
+        addMetric('input_bytes_total', 'counter', 'Decompressed bytes of JSON read.', [([], snapshot['input_bytes'])])
+        addMetric('lines_per_second', 'gauge', 'Average lines read per second.', [([], snapshot['lines_per_second'])])
+        addMetric('input_bytes_per_second', 'gauge', 'Average decompressed bytes read per second.', [([], snapshot['input_bytes_per_second'])])
+        addMetric('source_bytes_read', 'gauge', 'Offset into the (possibly compressed) source file.', [([], snapshot['source_bytes_read'])])
+        addMetric('source_size_bytes', 'gauge', 'Size of the (possibly compressed) source file.', [([], snapshot['source_size_bytes'])])
+        addMetric('eta_seconds', 'gauge', 'Estimated seconds until the source is read.', [([], snapshot['eta_seconds'])])
+        addMetric('rows_total', 'counter', 'Rows emitted per table.',
+                  [(['table="%s"' % self.escapeLabelValue(tableName)], numRows) for (tableName, numRows) in snapshot['rows'].items()])
+        addMetric('cache_hits_total', 'counter', 'Lookups answered from a cache.',
+                  [(['cache="%s"' % self.escapeLabelValue(cacheName)], hits) for (cacheName, (hits, lookups)) in snapshot['caches'].items()])  #@UnusedVariable
+        addMetric('cache_lookups_total', 'counter', 'Lookups of a cache.',
+                  [(['cache="%s"' % self.escapeLabelValue(cacheName)], lookups) for (cacheName, (hits, lookups)) in snapshot['caches'].items()])  #@UnusedVariable
+        return '\n'.join(lines) + '\n'
+
+    def escapeLabelValue(self, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf8')
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -15,21 +15,27 @@ Created on Sep 24, 2013
 
 Modifications:
   - Dec 30, 2013: Added closing of connection to close() method
+  - bulkInsert() loads over the existing connection instead of
+    via scp/ssh/mysql subprocesses, and returns (errors, warnings)
 
 '''
 #import pymysql
 #import MySQLdb
 
 import csv
-import subprocess
+import logging
 import tempfile
+import time
 
 import MySQLdb
+import MySQLdb.cursors
 
 from warnings import filterwarnings, resetwarnings
 from MySQLdb import Warning as db_warning
 from contextlib import contextmanager
 
+from connection_pool import ConnectionPool
+
 
 class MySQLDB(object):
     '''
@@ -37,16 +43,35 @@ class MySQLDB(object):
     The query() method is an iterator. So::
         for result in mySqlObj.query('SELECT * FROM foo'):
             print result
+
+    For very large results, pass streaming=True to query(), or use
+    queryBatches(), which yields lists of rows. Both then use an unbuffered,
+    server-side cursor, so results are not materialized on the client.
     '''
 
     #*****
-    # Set to True if this code is running on 
-    # a machine other than datastage, for instance
-    # inside of Eclipse. Normally this code is
-    # run as part of a CRON job on datastage:
+    # Formerly: set to True if this code is running
+    # on a machine other than datastage, so that
+    # bulkInsert() would scp its temp file over.
+    # bulkInsert() now streams the file over the
+    # connection, so the setting has no effect; it
+    # is kept for callers that still assign it:
     RUN_REMOTELY = False
 
-    def __init__(self, host='127.0.0.1', port=3306, user='root', passwd='', db='mysql'):
+    # Server/client error codes that mean LOAD DATA LOCAL
+    # INFILE was refused (ER_NOT_ALLOWED_COMMAND, and
+    # CR_LOAD_DATA_LOCAL_INFILE_REJECTED in newer clients):
+    LOCAL_INFILE_REFUSED_CODES = (1148, 2068)
+
+    # Bytes to leave unused in max_allowed_packet
+    # when sizing multi-row INSERT statements:
+    PACKET_SLACK = 1024
+
+    # Number of rows to pull from the server
+    # with each fetchmany() in query():
+    QUERY_BATCH_SIZE = 10000
+
+    def __init__(self, host='127.0.0.1', port=3306, user='root', passwd='', db='mysql', pooled=False):
         '''
 
         @param host: MySQL host
@@ -59,6 +84,9 @@ class MySQLDB(object):
         @type passwd: string
         @param db: database to connect to within server
         @type db: string
+        @param pooled: if True, take the connection from the process-wide
+                ConnectionPool, and return it there on close()
+        @type pooled: bool
         '''
 
         # If all arguments are set to None, we are unittesting:
@@ -70,10 +98,14 @@ class MySQLDB(object):
         self.db   = db
         self.name = db
         self.cursors = []
+        self.pooled = pooled
         try:
             #self.connection = pymysql.connect(host=host, port=port, user=user, passwd=passwd, db=db)
             #self.connection = pymysql.connect(host=host, port=port, user=user, passwd=passwd, db=db,charset='utf8')
-            self.connection = MySQLdb.connect(host=host, port=port, user=user, passwd=passwd, db=db, local_infile=1)
+            if pooled:
+                self.connection = ConnectionPool.acquire(MySQLdb.connect, host=host, port=port, user=user, passwd=passwd, db=db, local_infile=1)
+            else:
+                self.connection = MySQLdb.connect(host=host, port=port, user=user, passwd=passwd, db=db, local_infile=1)
 
         except MySQLdb.OperationalError:
         #except pymysql.OperationalError:
@@ -84,12 +116,18 @@ class MySQLDB(object):
     def close(self):
         '''
         Close all cursors that are currently still open.
+        Then close the connection, or return it to the
+        connection pool if this instance is pooled.
         '''
         for cursor in self.cursors:
             try:
                 cursor.close()
             except:
                 pass
+        self.cursors = []
+        if self.pooled:
+            ConnectionPool.release(self.connection)
+            return
         try:
             self.connection.close()
         except:
@@ -163,51 +201,124 @@ class MySQLDB(object):
     def bulkInsert(self, tblName, colNameTuple, valueTupleArray):
         '''
         Inserts large number of rows into given table. Strategy: write
-        the values to a temp file, then generate a LOAD INFILE LOCAL
-        MySQL command. Execute that command via subprocess.call().
-        Using a cursor.execute() fails with error 'LOAD DATA LOCAL
-        is not supported in this MySQL version...' even though MySQL
-        is set up to allow the op (load-infile=1 for both mysql and
-        mysqld in my.cnf).
+        the values to a temp file, then issue a LOAD DATA LOCAL INFILE
+        over this instance's own connection, which was opened with
+        local_infile=1. The client streams the temp file to the server,
+        so no scp/ssh or mysql command line process is involved, and
+        the file need not be visible on the server's file system.
+
+        If the server refuses LOCAL INFILE, falls back to multi-row
+        INSERT statements via executemany(), batched to the server's
+        max_allowed_packet.
+
+        Returns a tuple (errors, warnings). Each is None if the server
+        reported none, else a tuple of (level, code, message) tuples
+        as delivered by SHOW WARNINGS.
+
         @param tblName: table into which to insert
         @type tblName: string
         @param colNameTuple: tuple containing column names in proper order, i.e.
                 corresponding to valueTupleArray orders.
         @type colNameTuple: (str[,str[...]])
-        @param valueTupleArray: array of n-tuples, which hold the values. Order of
+        @param valueTupleArray: array or other iterable of n-tuples, which hold the values. Order of
                 values must correspond to order of column names in colNameTuple.
         @type valueTupleArray: [(<anyMySQLCompatibleTypes>[<anyMySQLCompatibleTypes,...]])
+        @return: errors and warnings generated by the load
+        @rtype: ((str,int,str)|None, (str,int,str)|None)
         '''
+        startTime = time.time()
+        # The rows are read twice if the server refuses LOAD DATA
+        # LOCAL, so a generator must not be used up by the first pass:
+        valueTupleArray = list(valueTupleArray)
         tmpCSVFile = tempfile.NamedTemporaryFile(dir='/tmp',prefix='userCountryTmp',suffix='.csv')
         self.csvWriter = csv.writer(tmpCSVFile, dialect='excel-tab', lineterminator='\n', delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
         # Can't use csvWriter.writerows() b/c some rows have
         # weird chars: self.csvWriter.writerows(valueTupleArray)
+        numRows = 0
         for row in valueTupleArray:
             # Convert each element in row to a string,
             # including mixed-in Unicode Strings:
             self.csvWriter.writerow([rowElement for rowElement in self.stringifyList(row)])
+            numRows += 1
         tmpCSVFile.flush()
 
-        if MySQLDB.RUN_REMOTELY:
-            # For running surveyextractor.py (e.g. in Eclipse) on non-datastage machine,
-            # need to copy the temp file over to datastage:
-            subprocess.call(["scp", tmpCSVFile.name, '%s@datastage:/tmp' % self.user])
-            subprocess.call(["ssh", "%s@datastage" % self.user, "chmod a+r %s" % tmpCSVFile.name]) 
-
+        if colNameTuple:
+            colSpec = '(%s)' % ','.join(colNameTuple)
+        else:
+            colSpec = ''
+        mySQLCmd = '''LOAD DATA LOCAL INFILE '%s'
+                        INTO TABLE %s
+                        FIELDS TERMINATED BY ','
+                        OPTIONALLY ENCLOSED BY '"'
+                        LINES TERMINATED BY '\\n' %s''' % (tmpCSVFile.name, tblName, colSpec)
+        cursor = self.connection.cursor()
         try:
-            mySQLCmd = '''
-              USE %s;
-              LOAD DATA LOCAL INFILE '%s'
-                INTO TABLE %s
-                FIELDS TERMINATED BY ','
-                OPTIONALLY ENCLOSED BY '\\"'
-                LINES TERMINATED BY '\n';
-              commit; 
-            ''' % (self.db, tmpCSVFile.name, tblName)
-            subprocess.call(['ssh', '%s@datastage' % self.user, 'mysql --login-path=%s -e "%s"' % (self.user, mySQLCmd)])
+            try:
+                cursor.execute(mySQLCmd)
+            except MySQLdb.OperationalError as e:
+                if e.args[0] not in MySQLDB.LOCAL_INFILE_REFUSED_CODES:
+                    raise
+                self.executemanyInsert(cursor, tblName, colNameTuple, valueTupleArray)
+            (errors, warnings) = self.collectWarnings(cursor)
+            self.connection.commit()
         finally:
+            cursor.close()
             tmpCSVFile.close()
 
+        elapsed = time.time() - startTime
+        logging.info('Bulk-inserted %d rows into %s in %.2f sec (%d rows/sec)' %
+                     (numRows, tblName, elapsed, numRows / elapsed if elapsed > 0 else numRows))
+        return (errors, warnings)
+
+    def executemanyInsert(self, cursor, tblName, colNameTuple, valueTupleArray):
+        '''
+        Insert rows with multi-row INSERT statements. MySQLdb's executemany()
+        folds the rows into as few INSERT statements as its cursor's
+        max_stmt_length allows. We raise that limit to the server's
+        max_allowed_packet (minus some slack for protocol overhead), so
+        each batch fills one packet.
+        @param cursor: open cursor on this instance's connection
+        @type cursor: MySQLdb.cursors.Cursor
+        @param tblName: table into which to insert
+        @type tblName: string
+        @param colNameTuple: column names in the order of the value tuples; may be None
+        @type colNameTuple: (str[,str[...]])
+        @param valueTupleArray: rows to insert
+        @type valueTupleArray: [(<anyMySQLCompatibleTypes>[<anyMySQLCompatibleTypes,...]])
+        '''
+        valueTupleArray = list(valueTupleArray)
+        if len(valueTupleArray) == 0:
+            return
+        if colNameTuple:
+            numCols = len(colNameTuple)
+            colSpec = '(%s)' % ','.join(colNameTuple)
+        else:
+            numCols = len(valueTupleArray[0])
+            colSpec = ''
+        cursor.execute('SELECT @@max_allowed_packet')
+        maxPacket = int(cursor.fetchone()[0])
+        cursor.max_stmt_length = max(maxPacket - MySQLDB.PACKET_SLACK, 1024)
+        cmd = 'INSERT INTO %s %s VALUES (%s)' % (tblName, colSpec, ','.join(['%s'] * numCols))
+        cursor.executemany(cmd, valueTupleArray)
+
+    def collectWarnings(self, cursor):
+        '''
+        Retrieve the diagnostics the server recorded for the most recent
+        statement on the given cursor, and split them into errors and
+        warnings.
+        @param cursor: cursor on which the statement was executed
+        @type cursor: MySQLdb.cursors.Cursor
+        @return: tuple (errors, warnings); each None if empty, else a tuple of
+            (level, code, message) tuples.
+        @rtype: ((str,int,str)|None, (str,int,str)|None)
+        '''
+        cursor.execute('SHOW WARNINGS')
+        diagnostics = cursor.fetchall()
+        errors   = tuple([diag for diag in diagnostics if diag[0] == 'Error'])
+        warnings = tuple([diag for diag in diagnostics if diag[0] != 'Error'])
+        return (errors if len(errors) > 0 else None,
+                warnings if len(warnings) > 0 else None)
+
     def update(self, tblName, colName, newVal, fromCondition=None):
         '''
         Update one column with a new value.
@@ -285,24 +396,56 @@ class MySQLDB(object):
                 resList.append(el)
         return ','.join(map(str,resList))
 
-    def query(self, queryStr):
+    def query(self, queryStr, streaming=False, batchSize=None):
         '''
         Query iterator. Given a query, return one result for each
-        subsequent call.
+        subsequent call. Rows are pulled from the server batchSize
+        at a time.
+
+        With streaming=True an unbuffered, server-side cursor is used,
+        so the result is not held on the client. Until such an iterator
+        is exhausted or this instance is closed, no other statement
+        may be issued on this instance's connection.
+        @param queryStr: query
+        @type queryStr: String
+        @param streaming: whether to use an unbuffered server-side cursor
+        @type streaming: bool
+        @param batchSize: number of rows per fetchmany(); default QUERY_BATCH_SIZE
+        @type batchSize: int
+        '''
+        for batch in self.queryBatches(queryStr, streaming=streaming, batchSize=batchSize):
+            for row in batch:
+                yield row
+
+    def queryBatches(self, queryStr, streaming=True, batchSize=None):
+        '''
+        Query iterator that yields the result in lists of up to
+        batchSize rows. Uses an unbuffered server-side cursor unless
+        streaming is False. See query() for the restrictions that
+        come with streaming.
         @param queryStr: query
         @type queryStr: String
+        @param streaming: whether to use an unbuffered server-side cursor
+        @type streaming: bool
+        @param batchSize: maximum number of rows per yielded list; default QUERY_BATCH_SIZE
+        @type batchSize: int
         '''
+        if batchSize is None:
+            batchSize = MySQLDB.QUERY_BATCH_SIZE
         queryStr = queryStr.encode('UTF-8')
-        cursor = self.connection.cursor()
+        if streaming:
+            cursor = self.connection.cursor(MySQLdb.cursors.SSCursor)
+        else:
+            cursor = self.connection.cursor()
         # For if caller never exhausts the results by repeated calls:
         self.cursors.append(cursor)
         cursor.execute(queryStr)
         while True:
-            nextRes = cursor.fetchone()
-            if nextRes is None:
+            batch = cursor.fetchmany(batchSize)
+            if not batch:
                 cursor.close()
                 return
-            yield nextRes
+            yield batch
 
     def stringifyList(self, iterable):
         '''
@@ -0,0 +1,279 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Concurrent response exports from the Qualtrics v1 API, for
+QualtricsExtractor.
+
+Exporting the responses of one survey means: start an export,
+poll its status until percentComplete reaches 100, then download
+a zip file with the responses as JSON. The download is spooled
+to a temporary file, from which iterResponses() stream-parses
+the responses one at a time, so memory use does not grow with
+the size of a survey. Qualtrics takes seconds to
+minutes to prepare an export, so exports of several surveys are
+run at once in a thread pool, and each is polled with exponential
+backoff rather than at a fixed interval.
+
+All HTTP requests of an exporter go through one RateLimiter, so the
+total request rate stays below maxRequestsPerSec however many exports
+are in flight. Responses with status 429 (Too Many Requests) or 5xx
+are retried after the server's Retry-After, or after a backoff delay.
+
+The API base URL is a constructor argument, so tests can point the
+exporter at a local HTTP stand-in.
+
+Usage::
+    exporter = QualtricsResponseExporter(apiToken)
+    for (surveyID, exportFile) in exporter.exportAll(['SV_1234', 'SV_5678']):
+        # Surveys arrive in order of completion; exportFile
+        # is None for failed exports:
+        if exportFile is not None:
+            with exportFile:
+                for response in QualtricsResponseExporter.iterResponses(exportFile):
+                    ...
+'''
+
+from collections import OrderedDict
+import json
+import logging
+from multiprocessing.pool import ThreadPool
+import shutil
+import tempfile
+import threading
+import time
+import urllib2
+import zipfile as z
+
+import ijson
+from ijson.common import JSONError
+try:
+    # C backend, if yajl is installed; same API, much faster:
+    import ijson.backends.yajl2_c as ijsonBackend
+except ImportError:
+    ijsonBackend = ijson
+
+
+class RateLimiter(object):
+    '''
+    Spaces out calls to wait() from any number of threads
+    so that at most maxPerSec of them return per second.
+    '''
+    def __init__(self, maxPerSec):
+        self.interval = 1.0 / maxPerSec
+        self.nextSlot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.nextSlot)
+            self.nextSlot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class QualtricsResponseExporter(object):
+
+    API_BASE = "https://dc-viawest.qualtrics.com:443/API/v1"
+
+    # Default number of exports in flight at once:
+    NUM_WORKERS = 4
+
+    # Default limit on HTTP requests per second, over all exports:
+    MAX_REQUESTS_PER_SEC = 5
+
+    # Export status polling: first delay, growth
+    # factor, and cap of the delay between polls,
+    # in seconds; and time after which an export
+    # is given up:
+    FIRST_POLL_DELAY = 2.0
+    POLL_BACKOFF_FACTOR = 2.0
+    MAX_POLL_DELAY = 30.0
+    EXPORT_TIMEOUT = 600.0
+
+    # Attempts per request when the server answers
+    # 429 or 5xx, and delay before the first retry
+    # (doubled for each further one) if the server
+    # sends no Retry-After:
+    MAX_ATTEMPTS = 5
+    FIRST_RETRY_DELAY = 2.0
+
+    # Bytes per read when spooling a download to disk:
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, apiToken, apiBase=None, numWorkers=None, maxRequestsPerSec=None):
+        '''
+        :param apiToken: Qualtrics API token
+        :type apiToken: String
+        :param apiBase: API URL up to and including the version; default API_BASE
+        :type apiBase: String
+        :param numWorkers: number of exports run at once; default NUM_WORKERS
+        :type numWorkers: int
+        :param maxRequestsPerSec: limit on HTTP requests per second; default MAX_REQUESTS_PER_SEC
+        :type maxRequestsPerSec: float
+        '''
+        self.apiToken = apiToken
+        self.apiBase = QualtricsResponseExporter.API_BASE if apiBase is None else apiBase
+        self.numWorkers = QualtricsResponseExporter.NUM_WORKERS if numWorkers is None else numWorkers
+        self.rateLimiter = RateLimiter(QualtricsResponseExporter.MAX_REQUESTS_PER_SEC if maxRequestsPerSec is None else maxRequestsPerSec)
+
+    def exportAll(self, surveyIDs):
+        '''
+        Generator that exports the responses of all given surveys,
+        numWorkers at a time, and yields each survey's result as soon
+        as it is available. Runs in the caller's thread, so callers
+        may load results into their database as they arrive.
+
+        :param surveyIDs: surveys to export
+        :type surveyIDs: [String]
+        :return: (surveyID, exportFile) pairs in order of completion; see exportOne() for exportFile
+        :rtype: generator((String, {file | None}))
+        '''
+        surveyIDs = list(surveyIDs)
+        if len(surveyIDs) == 0:
+            return
+        startTime = time.time()
+        pool = ThreadPool(min(self.numWorkers, len(surveyIDs)))
+        try:
+            for result in pool.imap_unordered(self.exportWithID, surveyIDs):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+        logging.info(" Exported responses of %d surveys in %.1f sec." % (len(surveyIDs), time.time() - startTime))
+
+    def exportWithID(self, surveyID):
+        return (surveyID, self.exportOne(surveyID))
+
+    def exportOne(self, surveyID):
+        '''
+        Export the responses of one survey into a temporary file.
+        The file is deleted when closed.
+
+        :param surveyID: Qualtrics survey ID
+        :type surveyID: String
+        :return: the export's zip file, positioned at its start, or None
+                 if the export failed or timed out
+        :rtype: {file | None}
+        '''
+        startTime = time.time()
+        try:
+            reqURL = "%s/surveys/%s/responseExports?apiToken=%s&fileType=JSON" % (self.apiBase, surveyID, self.apiToken)
+            req = json.loads(self.request(reqURL))
+            statURL = req['result']['exportStatus'] + "?apiToken=" + self.apiToken
+            fileURL = self.awaitExport(surveyID, statURL)
+            if fileURL is None:
+                return None
+            exportFile = self.download(fileURL)
+        except (urllib2.URLError, ValueError, KeyError) as e:
+            logging.error("  Survey %s gave error '%s'." % (surveyID, e))
+            return None
+        logging.info("  Exported survey %s in %.1f sec." % (surveyID, time.time() - startTime))
+        return exportFile
+
+    def awaitExport(self, surveyID, statURL):
+        '''
+        Poll an export's status with exponential backoff
+        until it is complete.
+
+        :return: URL of the export file, or None if the export timed out
+        :rtype: {String | None}
+        '''
+        deadline = time.time() + QualtricsResponseExporter.EXPORT_TIMEOUT
+        delay = QualtricsResponseExporter.FIRST_POLL_DELAY
+        while time.time() < deadline:
+            time.sleep(delay)
+            delay = min(delay * QualtricsResponseExporter.POLL_BACKOFF_FACTOR, QualtricsResponseExporter.MAX_POLL_DELAY)
+            try:
+                stat = json.loads(self.request(statURL))
+            except (urllib2.URLError, ValueError) as e:
+                logging.warning(" Recovered from HTTP error polling survey %s: %s" % (surveyID, e))
+                continue
+            if stat['result']['percentComplete'] == 100:
+                return stat['result']['fileUrl']
+        logging.error("  Survey %s timed out." % surveyID)
+        return None
+
+    def request(self, url):
+        '''
+        GET the given URL, observing the rate limit. Requests
+        answered with 429 or 5xx are retried up to MAX_ATTEMPTS
+        times, after the server's Retry-After if given.
+
+        :return: the response body
+        :rtype: str
+        @raise urllib2.URLError: if the request fails for good.
+        '''
+        remote = self.openURL(url)
+        try:
+            return remote.read()
+        finally:
+            remote.close()
+
+    def download(self, url):
+        '''
+        Like request(), but spools the response body
+        into a temporary file, which is returned.
+        '''
+        remote = self.openURL(url)
+        spool = tempfile.TemporaryFile()
+        try:
+            shutil.copyfileobj(remote, spool, QualtricsResponseExporter.DOWNLOAD_CHUNK_SIZE)
+        except:
+            spool.close()
+            raise
+        finally:
+            remote.close()
+        spool.seek(0)
+        return spool
+
+    def openURL(self, url):
+        retryDelay = QualtricsResponseExporter.FIRST_RETRY_DELAY
+        for attempt in range(QualtricsResponseExporter.MAX_ATTEMPTS):
+            self.rateLimiter.wait()
+            try:
+                return urllib2.urlopen(url)
+            except urllib2.HTTPError as e:
+                if (e.code != 429 and e.code < 500) or attempt == QualtricsResponseExporter.MAX_ATTEMPTS - 1:
+                    raise
+                try:
+                    delay = float(e.info().getheader('Retry-After'))
+                except (TypeError, ValueError):
+                    delay = retryDelay
+                logging.warning(" Qualtrics answered %s; retrying in %.1f sec." % (e.code, delay))
+                time.sleep(delay)
+                retryDelay *= 2
+
+    @staticmethod
+    def iterResponses(exportFile):
+        '''
+        Generator over the responses in an export's zip file. The
+        JSON in the zip file is decompressed and parsed incrementally;
+        only the response being yielded is held in memory.
+
+        :param exportFile: zip file as returned by exportOne()
+        :type exportFile: file
+        :return: responses, with fields in the order of the export
+        :rtype: generator(OrderedDict)
+        @raise ValueError: if the export is not a zip file of valid JSON.
+        '''
+        try:
+            archive = z.ZipFile(exportFile, 'r')
+            dataFile = archive.open(archive.namelist()[0])
+        except (z.BadZipfile, IndexError) as e:
+            raise ValueError("Bad export zip file: %s" % e)
+        try:
+            for response in ijsonBackend.items(dataFile, 'responses.item', map_type=OrderedDict):
+                yield response
+        except JSONError as e:
+            raise ValueError("Bad JSON in export: %s" % e)
+        finally:
+            dataFile.close()
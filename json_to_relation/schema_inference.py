@@ -0,0 +1,263 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Two-pass schema inference for the generic JSON-to-relation
+converter.
+
+By default GenericJSONParser creates conservative columns: DOUBLE
+for every number, TEXT for every string, SMALLINT for booleans. A
+SchemaInferrer makes a first pass over (a sample of) a JSON source,
+recording for each column the kinds of values seen, the integer
+range, and the longest string. From those it derives the tightest
+type that still fits the values times a headroom factor. The result
+is passed to JSONToRelation as schemaHints for the second pass,
+which converts the source.
+
+Column names are those GenericJSONParser gives, including array
+index suffixes and quoting.
+
+Statistics, not types, are persisted, so that the schema of a
+source can be reused for its later files, and widened when
+those files hold larger values. Types never narrow.
+
+Usage::
+    inferrer = SchemaInferrer.load(schemaPath) if os.path.exists(schemaPath) else SchemaInferrer()
+    inferrer.observeSource(InURI(jsonPath), sampleEvery=10)
+    inferrer.save(schemaPath)
+    converter = JSONToRelation(InURI(jsonPath), OutputFile(sqlPath, OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS),
+                               schemaHints=inferrer.schemaHints())
+
+A full first pass (sampleEvery=1) is safe for the file it
+reads. A sample may miss the widest values; the headroom
+factors make up for some of that.
+'''
+from collections import OrderedDict
+import json
+import os
+
+from col_data_type import ColDataType
+from generic_json_parser import GenericJSONParser
+from json_to_relation import JSONToRelation
+
+
+class ColumnStats(object):
+    '''
+    What a first pass saw of the values of one column.
+    Booleans count into the integer range as 0 and 1,
+    which is how they are stored.
+    '''
+    FIELDS = ['numStrings', 'maxLen', 'numFloats', 'numInts', 'minInt', 'maxInt', 'numBools', 'numNulls']
+
+    def __init__(self):
+        self.numStrings = 0
+        self.maxLen = 0
+        self.numFloats = 0
+        self.numInts = 0
+        self.minInt = None
+        self.maxInt = None
+        self.numBools = 0
+        self.numNulls = 0
+
+    def observe(self, value):
+        valueType = type(value)
+        if valueType is unicode or valueType is str:
+            self.numStrings += 1
+            if len(value) > self.maxLen:
+                self.maxLen = len(value)
+        elif valueType is int or valueType is long or valueType is bool:
+            if valueType is bool:
+                self.numBools += 1
+                value = int(value)
+            else:
+                self.numInts += 1
+            if self.minInt is None or value < self.minInt:
+                self.minInt = value
+            if self.maxInt is None or value > self.maxInt:
+                self.maxInt = value
+        elif value is None:
+            self.numNulls += 1
+        else:
+            # Decimal:
+            self.numFloats += 1
+
+    def colDataType(self, intHeadroom, textHeadroom):
+        '''
+        Return the tightest column type for the values seen,
+        after scaling integer bounds and string length by
+        the given headroom factors.
+
+        :rtype: ColDataType
+        '''
+        if self.numStrings > 0:
+            return ColDataType.textTypeForLength(int(self.maxLen * textHeadroom))
+        if self.numFloats > 0:
+            return ColDataType.DOUBLE
+        if self.numInts > 0:
+            # The integer types, and DOUBLE beyond
+            # BIGINT, are ordered by width:
+            return max(ColDataType.sqlTypeFromValue(long(self.minInt * intHeadroom)),
+                       ColDataType.sqlTypeFromValue(long(self.maxInt * intHeadroom)))
+        if self.numBools > 0:
+            # Not BOOL: its default value 0 would make
+            # missing values look like False:
+            return ColDataType.TINYINT
+        # Only nulls; as GenericJSONParser does:
+        return ColDataType.TEXT
+
+    def toDict(self):
+        return OrderedDict([(field, getattr(self, field)) for field in ColumnStats.FIELDS])
+
+    @classmethod
+    def fromDict(cls, statsDict):
+        stats = ColumnStats()
+        for field in ColumnStats.FIELDS:
+            setattr(stats, field, statsDict[field])
+        return stats
+
+
+class SchemaInferrer(object):
+
+    # Factors by which the largest integer magnitudes and
+    # string lengths seen are scaled before types are chosen:
+    DEFAULT_INT_HEADROOM = 2.0
+    DEFAULT_TEXT_HEADROOM = 2.0
+
+    # Version of the persisted format:
+    FILE_FORMAT_VERSION = 1
+
+    def __init__(self, intHeadroom=None, textHeadroom=None):
+        '''
+        :param intHeadroom: factor applied to the integer range seen; default DEFAULT_INT_HEADROOM
+        :type intHeadroom: float
+        :param textHeadroom: factor applied to the longest string seen; default DEFAULT_TEXT_HEADROOM
+        :type textHeadroom: float
+        @raise ValueError: if a headroom factor is below 1.
+        '''
+        self.intHeadroom  = SchemaInferrer.DEFAULT_INT_HEADROOM if intHeadroom is None else intHeadroom
+        self.textHeadroom = SchemaInferrer.DEFAULT_TEXT_HEADROOM if textHeadroom is None else textHeadroom
+        if self.intHeadroom < 1 or self.textHeadroom < 1:
+            raise ValueError("Headroom factors must be at least 1; got %s and %s." % (self.intHeadroom, self.textHeadroom))
+        # Column name to ColumnStats, in order of first appearance:
+        self.colStats = OrderedDict()
+        self.numLinesObserved = 0
+        self.numLinesSkipped = 0
+        # Only used for its column naming; a converter
+        # without source or destination suffices:
+        self.jsonParser = GenericJSONParser(JSONToRelation(None, None))
+
+    def observeSource(self, jsonSource, sampleEvery=1, maxLines=None):
+        '''
+        First pass: observe the JSON objects of an input source, one
+        per line. Lines that are not valid JSON are skipped; the
+        conversion will report them.
+
+        :param jsonSource: source of JSON objects, one per line
+        :type jsonSource: {InPipe | InString | InURI}
+        :param sampleEvery: observe only every sampleEvery'th line
+        :type sampleEvery: int
+        :param maxLines: stop after observing this many lines; None for all
+        :type maxLines: {int | None}
+        :return: number of lines observed
+        :rtype: int
+        '''
+        with jsonSource as inFd:
+            return self.observeLines(inFd, sampleEvery, maxLines)
+
+    def observeLines(self, jsonLines, sampleEvery=1, maxLines=None):
+        '''
+        Like observeSource(), but for any iterable of JSON strings.
+        '''
+        numObserved = 0
+        for (lineNum, jsonStr) in enumerate(jsonLines):
+            if lineNum % sampleEvery != 0:
+                continue
+            if maxLines is not None and numObserved >= maxLines:
+                break
+            if len(jsonStr.strip()) == 0:
+                continue
+            try:
+                self.observe(GenericJSONParser.JSON_DECODER.decode(jsonStr))
+            except ValueError:
+                self.numLinesSkipped += 1
+                continue
+            numObserved += 1
+        self.numLinesObserved += numObserved
+        return numObserved
+
+    def observe(self, jsonObj):
+        '''
+        Record the values of one decoded JSON object.
+
+        :param jsonObj: JSON object as decoded by GenericJSONParser.JSON_DECODER
+        :type jsonObj: {JSONObjectPairs | list | <scalar>}
+        '''
+        colStats = self.colStats
+        for (colName, value) in self.jsonParser.flattenJSON(jsonObj):
+            try:
+                stats = colStats[colName]
+            except KeyError:
+                stats = colStats[colName] = ColumnStats()
+            stats.observe(value)
+
+    def schemaHints(self):
+        '''
+        Return the inferred column types, in the form
+        that JSONToRelation takes as schemaHints.
+
+        :return: column name to type, in order of first appearance
+        :rtype: OrderedDict<String,ColDataType>
+        '''
+        return OrderedDict([(colName, stats.colDataType(self.intHeadroom, self.textHeadroom))
+                            for (colName, stats) in self.colStats.items()])
+
+    def save(self, schemaPath):
+        '''
+        Persist the statistics gathered so far, for reuse with
+        later files of the same source. The file is replaced
+        atomically.
+
+        :param schemaPath: path of the JSON file to write
+        :type schemaPath: String
+        '''
+        schema = OrderedDict([('version', SchemaInferrer.FILE_FORMAT_VERSION),
+                              ('numLinesObserved', self.numLinesObserved),
+                              ('columns', OrderedDict([(colName, stats.toDict()) for (colName, stats) in self.colStats.items()]))])
+        tmpPath = schemaPath + '.tmp'
+        with open(tmpPath, 'w') as fd:
+            json.dump(schema, fd, indent=1)
+        os.rename(tmpPath, schemaPath)
+
+    @classmethod
+    def load(cls, schemaPath, intHeadroom=None, textHeadroom=None):
+        '''
+        Create an inferrer from statistics persisted by save().
+        Further observations widen the loaded columns, and add
+        new ones.
+
+        :param schemaPath: path of a file written by save()
+        :type schemaPath: String
+        :rtype: SchemaInferrer
+        @raise ValueError: if the file is not a persisted schema.
+        '''
+        with open(schemaPath, 'r') as fd:
+            schema = json.load(fd, object_pairs_hook=OrderedDict)
+        try:
+            if schema['version'] != SchemaInferrer.FILE_FORMAT_VERSION:
+                raise ValueError("Schema file %s has format version %s; expected %s." %\
+                                 (schemaPath, schema['version'], SchemaInferrer.FILE_FORMAT_VERSION))
+            inferrer = SchemaInferrer(intHeadroom, textHeadroom)
+            inferrer.numLinesObserved = schema['numLinesObserved']
+            for (colName, statsDict) in schema['columns'].items():
+                inferrer.colStats[colName] = ColumnStats.fromDict(statsDict)
+        except (KeyError, TypeError) as e:
+            raise ValueError("Schema file %s is not a persisted schema: %s" % (schemaPath, `e`))
+        return inferrer
@@ -0,0 +1,183 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Per-stage timing of a JSON-to-relation conversion.
+
+A StageProfiler replaces chosen methods of chosen objects with
+wrappers that time each call, and sums the times per stage. Only
+the instances are changed, not their classes, so nothing is timed,
+and nothing costs, unless a profiler was asked to instrument them.
+
+Each stage has a total time, which includes the stages it calls,
+and a self time, which does not. Self times add up to the time
+spent in instrumented code, so they show where a conversion's
+time goes: reading and decompressing input, JSON decoding, common
+fields, each event type's handler, building INSERT statements, and
+writing output.
+
+Python 2 has no monotonic clock; timeit.default_timer is the best
+wall clock timer of the platform.
+
+Usage::
+    profiler = StageProfiler()
+    profiler.instrument(parser, ['handleCommonFields', 'handleProblemCheck'])
+    for line in profiler.timeIterator('read input', inFd):
+        parser.processOneJSONObject(line, [])
+    for reportLine in profiler.report(totalTime):
+        logger.info(reportLine)
+'''
+from collections import OrderedDict
+from timeit import default_timer
+
+
+class StageStats(object):
+    '''
+    Number of calls, total time, and self time of one stage.
+    '''
+    def __init__(self):
+        self.calls = 0
+        self.totalTime = 0.0
+        self.selfTime = 0.0
+
+class StageProfiler(object):
+    '''
+    Times calls of instrumented methods, and reports
+    the times per stage.
+    '''
+
+    def __init__(self):
+        # Stage name --> StageStats:
+        self.stages = OrderedDict()
+        # Time spent in nested stages, for each
+        # stage currently being timed. Innermost last:
+        self.childTimes = []
+        # (object, method name) of instrumented methods:
+        self.instrumented = []
+
+    def getStageStats(self, stageName):
+        '''
+        :return: the statistics of the given stage, created if new
+        :rtype: StageStats
+        '''
+        try:
+            return self.stages[stageName]
+        except KeyError:
+            stats = self.stages[stageName] = StageStats()
+            return stats
+
+    def instrument(self, obj, methodNames, stageName=None):
+        '''
+        Time calls of the given methods of obj until restore()
+        is called. Methods that obj does not have are skipped.
+
+        :param obj: object whose methods are to be timed
+        :type obj: <any>
+        :param methodNames: names of the methods
+        :type methodNames: [String]
+        :param stageName: stage to which all the methods' times are added. Default: each method is its own stage.
+        :type stageName: {String | None}
+        '''
+        for methodName in methodNames:
+            method = getattr(obj, methodName, None)
+            if method is None or (obj, methodName) in self.instrumented:
+                continue
+            setattr(obj, methodName, self.timed(method, stageName if stageName is not None else methodName))
+            self.instrumented.append((obj, methodName))
+
+    def restore(self):
+        '''
+        Remove the timing wrappers from all instrumented objects.
+        '''
+        for (obj, methodName) in self.instrumented:
+            delattr(obj, methodName)
+        self.instrumented = []
+
+    def instrumentByPrefix(self, obj, prefixes):
+        '''
+        Time calls of all methods of obj whose names start with
+        one of the given prefixes, each method being its own stage.
+        Ex.: all 'handle' methods of a parser.
+
+        :param obj: object whose methods are to be timed
+        :type obj: <any>
+        :param prefixes: method name prefixes
+        :type prefixes: [String]
+        '''
+        self.instrument(obj, [name for name in dir(obj)
+                              if name.startswith(tuple(prefixes)) and callable(getattr(obj, name))])
+
+    def timed(self, func, stageName):
+        '''
+        Return a wrapper of func that adds the time of each call to the given stage.
+        '''
+        stats = self.getStageStats(stageName)
+        childTimes = self.childTimes
+        def timedFunc(*args, **kwargs):
+            childTimes.append(0.0)
+            startTime = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = default_timer() - startTime
+                stats.calls += 1
+                stats.totalTime += elapsed
+                stats.selfTime += elapsed - childTimes.pop()
+                if len(childTimes) > 0:
+                    childTimes[-1] += elapsed
+        return timedFunc
+
+    def timeIterator(self, stageName, iterable):
+        '''
+        Iterate over iterable, adding the time each item
+        takes to produce to the given stage.
+
+        :param stageName: stage to which the times are added
+        :type stageName: String
+        :param iterable: e.g. an InputSource's file object
+        :type iterable: iterable
+        '''
+        nextItem = self.timed(iter(iterable).next, stageName)
+        while True:
+            try:
+                item = nextItem()
+            except StopIteration:
+                return
+            yield item
+
+    def getStages(self):
+        '''
+        :return: statistics of each stage, in the order the stages were instrumented
+        :rtype: OrderedDict<String,StageStats>
+        '''
+        return self.stages
+
+    def report(self, elapsedTime):
+        '''
+        Return lines of a table with calls, total time, self time,
+        and share of elapsedTime of each stage that was called,
+        highest self time first.
+
+        :param elapsedTime: time of the whole conversion
+        :type elapsedTime: float
+        :return: table lines
+        :rtype: [String]
+        '''
+        lines = ['%-45s %10s %12s %12s %7s' % ('Stage', 'Calls', 'Total sec', 'Self sec', '% time')]
+        calledStages = [(stageName, stats) for (stageName, stats) in self.stages.items() if stats.calls > 0]
+        for (stageName, stats) in sorted(calledStages, key=lambda (stageName, stats): stats.selfTime, reverse=True):
+            lines.append('%-45s %10d %12.3f %12.3f %7.1f' %\
+                         (stageName, stats.calls, stats.totalTime, stats.selfTime,
+                          100.0 * stats.selfTime / elapsedTime if elapsedTime > 0 else 0))
+        untimed = elapsedTime - sum([stats.selfTime for (stageName, stats) in calledStages])  #@UnusedVariable
+        lines.append('%-45s %10s %12s %12.3f %7.1f' %\
+                     ('(not instrumented)', '', '', untimed, 100.0 * untimed / elapsedTime if elapsedTime > 0 else 0))
+        return lines
@@ -5,22 +5,28 @@ import os.path
 import sys
 import xml.etree.ElementTree as ET
 from pymysql_utils1 import MySQLDB
-from string import Template
-import zipfile as z
-import StringIO as sio
-from collections import OrderedDict
 import getopt
-import time
 import logging
 import datetime as dt
 from ipToCountry import IpCountryDict
+from qualtricsExporter import QualtricsResponseExporter
 
-# NOTE: if running on a machine other than datastage,
-#       (for instance within Eclipse), then set
-#       RUN_REMOTELY in pymysql_utils1 to True
+# NOTE: bulk inserts stream their data over the MySQL
+#       connection, so this module runs the same way on
+#       datastage and on other machines (e.g. within Eclipse).
 
 class QualtricsExtractor(MySQLDB):
 
+    # Table mapping 32-char external (LTI) IDs to anon_screen_name,
+    # as used by edxprod.idExt2Anon(), and max number of IDs per
+    # lookup query:
+    LTI_TO_ANON_TABLE = 'edxprod.Lti2Anon'
+    ANON_ID_BATCH_SIZE = 1000
+
+    # Number of exported responses parsed and
+    # loaded at a time:
+    RESPONSE_BATCH_SIZE = 1000
+
     def __init__(self):
         '''
         Initializes extractor object with credentials from .ssh directory.
@@ -56,6 +62,9 @@ class QualtricsExtractor(MySQLDB):
                             level=logging.INFO)
 
         self.lookup = IpCountryDict()
+        # IP address --> three-letter country code:
+        self.countries = {}
+        self.exporter = QualtricsResponseExporter(self.apitoken)
 
         #************
         MySQLDB.__init__(self, db="EdxQualtrics", user=dbuser, passwd=dbpass)
@@ -211,45 +220,6 @@ class QualtricsExtractor(MySQLDB):
         data = urllib2.urlopen(url).read()
         return ET.fromstring(data)
 
-    def __getResponses(self, surveyID):
-        '''
-        Pull response data for given surveyID from Qualtrics. Method generates
-        JSON objects containing batches of 5000 surveys.
-        '''
-
-        urlTemp = Template("https://dc-viawest.qualtrics.com:443/API/v1/surveys/${svid}/responseExports?apiToken=${tk}&fileType=JSON")
-        reqURL = urlTemp.substitute(svid=surveyID, tk=self.apitoken)
-        req = json.loads(urllib2.urlopen(reqURL).read())
-
-        statURL = req['result']['exportStatus'] + "?apiToken=" + self.apitoken
-        percent, tries = 0, 0
-        while percent != 100 and tries < 20:
-            time.sleep(5)  # Wait 5 seconds between attempts to acquire data
-            try:
-                stat = json.loads(urllib2.urlopen(statURL).read())
-                percent = stat['result']['percentComplete']
-            except:
-                logging.warning(" Recovered from HTTP error.")
-                continue
-            finally:
-                tries += 1
-        if tries >= 20:
-            logging.error("  Survey %s timed out." % surveyID)
-            return None
-
-        dataURL = stat['result']['fileUrl']
-        remote = urllib2.urlopen(dataURL).read()
-        dataZip = sio.StringIO(remote)
-        archive = z.ZipFile(dataZip, 'r')
-        dataFile = archive.namelist()[0]
-        data = json.loads(archive.read(dataFile), object_pairs_hook=OrderedDict)
-
-        if not data['responses']:
-            return None
-        else:
-            return data
-
-
 ## Helper methods for interfacing with DB
 
     def __assignCDN(self, survey, surveyID):
@@ -280,17 +250,53 @@ class QualtricsExtractor(MySQLDB):
         '''
         return self.query("SELECT responses_actual FROM survey_meta WHERE SurveyID='%s'" % svID).next()[0]
 
-    def __getAnonUserID(self, uid):
-        '''
-        Given a userID from Qualtrics, returns translated anon user ID from platform data.
+    def resolveAnonUserIDs(self, extIds):
+        '''
+        Given userIDs from Qualtrics, returns a dict mapping each to its
+        translated anon user ID from platform data, with the same results
+        as edxprod.idExt2Anon(): None for IDs that are not 32 chars long,
+        or that are unknown. IDs are looked up ANON_ID_BATCH_SIZE at a
+        time. IDs of a batch whose query fails map to 'ERROR'.
+
+        The server compares lti_id case-insensitively, so a returned
+        lti_id may differ in case from the requested ID(s) it matched.
+        Results are therefore assigned to the requested IDs by their
+        lower-cased value.
+        '''
+        anonIds = dict.fromkeys(extIds)
+        ltiIds = sorted([extId for extId in anonIds.keys() if len(extId) == 32])
+        batchSize = QualtricsExtractor.ANON_ID_BATCH_SIZE
+        for start in range(0, len(ltiIds), batchSize):
+            batch = ltiIds[start:start + batchSize]
+            # Lower-cased ID --> requested IDs that match it:
+            requestedIds = {}
+            for ltiId in batch:
+                requestedIds.setdefault(ltiId.lower(), []).append(ltiId)
+            q = "SELECT lti_id, anon_screen_name FROM %s WHERE lti_id IN (%s)" % \
+                (QualtricsExtractor.LTI_TO_ANON_TABLE, ','.join(["'%s'" % ltiId.replace("'", "''") for ltiId in batch]))
+            try:
+                for (ltiId, anonId) in self.query(q):
+                    for requestedId in requestedIds.get(ltiId.lower(), []):
+                        # Like the LIMIT 1 in idExt2Anon(), first match wins:
+                        if anonIds[requestedId] is None:
+                            anonIds[requestedId] = anonId
+            except Exception as e:
+                logging.error("  Anon ID lookup failed: %s" % e)
+                for ltiId in batch:
+                    anonIds[ltiId] = 'ERROR'
+        return anonIds
+
+    def lookupCountry(self, ipStr):
+        '''
+        Given an IP address, returns its three-letter country code.
+        Each distinct address is looked up only once.
         '''
-        q = "SELECT edxprod.idExt2Anon('%s')" % uid
-        auid = ''
         try:
-            auid = self.query(q).next()[0]
-        except:
-            auid = 'ERROR'
-        return auid
+            return self.countries[ipStr]
+        except KeyError:
+            country = self.lookup.lookupIP(ipStr)[1]
+            self.countries[ipStr] = country
+            return country
 
 
 ## Transform methods
@@ -374,42 +380,23 @@ class QualtricsExtractor(MySQLDB):
 
         return masterQ, masterC
 
-    def __parseResponses(self, svID):
+    def __parseResponses(self, svID, rsBatch):
         '''
-        Given a survey ID, parses responses from Qualtrics and returns:
-        1. A list of dicts containing response metadata
-        2. A list of dicts containing question responses
-        Method expects a JSON formatted object with raw survey data.
+        Given a survey ID and a batch of the survey's responses as
+        exported from Qualtrics, returns:
+        1. A list of dicts containing question responses
+        2. A list of dicts containing response metadata
+        Method expects a list of JSON formatted objects with raw response data.
         '''
-        # Get responses from Qualtrics-- try multiple times to ensure API request goes through
-        rsRaw = None
-        for _ in range(0, 10):
-            try:
-                rsRaw = self.__getResponses(svID)
-                break
-            except urllib2.HTTPError as e:
-                logging.error("  Survey %s gave error '%s'." % (svID, e))
-                if e.getcode() == '400':
-                    continue
-                else:
-                    return None, None
-
-        # Return if API gave us no data
-        if rsRaw is None:
-            logging.info("  Survey %s gave no responses." % svID)
-            return None, None
-
-        # Get total expected responses
-        rq = 'SELECT `responses` FROM survey_meta WHERE SurveyID = "%s"' % svID
-        rnum = self.query(rq).next() #@UnusedVariable
-
-        logging.info(" Parsing %s responses from survey %s..." % (len(rsRaw['responses']), svID))
+        # Resolve all external IDs of the batch at once:
+        anonIds = self.resolveAnonUserIDs([rs['a'] for rs in rsBatch
+                                           if len(rs.get('uid', 'NULL')) < 40 and len(rs.get('a', 'NULL')) >= 32])
 
         responses = []
         respMeta = []
         rsID = None
 
-        for rs in rsRaw['responses']:
+        for rs in rsBatch:
             rsID = rs.pop('ResponseID', 'NULL')
             # Get response metadata for each response
             # Method destructively reads question fields
@@ -430,11 +417,11 @@ class QualtricsExtractor(MySQLDB):
             if(len(rm['UID']) >= 40):
                 rm['anon_screen_name'] = rm['UID']
             elif (len(rm['a']) >= 32):
-                rm['anon_screen_name'] = self.__getAnonUserID(rm['a'])
+                rm['anon_screen_name'] = anonIds[rm['a']]
             if (len(rm['IPAddress']) in range(8, 16)):
-                rm['Country'] = self.lookup.lookupIP(rm['IPAddress'])[1]
+                rm['Country'] = self.lookupCountry(rm['IPAddress'])
             elif (len(rm['UID']) in range(8, 16)):
-                rm['Country'] = self.lookup.lookupIP(rm['UID'])[1]
+                rm['Country'] = self.lookupCountry(rm['UID'])
             rm['advance'] = rs.pop('advance', 'NULL')
             rm['Finished'] = rs.pop('Finished', 'NULL')
             rm['Status'] = rs.pop('Status', 'NULL')
@@ -474,14 +461,17 @@ class QualtricsExtractor(MySQLDB):
         represented as a list of dicts mapping column names to values.
         '''
         try:
-            columns = tuple(data[5].keys())
+            # Rows may lack some columns, such as Country:
+            columns = []
+            for row in data:
+                columns.extend([colName for colName in row.keys() if colName not in columns])
             table = []
             # logging.info("     " + ", ".join(columns))
             for row in data:
-                vals = tuple(row.values())
+                vals = tuple([row.get(colName) for colName in columns])
                 # logging.info("     " + ", ".join(vals))
                 table.append(vals)
-            self.bulkInsert(tableName, columns, table)
+            self.bulkInsert(tableName, tuple(columns), table)
         except Exception as e:
             logging.error("  Insert query failed: %s" % e)
 
@@ -594,21 +584,57 @@ class QualtricsExtractor(MySQLDB):
         Client method extracts and transforms response data and response metadata
         and loads to MySQL database using MySQLDB class methods. User can specify
         where to start in the list of surveyIDs.
+
+        Survey IDs are collected first, then all exports run in
+        the exporter's thread pool, and surveys are loaded in
+        the order in which their exports complete.
         '''
-        sids = self.__genSurveyIDs()
-        for idx, svID in enumerate(sids):
+        sids = []
+        for idx, svID in enumerate(self.__genSurveyIDs()):
             if idx < startAfter:
                 logging.info("  Skipped surveyID %s" % svID)
                 continue  # skip first n surveys
-            responses, respMeta = self.__parseResponses(svID)
-            retrieved = len(respMeta) if respMeta is not None else 0
-            logging.info(" Inserting %d responses on survey %s to database." % (retrieved, svID))
+            sids.append(svID)
+        # Exports run concurrently; each finished one is
+        # parsed and loaded here, on the DB connection's thread:
+        for svID, exportFile in self.exporter.exportAll(sids):
+            retrieved = 0
+            if exportFile is not None:
+                try:
+                    retrieved = self.__loadResponses(svID, exportFile)
+                finally:
+                    exportFile.close()
+            if retrieved == 0:
+                logging.info("  Survey %s gave no responses." % svID)
             self.execute("UPDATE survey_meta SET responses_actual='%d' WHERE SurveyID='%s'" % (retrieved, svID))
-            if (responses is None) or (respMeta is None):
-                continue
-            self.__loadDB(responses, 'response')
-            self.__loadDB(respMeta, 'response_metadata')
 
+    def __loadResponses(self, svID, exportFile):
+        '''
+        Stream-parses the responses in the given export file, and loads
+        them and their metadata RESPONSE_BATCH_SIZE responses at a time.
+        Returns the number of responses loaded. If the export turns
+        out to be corrupt, the batches before the error stay loaded.
+        '''
+        retrieved = 0
+        rsBatch = []
+        try:
+            for rs in QualtricsResponseExporter.iterResponses(exportFile):
+                rsBatch.append(rs)
+                if len(rsBatch) >= QualtricsExtractor.RESPONSE_BATCH_SIZE:
+                    retrieved += self.__loadResponseBatch(svID, rsBatch)
+                    rsBatch = []
+        except ValueError as e:
+            logging.error("  Survey %s gave error '%s'." % (svID, e))
+        if rsBatch:
+            retrieved += self.__loadResponseBatch(svID, rsBatch)
+        return retrieved
+
+    def __loadResponseBatch(self, svID, rsBatch):
+        responses, respMeta = self.__parseResponses(svID, rsBatch)
+        logging.info(" Inserting %d responses on survey %s to database." % (len(respMeta), svID))
+        self.__loadDB(responses, 'response')
+        self.__loadDB(respMeta, 'response_metadata')
+        return len(respMeta)
 
 
 if __name__ == '__main__':
@@ -14,6 +14,7 @@ Created on Jul 2, 2014
 @author: paepcke
 '''
 import StringIO
+import json
 import os
 import re
 import shutil
@@ -21,6 +22,7 @@ import tempfile
 import unittest
 
 from json_to_relation.modulestoreImporter import ModulestoreImporter
+from json_to_relation.hash_lookup_store import HashLookupStore
 
 
 TEST_ALL = True
@@ -52,8 +54,8 @@ class TestModulestoreImporter(unittest.TestCase):
         testModStoreLatest  = os.path.join(currDir, 'data', 'mini_modulestore_latest.json')
         shutil.copy(testModStoreLatest, TestModulestoreImporter.currModStoreLatest)
         
-        # The hashLookup.pkl, if it exists, is moved to a save-copy:
-        TestModulestoreImporter.hashLookupPicklePath = os.path.join(TestModulestoreImporter.dataDir, 'hashLookup.pkl')
+        # The hashLookup.store, if it exists, is moved to a save-copy:
+        TestModulestoreImporter.hashLookupPicklePath = os.path.join(TestModulestoreImporter.dataDir, 'hashLookup.store')
         TestModulestoreImporter.savedHashLookupPicklePath = TestModulestoreImporter.hashLookupPicklePath + '.SAVED'
         if (os.path.exists(TestModulestoreImporter.hashLookupPicklePath)):
             shutil.move(TestModulestoreImporter.hashLookupPicklePath, TestModulestoreImporter.savedHashLookupPicklePath) 
@@ -70,7 +72,7 @@ class TestModulestoreImporter(unittest.TestCase):
         except IOError:
             print('NOTE: no modulestore_latest.json found in <projRoot>/json_to_relation/data; run scripts/cronRefreshModuleStore.sh.')
         
-        # If hashLookup.pkl existed at the the outset, and was saved,
+        # If hashLookup.store existed at the the outset, and was saved,
         # restore it:
         try:
             shutil.move(TestModulestoreImporter.savedHashLookupPicklePath, TestModulestoreImporter.hashLookupPicklePath)
@@ -87,7 +89,7 @@ class TestModulestoreImporter(unittest.TestCase):
     def setUp(self):
         jsonFileName = os.path.join(TestModulestoreImporter.dataDir, 'modulestore_latest.json')
         self.importer = ModulestoreImporter(jsonFileName)
-        self.pickleCachePath = os.path.join(TestModulestoreImporter.dataDir, 'tmpTestHashLookup.pkl')
+        self.pickleCachePath = os.path.join(TestModulestoreImporter.dataDir, 'tmpTestHashLookup.store')
         self.uuidRegex = '[a-f0-9]{8}_[a-f0-9]{4}_[a-f0-9]{4}_[a-f0-9]{4}_[a-f0-9]{12}'
         self.pattern   = re.compile(self.uuidRegex)
         self.timestampRegex = r'[1-2][0-9]{3}-[0-1][1-9]-[0-3][0-9]T[0-2][0-9]:[0-6][0-9]:[0-6][0-9]\.[0-9]{0,6}Z{0,1}'
@@ -99,11 +101,12 @@ class TestModulestoreImporter(unittest.TestCase):
         
     def tearDown(self):
         # Some of the tests create a temporary
-        # pickle file; remove it:
-        try:
-            os.remove(TestModulestoreImporter.hashLookupPicklePath)
-        except:
-            pass
+        # store file and its index; remove them:
+        for path in [TestModulestoreImporter.hashLookupPicklePath, TestModulestoreImporter.hashLookupPicklePath + '.index']:
+            try:
+                os.remove(path)
+            except:
+                pass
 
     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
     def testModuleStoreImporter(self):
@@ -122,6 +125,85 @@ class TestModulestoreImporter(unittest.TestCase):
         # Check whether dict ops still work:
         self.useTheDict()
         
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
+    def testLookupFromStore(self):
+        # setUp() created the store from the JSON file;
+        # a fresh instance must memory-map it:
+        ModulestoreImporter.hashLookupCache = None
+        jsonFileName = os.path.join(TestModulestoreImporter.dataDir, 'modulestore_latest.json')
+        self.importer = ModulestoreImporter(jsonFileName, useCache=True)
+        self.assertIsInstance(self.importer.hashLookup, HashLookupStore)
+        self.useTheDict()
+        self.assertIsNone(self.importer.getDisplayName('00000000000000000000000000000000'))
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")    
+    def testStreamingJSONLayouts(self):
+        # The mini modulestore as {"all" : [...]}, and as one
+        # entry per line; both must yield the same lookup:
+        with open(os.path.join(TestModulestoreImporter.dataDir, 'modulestore_latest.json'), 'r') as fd:
+            entries = json.load(fd)
+        tmpDir = tempfile.mkdtemp()
+        try:
+            for (layoutName, jsonText) in [('all', json.dumps({'all' : entries})),
+                                           ('lines', '# Extracted for testing\n' + '\n'.join([json.dumps(entry) for entry in entries]))]:
+                jsonFileName = os.path.join(tmpDir, layoutName + '.json')
+                with open(jsonFileName, 'w') as fd:
+                    fd.write(jsonText)
+                self.importer = ModulestoreImporter(jsonFileName, useCache=False, pickleCachePath=os.path.join(tmpDir, layoutName + '.store'))
+                self.useTheDict()
+            # Truncated JSON:
+            with open(jsonFileName, 'w') as fd:
+                fd.write(json.dumps(entries)[:-20])
+            self.assertRaises(ValueError, ModulestoreImporter, jsonFileName, useCache=False, pickleCachePath=os.path.join(tmpDir, 'bad.store'))
+        finally:
+            shutil.rmtree(tmpDir)
+
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testRefreshCache(self):
+        with open(os.path.join(TestModulestoreImporter.dataDir, 'modulestore_latest.json'), 'r') as fd:
+            entries = json.load(fd)
+        tmpDir = tempfile.mkdtemp()
+        try:
+            jsonFileName = os.path.join(tmpDir, 'modulestore.json')
+            storePath = os.path.join(tmpDir, 'hashLookup.store')
+            with open(jsonFileName, 'w') as fd:
+                json.dump(entries, fd)
+            numLookupEntries = len(ModulestoreImporter(jsonFileName, useCache=False, pickleCachePath=storePath).hashLookup)
+            self.assertTrue(os.path.exists(storePath + '.index'))
+
+            # Nothing changed:
+            self.importer = ModulestoreImporter(jsonFileName, pickleCachePath=storePath)
+            self.assertEqual([], self.importer.refreshCache())
+
+            # Add a course:
+            entries.append({'_id' : {'tag' : 'i4x', 'org' : 'Law', 'course' : 'LAW101', 'category' : 'course', 'name' : 'Fall2014', 'revision' : None},
+                            'metadata' : {'display_name' : 'Torts'}})
+            entries.append({'_id' : {'tag' : 'i4x', 'org' : 'Law', 'course' : 'LAW101', 'category' : 'video', 'name' : 'a' * 32, 'revision' : None},
+                            'metadata' : {'display_name' : 'Negligence'}})
+            with open(jsonFileName, 'w') as fd:
+                json.dump(entries, fd)
+            self.assertEqual(['LAW101'], self.importer.refreshCache())
+            self.assertEqual('Negligence', self.importer.getDisplayName('a' * 32))
+            self.assertEqual('Law/LAW101/Fall2014', self.importer['LAW101'])
+            self.useTheDict()
+
+            # A new instance gets the course name index from the index file:
+            ModulestoreImporter.hashLookupCache = None
+            self.importer = ModulestoreImporter(jsonFileName, pickleCachePath=storePath)
+            self.assertEqual('Law/LAW101/Fall2014', self.importer['LAW101'])
+            self.assertEqual(numLookupEntries + 2, len(self.importer.hashLookup))
+
+            # Remove it again:
+            with open(jsonFileName, 'w') as fd:
+                json.dump(entries[:-2], fd)
+            self.assertEqual(['LAW101'], self.importer.refreshCache())
+            self.assertIsNone(self.importer.getDisplayName('a' * 32))
+            self.assertRaises(KeyError, self.importer.__getitem__, 'LAW101')
+            self.useTheDict()
+        finally:
+            ModulestoreImporter.hashLookupCache = None
+            shutil.rmtree(tmpDir)
+
     def useTheDict(self):
         self.assertEqual('Module One video', self.importer.getDisplayName('c89417444f4443f9a34039be3054962e'))
         self.assertEqual('Medicine', self.importer.getOrg('c89417444f4443f9a34039be3054962e'))
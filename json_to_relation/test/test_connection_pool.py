@@ -0,0 +1,106 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from json_to_relation.connection_pool import ConnectionPool
+from json_to_relation.mysqldb import MySQLDB
+
+
+class FakeCursor(object):
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetchSizes = []
+
+    def execute(self, queryStr):
+        pass
+
+    def fetchmany(self, size):
+        self.fetchSizes.append(size)
+        batch = self.rows[:size]
+        self.rows = self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+class FakeConnection(object):
+
+    def __init__(self, **connArgs):
+        self.connArgs = connArgs
+        self.closed = False
+        self.alive = True
+        self.rows = []
+        self.cursorClasses = []
+
+    def ping(self):
+        if not self.alive:
+            raise IOError('Connection gone')
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self, cursorClass=None):
+        self.cursorClasses.append(cursorClass)
+        self.lastCursor = FakeCursor(self.rows)
+        return self.lastCursor
+
+class TestConnectionPool(unittest.TestCase):
+
+    def tearDown(self):
+        ConnectionPool.closeAll()
+
+    def testReuse(self):
+        conn1 = ConnectionPool.acquire(FakeConnection, host='h', db='Edx')
+        ConnectionPool.release(conn1)
+        self.assertEqual(1, ConnectionPool.numIdle())
+        conn2 = ConnectionPool.acquire(FakeConnection, host='h', db='Edx')
+        self.assertIs(conn1, conn2)
+        # Different connect args must not share the connection:
+        conn3 = ConnectionPool.acquire(FakeConnection, host='h', db='unittest')
+        self.assertIsNot(conn2, conn3)
+        self.assertEqual(0, ConnectionPool.numIdle())
+
+    def testDeadConnectionDiscarded(self):
+        conn1 = ConnectionPool.acquire(FakeConnection, host='h', db='Edx')
+        ConnectionPool.release(conn1)
+        conn1.alive = False
+        conn2 = ConnectionPool.acquire(FakeConnection, host='h', db='Edx')
+        self.assertIsNot(conn1, conn2)
+        self.assertTrue(conn1.closed)
+
+    def testIdleLimit(self):
+        conns = [ConnectionPool.acquire(FakeConnection, db='Edx') for _ in range(ConnectionPool.MAX_IDLE_PER_KEY + 1)]
+        for conn in conns:
+            ConnectionPool.release(conn)
+        self.assertEqual(ConnectionPool.MAX_IDLE_PER_KEY, ConnectionPool.numIdle())
+        self.assertTrue(conns[-1].closed)
+
+    def testQueryBatches(self):
+        mysqlDb = MySQLDB(None,None,None,None,None)
+        mysqlDb.cursors = []
+        mysqlDb.connection = FakeConnection()
+        mysqlDb.connection.rows = [(i,) for i in range(5)]
+        batches = list(mysqlDb.queryBatches('SELECT foo FROM bar', batchSize=2))
+        self.assertEqual([[(0,),(1,)], [(2,),(3,)], [(4,)]], batches)
+        self.assertIsNotNone(mysqlDb.connection.cursorClasses[-1])
+
+        mysqlDb.connection.rows = [(i,) for i in range(5)]
+        self.assertEqual([(i,) for i in range(5)], list(mysqlDb.query('SELECT foo FROM bar', batchSize=3)))
+        # Plain query() stays on the default, buffered cursor:
+        self.assertIsNone(mysqlDb.connection.cursorClasses[-1])
+        self.assertEqual([3,3,3], mysqlDb.connection.lastCursor.fetchSizes)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1856,6 +1856,28 @@ class TestEdxTrackLogJSONParser(unittest.TestCase):
         else:
             self.assertFileContentEquals(truthFile, dest.name)
 
+    @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
+    def testMainTableKeyWithPartitions(self):
+        fileConverter = JSONToRelation(self.stringSource,
+                                       OutputFile(os.devnull, OutputDisposition.OutputFormat.CSV),
+                                       mainTableName='EdxTrackEvent'
+                                       )
+        schema = OrderedDict([('_id', ColumnSpec('_id', ColDataType.UUID, fileConverter)),
+                              ('quarter', ColumnSpec('quarter', ColDataType.TINYTEXT, fileConverter))])
+        for partitionByQuarter in [False, True]:
+            edxParser = EdXTrackLogJSONParser(fileConverter, 'EdxTrackEvent', dbName='Edx', useDisplayNameCache=True,
+                                              partitionByQuarter=partitionByQuarter)
+            createStatement = edxParser.genOneCreateStatement('EdxTrackEvent', schema, primaryKeyName='_id',
+                                                              partitionClause=edxParser.genQuarterPartitionClause(),
+                                                              partitionColInKey=partitionByQuarter)
+            self.assertIn('PARTITION BY LIST COLUMNS(quarter)', createStatement)
+            if partitionByQuarter:
+                self.assertIn('PRIMARY KEY(_id,quarter)', createStatement)
+                self.assertNotIn('NOT NULL PRIMARY KEY', createStatement)
+            else:
+                self.assertIn('_id VARCHAR(40) NOT NULL PRIMARY KEY,', createStatement)
+                self.assertNotIn('PRIMARY KEY(_id,quarter)', createStatement)
+
 #     @unittest.skipIf(not TEST_ALL, "Temporarily disabled")
 #     def testInstructorEventsOnlyCommonFields(self):
 #  
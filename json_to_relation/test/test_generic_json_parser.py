@@ -0,0 +1,80 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from collections import OrderedDict
+import tempfile
+import unittest
+
+from json_to_relation.generic_json_parser import GenericJSONParser
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import OutputPipe, OutputDisposition
+
+
+# Objects whose labels exercise nested maps, arrays of scalars,
+# maps, and arrays, 'item' keys, empty keys, duplicate keys,
+# labels that need quoting, and all scalar types:
+JSON_OBJECTS = ['{"a": 1.10, "b": 1e5, "c": -0, "d": 12345678901234567890, "e": "\\u00e9x"}',
+                '{"f": [1, {"g": null}, [true, {"h": "x"}]], "": {"": 2}}',
+                '[1, {"a": 2}, [3]]',
+                '"just a string"',
+                '{"employees": [{"name": "Mary", "item": {"x": 1}}, {"name": "Jon"}], "has space": false, "q\\"x": 1}',
+                '{"a": 1, "a": 2}',
+                '{"a": {"item": {"b": [[{"c": 3}], {"d": 4}]}}}'
+                ]
+
+class TestGenericJSONParser(unittest.TestCase):
+
+    def setUp(self):
+        self.logFile = tempfile.NamedTemporaryFile()
+
+    def tearDown(self):
+        self.logFile.close()
+
+    def makeParser(self):
+        converter = JSONToRelation(InString(JSON_OBJECTS[0]),
+                                   OutputPipe(OutputDisposition.OutputFormat.CSV),
+                                   logFile=self.logFile.name)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        parser = GenericJSONParser(converter)
+        parser.colNamesByTable[converter.mainTableName] = []
+        parser.unittesting = True
+        return parser
+
+    def schemaOf(self, parser):
+        converter = parser.jsonToRelationConverter
+        return [(colSpec.getName(), colSpec.getType(), colSpec.colPos) for colSpec in converter.destination.getSchema(converter.mainTableName)]
+
+    def testFastPathMatchesEvents(self):
+        fastParser = self.makeParser()
+        eventParser = self.makeParser()
+        for jsonStr in JSON_OBJECTS:
+            fastRow = fastParser.processOneJSONObject(jsonStr, [])
+            eventRow = eventParser.processJSONEvents(jsonStr, [])
+            eventParser.getReadyForNextRow()
+            self.assertEqual(eventRow, fastRow, "Rows differ for %s" % jsonStr)
+        self.assertEqual(self.schemaOf(eventParser), self.schemaOf(fastParser))
+        colNames = [colName for (colName, colType, colPos) in self.schemaOf(fastParser)]  #@UnusedVariable
+        self.assertEqual(['a', 'b', 'c', 'd', 'e', '"f.item_-1"', '"f.g_0"', '"f.item.h_0"', '"."'], colNames[:9])
+        self.assertIn('"employees.item.x_1"', colNames)
+
+    def testIllFormedJSON(self):
+        parser = self.makeParser()
+        # Not decodable in one go; ijson fills the row
+        # up to the point of error:
+        row = []
+        self.assertRaises(Exception, parser.processOneJSONObject, '{"a": "foo", "b": [1, 2', row)
+        self.assertEqual('foo', row[0])
+        # NaN is not JSON, and stays rejected:
+        self.assertRaises(Exception, parser.processOneJSONObject, '{"c": NaN}', [])
+
+if __name__ == "__main__":
+    unittest.main()
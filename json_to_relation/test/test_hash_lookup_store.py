@@ -0,0 +1,64 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from json_to_relation.hash_lookup_store import HashLookupStore
+
+
+class TestHashLookupStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.storePath = os.path.join(self.tmpDir, 'hashLookup.store')
+        self.hashLookup = {}
+        for i in range(100):
+            key = u'%032x' % (i * 7919)
+            self.hashLookup[key] = {'org' : u'Medicine',
+                                    'course_short_name' : u'HRP%s' % i,
+                                    'category' : u'video',
+                                    'revision' : None,
+                                    'name' : key,
+                                    'display_name' : u'Vid\xe9o %s' % i}
+        self.hashLookup[u'HRP258'] = {'org' : u'Medicine', 'course_short_name' : u'HRP258', 'category' : u'course',
+                                      'revision' : u'draft', 'name' : u'Statistics_in_Medicine', 'display_name' : u''}
+        HashLookupStore.write(self.storePath, self.hashLookup)
+        self.store = HashLookupStore(self.storePath)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpDir)
+
+    def testLookups(self):
+        self.assertEqual(len(self.hashLookup), len(self.store))
+        for (key, infoDict) in self.hashLookup.items():
+            self.assertEqual(infoDict, self.store[key])
+            self.assertIn(key, self.store)
+        # Plain str keys find unicode entries:
+        self.assertEqual(u'Vid\xe9o 3', self.store.get('%032x' % (3 * 7919))['display_name'])
+        self.assertIsNone(self.store.get('ffffffffffffffffffffffffffffffff'))
+        self.assertNotIn('ffffffffffffffffffffffffffffffff', self.store)
+        self.assertRaises(KeyError, self.store.__getitem__, 'HRP259')
+
+    def testIteration(self):
+        self.assertEqual(sorted(self.hashLookup.keys()), self.store.keys())
+        self.assertEqual(self.hashLookup, dict(self.store.iteritems()))
+
+    def testBadFile(self):
+        with open(self.storePath, 'wb') as fd:
+            fd.write('(dp0\nS\'foo\'\n')
+        self.assertRaises(ValueError, HashLookupStore, self.storePath)
+
+if __name__ == "__main__":
+    unittest.main()
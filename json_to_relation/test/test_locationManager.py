@@ -0,0 +1,84 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Created on Oct 18, 2026
+
+Tests the one-pass country phrase matching of LocationManager
+against the n-gram loop it replaced.
+'''
+import glob
+import json
+import os
+import re
+import unittest
+
+from json_to_relation.locationManager import LocationManager
+
+
+class TestLocationManager(unittest.TestCase):
+
+    def setUp(self):
+        self.countryChecker = LocationManager()
+
+    def findCountryByNgrams(self, mailAddr):
+        '''
+        Country lookup as done before the phrase trie: for every word
+        try the four-, three-, two-, and one-word phrase starting there.
+        '''
+        words = re.split(r'\W+', mailAddr)
+        for wordIndx in range(len(words)):
+            for numWords in range(4, 0, -1):
+                if wordIndx + numWords > len(words):
+                    continue
+                country = self.countryChecker.isCountry(' '.join(words[wordIndx:wordIndx + numWords]))
+                if len(country) > 0:
+                    return country
+        return ''
+
+    def fixtureMailAddrs(self):
+        mailAddrs = []
+        dataDir = os.path.join(os.path.dirname(__file__), 'data')
+        for fileName in glob.glob(os.path.join(dataDir, 'createAccount*.json')):
+            with open(fileName, 'r') as fd:
+                for line in fd:
+                    if len(line.strip()) == 0:
+                        continue
+                    post = json.loads(json.loads(line)['event'])['POST']
+                    mailAddrs.extend(post.get('mailing_address', []))
+        return mailAddrs
+
+    def testFixtureAddresses(self):
+        mailAddrs = self.fixtureMailAddrs()
+        self.assertTrue(len(mailAddrs) > 0)
+        for mailAddr in mailAddrs:
+            self.assertEqual(self.findCountryByNgrams(mailAddr), self.countryChecker.findCountryInAddress(mailAddr))
+
+    def testLongestPhraseFirst(self):
+        for (mailAddr, country) in [('Live St 21453, Washington D.C., 93508, US', 'USA'),
+                                    ('12 Main St, Anytown, United States of America', 'USA'),
+                                    ('PO Box 4, Dubai, United Arab Emirates', 'United Arab Emirates'),
+                                    ('1 Rue Royale, Guinea', 'Guinea'),
+                                    ('Papua New Guinea', 'Papua New Guinea'),
+                                    ('Trinidad and Tobago', 'Trinidad'),
+                                    ('3 South Street, South Africa', 'South Africa'),
+                                    ('equatorial guinea', 'Guinea'),
+                                    ('south africa', ''),
+                                    ('  Gabon  ', 'Gabon'),
+                                    ('senegal', 'Senegal'),
+                                    ('SENEGAL', ''),
+                                    ('Guinea-Bissau', 'Guinea'),
+                                    ('United Arab', ''),
+                                    ('', '')]:
+            self.assertEqual(self.findCountryByNgrams(mailAddr), country)
+            self.assertEqual(self.countryChecker.findCountryInAddress(mailAddr), country)
+
+if __name__ == "__main__":
+    unittest.main()
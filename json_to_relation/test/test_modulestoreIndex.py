@@ -0,0 +1,100 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from json_to_relation.modulestoreIndex import ModulestoreIndex
+
+
+class FakeCollection(object):
+    '''
+    Stands in for a pymongo collection. Understands the
+    equality and '$in' queries that ModulestoreIndex issues,
+    ignores projections, and counts find() calls.
+    '''
+    def __init__(self, docs):
+        self.docs = docs
+        self.numFinds = 0
+
+    def find(self, query, projection=None):
+        self.numFinds += 1
+        return [doc for doc in self.docs if all([self.matches(doc, path, cond) for (path, cond) in query.items()])]
+
+    def matches(self, doc, path, cond):
+        value = doc
+        for key in path.split('.'):
+            value = value.get(key, None) if isinstance(value, dict) else None
+        values = value if isinstance(value, list) else [value]
+        wanted = cond['$in'] if isinstance(cond, dict) else [cond]
+        return any([oneValue in wanted for oneValue in values])
+
+class FakeModulestore(object):
+    def __init__(self, modulestore, definitions=None):
+        self.modulestore = modulestore
+        self.definitions = definitions
+
+    def __getitem__(self, collectionName):
+        return self.definitions
+
+def module(category, name, children=None, metadata=None):
+    return {'_id' : {'tag' : 'i4x', 'org' : 'Medicine', 'course' : 'HRP258', 'category' : category, 'name' : name},
+            'definition' : {'children' : [ModulestoreIndex.resourceURI(child) for child in (children or [])]},
+            'metadata' : metadata or {}}
+
+class TestModulestoreIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.problems = [module('problem', 'p%d' % i) for i in range(3)]
+        self.verticals = [module('vertical', 'v0', self.problems[:2], {'visible_to_staff_only' : True}),
+                          module('vertical', 'v1', self.problems[2:])]
+        self.sequential = module('sequential', 's0', self.verticals)
+        self.chapter = module('chapter', 'c0', [self.sequential])
+        self.course = module('course', 'Fall2014', [self.chapter])
+        self.collection = FakeCollection(self.problems + self.verticals + [self.sequential, self.chapter, self.course])
+        self.index = ModulestoreIndex(FakeModulestore(self.collection))
+
+    def testPrefetchOld(self):
+        self.index.prefetchOld(self.problems)
+        numFinds = self.collection.numFinds
+        # Course name, one query per parent level, staff-only:
+        self.assertEqual(1 + ModulestoreIndex.NUM_PARENT_LEVELS + 1, numFinds)
+
+        self.assertEqual('Fall2014', self.index.courseName('Medicine', 'HRP258'))
+        (verticalURI, problemIdx) = self.index.locateModuleInParent(ModulestoreIndex.resourceURI(self.problems[2]))
+        self.assertEqual((ModulestoreIndex.resourceURI(self.verticals[1]), 1), (verticalURI, problemIdx))
+        self.assertEqual((ModulestoreIndex.resourceURI(self.sequential), 2), self.index.locateModuleInParent(verticalURI))
+        self.assertEqual((ModulestoreIndex.resourceURI(self.course), 1),
+                         self.index.locateModuleInParent(ModulestoreIndex.resourceURI(self.chapter)))
+        self.assertEqual(ModulestoreIndex.NO_PARENT, self.index.locateModuleInParent(None))
+        self.assertTrue(self.index.isStaffOnly('v0'))
+        self.assertFalse(self.index.isStaffOnly('v1'))
+        # All answered from the index:
+        self.assertEqual(numFinds, self.collection.numFinds)
+        self.assertEqual(ModulestoreIndex.NO_PARENT, self.index.locateModuleInParent(ModulestoreIndex.resourceURI(self.course)))
+
+    def testLookupWithoutPrefetch(self):
+        self.assertIsNone(self.index.courseName('Medicine', 'NoSuchCourse'))
+        self.assertFalse(self.index.isStaffOnly('noSuchVertical'))
+        self.assertEqual((ModulestoreIndex.resourceURI(self.verticals[0]), 2),
+                         self.index.locateModuleInParent(ModulestoreIndex.resourceURI(self.problems[1])))
+
+    def testFetchDefinitions(self):
+        definitions = FakeCollection([{'_id' : defId, 'fields' : {'data' : '<problem/>'}} for defId in range(5)])
+        self.index = ModulestoreIndex(FakeModulestore(self.collection, definitions))
+        ModulestoreIndex.IN_BATCH_SIZE = 2
+        try:
+            fetched = self.index.fetchDefinitions([0, 1, 2, 2, 4, 17], {'fields.data' : 1})
+        finally:
+            ModulestoreIndex.IN_BATCH_SIZE = 1000
+        self.assertEqual([0, 1, 2, 4], sorted(fetched.keys()))
+        self.assertEqual(3, definitions.numFinds)
+
+if __name__ == "__main__":
+    unittest.main()
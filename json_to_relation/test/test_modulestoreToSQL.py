@@ -0,0 +1,201 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import csv
+import logging
+from multiprocessing.pool import ThreadPool
+import re
+import unittest
+
+import MySQLdb
+
+from json_to_relation.modulestoreIndex import ModulestoreIndex
+from json_to_relation.modulestoreToSQL import ModulestoreExtractor
+
+
+class FakeCursor(list):
+    '''
+    Stands in for a pymongo cursor.
+    '''
+    def batch_size(self, batchSize):
+        return self
+
+    def next(self):
+        if len(self) == 0:
+            raise StopIteration()
+        return self[0]
+
+class FakeCollection(object):
+    '''
+    Stands in for a pymongo collection. Understands equality
+    and '$in' queries, also on fields of array elements.
+    '''
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([doc for doc in self.docs if all([self.matches(doc, path, cond) for (path, cond) in (query or {}).items()])])
+
+    def matches(self, doc, path, cond):
+        values = [doc]
+        for key in path.split('.'):
+            nextValues = []
+            for value in values:
+                value = value.get(key, None) if isinstance(value, dict) else None
+                nextValues.extend(value if isinstance(value, list) else [value])
+            values = nextValues
+        wanted = cond['$in'] if isinstance(cond, dict) else [cond]
+        return any([oneValue in wanted for oneValue in values])
+
+class FakeModulestore(object):
+    def __init__(self, modulestore, collections):
+        self.modulestore = modulestore
+        self.collections = collections
+
+    def __getitem__(self, collectionName):
+        return self.collections[collectionName]
+
+class SchemaCheckingCursor(object):
+    '''
+    Records the columns of the tables created through it, and
+    checks that every LOAD DATA or INSERT names existing columns
+    of its table, and that every row has one value per column.
+    Refuses LOAD DATA LOCAL if told to, which makes bulkInsert()
+    fall back to INSERT statements.
+    '''
+    def __init__(self, testCase, refuseLocalInfile):
+        self.testCase = testCase
+        self.refuseLocalInfile = refuseLocalInfile
+        self.tables = {}
+        self.loadedRows = {}
+
+    def execute(self, queryStr):
+        createMatch = re.search(r'CREATE TABLE IF NOT EXISTS `(\w+)` \((.*)\)', queryStr, re.DOTALL)
+        if createMatch is not None:
+            colLines = [line.strip() for line in createMatch.group(2).split('\n')]
+            self.tables[createMatch.group(1)] = [line.split('`')[1] for line in colLines if line.startswith('`')]
+            return
+        loadMatch = re.search(r"LOAD DATA LOCAL INFILE '(.*)'\s+INTO TABLE (\w+).*\((.*)\)$", queryStr, re.DOTALL)
+        if loadMatch is not None:
+            if self.refuseLocalInfile:
+                raise MySQLdb.OperationalError(1148, 'The used command is not allowed with this MySQL version')
+            with open(loadMatch.group(1), 'r') as fd:
+                rows = list(csv.reader(fd, delimiter=',', quotechar='"'))
+            self.checkRows(loadMatch.group(2), loadMatch.group(3).split(','), rows)
+
+    def executemany(self, queryStr, rows):
+        insertMatch = re.match(r'INSERT INTO (\w+) \((.*)\) VALUES', queryStr)
+        self.testCase.assertIsNotNone(insertMatch, queryStr)
+        self.checkRows(insertMatch.group(1), insertMatch.group(2).split(','), rows)
+
+    def checkRows(self, tableName, colNames, rows):
+        self.testCase.assertEqual([], [colName for colName in colNames if colName not in self.tables[tableName]])
+        for row in rows:
+            self.testCase.assertEqual(len(colNames), len(row), '%s: %s' % (tableName, row))
+            self.loadedRows.setdefault(tableName, []).append(dict(zip(colNames, row)))
+
+    def fetchone(self):
+        return (4194304,)
+
+    def fetchall(self):
+        return ()
+
+    def close(self):
+        pass
+
+class FakeConnection(object):
+
+    def __init__(self, cursor):
+        self.theCursor = cursor
+
+    def cursor(self):
+        return self.theCursor
+
+    def commit(self):
+        pass
+
+def module(category, name, children=None, metadata=None, definition=None):
+    theDefinition = {'children' : [ModulestoreIndex.resourceURI(child) for child in (children or [])]}
+    theDefinition.update(definition or {})
+    return {'_id' : {'tag' : 'i4x', 'org' : 'Medicine', 'course' : 'HRP258', 'category' : category, 'name' : name},
+            'definition' : theDefinition,
+            'metadata' : metadata or {}}
+
+class TestModulestoreTableLayouts(unittest.TestCase):
+
+    def setUp(self):
+        problem = module('problem', 'p0', metadata={'display_name' : 'Problem 0'}, definition={'data' : '<problem/>'})
+        video = module('video', 'v0', metadata={'display_name' : 'Video 0', 'youtube_id_1_0' : 'abc'})
+        vertical = module('vertical', 'vert0', [problem, video])
+        sequential = module('sequential', 's0', [vertical])
+        chapter = module('chapter', 'c0', [sequential])
+        course = module('course', 'Fall2014', [chapter],
+                        metadata={'display_name' : 'Statistics', 'start' : '2014-09-22T00:00:00Z', 'end' : '2014-12-12T00:00:00Z'},
+                        definition={'data' : {'grading_policy' : {'GRADER' : [], 'GRADE_CUTOFFS' : {'Pass' : 0.5}}}})
+        oldModulestore = FakeCollection([problem, video, vertical, sequential, chapter, course])
+
+        blocks = [{'block_type' : 'course', 'block_id' : 'course', 'definition' : 'courseDef',
+                   'fields' : {'display_name' : 'Split Statistics', 'start' : '2015-01-05T00:00:00Z', 'end' : '2015-03-20T00:00:00Z'}},
+                  {'block_type' : 'problem', 'block_id' : 'sp0', 'definition' : 'problemDef', 'fields' : {'display_name' : 'Split Problem'}},
+                  {'block_type' : 'video', 'block_id' : 'sv0', 'definition' : 'videoDef', 'fields' : {'display_name' : 'Split Video'}}]
+        collections = {'modulestore.active_versions' : FakeCollection([{'schema_version' : 1, 'org' : 'Medicine', 'course' : 'HRP259', 'run' : 'Winter2015',
+                                                                        'versions' : {'published-branch' : 'structure0'}}]),
+                       'modulestore.structures' : FakeCollection([{'_id' : 'structure0', 'blocks' : blocks}]),
+                       'modulestore.definitions' : FakeCollection([{'_id' : 'courseDef', 'fields' : {'grading_policy' : {'GRADER' : [], 'GRADE_CUTOFFS' : {}}}},
+                                                                   {'_id' : 'problemDef', 'fields' : {'data' : '<problem/>'}},
+                                                                   {'_id' : 'videoDef', 'fields' : {}}])}
+        self.msdb = FakeModulestore(oldModulestore, collections)
+
+    def makeExtractor(self, refuseLocalInfile):
+        # Bypass __init__(), which connects to Mongo and MySQL:
+        extractor = ModulestoreExtractor.__new__(ModulestoreExtractor)
+        extractor.setupLogging(logging.ERROR)
+        extractor.msdb = self.msdb
+        extractor.index = ModulestoreIndex(self.msdb)
+        extractor.loadQueue = None
+        extractor.coursePool = ThreadPool(1)
+        extractor._ModulestoreExtractor__copyFromArchive = lambda archiveTable, tableName: 0
+        extractor.connection = FakeConnection(SchemaCheckingCursor(self, refuseLocalInfile))
+        return extractor
+
+    def testAllTableLayoutsLoad(self):
+        for refuseLocalInfile in [False, True]:
+            extractor = self.makeExtractor(refuseLocalInfile)
+            try:
+                extractor._ModulestoreExtractor__buildEmptyEdxProblemTable()
+                extractor._ModulestoreExtractor__buildEmptyEdxVideoTable()
+                extractor._ModulestoreExtractor__buildEmptyCourseInfoTable()
+                for extract in [extractor._ModulestoreExtractor__extractOldEdxProblem,
+                                extractor._ModulestoreExtractor__extractSplitEdxProblem,
+                                extractor._ModulestoreExtractor__extractOldEdxVideo,
+                                extractor._ModulestoreExtractor__extractSplitEdxVideo,
+                                extractor._ModulestoreExtractor__extractOldCourseInfo,
+                                extractor._ModulestoreExtractor__extractSplitCourseInfo]:
+                    self.assertEqual(1, extract())
+            finally:
+                extractor.coursePool.close()
+            loadedRows = extractor.connection.theCursor.loadedRows
+
+            (oldProblem, splitProblem) = loadedRows['EdxProblem']
+            self.assertEqual(('p0', 'i4x://Medicine/HRP258/vertical/vert0', 'i4x://Medicine/HRP258/chapter/c0'),
+                             (oldProblem['problem_id'], oldProblem['vertical_uri'], oldProblem['chapter_uri']))
+            self.assertEqual('sp0', splitProblem['problem_id'])
+            (oldVideo, splitVideo) = loadedRows['EdxVideo']
+            self.assertEqual(('v0', 'abc', 'i4x://Medicine/HRP258/sequential/s0'),
+                             (oldVideo['video_id'], oldVideo['video_code'], oldVideo['sequential_uri']))
+            self.assertEqual('sv0', splitVideo['video_id'])
+            for (courseInfo, startDate, catalogName) in zip(loadedRows['CourseInfo'],
+                                                            ['2014-09-22T00:00:00Z', '2015-01-05T00:00:00Z'],
+                                                            ['Statistics', 'Split Statistics']):
+                self.assertEqual((catalogName, startDate), (courseInfo['course_catalog_name'], courseInfo['start_date']))
+                self.assertEqual('2014', str(courseInfo['academic_year']))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,265 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from collections import OrderedDict
+import gzip
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+import unittest
+
+from json_to_relation.col_data_type import ColDataType
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import OutputDisposition, OutputFile, BufferedOutputFile, CompressedOutputFile
+
+
+class TestOutputFilePartitions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.outFile = OutputFile(os.path.join(self.tmpDir, 'tracking.sql'), OutputDisposition.OutputFormat.CSV)
+
+    def tearDown(self):
+        self.outFile.close()
+        shutil.rmtree(self.tmpDir)
+
+    def testRowsSplitByPartitionColumn(self):
+        self.outFile.setPartitionColumn('EdxTrackEvent', 'quarter')
+        self.outFile.writerow("INSERT INTO EdxTrackEvent (_id,agent,quarter) VALUES \n" +\
+                              "    ('id1','Mozilla, \\'quoted\\'','fall2014'),\n" +\
+                              "    ('id2','Chrome','winter2015'),\n" +\
+                              "    ('id3','Safari','fall2014');")
+        self.outFile.writerow("INSERT INTO Answer (answer_id,answer) VALUES \n" +\
+                              "    ('a1','42');")
+        self.outFile.flush()
+        for csvFd in self.outFile.csvTableFiles.values():
+            csvFd.close()
+        fileNames = self.outFile.getCSVPartitionOutFileNames('EdxTrackEvent')
+        self.assertEqual(['fall2014', 'winter2015'], fileNames.keys())
+        self.assertTrue(fileNames['fall2014'].endswith('tracking.sql_EdxTrackEvent_fall2014Table.csv'))
+        with open(fileNames['fall2014']) as fd:
+            self.assertEqual(["'id1','Mozilla, \\'quoted\\'','fall2014'\n", "'id3','Safari','fall2014'\n"], fd.readlines())
+        with open(fileNames['winter2015']) as fd:
+            self.assertEqual(["'id2','Chrome','winter2015'\n"], fd.readlines())
+        # Tables without partition column are written as before:
+        self.assertEqual({}, self.outFile.getCSVPartitionOutFileNames('Answer'))
+        with open(self.outFile.getCSVTableOutFileName('Answer')) as fd:
+            self.assertEqual(["'a1','42'\n"], fd.readlines())
+
+    def testNoSingleFileForPartitionedTable(self):
+        self.outFile.setPartitionColumn('EdxTrackEvent', 'quarter')
+        self.outFile.startNewTable('EdxTrackEvent', OrderedDict())
+        self.outFile.startNewTable('Answer', OrderedDict())
+        self.assertFalse(os.path.exists(self.outFile.getCSVTableOutFileName('EdxTrackEvent')))
+        self.assertTrue(os.path.exists(self.outFile.getCSVTableOutFileName('Answer')))
+
+class TestBufferedOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tmpDir, 'tracking.sql')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def fileContent(self, fileName=None):
+        with open(self.fileName if fileName is None else fileName) as fd:
+            return fd.read()
+
+    def testWritesHeldUntilFlush(self):
+        outFile = OutputFile(self.fileName, OutputDisposition.OutputFormat.SQL_INSERT_STATEMENTS, bufferSize=4096)
+        outFile.write('USE Edx;\n')
+        self.assertEqual('', self.fileContent())
+        # Buffer full: written through:
+        insertStmt = "INSERT INTO Answer (answer_id,answer) VALUES \n    ('a1','%s');" % ('4' * 4096)
+        outFile.writerow(insertStmt)
+        self.assertTrue(len(self.fileContent()) >= 4096)
+        outFile.write(u'-- done\n')
+        outFile.close()
+        self.assertEqual("USE Edx;\n" + insertStmt + "\n-- done\n", self.fileContent())
+        self.assertEqual(len(self.fileContent()), outFile.getBytesWritten())
+        # Closing twice is harmless:
+        outFile.close()
+
+    def testTableBoundaryFlushes(self):
+        outFile = OutputFile(self.fileName, OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV)
+        outFile.write('CREATE TABLE Answer (answer_id TEXT);\n')
+        outFile.startNewTable('Answer', OrderedDict())
+        self.assertEqual('CREATE TABLE Answer (answer_id TEXT);\n', self.fileContent())
+        outFile.writerow("INSERT INTO Answer (answer_id) VALUES \n    ('a1');")
+        outFile.flush()
+        self.assertEqual("'a1'\n", self.fileContent(outFile.getCSVTableOutFileName('Answer')))
+        outFile.close()
+
+    def testWriterows(self):
+        outFile = OutputFile(self.fileName, OutputDisposition.OutputFormat.CSV)
+        outFile.writerows([['a', 1], ['b,c', 2.5]])
+        outFile.close()
+        self.assertEqual('a,1\r\n"b,c",2.5\r\n', self.fileContent())
+
+    def testUnicodeEncodedLikeFile(self):
+        with open(self.fileName, 'wb') as fd:
+            bufferedFd = BufferedOutputFile(fd, closeFile=False)
+            self.assertRaises(UnicodeEncodeError, bufferedFd.write, u'caf\xe9')
+            bufferedFd.write(u'cafe')
+            bufferedFd.close()
+            self.assertFalse(fd.closed)
+        self.assertEqual('cafe', self.fileContent())
+
+class TestCompressedOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def gunzip(self, fileName):
+        with gzip.open(fileName) as fd:
+            return fd.read()
+
+    def testBlocksCompressedInOrder(self):
+        fileName = os.path.join(self.tmpDir, 'blocks.gz')
+        pool = ThreadPool(3)
+        try:
+            compressedFd = CompressedOutputFile(open(fileName, 'wb'), 'gzip', pool, blockSize=100)
+            lines = ['line %d of many\n' % lineNum for lineNum in range(2000)]
+            for line in lines:
+                compressedFd.write(line)
+            compressedFd.close()
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(''.join(lines), self.gunzip(fileName))
+        self.assertEqual(os.path.getsize(fileName), compressedFd.compressedBytesWritten)
+
+    def testSQLAndTableCSVCompressed(self):
+        fileName = os.path.join(self.tmpDir, 'tracking.sql.gz')
+        outFile = OutputFile(fileName, OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV)
+        insertStmt = "INSERT INTO Answer (answer_id,answer) VALUES \n    ('a1','42'),\n    ('a2','43');"
+        outFile.write('USE Edx;\n')
+        outFile.startNewTable('Answer', OrderedDict())
+        outFile.writerow(insertStmt)
+        outFile.close()
+        csvFileName = outFile.getCSVTableOutFileName('Answer')
+        self.assertEqual(os.path.join(self.tmpDir, 'tracking.sql_AnswerTable.csv.gz'), csvFileName)
+        self.assertEqual('USE Edx;\n' + insertStmt + '\n', self.gunzip(fileName))
+        self.assertEqual("'a1','42'\n'a2','43'\n", self.gunzip(csvFileName))
+        self.assertEqual('gzip -dc', OutputFile.decompressCommand(csvFileName))
+        self.assertIsNone(OutputFile.decompressCommand(os.path.join(self.tmpDir, 'tracking.sql_AnswerTable.csv')))
+
+class FlatRowParser(object):
+    '''
+    Turns flat JSON objects into CSV rows of the main
+    table, with columns in order of first appearance.
+    '''
+    def __init__(self, converter):
+        self.converter = converter
+
+    def processOneJSONObject(self, jsonStr, row):
+        for (colName, value) in json.loads(jsonStr, object_pairs_hook=OrderedDict).items():
+            self.converter.ensureColExistence(colName, ColDataType.TEXT)
+            colPos = self.converter.getSchemaHint(colName).colPos
+            row.extend([''] * (colPos + 1 - len(row)))
+            row[colPos] = value
+        self.converter.pushToTable(row)
+
+    def finish(self, includeCSVLoadCommands=False, outputDisposition=None):
+        pass
+
+class TestColHeader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.logFile = os.path.join(self.tmpDir, 'convert.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testHeaderFileNextToOutput(self):
+        fileName = os.path.join(self.tmpDir, 'events.csv')
+        outFile = OutputFile(fileName, OutputDisposition.OutputFormat.CSV, options='wb')
+        converter = JSONToRelation(InString('{"a": "x", "b": "y"}\n{"c": "z", "a": "w"}'), outFile, logFile=self.logFile)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        converter.jsonParserInstance = FlatRowParser(converter)
+        converter.convert(prependColHeader=True)
+        # Rows were written once, straight to the destination:
+        with open(fileName) as fd:
+            self.assertEqual('x,y\r\nw,,z\r\n', fd.read())
+        self.assertEqual(os.path.join(self.tmpDir, 'events_header.csv'), outFile.getHeaderFileName())
+        with open(outFile.getHeaderFileName()) as fd:
+            self.assertEqual('a,b,c\r\n', fd.read())
+        self.assertTrue(outFile.createCSVLoadCommand('Events').startswith("LOAD DATA LOCAL INFILE '%s' INTO TABLE Events" % fileName))
+        self.assertTrue(outFile.createCSVLoadCommand('Events').endswith(" (`a`,`b`,`c`);\n"))
+
+    def testHeaderFileOfCompressedOutput(self):
+        outFile = OutputFile(os.path.join(self.tmpDir, 'events.csv.gz'), OutputDisposition.OutputFormat.CSV, options='wb')
+        outFile.close()
+        self.assertEqual(os.path.join(self.tmpDir, 'events_header.csv'), outFile.getHeaderFileName())
+        self.assertTrue(outFile.createCSVLoadCommand('Events').startswith('system '))
+
+    def runSystemCommand(self, mysqlCommand):
+        # What the mysql client does with a 'system' line:
+        self.assertTrue(mysqlCommand.startswith('system '))
+        subprocess.check_call(mysqlCommand[len('system '):], shell=True)
+
+    def writeGzipCSV(self):
+        fileName = os.path.join(self.tmpDir, 'events.csv.gz')
+        gzipFd = gzip.open(fileName, 'wb')
+        gzipFd.write('a,b\r\n')
+        gzipFd.close()
+        return fileName
+
+    def testFifoExistsWhenPrologueReturns(self):
+        fileName = self.writeGzipCSV()
+        (loadSource, prologue) = OutputFile.createFifoLoadPrologue(fileName)
+        for _ in range(10):
+            self.runSystemCommand(prologue)
+            self.assertTrue(stat.S_ISFIFO(os.stat(loadSource).st_mode))
+            # Stands in for the LOAD:
+            with open(loadSource, 'rb') as fd:
+                self.assertEqual('a,b\r\n', fd.read())
+            self.runSystemCommand(OutputFile.createFifoLoadEpilogue(fileName))
+            self.assertFalse(os.path.exists(loadSource))
+            self.assertFalse(os.path.exists(loadSource + '.pid'))
+
+    def testEpilogueStopsDecompressorOfFailedLoad(self):
+        fileName = self.writeGzipCSV()
+        (loadSource, prologue) = OutputFile.createFifoLoadPrologue(fileName)
+        self.runSystemCommand(prologue)
+        with open(loadSource + '.pid') as fd:
+            decompressorPid = int(fd.read())
+        # The LOAD fails without opening the FIFO:
+        self.runSystemCommand(OutputFile.createFifoLoadEpilogue(fileName))
+        self.assertFalse(os.path.exists(loadSource))
+        for _ in range(50):
+            try:
+                # Fails once the decompressor is gone:
+                os.kill(decompressorPid, 0)
+            except OSError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail('Decompressor %d still running' % decompressorPid)
+
+    def testNoFifoCommandsForUncompressedFile(self):
+        fileName = os.path.join(self.tmpDir, 'events.csv')
+        self.assertEqual((fileName, ''), OutputFile.createFifoLoadPrologue(fileName))
+        self.assertEqual('', OutputFile.createFifoLoadEpilogue(fileName))
+
+if __name__ == "__main__":
+    unittest.main()
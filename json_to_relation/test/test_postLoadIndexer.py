@@ -0,0 +1,70 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from json_to_relation.postLoadIndexer import PostLoadIndexer
+
+
+class FakeDB(object):
+    '''
+    Stands in for a MySQLDB connection. Knows which tables
+    exist and which indexes they already have, and records
+    all executed statements.
+    '''
+    def __init__(self, dbName, existing, statements):
+        self.dbName = dbName
+        self.existing = existing
+        self.statements = statements
+
+    def query(self, queryStr):
+        tableName = queryStr.split("table_name = '")[1].split("'")[0]
+        if queryStr.startswith('SELECT COUNT(*)'):
+            return iter([(1 if tableName in self.existing else 0,)])
+        return iter([(indexName,) for indexName in self.existing[tableName]])
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def close(self):
+        pass
+
+class TestPostLoadIndexer(unittest.TestCase):
+
+    def setUp(self):
+        self.statements = []
+        self.existing = {'Answer' : ['PRIMARY', 'AnswerIdxAns'],
+                         'LoadInfo' : ['PRIMARY'],
+                         'Account' : ['PRIMARY']}
+        self.indexer = PostLoadIndexer(numWorkers=2)
+        self.indexer.openConnection = lambda dbName: FakeDB(dbName, self.existing, self.statements)
+
+    def testSkipsExistingIndexes(self):
+        timings = self.indexer.run(['Answer', 'LoadInfo'])
+        self.assertEqual([('Answer', None, 'enable keys'),
+                          ('Answer', 'AnswerIdxAns', 'exists'),
+                          ('Answer', 'AnswerIdxCourseID', 'created'),
+                          ('LoadInfo', None, 'enable keys')],
+                         [(timing.tableName, timing.indexName, timing.action) for timing in timings])
+        self.assertIn('CREATE INDEX AnswerIdxCourseID ON Edx.Answer(course_id(255))', self.statements)
+        self.assertNotIn('CREATE INDEX AnswerIdxAns ON Edx.Answer(answer(255))', self.statements)
+
+    def testMissingTableAndPrivateDb(self):
+        timings = self.indexer.run(['CorrectMap', 'Account'])
+        self.assertEqual('no table', timings[0].action)
+        self.assertIn('ALTER TABLE EdxPrivate.Account ENABLE KEYS', self.statements)
+        self.assertIn('CREATE INDEX AccountIdxDOB ON EdxPrivate.Account(year_of_birth)', self.statements)
+        self.assertEqual(1 + len(PostLoadIndexer.TABLE_INDEXES['Account'].indexes), len(self.statements))
+
+    def testUnknownTable(self):
+        self.assertRaises(ValueError, self.indexer.run, ['NoSuchTable'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import unittest
+
+from json_to_relation.privateTableMerger import PrivateTableMerger
+
+
+class FakeDB(object):
+    '''
+    Stands in for a MySQLDB connection. Knows the columns of the
+    staging tables, whether the private tables have a primary key,
+    and records all executed statements.
+    '''
+    def __init__(self, stagingCols, privateKeys, statements):
+        self.stagingCols = stagingCols
+        self.privateKeys = privateKeys
+        self.statements = statements
+
+    def query(self, queryStr):
+        tableName = queryStr.split("table_name = '")[1].split("'")[0]
+        if queryStr.startswith('SELECT COUNT(*)'):
+            return iter([(1 if tableName in self.privateKeys else 0,)])
+        return iter([(colName,) for colName in self.stagingCols.get(tableName, [])])
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        return 3 if statement.startswith('INSERT') else 0
+
+    def close(self):
+        pass
+
+class TestPrivateTableMerger(unittest.TestCase):
+
+    def setUp(self):
+        self.statements = []
+        self.stagingCols = {'EventIp' : ['event_table_id', 'event_ip']}
+        self.privateKeys = []
+        self.merger = PrivateTableMerger()
+        self.merger.openConnection = lambda: FakeDB(self.stagingCols, self.privateKeys, self.statements)
+
+    def testMergeEventIp(self):
+        timings = self.merger.merge()
+        self.assertEqual([('Account', 'no staging table', 0), ('EventIp', 'merged', 3)],
+                         [(timing.tableName, timing.action, timing.rowsAffected) for timing in timings])
+        self.assertEqual(['CREATE TABLE IF NOT EXISTS EdxPrivate.EventIp LIKE Edx.EventIp',
+                          'DROP TABLE IF EXISTS EdxPrivate.EventIp_keyed',
+                          'DROP TABLE IF EXISTS EdxPrivate.EventIp_unkeyed',
+                          'CREATE TABLE EdxPrivate.EventIp_keyed LIKE EdxPrivate.EventIp',
+                          'ALTER TABLE EdxPrivate.EventIp_keyed ADD PRIMARY KEY (event_table_id)',
+                          'INSERT IGNORE INTO EdxPrivate.EventIp_keyed SELECT * FROM EdxPrivate.EventIp',
+                          'RENAME TABLE EdxPrivate.EventIp TO EdxPrivate.EventIp_unkeyed, ' +\
+                          'EdxPrivate.EventIp_keyed TO EdxPrivate.EventIp',
+                          'DROP TABLE EdxPrivate.EventIp_unkeyed',
+                          'INSERT INTO EdxPrivate.EventIp (event_table_id,event_ip) ' +\
+                          'SELECT event_table_id,event_ip FROM Edx.EventIp ' +\
+                          'ON DUPLICATE KEY UPDATE event_ip=VALUES(event_ip)',
+                          'DROP TABLE Edx.EventIp'],
+                         self.statements)
+
+    def testExistingPrimaryKeyKept(self):
+        self.privateKeys.append('EventIp')
+        self.merger.merge()
+        self.assertFalse([statement for statement in self.statements if statement.startswith('ALTER') or statement.startswith('RENAME')])
+
+if __name__ == "__main__":
+    unittest.main()
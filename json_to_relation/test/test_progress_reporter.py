@@ -0,0 +1,109 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import OutputDisposition, OutputFile
+from json_to_relation.progress_reporter import ProgressReporter
+from json_to_relation.test.test_output_disposition import FlatRowParser
+from json_to_relation.test.test_warning_aggregator import ListHandler
+
+
+class HalfReadSource(object):
+    def getBytesRead(self):
+        return 250
+    def getSize(self):
+        return 1000
+
+class CachingParser(object):
+    def getCacheStats(self):
+        return OrderedDict([('mail_addresses', (3, 4)), ('empty', (0, 0))])
+
+class CountingConverter(object):
+    '''
+    Has the counters that a ProgressReporter reads from a JSONToRelation.
+    '''
+    def __init__(self):
+        self.jsonSource = HalfReadSource()
+        self.jsonParserInstance = CachingParser()
+        self.numInputLines = 100
+        self.numInputBytes = 4096
+        self.numBadLines = 5
+        self.rowsPerTable = OrderedDict([('EdxTrackEvent', 95), ('Answer', 12)])
+
+    def getSourceName(self):
+        return 'track"log.gz'
+
+class TestProgressReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='progressReporterTest')
+        self.logger = logging.getLogger('progressReporterTest')
+        self.logger.propagate = False
+        self.handler = ListHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        shutil.rmtree(self.tmpDir)
+
+    def testProgressLine(self):
+        reporter = ProgressReporter(CountingConverter(), self.logger)
+        reporter.startTime -= 10
+        reporter.report()
+        self.assertEqual(1, len(self.handler.msgs))
+        msg = self.handler.msgs[0]
+        self.assertTrue(msg.startswith('Processed 100 JSON objects in 10.0 sec (10 lines/sec'), msg)
+        self.assertIn('5.00% bad lines', msg)
+        self.assertIn('25.0% of source read, ETA 0:00:30', msg)
+        self.assertIn('rows: EdxTrackEvent=95, Answer=12', msg)
+        self.assertIn('cache hits: mail_addresses=75.0%', msg)
+        self.assertNotIn('empty', msg)
+
+    def testPrometheusSnapshot(self):
+        metricsFileName = os.path.join(self.tmpDir, 'j2s.prom')
+        reporter = ProgressReporter(CountingConverter(), self.logger, metricsFileName=metricsFileName)
+        reporter.report()
+        with open(metricsFileName, 'r') as fd:
+            samples = [line for line in fd.read().splitlines() if not line.startswith('#')]
+        self.assertIn('json_to_relation_lines_total{source="track\\"log.gz"} 100.0', samples)
+        self.assertIn('json_to_relation_rows_total{source="track\\"log.gz",table="Answer"} 12.0', samples)
+        self.assertIn('json_to_relation_cache_lookups_total{source="track\\"log.gz",cache="mail_addresses"} 4.0', samples)
+        self.assertIn('json_to_relation_source_size_bytes{source="track\\"log.gz"} 1000.0', samples)
+        self.assertEqual([], os.listdir(self.tmpDir)[1:])
+
+    def testConvertWritesFinalSnapshot(self):
+        metricsFileName = os.path.join(self.tmpDir, 'j2s.json')
+        converter = JSONToRelation(InString('{"a": 1}\n{"a": \n{"a": 2, "b": 3}\n'),
+                                   OutputFile(os.path.join(self.tmpDir, 'out.csv'), OutputDisposition.OutputFormat.CSV, 'wb'),
+                                   logFile=os.path.join(self.tmpDir, 'convert.log'),
+                                   metricsFile=metricsFileName)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        converter.jsonParserInstance = FlatRowParser(converter)
+        converter.convert()
+        with open(metricsFileName, 'r') as fd:
+            snapshot = json.load(fd)
+        self.assertTrue(snapshot['done'])
+        self.assertEqual(3, snapshot['lines'])
+        self.assertEqual(1, snapshot['bad_lines'])
+        self.assertEqual({'Main' : 2}, snapshot['rows'])
+        self.assertEqual(snapshot['source_size_bytes'], snapshot['source_bytes_read'])
+        self.assertEqual(1.0, snapshot['fraction_read'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import MySQLdb
+
+from json_to_relation.pymysql_utils1 import MySQLDB
+
+
+class LocalInfileRefusingCursor(object):
+    '''
+    Refuses LOAD DATA LOCAL INFILE, like a server
+    started with local_infile=0, and records the
+    rows of executemany().
+    '''
+    def __init__(self):
+        self.insertedRows = []
+
+    def execute(self, queryStr):
+        if queryStr.strip().startswith('LOAD DATA LOCAL'):
+            raise MySQLdb.OperationalError(1148, 'The used command is not allowed with this MySQL version')
+        self.lastQuery = queryStr
+
+    def fetchone(self):
+        return (4194304,)
+
+    def fetchall(self):
+        return ()
+
+    def executemany(self, queryStr, rows):
+        self.insertedRows.extend(rows)
+
+    def close(self):
+        pass
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.lastCursor = LocalInfileRefusingCursor()
+
+    def cursor(self):
+        return self.lastCursor
+
+    def commit(self):
+        pass
+
+class TestBulkInsert(unittest.TestCase):
+
+    def testGeneratorRowsSurviveFallback(self):
+        db = MySQLDB(host=None, port=None, user=None, passwd=None, db=None)
+        db.connection = FakeConnection()
+        rows = ((rowNum, 'name%d' % rowNum) for rowNum in range(3))
+        (errors, warnings) = db.bulkInsert('UserCountry', ('id', 'name'), rows)
+        self.assertEqual([(0, 'name0'), (1, 'name1'), (2, 'name2')], db.connection.lastCursor.insertedRows)
+        self.assertIsNone(errors)
+        self.assertIsNone(warnings)
+
+if __name__ == "__main__":
+    unittest.main()
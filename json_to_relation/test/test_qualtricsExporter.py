@@ -0,0 +1,147 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import StringIO as sio
+import json
+import tempfile
+import threading
+import time
+import unittest
+import urlparse
+import zipfile
+
+from json_to_relation.qualtricsExporter import QualtricsResponseExporter, RateLimiter
+
+
+class FakeQualtricsHandler(BaseHTTPRequestHandler):
+    '''
+    Answers the three kinds of requests of a response export:
+    /surveys/<id>/responseExports, /status/<id>, and /file/<id>.
+    Exports complete on the second status poll. Survey 'SV_busy'
+    is answered with 429 on its first export request.
+    '''
+    def do_GET(self):
+        server = self.server
+        url = urlparse.urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        with server.lock:
+            server.requests.append(url.path)
+            if urlparse.parse_qs(url.query).get('apiToken') != ['myToken'] and parts[0] != 'file':
+                return self.answer(401, '')
+            if parts[0] == 'surveys':
+                surveyID = parts[1]
+                if surveyID == 'SV_busy' and surveyID not in server.throttled:
+                    server.throttled.add(surveyID)
+                    return self.answer(429, '', {'Retry-After' : '0'})
+                if surveyID == 'SV_missing':
+                    return self.answer(404, '')
+                server.polls[surveyID] = 0
+                return self.answer(200, json.dumps({'result' : {'exportStatus' : server.baseURL + '/status/' + surveyID}}))
+            if parts[0] == 'status':
+                server.polls[parts[1]] += 1
+                percent = 100 if server.polls[parts[1]] >= 2 else 50
+                return self.answer(200, json.dumps({'result' : {'percentComplete' : percent,
+                                                                'fileUrl' : server.baseURL + '/file/' + parts[1]}}))
+            if parts[0] == 'file':
+                responses = [] if parts[1] == 'SV_empty' else [{'ResponseID' : 'R_%s_%d' % (parts[1], i)} for i in range(3)]
+                zipBytes = sio.StringIO()
+                archive = zipfile.ZipFile(zipBytes, 'w')
+                archive.writestr(parts[1] + '.json', json.dumps({'responses' : responses}))
+                archive.close()
+                return self.answer(200, zipBytes.getvalue())
+        self.answer(404, '')
+
+    def answer(self, code, body, headers={}):
+        self.send_response(code)
+        for (header, value) in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestQualtricsExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FakeQualtricsHandler)
+        self.server.baseURL = 'http://127.0.0.1:%d' % self.server.server_port
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.throttled = set()
+        self.server.polls = {}
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.daemon = True
+        self.serverThread.start()
+
+        self.savedDelays = (QualtricsResponseExporter.FIRST_POLL_DELAY, QualtricsResponseExporter.FIRST_RETRY_DELAY)
+        QualtricsResponseExporter.FIRST_POLL_DELAY = 0.01
+        QualtricsResponseExporter.FIRST_RETRY_DELAY = 0.01
+        self.exporter = QualtricsResponseExporter('myToken', apiBase=self.server.baseURL, numWorkers=3, maxRequestsPerSec=1000)
+
+    def tearDown(self):
+        (QualtricsResponseExporter.FIRST_POLL_DELAY, QualtricsResponseExporter.FIRST_RETRY_DELAY) = self.savedDelays
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testExportAll(self):
+        surveyIDs = ['SV_1', 'SV_2', 'SV_busy', 'SV_empty', 'SV_missing']
+        results = {}
+        for (surveyID, exportFile) in self.exporter.exportAll(surveyIDs):
+            if exportFile is None:
+                results[surveyID] = None
+                continue
+            with exportFile:
+                results[surveyID] = list(QualtricsResponseExporter.iterResponses(exportFile))
+        self.assertEqual(sorted(surveyIDs), sorted(results.keys()))
+        for surveyID in ['SV_1', 'SV_2', 'SV_busy']:
+            self.assertEqual(['R_%s_%d' % (surveyID, i) for i in range(3)],
+                             [response['ResponseID'] for response in results[surveyID]])
+        self.assertEqual([], results['SV_empty'])
+        self.assertIsNone(results['SV_missing'])
+        # The throttled export request was retried once:
+        self.assertEqual(2, self.server.requests.count('/surveys/SV_busy/responseExports'))
+        self.assertEqual(2, self.server.polls['SV_1'])
+
+    def testIterResponses(self):
+        zipFile = tempfile.TemporaryFile()
+        archive = zipfile.ZipFile(zipFile, 'w', zipfile.ZIP_DEFLATED)
+        archive.writestr('survey.json', '{"responses" : [{"ResponseID" : "R_1", "Q1" : "1", "Q2_TEXT" : "x", "IPAddress" : "1.2.3.4"}]}')
+        archive.close()
+        zipFile.seek(0)
+        responses = list(QualtricsResponseExporter.iterResponses(zipFile))
+        # Fields keep their order:
+        self.assertEqual(['ResponseID', 'Q1', 'Q2_TEXT', 'IPAddress'], responses[0].keys())
+
+        notAZip = tempfile.TemporaryFile()
+        notAZip.write('{"responses" : []}')
+        notAZip.seek(0)
+        with self.assertRaises(ValueError):
+            list(QualtricsResponseExporter.iterResponses(notAZip))
+
+    def testExportAllNoSurveys(self):
+        self.assertEqual([], list(self.exporter.exportAll([])))
+
+    def testRateLimiter(self):
+        limiter = RateLimiter(200)
+        startTime = time.time()
+        threads = [threading.Thread(target=lambda: [limiter.wait() for _ in range(5)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # First of the 20 calls returns at once, the others 5ms apart:
+        self.assertGreaterEqual(time.time() - startTime, 19 * limiter.interval)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+import unittest
+
+from json_to_relation.col_data_type import ColDataType
+from json_to_relation.generic_json_parser import GenericJSONParser
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import OutputPipe, OutputDisposition
+from json_to_relation.schema_inference import SchemaInferrer
+
+
+JSON_LINES = ['{"small": 3, "medium": 1000, "ratio": 1, "name": "Mary", "flag": true, "nothing": null, "tags": [{"t": 1}, {"t": 2}]}',
+              '{"small": -100, "medium": 40000, "ratio": 0.5, "name": "Jon", "flag": false, "nothing": null, "mixed": 5}',
+              'not JSON',
+              '{"small": 0, "medium": -7, "mixed": "five", "long": "%s"}' % ('x' * 200)
+              ]
+
+class TestSchemaInference(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.schemaPath = os.path.join(self.tmpDir, 'schema.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testInferTypes(self):
+        inferrer = SchemaInferrer()
+        self.assertEqual(3, inferrer.observeLines(JSON_LINES))
+        self.assertEqual(1, inferrer.numLinesSkipped)
+        hints = inferrer.schemaHints()
+        self.assertEqual(['small', 'medium', 'ratio', 'name', 'flag', 'nothing', '"tags.t_0"', '"tags.t_1"', 'mixed', 'long'], hints.keys())
+        # -100 doubled does not fit TINYINT:
+        self.assertEqual(ColDataType.SMALLINT, hints['small'])
+        self.assertEqual(ColDataType.MEDIUMINT, hints['medium'])
+        self.assertEqual(ColDataType.DOUBLE, hints['ratio'])
+        self.assertEqual(ColDataType.TINYTEXT, hints['name'])
+        self.assertEqual(ColDataType.TINYINT, hints['flag'])
+        self.assertEqual(ColDataType.TEXT, hints['nothing'])
+        self.assertEqual(ColDataType.TINYINT, hints['"tags.t_1"'])
+        self.assertEqual(ColDataType.TINYTEXT, hints['mixed'])
+        # 200 chars doubled do not fit VARCHAR(255):
+        self.assertEqual(ColDataType.TEXT, hints['long'])
+
+        noHeadroom = SchemaInferrer(intHeadroom=1, textHeadroom=1)
+        noHeadroom.observeLines(JSON_LINES)
+        self.assertEqual(ColDataType.TINYINT, noHeadroom.schemaHints()['small'])
+        self.assertEqual(ColDataType.TINYTEXT, noHeadroom.schemaHints()['long'])
+        self.assertRaises(ValueError, SchemaInferrer, 0.5)
+
+    def testSampling(self):
+        inferrer = SchemaInferrer()
+        self.assertEqual(1, inferrer.observeLines(JSON_LINES, sampleEvery=2, maxLines=1))
+        self.assertNotIn('mixed', inferrer.schemaHints())
+
+    def testPersistAndWiden(self):
+        inferrer = SchemaInferrer()
+        inferrer.observeLines(JSON_LINES[:1])
+        inferrer.save(self.schemaPath)
+
+        reloaded = SchemaInferrer.load(self.schemaPath)
+        self.assertEqual(inferrer.schemaHints(), reloaded.schemaHints())
+        self.assertEqual(ColDataType.TINYINT, reloaded.schemaHints()['small'])
+        # A later file of the same source holds wider values:
+        reloaded.observeLines(['{"small": 5000000, "extra": "x"}'])
+        hints = reloaded.schemaHints()
+        self.assertEqual(ColDataType.INT, hints['small'])
+        self.assertEqual('extra', hints.keys()[-1])
+
+        with open(self.schemaPath, 'w') as fd:
+            fd.write('{"columns": {}}')
+        self.assertRaises(ValueError, SchemaInferrer.load, self.schemaPath)
+
+    def testHintsFeedConverter(self):
+        inferrer = SchemaInferrer()
+        inferrer.observeSource(InString('\n'.join(JSON_LINES)))
+        logFile = tempfile.NamedTemporaryFile()
+        converter = JSONToRelation(InString(JSON_LINES[0]),
+                                   OutputPipe(OutputDisposition.OutputFormat.CSV),
+                                   schemaHints=inferrer.schemaHints(),
+                                   logFile=logFile.name)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        parser = GenericJSONParser(converter)
+        parser.colNamesByTable[converter.mainTableName] = []
+        parser.processOneJSONObject(JSON_LINES[0], [])
+        colTypes = dict([(colSpec.getName(), colSpec.getType()) for colSpec in converter.destination.getSchema(converter.mainTableName)])
+        self.assertEqual('SMALLINT', colTypes['small'])
+        self.assertEqual('VARCHAR(255)', colTypes['name'])
+        self.assertEqual('TINYINT', colTypes['flag'])
+        logFile.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import unittest
+
+from json_to_relation import stage_profiler
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import OutputDisposition, OutputFile
+from json_to_relation.stage_profiler import StageProfiler
+from json_to_relation.test.test_output_disposition import FlatRowParser
+
+
+class FakeClock(object):
+    '''
+    Timer whose time only moves when told to.
+    '''
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class Worker(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def outer(self):
+        self.clock.now += 1
+        self.inner()
+        self.inner()
+        return 'done'
+
+    def inner(self):
+        self.clock.now += 2
+
+class FailingFinishParser(FlatRowParser):
+    '''
+    Parser that fails when the conversion is sealed.
+    '''
+    def finish(self, includeCSVLoadCommands=False, outputDisposition=None):
+        raise RuntimeError('finish failed')
+
+class TestStageProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.savedTimer = stage_profiler.default_timer
+        self.clock = stage_profiler.default_timer = FakeClock()
+
+    def tearDown(self):
+        stage_profiler.default_timer = self.savedTimer
+
+    def testSelfTimeExcludesNestedStages(self):
+        worker = Worker(self.clock)
+        profiler = StageProfiler()
+        profiler.instrument(worker, ['outer', 'inner', 'noSuchMethod'])
+        self.assertEqual('done', worker.outer())
+        stages = profiler.getStages()
+        self.assertEqual(['outer', 'inner'], stages.keys())
+        self.assertEqual((1, 5.0, 1.0), (stages['outer'].calls, stages['outer'].totalTime, stages['outer'].selfTime))
+        self.assertEqual((2, 4.0, 4.0), (stages['inner'].calls, stages['inner'].totalTime, stages['inner'].selfTime))
+
+        report = profiler.report(10.0)
+        self.assertEqual(['inner', 'outer', '(not instrumented)'], [line[:45].strip() for line in report[1:]])
+        self.assertTrue(report[-1].endswith('5.000    50.0'))
+
+        profiler.restore()
+        worker.outer()
+        self.assertEqual(1, stages['outer'].calls)
+
+    def testTimeIterator(self):
+        def lines():
+            for line in ['a', 'b']:
+                self.clock.now += 3
+                yield line
+        profiler = StageProfiler()
+        self.assertEqual(['a', 'b'], list(profiler.timeIterator('read input', lines())))
+        self.assertEqual((3, 6.0), (profiler.getStages()['read input'].calls, profiler.getStages()['read input'].totalTime))
+
+class TestConvertProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='stageProfilerTest')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testConvertReportsStages(self):
+        logFileName = os.path.join(self.tmpDir, 'convert.log')
+        statsFileName = os.path.join(self.tmpDir, 'convert.pstats')
+        converter = JSONToRelation(InString('{"a": "x"}\n{"b": "y"}\n'),
+                                   OutputFile(os.path.join(self.tmpDir, 'out.csv'), OutputDisposition.OutputFormat.CSV, 'wb'),
+                                   logFile=logFileName,
+                                   profile=True,
+                                   profileStatsFile=statsFileName)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        parser = converter.jsonParserInstance = FlatRowParser(converter)
+        converter.convert()
+        with open(logFileName, 'r') as fd:
+            log = fd.read()
+        for stageName in ['read input', 'processOneJSONObject', 'processFinishedRow', 'write output', 'finish']:
+            self.assertIn('\n%s ' % stageName, log)
+        self.assertGreater(pstats.Stats(statsFileName).total_calls, 0)
+        # Instrumentation is gone after the conversion:
+        self.assertNotIn('processOneJSONObject', vars(parser))
+        self.assertNotIn('processFinishedRow', vars(converter))
+
+    def testFailedConvertStopsProfiling(self):
+        statsFileName = os.path.join(self.tmpDir, 'convert.pstats')
+        converter = JSONToRelation(InString('{"a": "x"}\n'),
+                                   OutputFile(os.path.join(self.tmpDir, 'out.csv'), OutputDisposition.OutputFormat.CSV, 'wb'),
+                                   logFile=os.path.join(self.tmpDir, 'convert.log'),
+                                   profile=True,
+                                   profileStatsFile=statsFileName)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        parser = converter.jsonParserInstance = FailingFinishParser(converter)
+        with self.assertRaises(RuntimeError):
+            converter.convert()
+        self.assertIsNone(sys.getprofile())
+        self.assertTrue(os.path.exists(statsFileName))
+        self.assertNotIn('processOneJSONObject', vars(parser))
+        self.assertNotIn('finish', vars(parser))
+        self.assertNotIn('processFinishedRow', vars(converter))
+
+if __name__ == "__main__":
+    unittest.main()
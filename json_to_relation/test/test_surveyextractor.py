@@ -0,0 +1,51 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from json_to_relation.surveyextractor import QualtricsExtractor
+
+
+class TestResolveAnonUserIDs(unittest.TestCase):
+
+    def setUp(self):
+        # Bypass __init__(), which connects to MySQL:
+        self.extractor = QualtricsExtractor.__new__(QualtricsExtractor)
+        self.queries = []
+        # lti_id as stored in the table --> anon_screen_name:
+        self.storedIds = {'abcdef0123456789abcdef0123456789' : 'anon1',
+                          '00000000000000000000000000000002' : 'anon2'}
+        self.extractor.query = self.query
+
+    def query(self, queryStr):
+        '''
+        Answers like MySQL under a case-insensitive collation:
+        returns the stored lti_id, whatever the case of the IN list.
+        '''
+        self.queries.append(queryStr)
+        inList = queryStr[queryStr.index('IN (') + len('IN ('):-1].lower()
+        return iter([(ltiId, anonId) for (ltiId, anonId) in sorted(self.storedIds.items()) if "'%s'" % ltiId in inList])
+
+    def testMixedCaseIdResolved(self):
+        anonIds = self.extractor.resolveAnonUserIDs(['ABCDEF0123456789abcdef0123456789',
+                                                     'abcdef0123456789abcdef0123456789',
+                                                     '00000000000000000000000000000002',
+                                                     '99999999999999999999999999999999',
+                                                     'tooShort'])
+        self.assertEqual({'ABCDEF0123456789abcdef0123456789' : 'anon1',
+                          'abcdef0123456789abcdef0123456789' : 'anon1',
+                          '00000000000000000000000000000002' : 'anon2',
+                          '99999999999999999999999999999999' : None,
+                          'tooShort' : None},
+                         anonIds)
+        self.assertEqual(1, len(self.queries))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,6 +13,7 @@ Created on Sep 22, 2013
 
 @author: paepcke
 '''
+import tempfile
 import unittest
 
 from json_to_relation.generic_json_parser import GenericJSONParser, Stack
@@ -61,6 +62,14 @@ class Test(unittest.TestCase):
         self.assertEqual('10,11.23,"My Poem"', mysqlDb.ensureSQLTyping((10, 11.23, 'My Poem')))
         self.assertEqual('10', mysqlDb.ensureSQLTyping((10,)))
         self.assertEqual('"foo"', mysqlDb.ensureSQLTyping(('foo',)))
+
+    def testReadOptionFilePassword(self):
+        with tempfile.NamedTemporaryFile(suffix='.cnf') as optionFile:
+            optionFile.write('[mysqld]\npassword = serverPwd\nskip-external-locking\n' +\
+                             '[client]\nuser=root\npassword = "my secret"\n')
+            optionFile.flush()
+            self.assertEqual('my secret', MySQLDB.readOptionFilePassword(optionFile.name))
+            self.assertEqual('', MySQLDB.readOptionFilePassword(optionFile.name, group='mysqldump'))
         
         
 if __name__ == "__main__":
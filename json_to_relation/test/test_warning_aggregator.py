@@ -0,0 +1,173 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import ast
+from collections import OrderedDict
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from json_to_relation.input_source import InString
+from json_to_relation.json_to_relation import JSONToRelation
+from json_to_relation.output_disposition import OutputDisposition, OutputFile
+from json_to_relation.test.test_output_disposition import FlatRowParser
+from json_to_relation.warning_aggregator import WarningAggregator
+
+
+class ListHandler(logging.Handler):
+    '''
+    Keeps the messages of log records in a list.
+    '''
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.msgs = []
+
+    def emit(self, record):
+        self.msgs.append(record.getMessage())
+
+class TestWarningAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='warningAggregatorTest')
+        self.logger = logging.getLogger('warningAggregatorTest')
+        self.logger.propagate = False
+        self.handler = ListHandler()
+        self.logger.addHandler(self.handler)
+        self.lineNum = 0
+        self.numLocationCalls = 0
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        shutil.rmtree(self.tmpDir)
+
+    def location(self):
+        self.numLocationCalls += 1
+        return ('test.json', self.lineNum)
+
+    def testFirstWarningsLoggedAllCounted(self):
+        warnings = WarningAggregator(self.logger, self.location, maxLoggedPerKey=2)
+        for self.lineNum in range(5):
+            warnings.warn('Line %s: bad event %s', self.lineNum, {'a' : 1})
+        warnings.warn('Line %s: no event', 5)
+        self.assertEqual(["Line 0: bad event {'a': 1}",
+                          "Line 1: bad event {'a': 1}",
+                          "Further warnings like the above are only counted: 'Line %s: bad event %s'",
+                          'Line 5: no event'],
+                         self.handler.msgs)
+        self.assertEqual([('Line %s: bad event %s', 5), ('Line %s: no event', 1)], warnings.getCounts().items())
+
+        del self.handler.msgs[:]
+        warnings.flush()
+        self.assertEqual(["5 warnings (2 logged) in test.json: 'Line %s: bad event %s'",
+                          "1 warnings (1 logged) in test.json: 'Line %s: no event'"],
+                         self.handler.msgs)
+        self.assertEqual(0, len(warnings.getCounts()))
+
+    def testLocationOnlyResolvedWhenLogged(self):
+        warnings = WarningAggregator(self.logger, self.location, maxLoggedPerKey=2)
+        for self.lineNum in range(5):
+            warnings.warn('Line %s: bad event %s', WarningAggregator.LOCATION, {'a' : 1})
+        self.assertEqual(["Line test.json:0: bad event {'a': 1}",
+                          "Line test.json:1: bad event {'a': 1}",
+                          "Further warnings like the above are only counted: 'Line %s: bad event %s'"],
+                         self.handler.msgs)
+        self.assertEqual(2, self.numLocationCalls)
+
+    def testSidecar(self):
+        sidecarFileName = os.path.join(self.tmpDir, 'warnings.jsonl')
+        warnings = WarningAggregator(self.logger, self.location, sidecarFileName=sidecarFileName, maxLoggedPerKey=1)
+        for self.lineNum in range(3):
+            warnings.warn('Line %s: bad value %s', WarningAggregator.LOCATION, ValueError('x'))
+        warnings.warn('Not UTF8: %s', '\xff')
+        warnings.close()
+        with open(sidecarFileName, 'r') as fd:
+            records = [json.loads(line) for line in fd]
+        self.assertEqual([{'source' : 'test.json', 'line' : lineNum, 'warning' : 'Line %s: bad value %s',
+                           'args' : ['test.json:%d' % lineNum, "ValueError('x',)"]} for lineNum in range(3)],
+                         records[:3])
+        self.assertEqual(["'\\xff'"], records[3]['args'])
+
+    def testConvertAggregatesBadLines(self):
+        outFileName = os.path.join(self.tmpDir, 'out.csv')
+        logFileName = os.path.join(self.tmpDir, 'convert.log')
+        sidecarFileName = os.path.join(self.tmpDir, 'warnings.jsonl')
+        badLines = '\n'.join(['{"a": %d' % lineNum for lineNum in range(2 * WarningAggregator.MAX_LOGGED_PER_KEY)])
+        converter = JSONToRelation(InString(badLines + '\n{"a": 1}\n'),
+                                   OutputFile(outFileName, OutputDisposition.OutputFormat.CSV, 'wb'),
+                                   logFile=logFileName,
+                                   warningsFile=sidecarFileName)
+        converter.destination.schemas[converter.mainTableName] = OrderedDict()
+        converter.jsonParserInstance = FlatRowParser(converter)
+        converter.convert()
+        # convert() closed the sidecar file:
+        self.assertIsNone(converter.warnings.sidecarFd)
+        with open(logFileName, 'r') as fd:
+            logLines = fd.readlines()
+        self.assertEqual(WarningAggregator.MAX_LOGGED_PER_KEY, len([line for line in logLines if 'bad JSON object' in line and line.startswith('Line ')]))
+        self.assertIn("%d warnings (%d logged)" % (2 * WarningAggregator.MAX_LOGGED_PER_KEY, WarningAggregator.MAX_LOGGED_PER_KEY),
+                      ''.join(logLines))
+        with open(sidecarFileName, 'r') as fd:
+            self.assertEqual(2 * WarningAggregator.MAX_LOGGED_PER_KEY, len(fd.readlines()))
+
+class TestWarningFormats(unittest.TestCase):
+
+    def literalString(self, node):
+        '''
+        Return the value of a string literal, or of a + concatenation
+        of string literals; None for any other expression.
+        '''
+        if isinstance(node, ast.Str):
+            return node.s
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            (left, right) = (self.literalString(node.left), self.literalString(node.right))
+            if left is not None and right is not None:
+                return left + right
+        return None
+
+    def isWarningCall(self, node):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            return False
+        if node.func.attr == 'logWarn':
+            return True
+        # warnings.warn() of a WarningAggregator:
+        return node.func.attr == 'warn' and isinstance(node.func.value, ast.Attribute) and node.func.value.attr == 'warnings'
+
+    def testFormatPlaceholdersMatchArguments(self):
+        '''
+        Every logWarn() and WarningAggregator.warn() call with a literal
+        format string passes one argument per placeholder; else the
+        warning raises TypeError when it is formatted.
+        '''
+        packageDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        mismatches = []
+        numChecked = 0
+        for sourceFileName in glob.glob(os.path.join(packageDir, '*.py')):
+            with open(sourceFileName, 'r') as fd:
+                tree = ast.parse(fd.read(), sourceFileName)
+            for node in ast.walk(tree):
+                if not self.isWarningCall(node) or len(node.args) < 2 or node.starargs is not None:
+                    continue
+                msgFormat = self.literalString(node.args[0])
+                if msgFormat is None:
+                    continue
+                numChecked += 1
+                try:
+                    msgFormat % tuple([0] * (len(node.args) - 1))
+                except TypeError as e:
+                    mismatches.append('%s:%d: %s' % (os.path.basename(sourceFileName), node.lineno, e))
+        self.assertGreater(numChecked, 100)
+        self.assertEqual([], mismatches)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Rate limited, counted warnings for the parsers' hot paths.
+
+Parsers warn about every malformed track log line, and about
+every field they did not anticipate. On a bad log day, formatting
+and writing those lines costs more than the conversion. Warnings
+passed to a WarningAggregator are keyed by their format string.
+Only the first few of each key are formatted and logged; the rest
+are counted. flush() logs one summary line per key that occurred,
+and starts the counts over, once per converted file.
+
+Where a warning should cite the source file and line being
+converted, callers pass WarningAggregator.LOCATION as the argument.
+The aggregator replaces it with 'source:line' from its locationFunc
+only when the warning is logged or recorded, rather than callers
+building the citation for every warning, counted or not.
+
+Optionally every warning is also appended to a sidecar file as one
+JSON object per line: source, line number, format string, and
+arguments, for analysis with tools rather than grep.
+
+Usage::
+    warnings = WarningAggregator(logger, converter.getSourceLocation, sidecarFileName='j2s_warnings.jsonl')
+    warnings.warn("Track log line %s: event is not a dict in book event: '%s'", WarningAggregator.LOCATION, event)
+    ...
+    warnings.flush()
+'''
+from collections import OrderedDict
+import json
+
+
+class SourceLocation(object):
+    '''
+    Placeholder warning argument that stands for the
+    source location being converted. See WarningAggregator.LOCATION.
+    '''
+    def __repr__(self):
+        return 'WarningAggregator.LOCATION'
+
+class WarningAggregator(object):
+    '''
+    Logs the first warnings of each format string, counts
+    all of them, and optionally records all of them in a
+    JSONL sidecar file.
+    '''
+    # Number of warnings per format string that are
+    # logged in full before they are only counted:
+    MAX_LOGGED_PER_KEY = 10
+
+    # Argument to warn() that is replaced by 'source:line'
+    # when the warning is logged or recorded:
+    LOCATION = SourceLocation()
+
+    def __init__(self, logger, locationFunc, sidecarFileName=None, maxLoggedPerKey=None):
+        '''
+        :param logger: logger to which warnings and summaries go
+        :type logger: logging.Logger
+        :param locationFunc: function returning the source name and line number being converted
+        :type locationFunc: function() --> (String, int)
+        :param sidecarFileName: file to which all warnings are appended as JSON lines. None: no sidecar.
+        :type sidecarFileName: {String | None}
+        :param maxLoggedPerKey: number of warnings per format string to log before only counting. Default: MAX_LOGGED_PER_KEY
+        :type maxLoggedPerKey: {int | None}
+        '''
+        self.logger = logger
+        self.locationFunc = locationFunc
+        self.maxLoggedPerKey = maxLoggedPerKey if maxLoggedPerKey is not None else WarningAggregator.MAX_LOGGED_PER_KEY
+        # Format string --> number of warnings since last flush():
+        self.counts = OrderedDict()
+        if sidecarFileName is not None:
+            self.sidecarFd = open(sidecarFileName, 'a')
+        else:
+            self.sidecarFd = None
+
+    def warn(self, msgFormat, *args):
+        '''
+        Count a warning, and log it if fewer than maxLoggedPerKey
+        warnings with the same format string were logged since the
+        last flush(). The message is only formatted if it is logged,
+        and LOCATION arguments are only resolved through locationFunc
+        if the warning is logged or written to the sidecar.
+
+        :param msgFormat: %-style format string; also the key under which the warning is counted
+        :type msgFormat: String
+        :param args: values for the format string
+        :type args: <any>
+        '''
+        count = self.counts.get(msgFormat, 0) + 1
+        self.counts[msgFormat] = count
+        if count > self.maxLoggedPerKey and self.sidecarFd is None:
+            return
+        location = self.locationFunc()
+        args = self.fillInLocation(args, location)
+        if count <= self.maxLoggedPerKey:
+            self.logger.warn(msgFormat % args)
+            if count == self.maxLoggedPerKey:
+                self.logger.warn("Further warnings like the above are only counted: '%s'" % msgFormat)
+        if self.sidecarFd is not None:
+            (sourceName, lineNum) = location
+            record = {'source' : sourceName, 'line' : lineNum, 'warning' : msgFormat, 'args' : args}
+            try:
+                jsonRecord = json.dumps(record, default=repr)
+            except ValueError:
+                # Non-UTF8 strings, or circular structures:
+                record['args'] = [repr(arg) for arg in args]
+                jsonRecord = json.dumps(record)
+            self.sidecarFd.write(jsonRecord + '\n')
+
+    def fillInLocation(self, args, location):
+        '''
+        Replace LOCATION placeholders among warning arguments
+        with the citation 'source:line'.
+
+        :param args: values for a warning's format string
+        :type args: (<any>)
+        :param location: source name and line number, as returned by locationFunc
+        :type location: (String, int)
+        :return: args, with any LOCATION replaced
+        :rtype: (<any>)
+        '''
+        if not any(arg is WarningAggregator.LOCATION for arg in args):
+            return args
+        citation = '%s:%s' % location
+        return tuple(citation if arg is WarningAggregator.LOCATION else arg for arg in args)
+
+    def getCounts(self):
+        '''
+        Return the number of warnings per format string since the last flush().
+
+        :rtype: OrderedDict<String,int>
+        '''
+        return self.counts
+
+    def flush(self):
+        '''
+        Log how often each format string was warned about since
+        the last flush(), start the counts over, and flush the
+        sidecar file.
+        '''
+        if len(self.counts) > 0:
+            (sourceName, lineNum) = self.locationFunc()  #@UnusedVariable
+            for (msgFormat, count) in self.counts.items():
+                self.logger.warn("%d warnings (%d logged) in %s: '%s'" %\
+                                 (count, min(count, self.maxLoggedPerKey), sourceName, msgFormat))
+            self.counts = OrderedDict()
+        if self.sidecarFd is not None:
+            self.sidecarFd.flush()
+
+    def close(self):
+        self.flush()
+        if self.sidecarFd is not None:
+            self.sidecarFd.close()
+            self.sidecarFd = None
@@ -27,6 +27,22 @@ happens here:
 - compute the percent_grade column
 - parse the original 'state' column's JSON and replace with plusses/minuses
 
+Rows are pulled BATCH_SIZE at a time, in activity_grade_id
+order. Each batch is completed column by column: module IDs
+are resolved once per distinct ID, grades are computed over the
+whole batch, and, with more than one process, the state JSON
+of the batch is parsed in a process pool. The batch is then
+loaded into ActivityGrade with one bulkInsert(), i.e. one
+LOAD DATA statement. Throughput is reported at the end.
+
+With --incremental, StudentmoduleExcerpt holds only the rows
+modified since the last refresh, some of which are already in
+ActivityGrade in an earlier state. Before each batch is loaded,
+the ActivityGrade rows with the batch's activity_grade_ids are
+deleted, so changed rows are replaced rather than duplicated.
+Rows first submitted after the refresh's high-water mark cannot
+be in ActivityGrade yet, and are not looked for.
+
 
 Assumptions:
     o (Optionally) TEMPORARY table StudentmoduleExcerpt holds 
@@ -36,8 +52,8 @@ Assumptions:
     	 SET @floatPlaceholder:=-1.0;
     	 SET @intPlaceholder:=-1;
     	 USE edxprod;
-    	 CREATE TABLE StudentmoduleExcerpt  (activity_grade_id INT PRIMARY KEY) ENGINE=myISAM \
-    	 SELECT id AS activity_grade_id, \
+    	 CREATE TABLE StudentmoduleExcerpt  (activity_grade_id INT NOT NULL PRIMARY KEY) ENGINE=myISAM \
+    	 IGNORE SELECT id AS activity_grade_id, \
     	        student_id, \
     	        course_id AS course_display_name, \
     	        grade, \
@@ -53,15 +69,18 @@ Assumptions:
     	        @emptyStr AS resource_display_name, \
     	        module_id
     	 FROM courseware_studentmodule \
-    	 WHERE modified > '"$LATEST_DATE"'; \" \
+    	 WHERE modified > '"$LATEST_DATE"' \
+    	   AND isTrueCourseName(course_id) = 1; \" \
 
 '''
 import argparse
 import getpass
 import itertools
+from multiprocessing import Pool
 import os
 import re
 import sys
+import time
 
 from pymysql_utils.pymysql_utils import MySQLDB
 
@@ -72,11 +91,24 @@ source_dir.extend(sys.path)
 sys.path = source_dir
 from utils import Utils
 
+
+def parseStates(jsonStateStrs):
+    '''
+    Process pool worker: parse a list of 'state' column
+    values with AnonAndModIDAdder.parseStateJSON().
+    '''
+    return [AnonAndModIDAdder.parseStateJSON(jsonStateStr) for jsonStateStr in jsonStateStrs]
+
 class AnonAndModIDAdder(object):
 
-    # Number of rows to process in memory
-    # before writing to ActivityGrade:
+    # Number of rows to pull, complete in memory,
+    # and write to ActivityGrade at a time:
     BATCH_SIZE = 10000
+
+    # Number of pieces into which each pool worker's
+    # share of a batch's states is cut, so that fast
+    # workers can take over from slow ones:
+    PIECES_PER_PROCESS = 4
     
     # For explanation of the following regex patterns,
     # see header comment of parseStateJSON:
@@ -102,6 +134,7 @@ class AnonAndModIDAdder(object):
                 ]
     
     # Indices into tuples from StudentmoduleExcerpt:
+    ACTIVITY_GRADE_ID_INDEX = 0
     STUDENT_INT_ID_INDEX = 1
     GRADE_INDEX = 3
     MAX_GRADE_INDEX = 4
@@ -109,21 +142,32 @@ class AnonAndModIDAdder(object):
     PARTS_CORRECTNESS_INDEX = 6
     ANSWERS_INDEX = 7
     NUM_ATTEMPTS_INDEX = 8
+    FIRST_SUBMIT_INDEX = 9
     ANON_SCREEN_NAME_INDEX = 12
     RESOURCE_DISPLAY_NAME_INDEX = 13
     MODULE_ID_INDEX = 14
     
     
-    def __init__(self, uid, pwd, db='Edx', testing=False):
+    def __init__(self, uid, pwd, db='Edx', testing=False, numProcesses=1, incremental=False):
         '''
-        ****** Update this comment header
-        Make connection to MySQL wrapper.
+        Make connection to MySQL wrapper, and add the rows
+        of StudentmoduleExcerpt to ActivityGrade.
         @param uid: MySQL user under which to log in. Assumed to be other than None
         @type uid: String
         @param pwd: MySQL password for user uid. May be None.
         @type pwd: {String | None}
+        @param numProcesses: number of processes that parse the 'state' JSON;
+            1 parses in this process.
+        @type numProcesses: int
+        @param incremental: whether to replace rows already in ActivityGrade
+            rather than only append
+        @type incremental: boolean
         '''
         self.db = db
+        self.numProcesses = numProcesses
+        self.incremental = incremental
+        # Module ID --> resource_display_name:
+        self.moduleNames = {}
         if pwd is None:
             self.mysqldbStudModule = MySQLDB(user=uid, db=db)
         else:
@@ -135,7 +179,7 @@ class AnonAndModIDAdder(object):
             self.colSpec += ',' + colName
     
         self.cacheIdInt2Anon(testing)
-        self.pullRowByRow()
+        self.pullInBatches()
 
     def cacheIdInt2Anon(self, testing=False):
         '''
@@ -158,68 +202,135 @@ class AnonAndModIDAdder(object):
         for user_int_id, anon_screen_name in queryIt:
             self.int2AnonCache[user_int_id] = anon_screen_name;
 
-    def pullRowByRow(self):
-        rowBatch = []
-        theQuery = "SELECT activity_grade_id,student_id,\
-                    	   course_display_name,grade,max_grade,percent_grade,\
-                    	   parts_correctness,answers,num_attempts,first_submit,\
-                    	   last_submit,module_type,anon_screen_name,\
-                    	   resource_display_name,module_id \
-                    FROM edxprod.StudentmoduleExcerpt \
-                    WHERE isTrueCourseName(course_display_name) = 1;"
-        if self.db == 'unittest':
-            queryIt = self.mysqldbStudModule.query("SELECT %s FROM unittest.StudentmoduleExcerpt;" % self.colSpec)
+    def pullInBatches(self):
+        '''
+        Pull StudentmoduleExcerpt BATCH_SIZE rows at a time, keyed
+        on activity_grade_id, complete each batch, and append it to
+        ActivityGrade. Prints rows/sec when done. Each batch is a
+        range scan of the excerpt's primary key; the excerpt only
+        holds rows of true courses (see cronRefreshActivityGrade.sh).
+        '''
+        dbName = 'unittest' if self.db == 'unittest' else 'edxprod'
+        queryTemplate = "SELECT %s FROM %s.StudentmoduleExcerpt \
+                         WHERE activity_grade_id > %%d \
+                         ORDER BY activity_grade_id LIMIT %%d;" % (self.colSpec, dbName)
+        if self.incremental:
+            highWaterMark = self.getHighWaterMark()
+        pool = Pool(self.numProcesses) if self.numProcesses > 1 else None
+        startTime = time.time()
+        numRows = 0
+        numReplaced = 0
+        lastId = -1
+        try:
+            while True:
+                rowBatch = [list(studmodTuple) for studmodTuple in
+                            self.mysqldbStudModule.query(queryTemplate % (lastId, AnonAndModIDAdder.BATCH_SIZE))]
+                if len(rowBatch) == 0:
+                    break
+                lastId = rowBatch[-1][AnonAndModIDAdder.ACTIVITY_GRADE_ID_INDEX]
+                self.completeBatch(rowBatch, pool)
+                if self.incremental:
+                    numReplaced += self.deleteExistingRows(rowBatch, highWaterMark)
+                self.mysqldbStudModule.bulkInsert('ActivityGrade', AnonAndModIDAdder.ACTIVITY_GRADE_COL_NAMES, rowBatch)
+                numRows += len(rowBatch)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        elapsed = time.time() - startTime
+        print('Added %d rows to ActivityGrade in %.1f sec (%d rows/sec)' %
+              (numRows, elapsed, numRows / elapsed if elapsed > 0 else numRows))
+        if self.incremental:
+            print('Of these, up to %d replaced rows with the same activity_grade_id' % numReplaced)
+
+    def getHighWaterMark(self):
+        '''
+        Return the newest last_submit in ActivityGrade, i.e. the
+        modified time of the newest source row of the previous
+        refresh, or None if ActivityGrade is empty.
+        '''
+        for (highWaterMark,) in self.mysqldbStudModule.query("SELECT MAX(last_submit) FROM ActivityGrade;"):
+            return highWaterMark
+
+    def deleteExistingRows(self, rowBatch, highWaterMark):
+        '''
+        Delete the earlier versions of the given rows from ActivityGrade.
+        Only rows first submitted no later than highWaterMark can have
+        an earlier version. Returns the number of rows looked for.
+        '''
+        if highWaterMark is None:
+            return 0
+        ids = [str(row[AnonAndModIDAdder.ACTIVITY_GRADE_ID_INDEX]) for row in rowBatch
+               if row[AnonAndModIDAdder.FIRST_SUBMIT_INDEX] is None or row[AnonAndModIDAdder.FIRST_SUBMIT_INDEX] <= highWaterMark]
+        if len(ids) > 0:
+            self.mysqldbStudModule.execute("DELETE FROM ActivityGrade WHERE activity_grade_id IN (%s);" % ','.join(ids))
+        return len(ids)
+
+    def completeBatch(self, rowBatch, pool=None):
+        '''
+        Fill in resource_display_name, anon_screen_name, percent_grade,
+        parts_correctness, answers, and num_attempts of the given rows,
+        in place, one column at a time.
+        @param rowBatch: rows from StudentmoduleExcerpt, as lists
+        @type rowBatch: [[<any>]]
+        @param pool: process pool for parsing the 'state' JSON, or None
+        @type pool: {multiprocessing.Pool | None}
+        '''
+        # Resolve the module_ids into human readable resource_display_names,
+        # once for each module:
+        for moduleID in set([row[AnonAndModIDAdder.MODULE_ID_INDEX] for row in rowBatch]):
+            if moduleID not in self.moduleNames:
+                self.moduleNames[moduleID] = self.getResourceDisplayName(moduleID)
+
+        percentGrades = AnonAndModIDAdder.computePercentGrades([row[AnonAndModIDAdder.GRADE_INDEX] for row in rowBatch],
+                                                               [row[AnonAndModIDAdder.MAX_GRADE_INDEX] for row in rowBatch])
+
+        # Parse 'state' column from JSON for plusses/minusses column:
+        states = [row[AnonAndModIDAdder.PARTS_CORRECTNESS_INDEX] for row in rowBatch]
+        if pool is None:
+            parsedStates = parseStates(states)
         else:
-            #**********queryIt = self.mysqldbStudModule.query("SELECT %s FROM edxprod.StudentmoduleExcerpt;" % self.colSpec)
-            queryIt = self.mysqldbStudModule.query(theQuery)
-        for studmodTuple in queryIt:
-            # Results return as tuples, but we need to change tuple items by index.
-            # So must convert to list:
-            studmodTuple = list(studmodTuple)
-            # Resolve the module_id into a human readable resource_display_name:
-            moduleID = studmodTuple[AnonAndModIDAdder.MODULE_ID_INDEX]
-            studmodTuple[AnonAndModIDAdder.RESOURCE_DISPLAY_NAME_INDEX] = self.getResourceDisplayName(moduleID)
-            
+            pieceSize = max(1, len(states) / (self.numProcesses * AnonAndModIDAdder.PIECES_PER_PROCESS))
+            parsedStates = list(itertools.chain.from_iterable(
+                                    pool.map(parseStates, [states[start:start + pieceSize]
+                                                           for start in range(0, len(states), pieceSize)])))
+
+        for (row, percentGrade, (partsCorrectness, answers, numAttempts)) in zip(rowBatch, percentGrades, parsedStates):
+            row[AnonAndModIDAdder.RESOURCE_DISPLAY_NAME_INDEX] = self.moduleNames[row[AnonAndModIDAdder.MODULE_ID_INDEX]]
             # Compute the anon_screen_name:
-            studentIntId = studmodTuple[AnonAndModIDAdder.STUDENT_INT_ID_INDEX]
             try:
-                studmodTuple[AnonAndModIDAdder.ANON_SCREEN_NAME_INDEX] = self.int2AnonCache[studentIntId]
+                row[AnonAndModIDAdder.ANON_SCREEN_NAME_INDEX] = self.int2AnonCache[row[AnonAndModIDAdder.STUDENT_INT_ID_INDEX]]
             except TypeError:
-                studmodTuple[AnonAndModIDAdder.ANON_SCREEN_NAME_INDEX] = ''
-
-            # Pick grade and max_grade out of the row,
-            # compute the percentage, and place that 
-            # back into the row in col 
-            grade = studmodTuple[AnonAndModIDAdder.GRADE_INDEX]
-            max_grade = studmodTuple[AnonAndModIDAdder.MAX_GRADE_INDEX]
-            percent_grade = 'NULL'
+                row[AnonAndModIDAdder.ANON_SCREEN_NAME_INDEX] = ''
+            row[AnonAndModIDAdder.PERCENT_GRADE_INDEX] = percentGrade
+            row[AnonAndModIDAdder.PARTS_CORRECTNESS_INDEX] = partsCorrectness
+            row[AnonAndModIDAdder.ANSWERS_INDEX] = ','.join(answers)
+            row[AnonAndModIDAdder.NUM_ATTEMPTS_INDEX] = numAttempts
+
+    @classmethod
+    def computePercentGrades(cls, grades, maxGrades):
+        '''
+        Given equally long lists of grades and max_grades,
+        return the list of percent_grade strings, rounded
+        to two decimals. Where a grade or max_grade is not
+        a number, or max_grade is 0, percent_grade is 'NULL'.
+        @rtype: [str]
+        '''
+        percentGrades = []
+        for (grade, maxGrade) in zip(grades, maxGrades):
             try:
-                percent_grade = round((int(grade) * 100.0/ int(max_grade)), 2)
-            except:
-                pass
-            studmodTuple[AnonAndModIDAdder.PERCENT_GRADE_INDEX] = str(percent_grade)
-
-            # Parse 'state' column from JSON and put result into plusses/minusses column:
-            (partsCorrectness, answers, numAttempts) = \
-                self.parseStateJSON(studmodTuple[AnonAndModIDAdder.PARTS_CORRECTNESS_INDEX])
-            
-            studmodTuple[AnonAndModIDAdder.PARTS_CORRECTNESS_INDEX] = partsCorrectness
-            studmodTuple[AnonAndModIDAdder.ANSWERS_INDEX] = ','.join(answers)
-            studmodTuple[AnonAndModIDAdder.NUM_ATTEMPTS_INDEX] = numAttempts
-            
-            rowBatch.append(studmodTuple)
-            if len(rowBatch) >= AnonAndModIDAdder.BATCH_SIZE:
-                self.mysqldbStudModule.bulkInsert('ActivityGrade', AnonAndModIDAdder.ACTIVITY_GRADE_COL_NAMES, rowBatch)
-                rowBatch = []
-        if len(rowBatch) > 0:
-            self.mysqldbStudModule.bulkInsert('ActivityGrade', AnonAndModIDAdder.ACTIVITY_GRADE_COL_NAMES, rowBatch)
-    
+                percentGrades.append(str(round((int(grade) * 100.0/ int(maxGrade)), 2)))
+            except (TypeError, ValueError, ZeroDivisionError):
+                percentGrades.append('NULL')
+        return percentGrades
+
     def getResourceDisplayName(self, moduleID):
         moduleName = Utils.getModuleNameFromID(moduleID)
         return moduleName
 
 
-    def parseStateJSON(self, jsonStateStr, srcTableName='courseware_studentmodule'):
+    @classmethod
+    def parseStateJSON(cls, jsonStateStr, srcTableName='courseware_studentmodule'):
         '''
         Given the 'state' column from a courseware_studentmodule
         column, return a 3-tuple: (plusMinusStr, answersArray, numAttempts)
@@ -399,6 +510,15 @@ if __name__ == '__main__':
                         dest='givenPass',
                         help='Mysql password. Default: see --password. If both -p and -w are provided, -w is used.'
                         )
+    parser.add_argument('-j', '--processes',
+                        action='store',
+                        type=int,
+                        default=1,
+                        help='Number of processes that parse the state JSON. Default: 1, i.e. no process pool.')
+    parser.add_argument('-i', '--incremental',
+                        action='store_true',
+                        help='Replace ActivityGrade rows that have the same activity_grade_id as new ones;\n' +\
+                             '    use when StudentmoduleExcerpt holds rows modified since the last refresh.')
     args = parser.parse_args();
 
     if args.user is None:
@@ -437,4 +557,4 @@ if __name__ == '__main__':
     #sys.exit()
     #************
                     
-    anonAdder = AnonAndModIDAdder(user, pwd)
+    anonAdder = AnonAndModIDAdder(user, pwd, numProcesses=args.processes, incremental=args.incremental)
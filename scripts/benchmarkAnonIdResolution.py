@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Compares per-response resolution of Qualtrics external IDs and
+IP addresses, as QualtricsExtractor used to do it, with the bulk
+resolution of QualtricsExtractor.resolveAnonUserIDs() and the
+memoized QualtricsExtractor.lookupCountry().
+
+A scratch table of external ID --> anon_screen_name is created in
+a local database, and a synthetic survey of respondents is drawn
+from it, with repeated IDs and IP addresses as in real surveys. The
+per-response method issues one query per response against the same
+table, as the body of edxprod.idExt2Anon() does, so no edxprod
+database is needed. Reports seconds and responses/sec, and whether
+the two methods agree.
+
+Example:
+    benchmarkAnonIdResolution.py -u myUser -d unittest -r 50000
+'''
+import argparse
+import getpass
+import os
+import random
+import sys
+import time
+import uuid
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from ipToCountry import IpCountryDict
+from pymysql_utils1 import MySQLDB
+from surveyextractor import QualtricsExtractor
+
+
+class BenchmarkExtractor(QualtricsExtractor):
+    '''
+    QualtricsExtractor on a local database, without
+    the Qualtrics and MySQL credential files.
+    '''
+    def __init__(self, user, pwd, dbName):
+        self.lookup = IpCountryDict()
+        self.countries = {}
+        MySQLDB.__init__(self, user=user, passwd=pwd, db=dbName)
+
+def makeSurvey(numResponses, numDistinct):
+    '''
+    Return numDistinct (externalId, anonScreenName) pairs, and
+    numResponses (externalId, ipAddress) responses drawn from them.
+    '''
+    pairs = [(uuid.uuid4().hex, uuid.uuid4().hex + uuid.uuid4().hex[:8]) for _ in range(numDistinct)]
+    ips = ['%d.%d.%d.%d' % (random.randint(1, 223), random.randint(0, 255), random.randint(0, 255), random.randint(1, 254))
+           for _ in range(numDistinct)]
+    responses = [(random.choice(pairs)[0], random.choice(ips)) for _ in range(numResponses)]
+    return pairs, responses
+
+def resolvePerResponse(extractor, responses):
+    results = []
+    for (extId, ip) in responses:
+        anonId = extractor.query("SELECT anon_screen_name FROM %s WHERE lti_id = '%s' LIMIT 1" %
+                                 (QualtricsExtractor.LTI_TO_ANON_TABLE, extId)).next()[0]
+        results.append((anonId, extractor.lookup.lookupIP(ip)[1]))
+    return results
+
+def resolveBulk(extractor, responses):
+    anonIds = extractor.resolveAnonUserIDs([extId for (extId, ip) in responses])
+    return [(anonIds[extId], extractor.lookupCountry(ip)) for (extId, ip) in responses]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Compare per-response with bulk anon ID and country resolution for a Qualtrics survey.')
+    parser.add_argument('-u', '--user',
+                        action='store',
+                        help='User ID that is to log into MySQL. Default: the user who is invoking this script.')
+    parser.add_argument('-p', '--password',
+                        action='store_true',
+                        help='Request to be asked for pwd for operating MySQL; default: no password.')
+    parser.add_argument('-d', '--database',
+                        action='store',
+                        default='unittest',
+                        help='Database for the scratch table. Default: unittest.')
+    parser.add_argument('-r', '--responses',
+                        action='store',
+                        type=int,
+                        default=30000,
+                        help='Number of survey responses. Default: 30000.')
+    parser.add_argument('--distinct',
+                        action='store',
+                        type=int,
+                        default=None,
+                        help='Number of distinct respondents and IP addresses. Default: half the responses.')
+    args = parser.parse_args();
+
+    user = args.user if args.user is not None else getpass.getuser()
+    pwd  = getpass.getpass("Enter %s's MySQL password on localhost: " % user) if args.password else ''
+    numDistinct = args.distinct if args.distinct is not None else max(1, args.responses / 2)
+
+    QualtricsExtractor.LTI_TO_ANON_TABLE = 'benchmarkLti2Anon'
+    extractor = BenchmarkExtractor(user, pwd, args.database)
+    try:
+        (pairs, responses) = makeSurvey(args.responses, numDistinct)
+        extractor.dropTable(QualtricsExtractor.LTI_TO_ANON_TABLE)
+        extractor.createTable(QualtricsExtractor.LTI_TO_ANON_TABLE, {'lti_id' : 'varchar(32)', 'anon_screen_name' : 'varchar(40)'})
+        extractor.bulkInsert(QualtricsExtractor.LTI_TO_ANON_TABLE, ('lti_id', 'anon_screen_name'), pairs)
+        extractor.execute('CREATE INDEX idxLtiId ON %s (lti_id)' % QualtricsExtractor.LTI_TO_ANON_TABLE)
+        print('%d responses from %d distinct respondents' % (len(responses), numDistinct))
+        print('%-14s %10s %16s' % ('Method', 'Seconds', 'Responses/sec'))
+
+        results = {}
+        for (methodName, resolveFunc) in [('per-response', resolvePerResponse),
+                                          ('bulk', resolveBulk)]:
+            startTime = time.time()
+            results[methodName] = resolveFunc(extractor, responses)
+            elapsed = time.time() - startTime
+            print('%-14s %10.2f %16.0f' % (methodName, elapsed, len(responses) / elapsed if elapsed > 0 else 0))
+        print('Results agree: %s' % (results['per-response'] == results['bulk']))
+    finally:
+        extractor.dropTable(QualtricsExtractor.LTI_TO_ANON_TABLE)
+        extractor.close()
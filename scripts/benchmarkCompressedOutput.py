@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Compares uncompressed transform output with gzip (and, if the
+zstandard package is installed, zstd) output of OutputFile.
+
+Synthetic EdxTrackEvent and Answer INSERT statements are written
+as .sql file plus per-table .csv files, as json2sql.py does. For
+each setting, reports the time to write, the bytes on disk, and the
+time to read the CSV files back the way the load does: straight
+from disk, or through a FIFO fed by the decompressor. Compressed
+runs are repeated with one and with -t compression threads.
+
+Examples:
+    benchmarkCompressedOutput.py -n 200000
+    benchmarkCompressedOutput.py -t 8 -d /data/scratch
+'''
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+import output_disposition
+from output_disposition import OutputFile, OutputDisposition
+
+
+EVENTS_PER_INSERT = 100
+
+def makeInsertStatements(numEvents):
+    rand = random.Random(4711)
+    statements = []
+    for start in range(0, numEvents, EVENTS_PER_INSERT):
+        eventValues = []
+        answerValues = []
+        for eventNum in range(start, min(start + EVENTS_PER_INSERT, numEvents)):
+            eventID = str(uuid.UUID(int=rand.getrandbits(128)))
+            eventValues.append("    ('%s','user%d','%s','Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36','Medicine/HRP258/Statistics_in_Medicine','2014-0%d-1%dT0%d:1%d:2%d.%06d','%s')" %\
+                               (eventID, rand.randint(0, 20000), rand.choice(['problem_check', 'play_video', 'seq_goto', 'page_close']),
+                                rand.randint(1, 9), rand.randint(0, 9), rand.randint(0, 9), rand.randint(0, 9), rand.randint(0, 9),
+                                rand.randint(0, 999999), 'fall2014'))
+            answerValues.append("    ('%s','i4x-Medicine-HRP258-problem-%032x_2_1','choice_%d','Medicine/HRP258/Statistics_in_Medicine')" %\
+                                (eventID, rand.getrandbits(128), rand.randint(0, 4)))
+        statements.append("INSERT INTO EdxTrackEvent (_id,anon_screen_name,event_type,agent,course_display_name,time,quarter) VALUES \n" +\
+                          ',\n'.join(eventValues) + ';')
+        statements.append("INSERT INTO Answer (answer_id,problem_id,answer,course_id) VALUES \n" +\
+                          ',\n'.join(answerValues) + ';')
+    return statements
+
+def writeOutput(statements, outFileName, numThreads):
+    outFile = OutputFile(outFileName, OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV, options='wb', numCompressionThreads=numThreads)
+    startTime = time.time()
+    outFile.write('USE Edx;\n')
+    for statement in statements:
+        outFile.writerow(statement)
+    outFile.close()
+    return (time.time() - startTime, [outFile.getCSVTableOutFileName(tableName) for tableName in ['EdxTrackEvent', 'Answer']])
+
+def readForLoad(csvFileName):
+    '''
+    Read a CSV file like LOAD DATA LOCAL INFILE would:
+    directly, or from a FIFO fed by the decompressor.
+    Returns the number of bytes read.
+    '''
+    decompressCmd = OutputFile.decompressCommand(csvFileName)
+    if decompressCmd is None:
+        loadSource = csvFileName
+    else:
+        loadSource = csvFileName + '.fifo'
+        os.mkfifo(loadSource)
+        decompressor = subprocess.Popen('%s %s > %s' % (decompressCmd, csvFileName, loadSource), shell=True)
+    numBytes = 0
+    with open(loadSource, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(1024 * 1024), ''):
+            numBytes += len(chunk)
+    if decompressCmd is not None:
+        decompressor.wait()
+        os.remove(loadSource)
+    return numBytes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Compare disk bytes and time of uncompressed and compressed transform output.')
+    parser.add_argument('-n', '--numEvents',
+                        action='store',
+                        type=int,
+                        default=100000,
+                        help='Number of synthetic events. Default: 100000.')
+    parser.add_argument('-t', '--numThreads',
+                        action='store',
+                        type=int,
+                        default=OutputFile.NUM_COMPRESSION_THREADS,
+                        help='Compression threads of the parallel runs. Default: %d.' % OutputFile.NUM_COMPRESSION_THREADS)
+    parser.add_argument('-d', '--scratchDir',
+                        action='store',
+                        default=None,
+                        help='Directory for the output files; should be on the disk of interest. Default: system temp dir.')
+    args = parser.parse_args();
+
+    statements = makeInsertStatements(args.numEvents)
+    settings = [('none', '', 1), ('gzip', '.gz', 1), ('gzip', '.gz', args.numThreads)]
+    if output_disposition.zstandard is not None:
+        settings.extend([('zstd', '.zst', 1), ('zstd', '.zst', args.numThreads)])
+
+    print('%d events' % args.numEvents)
+    print('%-6s %8s %12s %10s %10s %10s' % ('Codec', 'Threads', 'Disk bytes', 'Write sec', 'Read sec', 'Total sec'))
+    scratchDir = tempfile.mkdtemp(dir=args.scratchDir)
+    try:
+        for (codec, suffix, numThreads) in settings:
+            outFileName = os.path.join(scratchDir, 'tracking.log.sql' + suffix)
+            (writeTime, csvFileNames) = writeOutput(statements, outFileName, numThreads)
+            diskBytes = sum([os.path.getsize(fileName) for fileName in [outFileName] + csvFileNames])
+            startTime = time.time()
+            for csvFileName in csvFileNames:
+                readForLoad(csvFileName)
+            readTime = time.time() - startTime
+            print('%-6s %8d %12d %10.2f %10.2f %10.2f' % (codec, numThreads, diskBytes, writeTime, readTime, writeTime + readTime))
+            for fileName in [outFileName] + csvFileNames:
+                os.remove(fileName)
+    finally:
+        shutil.rmtree(scratchDir)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Compares the throughput of GenericJSONParser's two ways of
+turning one JSON object per line into a row: the ijson event
+stream (processJSONEvents()), and the fast path that decodes
+each line in one go and flattens the result (flattenIntoRow(),
+as called by processOneJSONObject()).
+
+Input is a file with one JSON object per line, such as a tracking
+log, or synthetic edX-like events. Each method fills rows of its
+own schema. Reports time and lines/sec, and whether rows and
+schemas of the two methods agree.
+
+Examples:
+    benchmarkGenericJSONParser.py -n 50000
+    benchmarkGenericJSONParser.py -f tracking.log
+'''
+import argparse
+from collections import OrderedDict
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from generic_json_parser import GenericJSONParser
+from input_source import InString
+from json_to_relation import JSONToRelation
+from output_disposition import OutputPipe, OutputDisposition
+
+
+def makeEvents(numLines):
+    '''
+    Synthetic tracking log lines with nested maps,
+    arrays of maps, and arrays of scalars.
+    '''
+    rand = random.Random(4711)
+    eventTypes = ['problem_check', 'play_video', 'seq_goto', 'page_close']
+    lines = []
+    for lineNum in range(numLines):
+        answers = [{'answer_id' : 'i4x-Medicine-HRP258-problem-%d_2_%d' % (lineNum % 50, i),
+                    'correct' : rand.random() < 0.5,
+                    'hint' : None}
+                   for i in range(rand.randint(1, 4))]
+        event = {'username' : 'user%d' % rand.randint(0, 1000),
+                 'event_type' : rand.choice(eventTypes),
+                 'ip' : '171.64.%d.%d' % (rand.randint(0, 255), rand.randint(0, 255)),
+                 'time' : '2014-03-%02dT10:%02d:00.000000+00:00' % (rand.randint(1, 28), rand.randint(0, 59)),
+                 'context' : {'course_id' : 'Medicine/HRP258/Statistics_in_Medicine',
+                              'module' : {'display_name' : 'Problem %d' % (lineNum % 50)},
+                              'user_id' : rand.randint(1, 100000)},
+                 'event' : {'answers' : answers,
+                            'grade' : rand.randint(0, 4),
+                            'max_grade' : 4,
+                            'attempts' : rand.randint(1, 3),
+                            'position' : [rand.random(), rand.random()]}}
+        lines.append(json.dumps(event))
+    return lines
+
+def makeParser(logFileName):
+    converter = JSONToRelation(InString('{}'),
+                               OutputPipe(OutputDisposition.OutputFormat.CSV),
+                               logFile=logFileName)
+    converter.destination.schemas[converter.mainTableName] = OrderedDict()
+    parser = GenericJSONParser(converter, progressEvery=sys.maxint)
+    parser.colNamesByTable[converter.mainTableName] = []
+    return parser
+
+def runEvents(parser, lines):
+    rows = []
+    for line in lines:
+        try:
+            rows.append(parser.processJSONEvents(line, []))
+        finally:
+            parser.getReadyForNextRow()
+    return rows
+
+def runFastPath(parser, lines):
+    return [parser.processOneJSONObject(line, []) for line in lines]
+
+def schemaOf(parser):
+    converter = parser.jsonToRelationConverter
+    return [(colSpec.getName(), colSpec.getType()) for colSpec in converter.destination.getSchema(converter.mainTableName)]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description="Compare ijson events with the fast path of GenericJSONParser.")
+    parser.add_argument('-f', '--file',
+                        action='store',
+                        help='File with one JSON object per line. Default: synthetic events.')
+    parser.add_argument('-n', '--numLines',
+                        action='store',
+                        type=int,
+                        default=20000,
+                        help='Number of synthetic events, or max lines read from --file. Default: 20000.')
+    args = parser.parse_args();
+
+    if args.file is None:
+        lines = makeEvents(args.numLines)
+    else:
+        with open(args.file, 'r') as fd:
+            lines = [line for (lineNum, line) in zip(xrange(args.numLines), fd) if len(line.strip()) > 0]
+    print('%d JSON lines' % len(lines))
+    print('%-12s %10s %12s' % ('Method', 'Seconds', 'Lines/sec'))
+
+    logFile = tempfile.NamedTemporaryFile()
+    results = {}
+    for (methodName, runFunc) in [('ijson', runEvents), ('fast path', runFastPath)]:
+        jsonParser = makeParser(logFile.name)
+        startTime = time.time()
+        rows = runFunc(jsonParser, lines)
+        elapsed = time.time() - startTime
+        results[methodName] = (rows, schemaOf(jsonParser))
+        print('%-12s %10.2f %12.0f' % (methodName, elapsed, len(lines) / elapsed if elapsed > 0 else 0))
+    logFile.close()
+    print('Rows agree: %s' % (results['ijson'][0] == results['fast path'][0]))
+    print('Schemas agree: %s' % (results['ijson'][1] == results['fast path'][1]))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Compares the per-module Mongo queries that ModulestoreExtractor
+used to issue for placing old-modulestore problems in their
+courses with the bulk prefetch of ModulestoreIndex.
+
+A synthetic old-style modulestore of courses, chapters, sequentials,
+verticals, and problems is written to a scratch database, either
+in a local mongod, or in mongomock. Both methods then resolve
+course name, vertical, sequential, chapter, and staff-only flag
+of every problem. Reports time, find() calls, and whether the
+two methods agree.
+
+Examples:
+    benchmarkModulestoreExtract.py -c 20 -p 10
+    benchmarkModulestoreExtract.py --mongomock
+'''
+import argparse
+import os
+import sys
+import time
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from modulestoreIndex import ModulestoreIndex
+
+
+class CountingCollection(object):
+    '''
+    Wraps a collection, counting find() calls.
+    '''
+    def __init__(self, collection):
+        self.collection = collection
+        self.numFinds = 0
+
+    def find(self, *args, **kwargs):
+        self.numFinds += 1
+        return self.collection.find(*args, **kwargs)
+
+class CountingModulestore(object):
+    def __init__(self, db):
+        self.modulestore = CountingCollection(db.modulestore)
+
+def makeModule(course, category, name, childURIs, staffOnly=False):
+    return {'_id' : {'tag' : 'i4x', 'org' : 'Medicine', 'course' : course, 'category' : category, 'name' : name, 'revision' : None},
+            'definition' : {'children' : childURIs, 'data' : '<problem/>'},
+            'metadata' : {'display_name' : name, 'visible_to_staff_only' : staffOnly}}
+
+def fillModulestore(collection, numCourses, fanOut, problemsPerVertical):
+    '''
+    Write numCourses courses of fanOut chapters, each with fanOut
+    sequentials of fanOut verticals of problemsPerVertical problems.
+    '''
+    for courseNum in range(numCourses):
+        course = 'HRP%d' % courseNum
+        modules = []
+        chapterURIs = []
+        for chapterNum in range(fanOut):
+            sequentialURIs = []
+            for seqNum in range(fanOut):
+                verticalURIs = []
+                for vertNum in range(fanOut):
+                    problems = [makeModule(course, 'problem', 'p_%s_%d_%d_%d_%d' % (course, chapterNum, seqNum, vertNum, probNum), [])
+                                for probNum in range(problemsPerVertical)]
+                    vertical = makeModule(course, 'vertical', 'v_%s_%d_%d_%d' % (course, chapterNum, seqNum, vertNum),
+                                          [ModulestoreIndex.resourceURI(problem) for problem in problems],
+                                          staffOnly=(vertNum == 0))
+                    modules.extend(problems)
+                    modules.append(vertical)
+                    verticalURIs.append(ModulestoreIndex.resourceURI(vertical))
+                sequential = makeModule(course, 'sequential', 's_%s_%d_%d' % (course, chapterNum, seqNum), verticalURIs)
+                modules.append(sequential)
+                sequentialURIs.append(ModulestoreIndex.resourceURI(sequential))
+            chapter = makeModule(course, 'chapter', 'c_%s_%d' % (course, chapterNum), sequentialURIs)
+            modules.append(chapter)
+            chapterURIs.append(ModulestoreIndex.resourceURI(chapter))
+        modules.append(makeModule(course, 'course', 'Fall2014', chapterURIs))
+        collection.insert_many(modules)
+
+def placePerModule(msdb, problems):
+    '''
+    The former lookups: one find() per course name,
+    parent, and staff-only flag.
+    '''
+    def locate(uri):
+        if not uri:
+            return None, -2
+        try:
+            parent = msdb.modulestore.find({"definition.children": uri}).next()
+        except StopIteration:
+            return None, -2
+        return ModulestoreIndex.resourceURI(parent), parent['definition']['children'].index(uri) + 1
+
+    placements = []
+    for problem in problems:
+        courseName = msdb.modulestore.find({"_id.category": "course",
+                                            "_id.org": problem['_id']['org'],
+                                            "_id.course": problem['_id']['course']})[0]['_id']['name']
+        verticalURI, problemIdx = locate(ModulestoreIndex.resourceURI(problem))
+        sequentialURI, verticalIdx = locate(verticalURI)
+        staffOnly = msdb.modulestore.find({"_id.name": verticalURI.split('/')[5]}).next()['metadata'].get('visible_to_staff_only', False)
+        chapterURI, sequentialIdx = locate(sequentialURI)
+        courseURI, chapterIdx = locate(chapterURI)  #@UnusedVariable
+        placements.append((courseName, verticalURI, problemIdx, sequentialURI, verticalIdx, staffOnly, chapterURI, sequentialIdx, chapterIdx))
+    return placements
+
+def placePrefetched(msdb, problems, batchSize):
+    index = ModulestoreIndex(msdb)
+    placements = []
+    for start in range(0, len(problems), batchSize):
+        batch = problems[start:start + batchSize]
+        index.prefetchOld(batch)
+        for problem in batch:
+            courseName = index.courseName(problem['_id']['org'], problem['_id']['course'])
+            verticalURI, problemIdx = index.locateModuleInParent(ModulestoreIndex.resourceURI(problem))
+            sequentialURI, verticalIdx = index.locateModuleInParent(verticalURI)
+            staffOnly = index.isStaffOnly(verticalURI.split('/')[5])
+            chapterURI, sequentialIdx = index.locateModuleInParent(sequentialURI)
+            courseURI, chapterIdx = index.locateModuleInParent(chapterURI)  #@UnusedVariable
+            placements.append((courseName, verticalURI, problemIdx, sequentialURI, verticalIdx, staffOnly, chapterURI, sequentialIdx, chapterIdx))
+    return placements
+
+def openScratchDb(useMongomock, dbName):
+    if useMongomock:
+        import mongomock
+        return mongomock.MongoClient()[dbName]
+    import pymongo
+    client = pymongo.MongoClient()
+    client.drop_database(dbName)
+    return client[dbName]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Compare per-module Mongo queries with bulk prefetch when placing modulestore problems.')
+    parser.add_argument('-c', '--numCourses',
+                        action='store',
+                        type=int,
+                        default=10,
+                        help='Number of synthetic courses. Default: 10.')
+    parser.add_argument('-f', '--fanOut',
+                        action='store',
+                        type=int,
+                        default=4,
+                        help='Chapters per course, sequentials per chapter, verticals per sequential. Default: 4.')
+    parser.add_argument('-p', '--problemsPerVertical',
+                        action='store',
+                        type=int,
+                        default=3,
+                        help='Problems per vertical. Default: 3.')
+    parser.add_argument('-b', '--batchSize',
+                        action='store',
+                        type=int,
+                        default=500,
+                        help='Problems per prefetch batch. Default: 500.')
+    parser.add_argument('--mongomock',
+                        action='store_true',
+                        help='Use an in-memory mongomock database instead of the local mongod.')
+    parser.add_argument('--dbName',
+                        action='store',
+                        default='modulestoreBenchmark',
+                        help='Scratch database; dropped before and after. Default: modulestoreBenchmark.')
+    args = parser.parse_args();
+
+    db = openScratchDb(args.mongomock, args.dbName)
+    try:
+        if not args.mongomock:
+            db.modulestore.create_index('definition.children')
+            db.modulestore.create_index('_id.name')
+        fillModulestore(db.modulestore, args.numCourses, args.fanOut, args.problemsPerVertical)
+        problems = list(db.modulestore.find({"_id.category": "problem"}))
+        print('%d problems in %d courses' % (len(problems), args.numCourses))
+        print('%-12s %10s %12s %14s' % ('Method', 'Seconds', 'find() calls', 'Problems/sec'))
+
+        results = {}
+        for (methodName, placeFunc) in [('per-module', lambda msdb: placePerModule(msdb, problems)),
+                                        ('prefetched', lambda msdb: placePrefetched(msdb, problems, args.batchSize))]:
+            msdb = CountingModulestore(db)
+            startTime = time.time()
+            results[methodName] = placeFunc(msdb)
+            elapsed = time.time() - startTime
+            print('%-12s %10.2f %12d %14.0f' % (methodName, elapsed, msdb.modulestore.numFinds, len(problems) / elapsed if elapsed > 0 else 0))
+        print('Results agree: %s' % (results['per-module'] == results['prefetched']))
+    finally:
+        if not args.mongomock:
+            db.client.drop_database(args.dbName)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Compares startup time, lookup time, and peak RSS of the two
+ModulestoreImporter hash lookup caches:
+
+   - the pickled dict (hashLookup.pkl) that used to be loaded in full
+   - the memory-mapped HashLookupStore (hashLookup.store)
+
+A synthetic hash --> info map with the given number of entries
+is written in both formats. Each format is then measured in a
+fresh child process, so that RSS figures are not polluted by
+the other format, or by building the test data.
+
+With -j, instead times the streaming ingestion of a modulestore
+JSON extract by ModulestoreImporter, reporting entries/sec and peak RSS.
+
+Examples:
+    benchmarkModulestoreLookup.py -n 1000000 -l 100000
+    benchmarkModulestoreLookup.py -j ../json_to_relation/data/modulestore_latest.json
+'''
+import argparse
+import cPickle
+import hashlib
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from hash_lookup_store import HashLookupStore
+from modulestoreImporter import ModulestoreImporter
+
+
+class PrintingLogger(object):
+    '''
+    Stands in for the parser that ModulestoreImporter
+    normally logs through.
+    '''
+    def logInfo(self, msg):
+        print(msg)
+
+    def logError(self, msg):
+        print(msg)
+
+    def logDebug(self, msg):
+        pass
+
+
+def makeKey(i):
+    return hashlib.md5(str(i)).hexdigest()
+
+def makeHashLookup(numEntries):
+    hashLookup = {}
+    for i in range(numEntries):
+        hashLookup[unicode(makeKey(i))] = {'org' : u'Medicine',
+                                           'course_short_name' : u'HRP%s' % (i % 500),
+                                           'category' : u'problem' if i % 3 else u'video',
+                                           'revision' : None,
+                                           'name' : unicode(makeKey(i)),
+                                           'display_name' : u'Problem %s of module %s' % (i % 20, i % 37)}
+    return hashLookup
+
+def measure(storeFormat, path, numEntries, numLookups):
+    '''
+    Run in the child process: open the cache, look up
+    numLookups random keys, and print one result line.
+    '''
+    startTime = time.time()
+    if storeFormat == 'pickle':
+        with open(path, 'rb') as pickleFd:
+            hashLookup = cPickle.load(pickleFd)
+    else:
+        hashLookup = HashLookupStore(path)
+    startupTime = time.time() - startTime
+
+    keys = [makeKey(random.randrange(numEntries)) for _ in range(numLookups)]
+    startTime = time.time()
+    for key in keys:
+        hashLookup.get(key)['display_name']
+    lookupTime = time.time() - startTime
+    print('%-8s %14.3f %14.0f %14.1f' % (storeFormat, startupTime, numLookups / lookupTime if lookupTime > 0 else 0, getMaxRSS() / 1024.0))
+
+def measureJSONIngestion(jsonFileName):
+    storePath = os.path.join(tempfile.mkdtemp(prefix='modstoreBenchmark'), 'hashLookup.store')
+    try:
+        ModulestoreImporter(jsonFileName, useCache=False, pickleCachePath=storePath, parent=PrintingLogger())
+    finally:
+        shutil.rmtree(os.path.dirname(storePath))
+    print('Peak RSS (VmHWM): %.1f MB' % (getMaxRSS() / 1024.0))
+
+def getMaxRSS():
+    '''
+    Return this process' peak resident set size in KB. On Linux
+    VmHWM is used, because ru_maxrss would include the parent's
+    RSS from before the exec() of this process.
+    '''
+    try:
+        with open('/proc/self/status', 'r') as statusFd:
+            for line in statusFd:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Compare startup time and RSS of pickled versus memory-mapped modulestore hash lookup.')
+    parser.add_argument('-n', '--numEntries',
+                        action='store',
+                        type=int,
+                        default=500000,
+                        help='Number of hash entries in the synthetic lookup. Default: 500000.')
+    parser.add_argument('-l', '--numLookups',
+                        action='store',
+                        type=int,
+                        default=100000,
+                        help='Number of random lookups after startup. Default: 100000.')
+    parser.add_argument('-j', '--jsonFile',
+                        action='store',
+                        help='Time ingestion of this modulestore JSON extract instead.')
+    parser.add_argument('--child',
+                        nargs=2,
+                        metavar=('FORMAT', 'PATH'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args();
+
+    if args.child is not None:
+        measure(args.child[0], args.child[1], args.numEntries, args.numLookups)
+        sys.exit(0)
+
+    if args.jsonFile is not None:
+        measureJSONIngestion(args.jsonFile)
+        sys.exit(0)
+
+    tmpDir = tempfile.mkdtemp(prefix='modstoreBenchmark')
+    try:
+        hashLookup = makeHashLookup(args.numEntries)
+        picklePath = os.path.join(tmpDir, 'hashLookup.pkl')
+        storePath  = os.path.join(tmpDir, 'hashLookup.store')
+        with open(picklePath, 'wb') as pickleFd:
+            cPickle.dump(hashLookup, pickleFd)
+        HashLookupStore.write(storePath, hashLookup)
+        del hashLookup
+
+        print('%d entries; pickle file %.1f MB, store file %.1f MB' %
+              (args.numEntries, os.path.getsize(picklePath) / 1e6, os.path.getsize(storePath) / 1e6))
+        print('%-8s %14s %14s %14s' % ('Format', 'Startup (sec)', 'Lookups/sec', 'Max RSS (MB)'))
+        sys.stdout.flush()
+        for (storeFormat, path) in [('pickle', picklePath), ('store', storePath)]:
+            subprocess.check_call([sys.executable, os.path.abspath(__file__),
+                                   '-n', str(args.numEntries), '-l', str(args.numLookups),
+                                   '--child', storeFormat, path])
+    finally:
+        shutil.rmtree(tmpDir)
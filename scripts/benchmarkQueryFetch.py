@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Compares rows/sec of the ways MySQLDB can pull a large
+query result from a local database:
+
+   - fetchone() loop on a buffered cursor (how query() used to work)
+   - query() on a buffered cursor with fetchmany() batching
+   - query(streaming=True) on an unbuffered server-side cursor
+   - queryBatches() on an unbuffered server-side cursor
+
+Also times opening plain versus pooled connections.
+
+Example:
+    benchmarkQueryFetch.py -u myUser -d Edx "SELECT * FROM EdxTrackEvent LIMIT 1000000"
+'''
+import argparse
+import getpass
+import os
+import sys
+import time
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from connection_pool import ConnectionPool
+from mysqldb import MySQLDB
+
+
+def fetchOneLoop(db, queryStr):
+    cursor = db.connection.cursor()
+    cursor.execute(queryStr)
+    numRows = 0
+    while cursor.fetchone() is not None:
+        numRows += 1
+    cursor.close()
+    return numRows
+
+def queryBuffered(db, queryStr, batchSize):
+    numRows = 0
+    for _ in db.query(queryStr, batchSize=batchSize):
+        numRows += 1
+    return numRows
+
+def queryStreaming(db, queryStr, batchSize):
+    numRows = 0
+    for _ in db.query(queryStr, streaming=True, batchSize=batchSize):
+        numRows += 1
+    return numRows
+
+def queryBatched(db, queryStr, batchSize):
+    numRows = 0
+    for batch in db.queryBatches(queryStr, batchSize=batchSize):
+        numRows += len(batch)
+    return numRows
+
+def timeConnects(user, pwd, dbName, numConnects, pooled):
+    startTime = time.time()
+    for _ in range(numConnects):
+        db = MySQLDB(user=user, passwd=pwd, db=dbName, pooled=pooled)
+        db.close()
+    return time.time() - startTime
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Compare rows/sec of MySQLDB fetch strategies against a local database.')
+    parser.add_argument('-u', '--user',
+                        action='store',
+                        help='User ID that is to log into MySQL. Default: the user who is invoking this script.')
+    parser.add_argument('-p', '--password',
+                        action='store_true',
+                        help='Request to be asked for pwd for operating MySQL; default: no password.')
+    parser.add_argument('-d', '--database',
+                        action='store',
+                        default='Edx',
+                        help='Database to connect to. Default: Edx.')
+    parser.add_argument('-b', '--batchSize',
+                        action='store',
+                        type=int,
+                        default=MySQLDB.QUERY_BATCH_SIZE,
+                        help='Rows per fetchmany(). Default: %s.' % MySQLDB.QUERY_BATCH_SIZE)
+    parser.add_argument('-c', '--connects',
+                        action='store',
+                        type=int,
+                        default=100,
+                        help='Number of connection opens to time. Default: 100.')
+    parser.add_argument('query',
+                        action='store',
+                        help='SELECT statement whose result is pulled by each strategy.')
+    args = parser.parse_args();
+
+    user = args.user if args.user is not None else getpass.getuser()
+    pwd  = getpass.getpass("Enter %s's MySQL password on localhost: " % user) if args.password else ''
+
+    strategies = [('fetchone() loop',         lambda db: fetchOneLoop(db, args.query)),
+                  ('query(), buffered',       lambda db: queryBuffered(db, args.query, args.batchSize)),
+                  ('query(), streaming',      lambda db: queryStreaming(db, args.query, args.batchSize)),
+                  ('queryBatches(), streaming', lambda db: queryBatched(db, args.query, args.batchSize))]
+
+    print('%-28s %12s %10s %14s' % ('Strategy', 'Rows', 'Seconds', 'Rows/sec'))
+    for (name, strategy) in strategies:
+        db = MySQLDB(user=user, passwd=pwd, db=args.database)
+        try:
+            startTime = time.time()
+            numRows = strategy(db)
+            elapsed = time.time() - startTime
+        finally:
+            db.close()
+        print('%-28s %12d %10.2f %14.0f' % (name, numRows, elapsed, numRows / elapsed if elapsed > 0 else 0))
+
+    plainTime  = timeConnects(user, pwd, args.database, args.connects, pooled=False)
+    pooledTime = timeConnects(user, pwd, args.database, args.connects, pooled=True)
+    ConnectionPool.closeAll()
+    print('%d plain connects: %.2f sec; %d pooled connects: %.2f sec' %
+          (args.connects, plainTime, args.connects, pooledTime))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# Copyright (c) 2014, Stanford University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+'''
+Compares the conservative column types of the generic JSON-to-relation
+converter (DOUBLE, TEXT, SMALLINT) with types inferred by a first pass
+of SchemaInferrer.
+
+Input is a file with one JSON object per line, or synthetic events.
+Both schemas convert the same lines into rows. Reports the time of
+the inference pass, how many columns were narrowed, and the storage
+the rows need under each schema, estimated from MySQL's per-type
+sizes. With -u, also loads the rows into two scratch tables of the
+given database, and reports load time and the tables' data length
+as MySQL reports it.
+
+Examples:
+    benchmarkSchemaInference.py -n 50000
+    benchmarkSchemaInference.py -f tracking.log -s 10
+    benchmarkSchemaInference.py -u myUser -p -d test
+'''
+import argparse
+from collections import OrderedDict
+import getpass
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add json_to_relation source dir to $PATH
+# for duration of this execution:
+source_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "../json_to_relation/")]
+source_dir.extend(sys.path)
+sys.path = source_dir
+
+from col_data_type import ColDataType
+from generic_json_parser import GenericJSONParser
+from input_source import InString
+from json_to_relation import JSONToRelation
+from mysqldb import MySQLDB
+from output_disposition import OutputPipe, OutputDisposition
+from schema_inference import SchemaInferrer
+
+
+# Bytes per value of fixed-size types, and bytes of the
+# length prefix of variable-length ones:
+FIXED_SIZES = {ColDataType.TINYINT : 1, ColDataType.SMALLINT : 2, ColDataType.MEDIUMINT : 3,
+               ColDataType.INT : 4, ColDataType.BIGINT : 8, ColDataType.FLOAT : 4, ColDataType.DOUBLE : 8}
+LENGTH_PREFIX_SIZES = {ColDataType.TINYTEXT : 1, ColDataType.TEXT : 2, ColDataType.MEDIUMTEXT : 3, ColDataType.LONGTEXT : 4}
+
+INSERT_BATCH_SIZE = 1000
+
+def makeEvents(numLines):
+    rand = random.Random(4711)
+    lines = []
+    for lineNum in range(numLines):
+        event = {'username' : 'user%d' % rand.randint(0, 1000),
+                 'event_type' : rand.choice(['problem_check', 'play_video', 'seq_goto']),
+                 'context' : {'course_id' : 'Medicine/HRP258/Statistics_in_Medicine',
+                              'user_id' : rand.randint(1, 100000),
+                              'org_id' : 'Medicine'},
+                 'event' : {'answers' : [{'correct' : rand.random() < 0.5, 'attempt' : i + 1} for i in range(rand.randint(1, 3))],
+                            'grade' : rand.randint(0, 4),
+                            'max_grade' : 4,
+                            'seconds' : rand.randint(0, 7200),
+                            'position' : rand.random(),
+                            'saved' : rand.random() < 0.1}}
+        lines.append(json.dumps(event))
+    return lines
+
+def convertLines(lines, schemaHints, logFileName):
+    '''
+    Convert the lines to rows with GenericJSONParser.
+
+    :return: rows, and (column name, ColDataType) of each column
+    :rtype: ([[<any>]], [(String, ColDataType)])
+    '''
+    converter = JSONToRelation(InString('{}'),
+                               OutputPipe(OutputDisposition.OutputFormat.CSV),
+                               schemaHints=schemaHints,
+                               logFile=logFileName)
+    converter.destination.schemas[converter.mainTableName] = OrderedDict()
+    jsonParser = GenericJSONParser(converter, progressEvery=sys.maxint)
+    jsonParser.colNamesByTable[converter.mainTableName] = []
+    rows = [jsonParser.processOneJSONObject(line, []) for line in lines]
+    schema = [(colSpec.getName(), colSpec.colDataType) for colSpec in converter.destination.getSchema(converter.mainTableName)]
+    # Pad short rows with the defaults of the columns they lack:
+    defaults = [ColDataType.defaultValues[colType] for (colName, colType) in schema]  #@UnusedVariable
+    for row in rows:
+        row.extend(defaults[len(row):])
+    return (rows, schema)
+
+def estimateBytes(rows, schema):
+    numBytes = 0
+    for (colPos, (colName, colType)) in enumerate(schema):  #@UnusedVariable
+        try:
+            numBytes += FIXED_SIZES[colType] * len(rows)
+        except KeyError:
+            numBytes += sum([LENGTH_PREFIX_SIZES[colType] + len(unicode(row[colPos]).encode('utf8')) for row in rows])
+    return numBytes
+
+def sqlColName(colName):
+    # Quotes from ensureLegalIdentifierChars() become backticks:
+    return '`%s`' % colName.strip('"\'').replace('`', '``')
+
+def loadRows(db, tableName, rows, schema):
+    '''
+    Create the table, insert the rows, and return the load time
+    and the table's data length.
+    '''
+    db.dropTable(tableName)
+    db.createTable(tableName, OrderedDict([(sqlColName(colName), ColDataType().toString(colType)) for (colName, colType) in schema]))
+    insertCmd = 'INSERT INTO %s VALUES (%s)' % (tableName, ','.join(['%s'] * len(schema)))
+    cursor = db.connection.cursor()
+    try:
+        startTime = time.time()
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            cursor.executemany(insertCmd, [[None if value == '' and colType in FIXED_SIZES else value
+                                            for (value, (colName, colType)) in zip(row, schema)]  #@UnusedVariable
+                                           for row in rows[start:start + INSERT_BATCH_SIZE]])
+        db.connection.commit()
+        elapsed = time.time() - startTime
+        cursor.execute('ANALYZE TABLE %s' % tableName)
+        cursor.fetchall()
+        cursor.execute("SELECT data_length FROM information_schema.TABLES WHERE table_schema = DATABASE() AND table_name = '%s'" % tableName)
+        dataLength = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        db.dropTable(tableName)
+    return (elapsed, dataLength)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description='Compare conservative and inferred column types of the generic converter.')
+    parser.add_argument('-f', '--file',
+                        action='store',
+                        help='File with one JSON object per line. Default: synthetic events.')
+    parser.add_argument('-n', '--numLines',
+                        action='store',
+                        type=int,
+                        default=20000,
+                        help='Number of synthetic events, or max lines read from --file. Default: 20000.')
+    parser.add_argument('-s', '--sampleEvery',
+                        action='store',
+                        type=int,
+                        default=1,
+                        help='Infer from every sampleEvery\'th line only. Default: 1.')
+    parser.add_argument('--headroom',
+                        action='store',
+                        type=float,
+                        default=SchemaInferrer.DEFAULT_INT_HEADROOM,
+                        help='Headroom factor for integer ranges and string lengths. Default: %s.' % SchemaInferrer.DEFAULT_INT_HEADROOM)
+    parser.add_argument('-u', '--user',
+                        action='store',
+                        help='MySQL user for loading the rows; no loading if omitted.')
+    parser.add_argument('-p', '--password',
+                        action='store_true',
+                        help='Request to be asked for pwd for operating MySQL; default: no password.')
+    parser.add_argument('-d', '--database',
+                        action='store',
+                        default='test',
+                        help='Database for the scratch tables. Default: test.')
+    args = parser.parse_args();
+
+    if args.file is None:
+        lines = makeEvents(args.numLines)
+    else:
+        with open(args.file, 'r') as fd:
+            lines = [line for (lineNum, line) in zip(xrange(args.numLines), fd) if len(line.strip()) > 0]  #@UnusedVariable
+
+    inferrer = SchemaInferrer(args.headroom, args.headroom)
+    startTime = time.time()
+    inferrer.observeLines(lines, sampleEvery=args.sampleEvery)
+    print('Inferred %d columns from %d of %d lines in %.2f sec' %\
+          (len(inferrer.colStats), inferrer.numLinesObserved, len(lines), time.time() - startTime))
+
+    logFile = tempfile.NamedTemporaryFile()
+    results = OrderedDict()
+    for (schemaName, schemaHints) in [('conservative', OrderedDict()), ('inferred', inferrer.schemaHints())]:
+        results[schemaName] = convertLines(lines, schemaHints, logFile.name)
+    logFile.close()
+
+    (conservativeSchema, inferredSchema) = [schema for (rows, schema) in results.values()]  #@UnusedVariable
+    numNarrowed = len([1 for (conservative, inferred) in zip(conservativeSchema, inferredSchema) if conservative != inferred])
+    print('%d of %d columns narrowed' % (numNarrowed, len(inferredSchema)))
+
+    if args.user is not None:
+        pwd = getpass.getpass("Enter %s's MySQL password on localhost: " % args.user) if args.password else ''
+        db = MySQLDB(user=args.user, passwd=pwd, db=args.database)
+    else:
+        db = None
+    print('%-14s %16s %12s %16s' % ('Schema', 'Est. bytes', 'Load sec', 'Data length'))
+    try:
+        for (schemaName, (rows, schema)) in results.items():
+            if db is not None:
+                (loadTime, dataLength) = loadRows(db, 'schemaInferenceBenchmark', rows, schema)
+                print('%-14s %16d %12.2f %16d' % (schemaName, estimateBytes(rows, schema), loadTime, dataLength))
+            else:
+                print('%-14s %16d %12s %16s' % (schemaName, estimateBytes(rows, schema), '-', '-'))
+    finally:
+        if db is not None:
+            db.close()
@@ -36,7 +36,11 @@
 # Input: either an absolute path to a directory that 
 # contains .sql files (usually mixed in with related
 # .csv files), or a list of absolute paths to the .sql
-# files.
+# files. The .sql files may be compressed (.sql.gz, .sql.zst).
+# The LOAD DATA lines for compressed .csv files are preceded by
+# mysql client 'system' lines that decompress the .csv file into
+# a FIFO, from which the LOAD DATA reads, and followed by 'system'
+# lines that remove the FIFO. Those lines are copied along.
 
 usage="Usage: "`basename $0`" {<path/to/.sql-files>|<.sql-files-list}"
 
@@ -49,6 +53,16 @@ fi
 csvDirOrFirstFile=$1
 # batchLoadFile=batchLoad_`$(date --utc +%FT%TZ)`.sql
 
+# Print the LOAD DATA lines of one .sql file, together
+# with the FIFO set-up and clean-up lines of compressed .csv files:
+extractLoadCommands() {
+    case $1 in
+	*.gz)  gzip -dc $1 ;;
+	*.zst) zstd -dc $1 ;;
+	*)     cat $1 ;;
+    esac | sed -n '/^system \|LOAD DATA LOCAL INFILE/p'
+}
+
 echo "/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;"
 echo "/*!40101 SET @OLD_CHARACTER_SET_RESULTS=@@CHARACTER_SET_RESULTS */;"
 echo "/*!40101 SET @OLD_COLLATION_CONNECTION=@@COLLATION_CONNECTION */;"
@@ -113,7 +127,8 @@ echo "SET autocommit=0;"
 
 if [ -d $1 ]
 then
-    for fileName in ${csvDirOrFirstFile}/*.sql
+    shopt -s nullglob
+    for fileName in ${csvDirOrFirstFile}/*.sql ${csvDirOrFirstFile}/*.sql.gz ${csvDirOrFirstFile}/*.sql.zst
     do
 	echo "-- Loading data from "$(echo ${fileName} | sed -n 's/.*\(tracking.*\.gz\).*/\1/p')
 	# The following extracts all LOAD DATA... lines from
@@ -123,7 +138,7 @@ then
 	#     sed -i.bak 's/;\\n//g' <your .sql output file>
 	#     rm <your .sql output file>.bak
 
-	echo "$(sed -n '/LOAD DATA LOCAL INFILE/p' ${fileName});\n"
+	echo "$(extractLoadCommands ${fileName});\n"
 	echo "COMMIT;"
     done
 else
@@ -136,7 +151,7 @@ else
 	# Do this afterwards:
 	#     sed -i.bak 's/;\\n//g' <your .sql output file>
 	#     rm <your .sql output file>.bak
-	echo "$(sed -n '/LOAD DATA LOCAL INFILE/p' ${fileName});\n"
+	echo "$(extractLoadCommands ${fileName});\n"
 	echo "COMMIT;"
     done
 fi    
@@ -19,12 +19,19 @@
 # the local MySQL's EdxPrivate.UserGrade table, and creates
 # indexes.
 #
+# Normally runs incrementally: only courseware_studentmodule rows
+# modified since the newest last_submit in ActivityGrade (the
+# high-water mark) are pulled, and addAnonToActivityGradeTable.py
+# replaces the earlier versions of changed rows. On FULL_REBUILD_DAY,
+# or with -f, ActivityGrade is emptied and rebuilt from all of
+# courseware_studentmodule, as a safety net against drift.
+#
 # To figure out what all the preliminary sections do,
 # uncomment the lines between '#***********'; then
 # invoke the script with various combinations of 
 # user ids and pwds on the commandline.
 
-USAGE='Usage: '`basename $0`' [-u localMySQLUser][-p][-pLocalMySQLPwd]'
+USAGE='Usage: '`basename $0`' [-u localMySQLUser][-p][-pLocalMySQLPwd][-f]'
 
 # Get MySQL version on this machine
 MYSQL_VERSION=$(mysql --version | sed -ne 's/.*Distrib \([0-9][.][0-9]\).*/\1/p')
@@ -42,6 +49,10 @@ MYSQL_PWD=''
 LOG_FILE=/home/dataman/Data/EdX/NonTransformLogs/refreshActivityGradeTable.log
 USERNAME=`whoami`
 needLocalPasswd=false
+# Day of week (1=Monday ... 7=Sunday, as from 'date +%u')
+# on which ActivityGrade is rebuilt from scratch:
+FULL_REBUILD_DAY=7
+FULL_REBUILD=false
 # Get directory in which this script is running,
 # and where its support scripts therefore live:
 currScriptsDir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
@@ -79,13 +90,17 @@ done
 # to drop into \? branch:
 NEXT_ARG=0
 
-while getopts ":pu:" opt
+while getopts ":pfu:" opt
 do
   case $opt in
     p)
       needLocalPasswd=true
       NEXT_ARG=$((NEXT_ARG + 1))
       ;;
+    f)
+      FULL_REBUILD=true
+      NEXT_ARG=$((NEXT_ARG + 1))
+      ;;
     u)
       USERNAME=$OPTARG
       NEXT_ARG=$((NEXT_ARG + 2))
@@ -150,8 +165,32 @@ fi
 # exit 0
 #**********
 
+if [[ `date +%u` == $FULL_REBUILD_DAY ]]
+then
+    FULL_REBUILD=true
+fi
+
+# Run the given SQL statements with the local
+# MySQL credentials established above:
+function runMySQL {
+    if [[ $MYSQL_VERSION == '5.6+' ]]
+    then
+        mysql --login-path=root -e "$1"
+    elif [ -z $MYSQL_PWD ]
+    then
+        mysql -u $USERNAME -e "$1"
+    else
+        mysql -u $USERNAME -p$MYSQL_PWD -e "$1"
+    fi
+}
+
 # ------------------ Signin -------------------
-echo `date`": Start updating table ActivityGrade..."  | tee --append $LOG_FILE
+if $FULL_REBUILD
+then
+    echo `date`": Start rebuilding table ActivityGrade from scratch..."  | tee --append $LOG_FILE
+else
+    echo `date`": Start updating table ActivityGrade incrementally..."  | tee --append $LOG_FILE
+fi
 
 # ----------------- Find Newest Entry in Local ActivityGrade Table ------------------
 
@@ -180,6 +219,18 @@ then
 fi
 
 
+if $FULL_REBUILD
+then
+    echo `date`": Emptying ActivityGrade for full rebuild..."  | tee --append $LOG_FILE
+    runMySQL "TRUNCATE TABLE Edx.ActivityGrade;"
+    if [[ $? != 0 ]]
+    then
+        echo `date`": Error emptying ActivityGrade."  | tee --append $LOG_FILE
+        exit 1
+    fi
+    LATEST_DATE='0000-00-00 00:00:00'
+fi
+
 if [ "${LATEST_DATE}" == "NULL" ]
 then
     # No dated entry in ActivityGrade at all (likely table is empty):
@@ -234,11 +285,14 @@ function cleanup {
 trap cleanup EXIT
 
 # Export from courseware_studentmodule:
-# test courses:
+# test courses. Rows modified at exactly the high-water
+# mark are pulled again, in case some of them were
+# committed after the previous refresh read the table;
+# they replace their earlier versions:
 
 read -rd '' TBL_EXPORT_CMD <<EOF
 SELECT created,course_id FROM edxprod.courseware_studentmodule
-  where modified > '${LATEST_DATE}'
+  where modified >= '${LATEST_DATE}'
   INTO OUTFILE '${TMP_FILE}'
   FIELDS TERMINATED BY "," OPTIONALLY ENCLOSED BY '"' LINES TERMINATED BY '\n';
 EOF
@@ -325,7 +379,11 @@ echo `date`": About to pull from courseware_studentmodule"  | tee --append $LOG_
 # script addAnonToActivityGradeTable.py assumes
 # this name. The @foo names below sneak in columns
 # that are not in courseware_studentmodule where we
-# pull the courses. 
+# pull the courses. The primary key lets that script
+# page through the table by activity_grade_id, and
+# courses are filtered here, once, rather than on
+# each of its batches. IGNORE keeps one row of any
+# that the join repeats.
 
 read -rd '' tmpTableCmd <<EOF
 SET @emptyStr:='';
@@ -333,8 +391,8 @@ SET @floatPlaceholder:=-1.0;
 SET @intPlaceholder:=-1;
 USE edxprod;
 DROP TABLE IF EXISTS StudentmoduleExcerpt;
-CREATE TABLE StudentmoduleExcerpt (activity_grade_id INT) ENGINE=MyISAM
-SELECT id AS activity_grade_id,
+CREATE TABLE StudentmoduleExcerpt (activity_grade_id INT NOT NULL PRIMARY KEY) ENGINE=MyISAM
+IGNORE SELECT id AS activity_grade_id,
        student_id,
        course_id AS course_display_name,
        grade,
@@ -351,7 +409,9 @@ SELECT id AS activity_grade_id,
        module_id
 FROM TMP_FILTER_TABLE LEFT JOIN courseware_studentmodule
      ON TMP_FILTER_TABLE.modified = courseware_studentmodule.modified
-    AND TMP_FILTER_TABLE.course_display_name = courseware_studentmodule.course_id;
+    AND TMP_FILTER_TABLE.course_display_name = courseware_studentmodule.course_id
+WHERE courseware_studentmodule.id IS NOT NULL
+  AND isTrueCourseName(courseware_studentmodule.course_id) = 1;
 DROP TABLE if exists TMP_FILTER_TABLE;
 EOF
 
@@ -381,72 +441,50 @@ echo `date`": Done creating auxiliary table."  | tee --append $LOG_FILE
 
 echo `date`": About to add percent_grade, resolve resource id, add anon_screen_name, and module_id..."  | tee --append $LOG_FILE
 
-if [[ $MYSQL_VERSION == '5.6+' ]]
+if $FULL_REBUILD
 then
+    # Turn off indexing while bulk-adding:
     echo "    "`date`": Begin disable ActivityGrade indexing."  | tee --append $LOG_FILE
-    mysql --login-path=root -e "ALTER TABLE Edx.ActivityGrade DISABLE KEYS;"
+    runMySQL "ALTER TABLE Edx.ActivityGrade DISABLE KEYS;"
     if [[ $? != 0 ]]
     then
         echo `date`": Error disabling indexing on ActivityGrade."  | tee --append $LOG_FILE
         exit 1
     fi
-
-    echo "    "`date`": Done done disable ActivityGrade indexing."  | tee --append $LOG_FILE
-    KEYS_DISABLED=1
+    echo "    "`date`": Done disable ActivityGrade indexing."  | tee --append $LOG_FILE
+    ADD_ANON_OPTS=''
 else
-    KEYS_DISABLED=0
+    # Changed rows are replaced by activity_grade_id, which
+    # needs that index; and few rows are added, so indexing
+    # stays on:
+    runMySQL "USE Edx; CALL createIndexIfNotExists('ActivityGradeActGrdIdIdx', 'ActivityGrade', 'activity_grade_id', NULL);"
+    if [[ $? != 0 ]]
+    then
+        echo `date`": Error ensuring activity_grade_id index on ActivityGrade."  | tee --append $LOG_FILE
+        exit 1
+    fi
+    ADD_ANON_OPTS='--incremental'
 fi
 
 if [ ! -z $MYSQL_PWD ]
 then
-    # Turn off indexing while bulk-adding:
-    if [[ $KEYS_DISABLED == 0 ]]
-    then
-	echo "    "`date`": Begin disable ActivityGrade indexing."  | tee --append $LOG_FILE
-	mysql -u $USERNAME -w $MYSQL_PWD -e "ALTER TABLE Edx.ActivityGrade DISABLE KEYS;"
-        if [[ $? != 0 ]]
-        then
-            echo `date`": Error "  | tee --append $LOG_FILE
-            exit 1
-        fi
-            echo "    "`date`": Done done disable ActivityGrade indexing."  | tee --append $LOG_FILE
-        fi
-        $currScriptsDir/addAnonToActivityGradeTable.py -u $USERNAME -w $MYSQL_PWD
+    $currScriptsDir/addAnonToActivityGradeTable.py -u $USERNAME -w $MYSQL_PWD $ADD_ANON_OPTS | tee --append $LOG_FILE
 else
-    # Turn off indexing while bulk-adding:
-    if [[ $KEYS_DISABLED == 0 ]]
-    then
-        echo "    "`date`": Begin disable ActivityGrade indexing."  | tee --append $LOG_FILE
-	mysql -u $USERNAME -e "ALTER TABLE Edx.ActivityGrade DISABLE KEYS;"
-        if [[ $? != 0 ]]
-        then
-            echo `date`": Error "  | tee --append $LOG_FILE
-            exit 1
-        fi
-        echo "    "`date`": Done done disable ActivityGrade indexing."  | tee --append $LOG_FILE
-    fi
-    $currScriptsDir/addAnonToActivityGradeTable.py -u $USERNAME
+    $currScriptsDir/addAnonToActivityGradeTable.py -u $USERNAME $ADD_ANON_OPTS | tee --append $LOG_FILE
 fi
 
 echo "    "`date`": Done loading new entries into ActivityGrade."  | tee --append $LOG_FILE
-echo "    "`date`": Start re-enabling indexing in ActivityGrade..."  | tee --append $LOG_FILE
 
-if [[ $MYSQL_VERSION == '5.6+' ]]
+if $FULL_REBUILD
 then
-    mysql --login-path=root -e "ALTER TABLE Edx.ActivityGrade ENABLE KEYS;"
-else
-    if [ ! -z $MYSQL_PWD ]
+    echo "    "`date`": Start re-enabling indexing in ActivityGrade..."  | tee --append $LOG_FILE
+    runMySQL "ALTER TABLE Edx.ActivityGrade ENABLE KEYS;"
+    if [[ $? != 0 ]]
     then
-        mysql -u $USERNAME -w $MYSQL_PWD -e "ALTER TABLE Edx.ActivityGrade ENABLE KEYS;"
-    else
-        mysql -u $USERNAME -e "ALTER TABLE Edx.ActivityGrade ENABLE KEYS;"
+        echo `date`": Error re-enabling indexing on ActivityGrade."  | tee --append $LOG_FILE
+        exit 1
     fi
 fi
-if [[ $? != 0 ]]
-then
-    echo `date`": Error re-enabling indexing on ActivityGrade."  | tee --append $LOG_FILE
-    exit 1
-fi
 
 echo `date`": Done adding percent_grade, ..."  | tee --append $LOG_FILE
 
@@ -21,3 +21,4 @@ CALL createIndexIfNotExists('ActivityGradeModTypeIdx', 'ActivityGrade', 'module_
 CALL createIndexIfNotExists('ActivityGradeRsrcDispIdx', 'ActivityGrade', 'resource_display_name', 255);
 CALL createIndexIfNotExists('ActivityGradeAnonNmIdx', 'ActivityGrade', 'anon_screen_name', 40);
 CALL createIndexIfNotExists('ActivityGradeModIdIdx', 'ActivityGrade', 'module_id', 255);
+CALL createIndexIfNotExists('ActivityGradeActGrdIdIdx', 'ActivityGrade', 'activity_grade_id', NULL);
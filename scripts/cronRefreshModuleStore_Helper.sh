@@ -261,10 +261,15 @@ else
     exit 1
 fi
 
-# Remove old hash lookup pickle file to force ModulestoreImporter
-# to re-build that hash:
-echo `date`": Removing old ModulestoreImporter cash pickle file if exists; OK if it does not."
-rm $TARGET_DIR/hashLookup.pkl
+# Bring the ModulestoreImporter hash lookup store up to date.
+# Only courses whose modulestore entries changed since the last
+# refresh are re-ingested; without a store, it is built in full.
+# hashLookup.pkl is the cache format used by earlier versions:
+echo `date`": Refreshing ModulestoreImporter cache file."
+rm -f $TARGET_DIR/hashLookup.pkl
+python $currScriptsDir/../json_to_relation/modulestoreImporter.py \
+    -c $TARGET_DIR/hashLookup.store \
+    $TARGET_DIR/modulestore_latest.json | tee --append $LOG_FILE
 
 # ------------------ Signout -------------------
 echo `date`": Finished updating table modulestore extract."  | tee --append $LOG_FILE
@@ -19,6 +19,7 @@
 # are loaded without indexing. Finally, the indexes are
 # created in memory, if sufficient RAM is available.
 # Remember: each .sql file knows to load each table's .csv files.
+# The .sql files may also be compressed (.sql.gz, .sql.zst).
 #
 # This script needs to use MySQL as root. There are multiple 
 # methods for accomplishing this from the cmd line:
@@ -40,7 +41,7 @@
 # This script is complex enough that Python would have
 # been more appropriate. But it grew from a small kernel.
 
-usage="Usage: "`basename $0`" [-u username][-p][-w rootpass] logDir file1.sql file2.sql... # You may be asked for MySQL root pwd."
+usage="Usage: "`basename $0`" [-u username][-p][-w rootpass] logDir file1.sql file2.sql.gz file3.sql.zst... # You may be asked for MySQL root pwd."
 
 # Get MySQL version on this machine
 MYSQL_VERSION=$(mysql --version | sed -ne 's/.*Distrib \([0-9][.][0-9]\).*/\1/p')
@@ -86,6 +87,16 @@ inArray() {
     echo 0
 }
 
+catSqlFile() {
+# Write the given .sql file to stdout, decompressing
+# .sql.gz and .sql.zst files written by json2sql.py -z:
+    case $1 in
+	*.gz)  gzip -dc $1 ;;
+	*.zst) zstd -dc $1 ;;
+	*)     cat $1 ;;
+    esac
+}
+
 # -------------------  Process Commandline Option -----------------
 
 # Keep track of number of optional args the user provided:
@@ -126,6 +137,10 @@ then
     exit 1
 fi
 
+# Get home directory of whichever user will
+# log into MySQL:
+HOME_DIR=$(getent passwd $USERNAME | cut -d: -f6)
+
 if $askForPasswd
 then
     # The -s option suppresses echo:
@@ -133,9 +148,6 @@ then
     echo
 elif [ -z $password ]
 then
-    # Get home directory of whichever user will
-    # log into MySQL:
-    HOME_DIR=$(getent passwd $USERNAME | cut -d: -f6)
     # If the home dir has a readable file called mysql_root in its .ssh
     # subdir, then pull the pwd from there:
     if test -f $HOME_DIR/.ssh/mysql_root && test -r $HOME_DIR/.ssh/mysql_root
@@ -149,13 +161,9 @@ shift
 
 # Make sure all the files remaining in the 
 # argument list are readable files:
+okSoFar=1
 for file in $@
 do
-    okSoFar=1
-    # Get file extension:
-    filename=$(basename "$file")
-    extension="${filename##*.}"
-
     if [ ! -r $file ]
     then
 	echo "File "$file" is not readable."
@@ -164,10 +172,14 @@ do
     then
 	echo "File "$file" is a directory."
 	okSoFar=0
-    elif [ $extension != 'sql' ]
-    then
-	echo "File "$file" does not end with .sql (I know...picky, but better than crashing later)"
-	okSoFar=0
+    else
+	case $file in
+	    *.sql|*.sql.gz|*.sql.zst) ;;
+	    *)
+		echo "File "$file" does not end with .sql, .sql.gz, or .sql.zst (I know...picky, but better than crashing later)"
+		okSoFar=0
+		;;
+	esac
     fi
 done
 if [ $okSoFar -ne 1 ]
@@ -234,6 +246,7 @@ do
         { mysql --login-path=root -e 'FLUSH TABLES $table' EdxPrivate; } >> $LOG_FILE 2>&1
     else
 	{ mysql -u root -p$password -e 'FLUSH TABLES $table' EdxPrivate; } >> $LOG_FILE 2>&1
+    fi
 done
 
 # -------------------  Remove Primary Keys for Loading Speed -----------------
@@ -255,22 +268,50 @@ done
 # -------------------  Loading SQL Files, Which Load CSVs -----------------
 
 # Do the actual loading of CSV files into their respective tables;
-# $@ are the .sql files from the CLI:
+# $@ are the .sql files from the CLI. Compressed .sql files are
+# piped through their decompressor; the 'system' lines they contain
+# decompress their .csv files into FIFOs for LOAD DATA:
 for sqlFile in $@
 do  
     echo "`date`: starting on $sqlFile"  >> $LOG_FILE 2>&1
     if [[ $MYSQL_VERSION == '5.6+' ]]
     then
-    	{ mysql -f --login-path=root --local_infile=1 < $sqlFile; } >> $LOG_FILE 2>&1
+    	{ catSqlFile $sqlFile | mysql -f --login-path=root --local_infile=1; } >> $LOG_FILE 2>&1
     	mysql -f --login-path=root -e "USE Edx; COMMIT; USE EdxPrivate; COMMIT;"
     	echo "`date`: done loading $sqlFile"  >> $LOG_FILE 2>&1
     else
-    	{ mysql -f -u root -p$password --local_infile=1 < $sqlFile; } >> $LOG_FILE 2>&1
+    	{ catSqlFile $sqlFile | mysql -f -u root -p$password --local_infile=1; } >> $LOG_FILE 2>&1
     	mysql -f -u root -p$password -e "USE Edx; COMMIT; USE EdxPrivate; COMMIT;"
     	echo "`date`: done loading $sqlFile"  >> $LOG_FILE 2>&1
     fi
 done
 
+currScriptsDir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Credentials for the Python scripts below. Under MySQL 5.6+ the
+# mysql calls above log in with --login-path=root, which the Python
+# MySQL driver cannot read. Without a password from -p, -w, or
+# .ssh/mysql_root, the scripts then take the [client] password
+# from the user's ~/.my.cnf:
+if [ -n "$password" ]
+then
+    pyCredentials=(-u root -w "$password")
+elif test -r $HOME_DIR/.my.cnf
+then
+    pyCredentials=(-u root -c $HOME_DIR/.my.cnf)
+else
+    echo "`date`: no MySQL password and no $HOME_DIR/.my.cnf; Python scripts log in as root without password." >> $LOG_FILE 2>&1
+    pyCredentials=(-u root)
+fi
+
+# -------------------  Merge Private Staging Tables -----------------
+
+# .sql files produced with json2sql.py -m leave their Account
+# and EventIp rows in Edx staging tables. Merge them into
+# EdxPrivate once for the whole batch, rather than once per file:
+echo "`date`: merging Edx.Account and Edx.EventIp into EdxPrivate..." >> $LOG_FILE 2>&1
+{ python $currScriptsDir/../json_to_relation/privateTableMerger.py "${pyCredentials[@]}"; } >> $LOG_FILE 2>&1
+
 # -------------------  Restore Primary Keys -----------------
 
 # Add primary keys back in:
@@ -295,42 +336,18 @@ done
 # Fix up the indexes, since we didn't update
 # them during the load. 
 
-currScriptsDir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
-
-# Re-Enable foreign key constraints that were disabled in the 
-# loaded .sql files:
-for table in ${!tables[@]}
-do
-    echo "`date`: re-enabling non-primary key indexes for Edx."$table"..." >> $LOG_FILE 2>&1
-    # The ${tables["$table"]} accesses the primary key column name (i.e. the value of the dict):
-    if [[ $MYSQL_VERSION == '5.6+' ]]
-    then
-	{ mysql --login-path=root -e "USE Edx; ALTER TABLE "$table" ENABLE KEYS;"; } >> $LOG_FILE 2>&1
-    else
-	{ mysql -u root -p$password -e "USE Edx; ALTER TABLE "$table" ENABLE KEYS;"; } >> $LOG_FILE 2>&1
-    fi
-done
-
-# Same for private tables
-for table in ${!privateTables[@]}
-do
-    echo "`date`: re-enabling non-primary key indexes for EdxPrivate."$table"..." >> $LOG_FILE 2>&1
-    # The ${tables["$table"]} accesses the primary key column name (i.e. the value of the dict):
-    if [[ $MYSQL_VERSION == '5.6+' ]]
-    then
-	{ mysql --login-path=root -e "USE EdxPrivate; ALTER TABLE "$table" ENABLE KEYS;"; } >> $LOG_FILE 2>&1
-    else
-	{ mysql -u root -p$password -e "USE EdxPrivate; ALTER TABLE "$table" ENABLE KEYS;"; } >> $LOG_FILE 2>&1
-    fi
-done
-
-# Create any missing non-primary indexes:
-{ $currScriptsDir/createIndexForTable.sh -u root -p$password; } >> $LOG_FILE 2>&1
+# Re-enable the keys that were disabled in the loaded
+# .sql files, and create any missing non-primary indexes.
+# postLoadIndexer.py works on several tables concurrently,
+# each over its own connection, skips indexes that already
+# exist, and logs the time taken for each index:
+echo "`date`: re-enabling keys and creating missing indexes for Edx and EdxPrivate..." >> $LOG_FILE 2>&1
+{ python $currScriptsDir/../json_to_relation/postLoadIndexer.py "${pyCredentials[@]}"; } >> $LOG_FILE 2>&1
 
 # Any un-updated indexes are now rebuilt in memory by the following:
 # We don't normally need to do this, since above indexes were either
-# newly created (in createIndexForTable.sh), or refreshed in
-# the ALTER TABLE ENABLE KEYS calls:
+# newly created, or refreshed by ALTER TABLE ENABLE KEYS
+# in postLoadIndexer.py:
 #echo "`date`: checking indexes using mysqlcheck..." >> $LOG_FILE 2>&1
 #{ time mysqlcheck -u root -p$password --repair --databases Edx EdxPrivate; } >> $LOG_FILE 2>&1
 
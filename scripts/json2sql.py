@@ -138,6 +138,50 @@ if __name__ == "__main__":
                         dest='targetFormat',
                         default='sql_dump',
                         choices = ['csv', 'sql_dump', 'sql_dump_and_csv']);
+    parser.add_argument('-m', '--deferMerge',
+                        help='leave Account and EventIp rows in Edx staging tables; privateTableMerger.py merges them into EdxPrivate once per load batch.',
+                        dest='deferMerge',
+                        action='store_true',
+                        default=False);
+    parser.add_argument('-q', '--quarterFiles',
+                        help='write EdxTrackEvent CSV rows to one file per quarter, each loaded into its own partition. Only for -t csv.',
+                        dest='quarterFiles',
+                        action='store_true',
+                        default=False);
+    parser.add_argument('-b', '--bufferSize',
+                        help='bytes buffered per output file before writing. Default: %d' % OutputDisposition.WRITE_BUFFER_SIZE,
+                        dest='bufferSize',
+                        type=int,
+                        default=OutputDisposition.WRITE_BUFFER_SIZE);
+    parser.add_argument('-z', '--compress',
+                        help='compress the .sql and .csv outputs. Default: none',
+                        dest='compress',
+                        choices=['none', 'gzip', 'zstd'],
+                        default='none');
+    parser.add_argument('-w', '--warningsFile',
+                        help='also write every parse warning as a JSON line to a .jsonl file next to the log file. The log only shows the first few warnings of each kind.',
+                        dest='warningsFile',
+                        action='store_true',
+                        default=False);
+    parser.add_argument('--profile',
+                        help='log a table of the time spent in each stage of the transform: reading input, JSON decoding, each event handler, writing output.',
+                        dest='profile',
+                        action='store_true',
+                        default=False);
+    parser.add_argument('--cProfile',
+                        help='also write cProfile statistics of the transform to a .pstats file next to the log file.',
+                        dest='cProfile',
+                        action='store_true',
+                        default=False);
+    parser.add_argument('--metricsDir',
+                        help='directory to which snapshots of throughput, rows per table, cache hit rates, and ETA are written while transforming. Default: none',
+                        dest='metricsDir',
+                        default=None);
+    parser.add_argument('--metricsFormat',
+                        help='format of the metrics snapshots: Prometheus text (for node_exporter\'s textfile collector), or JSON. Default: prom',
+                        dest='metricsFormat',
+                        choices=['prom', 'json'],
+                        default='prom');
     parser.add_argument('destDir',
                         help='file path for the destination .sql/csv file(s)')
     parser.add_argument('inFilePath',
@@ -154,6 +198,10 @@ if __name__ == "__main__":
     fileStamp = dt.isoformat().replace(':','_') + '_' + str(os.getpid())
 
     outFullPath = buildOutputFileName(args.inFilePath, args.destDir, fileStamp)
+    if args.compress == 'gzip':
+        outFullPath += '.gz'
+    elif args.compress == 'zstd':
+        outFullPath += '.zst'
 
     #********************
     #print('In: %s' % args.inFilePath)
@@ -171,6 +219,20 @@ if __name__ == "__main__":
             pass
 
     logFile = os.path.join(logDir, 'j2s_%s_%s.log' % (os.path.basename(args.inFilePath), fileStamp))
+    if args.warningsFile:
+        warningsFile = os.path.join(logDir, 'j2s_%s_%s_warnings.jsonl' % (os.path.basename(args.inFilePath), fileStamp))
+    else:
+        warningsFile = None
+    if args.cProfile:
+        profileStatsFile = os.path.join(logDir, 'j2s_%s_%s.pstats' % (os.path.basename(args.inFilePath), fileStamp))
+    else:
+        profileStatsFile = None
+    if args.metricsDir is not None:
+        if not os.path.isdir(args.metricsDir):
+            os.makedirs(args.metricsDir)
+        metricsFile = os.path.join(args.metricsDir, 'j2s_%s_%s.%s' % (os.path.basename(args.inFilePath), fileStamp, args.metricsFormat))
+    else:
+        metricsFile = None
 
 
 #    print('xpunge: %s' % args.dropTables)
@@ -190,11 +252,15 @@ if __name__ == "__main__":
     else:
         outputFormat = OutputDisposition.OutputFormat.SQL_INSERTS_AND_CSV
 
-    outSQLFile = OutputFile(outFullPath, outputFormat, options='wb')  # overwrite any sql file that's there
+    outSQLFile = OutputFile(outFullPath, outputFormat, options='wb', bufferSize=args.bufferSize)  # overwrite any sql file that's there
     jsonConverter = JSONToRelation(InURI(args.inFilePath),
                                    outSQLFile,
                                    mainTableName='EdxTrackEvent',
-    				               logFile=logFile
+    				               logFile=logFile,
+                                   warningsFile=warningsFile,
+                                   profile=args.profile,
+                                   profileStatsFile=profileStatsFile,
+                                   metricsFile=metricsFile
                                    )
     try:
         # Setting useDisplayNameCache to True prevents guaranteed
@@ -206,7 +272,9 @@ if __name__ == "__main__":
         						  'EdxTrackEvent',
         						  replaceTables=args.dropTables,
         						  dbName='Edx',
-                      useDisplayNameCache=True
+                      useDisplayNameCache=True,
+                      deferPrivateMerge=args.deferMerge,
+                      partitionByQuarter=args.quarterFiles
         						  ))
     except Exception as e:
         with open(logFile, 'w') as fd:
@@ -846,7 +846,7 @@ class TrackLogPuller(object):
             self.logInfo("Pulled %s OpenEdX tracking log files from S3" % str(len(rfileNamesToPull)))
         return rfileNamesToPull
 
-    def transform(self, logFilePathsOrDir=None, csvDestDir=None, processOnCluster=False, dryRun=False):
+    def transform(self, logFilePathsOrDir=None, csvDestDir=None, processOnCluster=False, dryRun=False, profile=False, cProfile=False, metricsDir=None):
         '''
         Given a list of full-path log files, initiate their transform.
         Uses gnu parallel to use multiple cores if available. One error log file
@@ -871,6 +871,14 @@ class TrackLogPuller(object):
         @type: bool
         @param dryRun: if True, only log what *would* be done. Cause no actual changes.
         @type dryRun: Bool
+        @param profile: if True, each json2sql.py logs the time spent in each stage of its transform.
+        @type profile: Bool
+        @param cProfile: if True, each json2sql.py writes cProfile statistics next to its log.
+        @type cProfile: Bool
+        @param metricsDir: if given, each json2sql.py writes snapshots of its throughput, rows per table,
+                           and ETA to a .prom file in this directory, for node_exporter's textfile collector.
+                           The path must not contain spaces.
+        @type metricsDir: String
         '''
 
         self.logDebug("Method transform() called with logFilePathsOrDir='%s'; csvDestDir='%s'" % (logFilePathsOrDir,csvDestDir))
@@ -937,6 +945,18 @@ class TrackLogPuller(object):
         logDir = os.path.join(csvDestDir, '..') + '/TransformLogs'
         print('Transform logs will be in %s' % logDir)
 
+        # The transform shell scripts pass options
+        # in JSON2SQL_OPTIONS on to json2sql.py:
+        json2sqlOptions = []
+        if profile:
+            json2sqlOptions.append('--profile')
+        if cProfile:
+            json2sqlOptions.append('--cProfile')
+        if metricsDir is not None:
+            json2sqlOptions.extend(['--metricsDir', os.path.abspath(metricsDir)])
+        transformEnv = dict(os.environ)
+        transformEnv['JSON2SQL_OPTIONS'] = ' '.join(json2sqlOptions)
+
         if dryRun:
             self.logInfo('Would start to transform %d tracklog files...' % len(fileList))
             # List just the basenames of the log files.
@@ -997,7 +1017,7 @@ class TrackLogPuller(object):
                 # in Eclipse), comment the subprocess line,
                 # and uncomment up to the "#******"
                 #***********
-                subprocess.call(shellCommand)
+                subprocess.call(shellCommand, env=transformEnv)
                 
 #                 from input_source import InURI                
 #                 from json_to_relation import JSONToRelation
@@ -1342,6 +1362,18 @@ if __name__ == '__main__':
                         help='For load: maximum number of new OpenEdx tracking log files to pull from AmazonS3',
                         type=int
                         )
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='For transform: log the time spent in each stage of each\n' +\
+                             '    transform to its log in TransformLogs.')
+    parser.add_argument('--cProfile',
+                        action='store_true',
+                        help='For transform: also write cProfile statistics of each transform\n' +\
+                             '    to a .pstats file in TransformLogs.')
+    parser.add_argument('--metricsDir',
+                        action='store',
+                        help='For transform: directory to which each transform writes snapshots\n' +\
+                             '    of its throughput, rows per table, and ETA as a Prometheus .prom file.')
     parser.add_argument('-u', '--user',
                         action='store',
                         help='For load: User ID that is to log into MySQL. Default: the user who is invoking this script.')
@@ -1547,7 +1579,8 @@ if __name__ == '__main__':
             tblCreator.logErr("You need to provide sqlDest, since TrackLogPuller.LOCAL_LOG_STORE_ROOT in manageEdxDb.py was not customized.")
             sys.exit(1)
 
-        tblCreator.transform(logFilePathsOrDir=allLogFiles, csvDestDir=args.sqlDest, dryRun=args.dryRun, processOnCluster=args.onCluster)
+        tblCreator.transform(logFilePathsOrDir=allLogFiles, csvDestDir=args.sqlDest, dryRun=args.dryRun, processOnCluster=args.onCluster,
+                             profile=args.profile, cProfile=args.cProfile, metricsDir=args.metricsDir)
 
     if args.toDo == 'load' or args.toDo == 'transformLoad' or args.toDo == 'pullTransformLoad':
         # For loading, args.sqlSrc must be None, or a readable directory, or a sequence of readable .sql files.
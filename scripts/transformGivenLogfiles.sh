@@ -13,13 +13,16 @@
 # Takes a destination dir and a list of track log
 # files. Transforms the log files, and places the
 # resulting .sql and .csv files in the destination dir.
-# Invokes json2sql.py with '-t csv', causing one
+# Invokes json2sql.py with '-t csv -m', causing one
 # .sql file for each log file to be created, plus
 # as many .csv files for each log file as there are
 # tables. The .sql file contains statements that loads 
 # the .csv files. The loading is done after transform
 # via executeCSVLoad.sh
 #
+# Further json2sql.py options, such as --profile,
+# may be passed in environment variable JSON2SQL_OPTIONS.
+#
 # Assumes that json2sql.py is in same directory
 # as this script. But this script can be called
 # from anywhere.
@@ -66,9 +69,9 @@ thisScriptDir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 echo "Transform-only start transform: `date`" >> /tmp/transformOnly.txt
 if [[ $PLATFORM == 'macos' ]]
 then   
-    time /usr/local/bin/parallel --gnu --progress $thisScriptDir/json2sql.py  -t csv $destDir ::: ${@};
+    time /usr/local/bin/parallel --gnu --progress $thisScriptDir/json2sql.py  -t csv -m $JSON2SQL_OPTIONS $destDir ::: ${@};
 else
-    time parallel --gnu --progress $thisScriptDir/json2sql.py  -t csv $destDir ::: ${@};
+    time parallel --gnu --progress $thisScriptDir/json2sql.py  -t csv -m $JSON2SQL_OPTIONS $destDir ::: ${@};
 fi    
 echo "Transform-only transform done: `date`" >> /tmp/transformOnly.txt
 
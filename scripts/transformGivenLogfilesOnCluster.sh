@@ -21,13 +21,16 @@
 # is a destination dir into which result SQL/CSV files
 # will be placed. Transforms the log files, and places the
 # resulting .sql and .csv files in the destination dir.
-# Invokes json2sql.py with '-t csv', causing one
+# Invokes json2sql.py with '-t csv -m', causing one
 # .sql file for each log file to be created, plus
 # as many .csv files for each log file as there are
 # tables. The .sql file contains statements that loads 
 # the .csv files. The loading is done after transform
 # via executeCSVLoad.sh
 #
+# Further json2sql.py options, such as --profile,
+# may be passed in environment variable JSON2SQL_OPTIONS.
+#
 # Assumes that json2sql.py is in same directory
 # as this script. But this script can be called
 # from anywhere.
@@ -128,6 +131,6 @@ do
 
     # ...and process:
     echo "Transform-only start transform: `date`: ${chosenFile}" >> $LOGFILE
-    $thisScriptDir/json2sql.py  -t csv $destDir ${chosenFile}.DONE.gz
+    $thisScriptDir/json2sql.py  -t csv -m $JSON2SQL_OPTIONS $destDir ${chosenFile}.DONE.gz
     echo "`date`: ${chosenFile} is done." >> $LOGFILE
 done